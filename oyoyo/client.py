@@ -15,6 +15,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import queue
 import socket
 import ssl
 import sys
@@ -26,6 +27,9 @@ import os
 from oyoyo.parse import parse_raw_irc_command
 
 
+# what credentials are replaced with in captures
+REDACTED = b"<redacted>"
+
 # Adapted from http://code.activestate.com/recipes/511490-implementation-of-the-token-bucket-algorithm/
 class TokenBucket(object):
     """An implementation of the token bucket algorithm.
@@ -102,7 +106,15 @@ class IRCClient:
         self.lock = threading.RLock()
         self.stream_handler = lambda output, level=None: print(output)
 
+        self.capture = None # a binary file to record every line sent and received to
         self.tokenbucket = TokenBucket(23, 1.73)
+        self.pacer = None # told of every line sent and received, to adjust the token bucket
+        self.lines_sent = 0
+        self.lines_received = 0
+        self.send_waits = 0
+        self.send_wait_time = 0.0
+        self.send_queue = None # lines waiting for the sending thread, once start_sending() was called
+        self.send_queue_time = 0.0 # how long the lines sent from it waited there, in total
 
         self.__dict__.update(kwargs)
         self.command_handler = cmd_handler
@@ -147,9 +159,82 @@ class IRCClient:
             msg = bytes(" ", "utf_8").join(bargs)
             self.stream_handler('---> send {0}'.format(str(msg)[1:]))
 
+            if self.send_queue is not None:
+                self.send_queue.put((time.time(), msg))
+                return
+
+            self._wait_for_token()
+            self._write(msg)
+
+    def start_sending(self):
+        """ send lines from a thread of this client's own from now on.
+        send() then only queues the line and returns, and it's the
+        sending thread which waits for the token bucket, so whoever is
+        sending (such as the game loop) isn't held up while it refills.
+        """
+        if self.send_queue is None:
+            self.send_queue = queue.SimpleQueue()
+            threading.Thread(None, self._send_queued, name="send-{0}".format(self.host), daemon=True).start()
+
+    def _send_queued(self):
+        while True:
+            queued, msg = self.send_queue.get()
+            # not holding the lock, so that more lines can be queued meanwhile
+            self._wait_for_token()
+            with self.lock:
+                self.send_queue_time += time.time() - queued
+                try:
+                    self._write(msg)
+                except OSError as e:
+                    # the connection is gone; the receiving end finds out and ends the client
+                    self.stream_handler('Error: {0}'.format(e), level="warning")
+
+    def _wait_for_token(self):
+        if not self.tokenbucket.consume(1):
+            start = time.time()
             while not self.tokenbucket.consume(1):
                 time.sleep(0.3)
-            self.socket.send(msg + bytes("\r\n", "utf_8"))
+            self.send_waits += 1
+            self.send_wait_time += time.time() - start
+
+    def _write(self, msg):
+        self.socket.send(msg + bytes("\r\n", "utf_8"))
+        self.lines_sent += 1
+        if self.capture is not None:
+            self.record(b">", msg)
+        if self.pacer is not None:
+            self.pacer.sent(msg)
+
+    def record(self, direction, line):
+        """ append a line to the capture, with a monotonic timestamp and
+        its direction: b">" for sent, b"<" for received, and b"*" when
+        (re)connecting. Each record is a single write, so the sending and
+        receiving threads can't split each other's records.
+        """
+        line = line.rstrip(b"\r")
+        if direction == b">":
+            line = self.redact(line)
+        self.capture.write(b"%.6f %s %s\n" % (time.monotonic(), direction, line))
+
+    def redact(self, line):
+        """ return a line being sent with any credentials in it replaced
+        by a placeholder: the arguments of PASS, AUTHENTICATE and NickServ
+        IDENTIFY, and the password wherever else it appears (such as in a
+        GHOST or REGAIN command).
+        """
+        command, _, rest = line.partition(b" ")
+        upper = command.upper()
+        if upper in (b"PASS", b"AUTHENTICATE") and rest:
+            return command + b" " + REDACTED
+        if upper in (b"NS", b"NICKSERV") and rest:
+            return command + b" " + REDACTED
+        if upper == b"PRIVMSG":
+            target, _, text = rest.partition(b" ")
+            if text.lstrip(b":")[:8].upper() == b"IDENTIFY":
+                return command + b" " + target + b" :IDENTIFY " + REDACTED
+        if self.password:
+            line = line.replace(self.password.encode("utf_8"), REDACTED)
+        return line
 
     def connect(self):
         """ initiates the connection to the server set in self.host:self.port
@@ -176,6 +261,9 @@ class IRCClient:
             if self.use_ssl:
                 self.socket = ssl.wrap_socket(self.socket)
 
+            if self.capture is not None:
+                self.record(b"*", "{0}:{1}".format(self.host, self.port).encode("utf_8"))
+
             if not self.blocking:
                 self.socket.setblocking(0)
 
@@ -213,35 +301,47 @@ class IRCClient:
                     buffer = data.pop()
 
                     for el in data:
-                        prefix, command, args = parse_raw_irc_command(el)
-
-                        try:
-                            enc = "utf8"
-                            fargs = [arg.decode(enc) for arg in args if isinstance(arg,bytes)]
-                        except UnicodeDecodeError:
-                            enc = "latin1"
-                            fargs = [arg.decode(enc) for arg in args if isinstance(arg,bytes)]
-
-                        try:
-                            largs = list(args)
-                            if prefix is not None:
-                                prefix = prefix.decode(enc)
-                            self.stream_handler("<--- receive {0} {1} ({2})".format(prefix, command, ", ".join(fargs)), level="debug")
-                            # for i,arg in enumerate(largs):
-                                # if arg is not None: largs[i] = arg.decode(enc)
-                            if command in self.command_handler:
-                                self.command_handler[command](self, prefix,*fargs)
-                            elif "" in self.command_handler:
-                                self.command_handler[""](self, prefix, command, *fargs)
-                        except Exception as e:
-                            sys.stderr.write(traceback.format_exc())
-                            raise e  # ?
+                        self.handle_line(el)
                 yield True
         finally:
             if self.socket:
                 self.stream_handler('closing socket')
                 self.socket.close()
                 yield False
+
+    def handle_line(self, el):
+        """ parse one raw line from the server, and pass it on to the
+        command handler.
+        """
+        self.lines_received += 1
+        if self.capture is not None:
+            self.record(b"<", el)
+        prefix, command, args = parse_raw_irc_command(el)
+
+        try:
+            enc = "utf8"
+            fargs = [arg.decode(enc) for arg in args if isinstance(arg,bytes)]
+        except UnicodeDecodeError:
+            enc = "latin1"
+            fargs = [arg.decode(enc) for arg in args if isinstance(arg,bytes)]
+
+        try:
+            largs = list(args)
+            if prefix is not None:
+                prefix = prefix.decode(enc)
+            if self.pacer is not None:
+                self.pacer.received(prefix, command, fargs)
+            self.stream_handler("<--- receive {0} {1} ({2})".format(prefix, command, ", ".join(fargs)), level="debug")
+            # for i,arg in enumerate(largs):
+                # if arg is not None: largs[i] = arg.decode(enc)
+            if command in self.command_handler:
+                self.command_handler[command](self, prefix,*fargs)
+            elif "" in self.command_handler:
+                self.command_handler[""](self, prefix, command, *fargs)
+        except Exception as e:
+            sys.stderr.write(traceback.format_exc())
+            raise e  # ?
+
     def msg(self, user, msg):
         for line in msg.split('\n'):
             maxchars = 494 - len(self.nickname+self.ident+self.hostmask+user)
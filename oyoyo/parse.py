@@ -56,7 +56,7 @@ def parse_raw_irc_command(element):
     command = command.lower()
     if isinstance(command, bytes): command = command.decode("utf_8")
 
-    if args[0].startswith(bytes(':', 'utf_8')):
+    if args and args[0].startswith(bytes(':', 'utf_8')):
         args = [bytes(" ", "utf_8").join(args)[1:]]
     else:
         for idx, arg in enumerate(args):
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+# Play back IRC traffic recorded with IRC_CAPTURE_FILE against this checkout,
+# and report how long the bot took to handle each line, by command; see src/replay.py.
+# Run it on the same capture before and after a change to see what it did to the bot's speed.
+
+import argparse
+import os
+import sys
+import tempfile
+
+parser = argparse.ArgumentParser(description="Play back a capture of IRC traffic and report the handling time of each line.")
+parser.add_argument("capture", help="capture file to play back")
+parser.add_argument("-s", "--session", type=int, default=-1, help="which connection in the capture to play back, from 1 (default: the last one)")
+parser.add_argument("--realtime", action="store_true", help="play back at the speed it was recorded at, instead of as fast as possible")
+parser.add_argument("--workdir", help="where to keep the database and logs (default: a new temporary directory)")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    del sys.argv[1:] # src parses the command line too
+    capture = os.path.abspath(args.capture)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="lykos-replay-")
+    os.makedirs(workdir, exist_ok=True)
+
+import src
+from src import db, replay
+
+def main():
+    found = replay.sessions(replay.read_capture(capture))
+    if not found:
+        parser.error("{0} is empty".format(args.capture))
+    if args.session == 0 or not -len(found) <= args.session <= len(found):
+        parser.error("there are {0} sessions in {1}".format(len(found), args.capture))
+    records = found[args.session - 1 if args.session > 0 else args.session]
+
+    os.chdir(workdir)
+    # the bot logs everything to the console as well; keep it out of the report
+    sys.stdout.flush()
+    report = os.fdopen(os.dup(1), "w")
+    os.dup2(os.open("console.log", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644), 1)
+    db.init()
+    lines = replay.Replayer(records, realtime=args.realtime).play()
+    with report:
+        print("\n".join(lines), file=report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Play lots of games without connecting anywhere, as a benchmark and as a
+# check that every game mode can still be played to the end without errors.
+# Exits with a non-zero status if any game errored, stalled, or couldn't start.
+# With --balance, plays every size each mode allows instead, and reports how
+# often each team and role wins next to the games recorded in data.sqlite3.
+
+import argparse
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+parser = argparse.ArgumentParser(description="Play simulated games of every game mode, or the given ones.")
+parser.add_argument("-m", "--mode", action="append", dest="modes", metavar="MODE", help="game mode to play (may be repeated)")
+parser.add_argument("-n", "--games", type=int, default=100, help="games to play per mode (default: %(default)s)")
+parser.add_argument("-p", "--players", type=int, help="players per game (default: random, within what the mode allows)")
+parser.add_argument("-j", "--processes", type=int, help="worker processes (default: one per CPU)")
+parser.add_argument("--seed", type=int, help="seed for the game sizes and every game")
+parser.add_argument("--balance", action="store_true", help="play --games games at every size and report win rates per team and role")
+parser.add_argument("--workdir", help="where to keep the workers' databases and logs (default: a new temporary directory)")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    del sys.argv[1:] # src parses the command line too, and the workers inherit it
+
+import os
+
+import src
+import src.settings as var
+from src import balance, simulator
+
+def main():
+    modes = args.modes or sorted(var.GAME_MODES.keys() - var.DISABLED_GAMEMODES - {"roles"}) # roles needs to be told the roles
+    for mode in modes:
+        if mode not in var.GAME_MODES:
+            parser.error("unknown game mode: {0}".format(mode))
+
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    rng = random.Random(seed)
+    tasks = []
+    for mode in modes:
+        sizes = simulator.game_sizes(mode)
+        if args.players is not None and args.players not in sizes:
+            parser.error("{0} needs between {1} and {2} players".format(mode, sizes[0], sizes[-1]))
+        if args.balance:
+            for size in ([args.players] if args.players is not None else sizes):
+                for i in range(args.games):
+                    tasks.append((mode, size, seed + len(tasks)))
+        else:
+            for i in range(args.games):
+                tasks.append((mode, args.players or rng.choice(sizes), seed + len(tasks)))
+
+    print("Playing {0} games with seed {1}...".format(len(tasks), seed))
+    start = time.perf_counter()
+    results = defaultdict(list)
+    for result in simulator.run(tasks, processes=args.processes, workdir=args.workdir, hashseed=seed % 2**32):
+        results[result["mode"]].append(result)
+    elapsed = time.perf_counter() - start
+
+    if args.balance:
+        # only read the history if there is one; the database would be created otherwise
+        history = balance.from_history(modes) if os.path.isfile("data.sqlite3") else {}
+        for mode in modes:
+            table = balance.BalanceTable(mode)
+            for result in results[mode]:
+                if result["results"]:
+                    table.add_game(result["results"])
+            print(balance.report(table, history.get(mode)))
+            print()
+        print("Played {0} games in {1:.1f}s; stalled games are left out".format(len(tasks), elapsed))
+        return 0
+
+    failed = False
+    print("{0:<13}{1:>6}{2:>9}{3:>8}{4:>7}{5:>9}  {6}".format("mode", "games", "stalled", "errors", "days", "ms/game", "winners"))
+    for mode in modes:
+        games = results[mode]
+        played = [r for r in games if r["played"]]
+        stalled = sum(r["stalled"] for r in games)
+        errors = sum(r["errors"] for r in games)
+        if stalled or errors or len(played) < len(games):
+            failed = True
+        winners = Counter(r["winner"] or "nobody" for r in played)
+        print("{0:<13}{1:>6}{2:>9}{3:>8}{4:>7.1f}{5:>9.1f}  {6}".format(
+            mode, len(played), stalled, errors,
+            sum(r["days"] for r in played) / max(len(played), 1),
+            sum(r["wall_time"] for r in games) * 1000 / max(len(games), 1),
+            ", ".join("{0} {1:.0%}".format(w, n / len(played)) for w, n in winners.most_common())))
+
+    print("Played {0} games in {1:.1f}s ({2:.0f} games per minute)".format(len(tasks), elapsed, len(tasks) * 60 / elapsed))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -57,6 +57,7 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--debug', action='store_true')
 parser.add_argument('--verbose', action='store_true')
 parser.add_argument('--normal', action='store_true')
+parser.add_argument('--profile-startup', action='store_true') # handled by wolfbot.py
 
 args = parser.parse_args()
 
@@ -67,4 +68,9 @@ if args.normal: normal = True
 botconfig.DEBUG_MODE = debug_mode if not normal else False
 botconfig.VERBOSE_MODE = verbose if not normal else False
 
+# the messages were loaded before the logs could be written to
+from src.messages import messages
+for warning in messages.warnings:
+    errlog(warning)
+
 # vim: set sw=4 expandtab:
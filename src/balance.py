@@ -0,0 +1,152 @@
+"""How often each team and role wins, in simulated games or in the game history.
+
+A BalanceTable counts the games of one game mode: how many were played at
+each size, which team won them, and how each role did. Counts are kept in
+one array per team or role, indexed by game size, so tables for the same
+mode can be added together cheaply (say, one per worker process). These
+are NumPy arrays if NumPy is installed, and plain arrays otherwise.
+
+Simulated games are recorded in the database like any other game, and
+tables are filled from those same rows, so simulated and real win rates
+can be compared directly; ./simulate.py --balance prints that comparison.
+"""
+
+import array
+import itertools
+import math
+
+try:
+    import numpy # type: ignore
+except ImportError:
+    numpy = None
+
+import src.settings as var
+from src import db
+
+__all__ = ["BalanceTable", "from_history", "report"]
+
+def _zeros(length):
+    if numpy is not None:
+        return numpy.zeros(length, dtype=numpy.int64)
+    return array.array("q", bytes(8 * length))
+
+def _add(into, counts):
+    if numpy is not None:
+        into += counts
+    else:
+        for i, count in enumerate(counts):
+            into[i] += count
+
+class BalanceTable:
+    """Win counts for one game mode, broken down by game size."""
+
+    def __init__(self, mode):
+        _, minp, maxp, _ = var.GAME_MODES[mode]
+        self.mode = mode
+        self.sizes = range(minp, maxp + 1)
+        self.games = _zeros(len(self.sizes))
+        self.wins = {} # winning team -> games won at each size
+        self.played = {} # role -> times it was played at each size
+        self.won = {} # role -> times it won, as a team or individually, at each size
+
+    def _counts(self, table, key):
+        counts = table.get(key)
+        if counts is None:
+            counts = table[key] = _zeros(len(self.sizes))
+        return counts
+
+    def add_game(self, rows):
+        """Count one game, given its (gamesize, winner, role, team_win, indiv_win) rows.
+
+        Returns False if the game's size isn't one this mode can be played with.
+        """
+        size, winner = rows[0][:2]
+        if size not in self.sizes:
+            return False
+        i = size - self.sizes.start
+        self.games[i] += 1
+        self._counts(self.wins, winner or "nobody")[i] += 1
+        for _, _, role, team_win, indiv_win in rows:
+            self._counts(self.played, role)[i] += 1
+            if team_win or indiv_win:
+                self._counts(self.won, role)[i] += 1
+        return True
+
+    def update(self, other):
+        """Add the counts of another table for the same mode to this one."""
+        _add(self.games, other.games)
+        for mine, theirs in ((self.wins, other.wins), (self.played, other.played), (self.won, other.won)):
+            for key, counts in theirs.items():
+                _add(self._counts(mine, key), counts)
+
+    def teams(self):
+        """Return the teams which won any games, villagers and wolves first."""
+        return sorted(self.wins, key=lambda team: ({"villagers": 0, "wolves": 1}.get(team, 2), team))
+
+    def roles(self):
+        """Return the roles which were played, in ROLE_GUIDE order."""
+        order = {role: i for i, role in enumerate(var.ROLE_GUIDE)}
+        return sorted(self.played, key=lambda role: (order.get(role, len(order)), role))
+
+def from_history(modes):
+    """Return a BalanceTable for each of the given modes, filled from the recorded games."""
+    tables = {mode: BalanceTable(mode) for mode in modes}
+    for (_, mode), rows in itertools.groupby(db.get_game_results(), key=lambda row: row[:2]):
+        if mode in tables:
+            tables[mode].add_game([row[2:] for row in rows])
+    return tables
+
+def _rate(wins, games):
+    if not games:
+        return "-"
+    return "{0:.0%}".format(wins / games)
+
+def _differs(wins1, games1, wins2, games2):
+    """Return True if two win rates are more than two standard errors apart."""
+    if not games1 or not games2:
+        return False
+    pooled = (wins1 + wins2) / (games1 + games2)
+    error = math.sqrt(pooled * (1 - pooled) * (1 / games1 + 1 / games2))
+    return abs(wins1 / games1 - wins2 / games2) > 2 * error
+
+def _compare(wins, games, real_wins, real_games):
+    mark = "*" if _differs(wins, games, real_wins, real_games) else ""
+    return "{0:>4} ({1:>4}){2:1}".format(_rate(wins, games), _rate(real_wins, real_games), mark)
+
+def report(table, history=None):
+    """Return a report of the win rates in table, next to those in history if given.
+
+    Rates are shown as "simulated (recorded)", and marked with * where they
+    are far enough apart that chance is an unlikely explanation.
+    """
+    if history is None:
+        history = BalanceTable(table.mode)
+    lines = ["{0}: {1} games ({2} recorded)".format(table.mode, int(sum(table.games)), int(sum(history.games)))]
+
+    teams = table.teams()
+    teams.extend(team for team in history.teams() if team not in teams)
+    lines.append("{0:>7}{1:>13}  {2}".format("players", "games", "".join("{0:<13.12}".format(team) for team in teams)))
+    for i, size in enumerate(table.sizes):
+        games, real_games = int(table.games[i]), int(history.games[i])
+        if not games and not real_games:
+            continue
+        rates = []
+        for team in teams:
+            wins = int(table.wins[team][i]) if team in table.wins else 0
+            real_wins = int(history.wins[team][i]) if team in history.wins else 0
+            rates.append(_compare(wins, games, real_wins, real_games))
+        lines.append("{0:>7}{1:>6} ({2:>4})  {3}".format(size, games, real_games, "".join(rates)))
+
+    roles = table.roles()
+    roles.extend(role for role in history.roles() if role not in roles)
+    lines.append("{0:<18}{1:>13}  {2}".format("role", "played", "won"))
+    for role in roles:
+        played = int(sum(table.played[role])) if role in table.played else 0
+        won = int(sum(table.won[role])) if role in table.won else 0
+        real_played = int(sum(history.played[role])) if role in history.played else 0
+        real_won = int(sum(history.won[role])) if role in history.won else 0
+        lines.append("{0:<18}{1:>6} ({2:>4})  {3}".format(role, played, real_played, _compare(won, played, real_won, real_played)))
+
+    return "\n".join(line.rstrip() for line in lines)
+
+# vim: set sw=4 expandtab:
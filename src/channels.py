@@ -5,9 +5,9 @@ from enum import Enum
 from src.context import IRCContext, Features, lower
 from src.events import Event
 from src import settings as var
-from src import users
+from src import metrics, users
 
-Main = None # main channel
+Main = None # main channel, or the channel of the game running (see src.games)
 Dummy = None # fake channel
 Dev = None # dev channel
 
@@ -79,6 +79,9 @@ class Channel(IRCContext):
         self.timestamp = None
         self.state = _States.NotJoined
         self._pending = []
+        self._desired = {} # mode key -> (mode, target) to apply at the end of the batch
+        self._sent = {} # mode key -> (mode, target, time sent) for changes the server hasn't confirmed yet
+        self._mode_timer = None
 
     def __del__(self):
         self.users.clear()
@@ -151,18 +154,25 @@ class Channel(IRCContext):
             return
 
         max_modes = Features["MODES"]
-        params = []
-        for change in changes:
-            if isinstance(change, str):
-                change = (change, None)
-            mode, target = change
-            if len(mode) < 2:
-                mode = "+" + mode
-            params.append((mode, target))
+        params = _parse_changes(changes)
         params.sort(key=lambda x: x[0][0]) # sort by prefix
 
+        # only the changes with a parameter count towards the server's limit, but the line length limits them all
+        room = 510 - len(":{0}!{1}@{2} MODE {3} ".format(self.client.nickname, self.client.ident, self.client.hostmask, self.name))
+
         while params:
-            cur, params = params[:max_modes], params[max_modes:]
+            with_target = 0
+            length = 0
+            for count, (mode, target) in enumerate(params):
+                length += len(mode)
+                if target is not None:
+                    length += len("{0}".format(target)) + 1
+                    with_target += 1
+                if count and (with_target > max_modes or length > room):
+                    break
+            else:
+                count = len(params)
+            cur, params = params[:count], params[count:]
             modes, targets = zip(*cur)
             prefix = ""
             final = []
@@ -181,6 +191,106 @@ class Channel(IRCContext):
 
             self.client.send("MODE", self.name, "".join(final))
 
+    def set_modes(self, *changes):
+        """Bring the channel to the given modes, sending as little as possible.
+
+        This takes changes the same way as mode() does, but instead of
+        sending them right away, it waits MODE_BATCH_DELAY seconds for
+        more of them. Then only the changes which the channel isn't already
+        in the state of (as far as the bot knows; see apply_modes()) are
+        sent, packed as tightly as the server allows. A later change to the
+        same mode, and target if there is one, replaces an earlier one, so
+        that voicing and then devoicing someone sends nothing at all.
+
+        """
+
+        for mode, target in _parse_changes(changes):
+            self._desired[self._mode_key(mode, target)] = (mode, target)
+
+        if var.MODE_BATCH_DELAY <= 0:
+            self.apply_modes()
+        elif self._mode_timer is None or not self._mode_timer.is_alive():
+            self._mode_timer = metrics.Timer(var.MODE_BATCH_DELAY, self.apply_modes)
+            self._mode_timer.daemon = True
+            self._mode_timer.start()
+
+    def apply_modes(self):
+        """Send the changes given to set_modes() which would make a difference, now.
+
+        A change makes no difference if the channel's modes already are what
+        it would make them, or if the bot sent it less than MODE_CONFIRM_TIMEOUT
+        seconds ago and the server hasn't said otherwise since. Status modes
+        (op, voice, ...) for people who aren't in the channel are dropped;
+        removals from lists (bans, quiets, ...) are always sent, as the bot
+        may not know the whole list.
+
+        """
+
+        if self._mode_timer is not None:
+            self._mode_timer.cancel()
+            self._mode_timer = None
+
+        desired, self._desired = self._desired, {}
+        now = time.time()
+        for key, (mode, target, sent) in list(self._sent.items()):
+            if now - sent > var.MODE_CONFIRM_TIMEOUT:
+                del self._sent[key]
+
+        changes = []
+        for key, (mode, target) in desired.items():
+            if self._has_mode(key, mode, target):
+                continue
+            changes.append((mode, target))
+            self._sent[key] = (mode, target, now)
+
+        if changes:
+            self.mode(*changes)
+
+    def _mode_key(self, mode, target):
+        status_modes = Features.get("PREFIX", {}).values()
+        list_modes, all_set, only_set, no_set = Features.get("CHANMODES", ("", "", "", ""))
+        c = mode[1]
+        if target is None or c in all_set or c in only_set: # one value at a time; -k and +l have one, but -l doesn't
+            return (c, None)
+        if c in status_modes:
+            if isinstance(target, users.User):
+                target = target.nick
+            return (c, lower(target))
+        return (c, target)
+
+    def _has_mode(self, key, mode, target):
+        """Return True if the channel is in, or about to be in, the state mode would put it in."""
+        if key in self._sent:
+            sent_mode, sent_target, _ = self._sent[key]
+            if key[1] is not None: # the target is part of the key
+                return sent_mode == mode
+            return sent_mode == mode and str(sent_target) == str(target)
+
+        status_modes = Features.get("PREFIX", {}).values()
+        list_modes, all_set, only_set, no_set = Features.get("CHANMODES", ("", "", "", ""))
+        prefix, c = mode
+        if c in status_modes:
+            for user in self.users:
+                if lower(user.nick) == key[1]:
+                    present = (user in self.modes.get(c, ()))
+                    break
+            else:
+                return True # not here, so there's nothing to do
+        elif c in list_modes:
+            if prefix == "-":
+                return False # the list may not be complete, and removing what isn't there is harmless
+            present = (target in self.modes.get(c, {}))
+        elif c in all_set or c in only_set:
+            if prefix == "+":
+                return c in self.modes and str(self.modes[c]) == str(target)
+            present = (c in self.modes)
+        elif c in no_set:
+            present = (c in self.modes)
+        else:
+            return False # we don't know what this mode is; just send it
+
+        return present is (prefix == "+")
+
     def update_modes(self, actor, mode, targets):
         """Update the channel's mode registry with the new modes.
 
@@ -202,6 +312,12 @@ class Channel(IRCContext):
                 prefix = c
                 continue
 
+            if self._sent:
+                if c in status_modes or c in list_modes or (prefix == "+" and (c in all_set or c in only_set)):
+                    self._sent.pop(self._mode_key(prefix + c, targets[i]), None)
+                else:
+                    self._sent.pop(self._mode_key(prefix + c, None), None)
+
             if prefix == "+":
                 if c in status_modes: # op/voice status; keep it here and update the user's registry too
                     if c not in self.modes:
@@ -267,6 +383,11 @@ class Channel(IRCContext):
             event.dispatch(var, user)
 
     def _clear(self):
+        if self._mode_timer is not None:
+            self._mode_timer.cancel()
+            self._mode_timer = None
+        self._desired.clear()
+        self._sent.clear()
         for user in self.users:
             del user.channels[self]
         self.users.clear()
@@ -275,6 +396,18 @@ class Channel(IRCContext):
         self.timestamp = None
         del _channels[self.name]
 
+def _parse_changes(changes):
+    """Return mode changes, as given to Channel.mode(), as a list of (mode, target) with the mode prefixed."""
+    params = []
+    for change in changes:
+        if isinstance(change, str):
+            change = (change, None)
+        mode, target = change
+        if len(mode) < 2:
+            mode = "+" + mode
+        params.append((mode, target))
+    return params
+
 class FakeChannel(Channel):
 
     is_fake = True
@@ -196,12 +196,13 @@ class IRCContext:
     def who(self, data=b""):
         """Send a WHO request with respect to the server's capabilities.
 
-        To get the WHO replies, add an event listener for "who_result",
-        and an event listener for "who_end" for the end of WHO replies.
+        To get the WHO replies, add an event listener for "who_end"; they
+        all come at once, in its event.params.replies attribute, when the
+        server is done replying (see src.hooks.end_who).
 
         The return value of this function is an integer equal to the data
         given. If the server supports WHOX, the same integer will be in the
-        event.params.data attribute. Otherwise, this attribute will be 0.
+        data attribute of each reply's params. Otherwise, this will be 0.
 
         """
 
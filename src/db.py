@@ -6,17 +6,24 @@ import sys
 import time
 from collections import defaultdict
 import threading
+import weakref
 from datetime import datetime, timedelta
 
 import botconfig
 import src.settings as var
+from src import metrics
 from src.utilities import irc_lower, break_long_message, role_order, singular
 
 # increment this whenever making a schema change so that the schema upgrade functions run on start
 # they do not run by default for performance reasons
-SCHEMA_VERSION = 5
+SCHEMA_VERSION = 6
 
 _ts = threading.local()
+_pool = [] # connections whose threads have finished, for the next threads to reuse
+_pool_lock = threading.Lock()
+_init_lock = threading.RLock()
+_initializing = False
+_initialized = False
 
 def init_vars():
     with var.GRAVEYARD_LOCK:
@@ -303,6 +310,41 @@ def add_game(mode, size, started, finished, winner, players, options):
                 c.execute("""INSERT INTO game_player_role (game_player, role, special)
                              VALUES (?, ?, 1)""", (gpid, sq))
 
+def get_last_game():
+    """ Returns (id, winner) of the most recently recorded game, or (None, None) if there are none. """
+    conn = _conn()
+    c = conn.cursor()
+    c.execute("SELECT id, winner FROM game ORDER BY id DESC LIMIT 1")
+    return c.fetchone() or (None, None)
+
+def get_game_results(mode=None, gameid=None):
+    """ Returns every role played in recorded games and how it did, optionally only for one game mode or game.
+
+    Each row is (game id, gamemode, gamesize, winner, role, team_win, indiv_win), ordered
+    by game. Templates are included as roles of their own, the same as in !playerstats.
+    """
+    conn = _conn()
+    c = conn.cursor()
+    c.execute("""SELECT
+                   g.id,
+                   g.gamemode,
+                   g.gamesize,
+                   g.winner,
+                   gpr.role,
+                   gp.team_win,
+                   gp.indiv_win
+                 FROM game g
+                 JOIN game_player gp
+                   ON gp.game = g.id
+                 JOIN game_player_role gpr
+                   ON gpr.game_player = gp.id
+                   AND gpr.special = 0
+                 WHERE
+                   (? IS NULL OR g.gamemode = ?)
+                   AND (? IS NULL OR g.id = ?)
+                 ORDER BY g.id""", (mode, mode, gameid, gameid))
+    return c.fetchall()
+
 def get_player_stats(acc, hostmask, role):
     peid, plid = _get_ids(acc, hostmask)
     if not _total_games(peid):
@@ -828,6 +870,24 @@ def set_pre_restart_state(players):
         c = conn.cursor()
         c.execute("UPDATE pre_restart_state SET players = ?", (" ".join(players),))
 
+def get_game_state():
+    conn = _conn()
+    c = conn.cursor()
+    c.execute("SELECT game_state FROM pre_restart_state")
+    row = c.fetchone()
+    if row is None:
+        return None
+    return row[0]
+
+def set_game_state(data):
+    # data is None to clear the saved state
+    conn = _conn()
+    with conn:
+        c = conn.cursor()
+        c.execute("UPDATE pre_restart_state SET game_state = ?", (data,))
+        if c.rowcount == 0:
+            c.execute("INSERT INTO pre_restart_state (players, game_state) VALUES (NULL, ?)", (data,))
+
 def _upgrade(oldversion):
     # try to make a backup copy of the database
     print ("Performing schema upgrades, this may take a while.", file=sys.stderr)
@@ -863,6 +923,9 @@ def _upgrade(oldversion):
             if oldversion < 5:
                 print ("Upgrade from version 4 to 5...", file=sys.stderr)
                 c.execute("CREATE INDEX game_gamesize_idx ON game (gamesize)")
+            if oldversion < 6:
+                print ("Upgrade from version 5 to 6...", file=sys.stderr)
+                c.execute("ALTER TABLE pre_restart_state ADD COLUMN game_state BLOB")
 
             print ("Rebuilding indexes...", file=sys.stderr)
             c.execute("REINDEX")
@@ -1001,16 +1064,45 @@ def _toggle_thing(thing, acc, hostmask):
     _set_thing(thing, "CASE {0} WHEN 1 THEN 0 ELSE 1 END".format(thing), acc, hostmask, raw=True)
 
 def _conn():
+    if not _initialized:
+        init()
     try:
         return _ts.conn
     except AttributeError:
-        _ts.conn = sqlite3.connect("data.sqlite3")
-        with _ts.conn:
-            c = _ts.conn.cursor()
+        pass
+    # every timer runs in a thread of its own, so threads come and go all
+    # the time (on every network); hand their connections on rather than
+    # opening a new one each time
+    with _pool_lock:
+        conn = _pool.pop() if _pool else None
+    if conn is None:
+        conn = sqlite3.connect("data.sqlite3", check_same_thread=False,
+                               factory=_TimedConnection if metrics.enabled else sqlite3.Connection)
+        with conn:
+            c = conn.cursor()
             c.execute("PRAGMA foreign_keys = ON")
         # remap NOCASE to be IRC casing
-        _ts.conn.create_collation("NOCASE", _collate_irc)
-        return _ts.conn
+        conn.create_collation("NOCASE", _collate_irc)
+    _ts.conn = conn
+    weakref.finalize(threading.current_thread(), _release, conn)
+    return conn
+
+def _release(conn):
+    with _pool_lock:
+        _pool.append(conn)
+
+class _TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        with metrics.DB_QUERY_SECONDS.time(sql.split(None, 1)[0].upper()):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with metrics.DB_QUERY_SECONDS.time(sql.split(None, 1)[0].upper()):
+            return super().executemany(sql, *args)
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
 
 def _collate_irc(s1, s2):
     # treat hostmasks specially, otherwise call irc_lower on stuff
@@ -1033,28 +1125,46 @@ def _collate_irc(s1, s2):
     else:
         return 1
 
-need_install = not os.path.isfile("data.sqlite3")
-conn = _conn()
-with conn:
-    c = conn.cursor()
-    c.execute("PRAGMA foreign_keys = ON")
-    if need_install:
-        _install()
-    c.execute("PRAGMA user_version")
-    row = c.fetchone()
-    ver = row[0]
-    c.close()
-
-if ver == 0:
-    # new schema does not exist yet, migrate from old schema
-    # NOTE: game stats are NOT migrated to the new schema; the old gamestats table
-    # will continue to exist to allow queries against it, however given how horribly
-    # inaccurate the stats on it are, it would be a disservice to copy those inaccurate
-    # statistics over to the new schema which has the capability of actually being accurate.
-    _migrate()
-elif ver < SCHEMA_VERSION:
-    _upgrade(ver)
-
-del need_install, conn, c, ver
+def init():
+    """Create or upgrade the database schema if needed.
+
+    This runs the first time the database is used, but the bot calls it
+    during startup so that any lengthy upgrade happens before connecting.
+    """
+    global _initializing, _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized or _initializing: # _install and friends call _conn() as well
+            return
+        _initializing = True
+        try:
+            _init_schema()
+        finally:
+            _initializing = False
+        _initialized = True
+
+def _init_schema():
+    need_install = not os.path.isfile("data.sqlite3")
+    conn = _conn()
+    with conn:
+        c = conn.cursor()
+        c.execute("PRAGMA foreign_keys = ON")
+        if need_install:
+            _install()
+        c.execute("PRAGMA user_version")
+        row = c.fetchone()
+        ver = row[0]
+        c.close()
+
+    if ver == 0:
+        # new schema does not exist yet, migrate from old schema
+        # NOTE: game stats are NOT migrated to the new schema; the old gamestats table
+        # will continue to exist to allow queries against it, however given how horribly
+        # inaccurate the stats on it are, it would be a disservice to copy those inaccurate
+        # statistics over to the new schema which has the capability of actually being accurate.
+        _migrate()
+    elif ver < SCHEMA_VERSION:
+        _upgrade(ver)
 
 # vim: set expandtab:sw=4:ts=4:
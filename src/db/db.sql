@@ -170,5 +170,7 @@ CREATE TABLE bantrack (
 -- Used to hold state between restarts
 CREATE TABLE pre_restart_state (
 	-- List of players to ping after the bot comes back online
-	players TEXT
+	players TEXT,
+	-- Snapshot of the game in progress, used to resume it after a restart or crash
+	game_state BLOB
 );
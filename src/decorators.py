@@ -3,11 +3,14 @@ import threading
 import string
 import random
 import json
+import queue
 import re
+import reprlib
+import time
 
 import urllib.request, urllib.parse
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 
 from oyoyo.client import IRCClient
 from oyoyo.parse import parse_nick
@@ -17,7 +20,8 @@ import src.settings as var
 from src.dispatcher import MessageDispatcher
 from src.utilities import *
 from src.messages import messages
-from src import channels, users, logger, errlog, events
+from src import channels, users, logger, metrics, errlog, events
+from src.flood import flood
 
 adminlog = logger.logger("audit.log")
 
@@ -32,12 +36,194 @@ class _local(threading.local):
 
 _local = _local()
 
-# This is a mapping of stringified tracebacks to (link, uuid) tuples
-# That way, we don't have to call in to the website everytime we have
-# another error. If you ever need to delete pastes, do the following:
+# Tracebacks are formatted on the thread which hit the error, but everything
+# slow (writing the error log, pastebinning, sending to channels) happens on a
+# background thread, so that an error storm can't hold up the bot. Errors are
+# fingerprinted by the exception type and the place it was raised from, and
+# repeats of the same error are counted instead of being reported again.
+# If you ever need to delete pastes, do the following:
 # $ curl -x DELETE https://ptpb.pw/<uuid>
 
-_tracebacks = {}
+_repr = reprlib.Repr()
+_repr.maxlevel = 3
+_repr.maxtuple = _repr.maxlist = _repr.maxarray = _repr.maxdict = 25
+_repr.maxset = _repr.maxfrozenset = _repr.maxdeque = 25
+
+def _short_repr(value):
+    limit = var.TRACEBACK_REPR_LIMIT
+    _repr.maxstring = _repr.maxlong = _repr.maxother = limit
+    r = _repr.repr(value)
+    if len(r) > limit:
+        r = r[:limit] + "..."
+    return r
+
+def fingerprint(exc_type, tb):
+    """Return a key which is the same for every occurrence of the same error.
+
+    Only the exception type and the code locations in the traceback are
+    used, so the same bug triggered with different arguments (or messages)
+    still has the same fingerprint.
+    """
+    where = []
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        where.append((code.co_filename, code.co_name, tb.tb_lineno))
+        tb = tb.tb_next
+    return (exc_type.__module__, exc_type.__qualname__, tuple(where))
+
+def describe(key):
+    """Return a one-line description of the error with the given fingerprint."""
+    module, name, where = key
+    if module != "builtins":
+        name = "{0}.{1}".format(module, name)
+    if not where:
+        return name
+    filename, func, lineno = where[-1]
+    return "{0} in {1} ({2}:{3})".format(name, func, filename, lineno)
+
+def paste_traceback(contents):
+    """Paste contents to TRACEBACK_PASTE_URL, returning a (link, uuid) tuple.
+
+    uuid is None if the paste already existed.
+    """
+    bot_id = re.sub(r"[^A-Za-z0-9-]", "-", users.Bot.nick)
+    bot_id = re.sub(r"--+", "-", bot_id).strip("-")
+
+    rand_id = "".join(random.sample(string.ascii_letters + string.digits, 8))
+
+    api_url = var.TRACEBACK_PASTE_URL.format(bot=bot_id, id=rand_id)
+
+    req = urllib.request.Request(api_url, urllib.parse.urlencode({
+            "c": contents,  # contents
+        }).encode("utf-8", "replace"))
+
+    req.add_header("Accept", "application/json")
+    resp = urllib.request.urlopen(req, timeout=10)
+    data = json.loads(resp.read().decode("utf-8"))
+    return data["url"] + "/pytb", data.get("uuid")
+
+class _Error:
+    __slots__ = ("count", "repeats", "last_report", "link", "uuid")
+
+    def __init__(self):
+        self.count = 0 # how many times this happened in total
+        self.repeats = 0 # how many times this happened since it was last reported
+        self.last_report = None
+        self.link = None
+        self.uuid = None
+
+class ErrorReporter:
+    """Report errors from a background thread.
+
+    The paste function is called with the full traceback text and should
+    return a (link, uuid) tuple; replace it to pastebin somewhere else.
+    """
+
+    def __init__(self, paste=paste_traceback):
+        self.paste = paste
+        self.errors = OrderedDict() # fingerprint -> _Error, the most recently seen last
+        self.total = 0 # errors seen, including those forgotten since
+        self.dropped = 0 # errors which didn't fit in the queue
+        self._queue = queue.Queue(var.TRACEBACK_QUEUE_SIZE)
+        self._recent = deque() # when the reports in the last minute were made
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def check(self, key):
+        """Count an occurrence of the error and decide whether to report it.
+
+        Returns the _Error to pass to submit(), or None if the error should
+        only be counted this time.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.total += 1
+            error = self.errors.get(key)
+            if error is None:
+                error = self.errors[key] = _Error()
+                while len(self.errors) > var.TRACEBACK_MAX_ERRORS:
+                    self.errors.popitem(last=False)
+            else:
+                self.errors.move_to_end(key)
+            error.count += 1
+            error.repeats += 1
+            if error.last_report is None or now - error.last_report >= var.TRACEBACK_REPEAT_INTERVAL:
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) < var.TRACEBACK_RATE_LIMIT:
+                    self._recent.append(now)
+                    error.last_report = now
+                    return error
+            count = error.count
+        # not reported this time, but the log should still show that it happened
+        errlog("{0} (x{1}, not reported)".format(describe(key), count))
+        return None
+
+    def submit(self, error, text):
+        with self._lock:
+            repeats, error.repeats = error.repeats, 0
+        try:
+            self._queue.put_nowait((error, text, repeats))
+        except queue.Full:
+            self.dropped += 1
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(None, self._work, name="error-reporter")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def wait(self):
+        """Block until every queued error has been reported."""
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            error, text, repeats = self._queue.get()
+            try:
+                self._report(error, text, repeats)
+            except Exception:
+                # there's nowhere left to report this, so only the console gets it
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def _report(self, error, text, repeats):
+        if repeats > 1:
+            text = "{0}\n(Happened {1} times since it was last reported, {2} times in total)".format(text, repeats, error.count)
+        errlog(text)
+
+        if channels.Main is not None and (not botconfig.PASTEBIN_ERRORS or channels.Main is not channels.Dev):
+            channels.Main.send(messages["error_log"])
+        if botconfig.PASTEBIN_ERRORS and channels.Dev is not None:
+            message = [messages["error_log"]]
+
+            if error.link is None:
+                try:
+                    error.link, error.uuid = self.paste(text)
+                except Exception:
+                    errlog("Unable to pastebin traceback:\n" + traceback.format_exc())
+                    message.append(messages["error_pastebin"])
+                else:
+                    message.append(error.link)
+                    if error.uuid is None: # if there's no uuid, the paste already exists and we don't have it
+                        message.append("(Already reported by another instance)")
+                    else:
+                        message.append("(uuid: {0})".format(error.uuid))
+
+            else:
+                message.append(error.link)
+                if error.uuid is None:
+                    message.append("(Previously reported)")
+                else:
+                    message.append("(uuid: {0}-...)".format(error.uuid[:8]))
+
+            if repeats > 1:
+                message.append("(x{0})".format(repeats))
+
+            channels.Dev.send(" ".join(message), prefix=botconfig.DEV_PREFIX)
+
+reporter = ErrorReporter()
 
 class chain_exceptions:
 
@@ -63,28 +249,10 @@ class chain_exceptions:
 
 class print_traceback:
 
-    def __enter__(self):
-        _local.level += 1
-        return self
-
-    def __exit__(self, exc_type, exc_value, tb):
-        if exc_type is exc_value is tb is None:
-            _local.level -= 1
-            return False
-
-        if not issubclass(exc_type, Exception):
-            _local.level -= 1
-            return False
-
-        if _local.level > 1:
-            _local.level -= 1
-            return False # the outermost caller should handle this
-
+    @staticmethod
+    def format(tb):
         variables = ["", None]
 
-        if _local.handler is None:
-            _local.handler = chain_exceptions(exc_value)
-
         if var.TRACEBACK_VERBOSITY > 0:
             word = "\nLocal variables from frame #{0} (in {1}):\n"
             variables.append(None)
@@ -107,7 +275,7 @@ class print_traceback:
                         continue
                     variables.append(word.format(i, frame.f_code.co_name))
                     for name, value in frame.f_locals.items():
-                        variables.append("{0} = {1!r}".format(name, value))
+                        variables.append("{0} = {1}".format(name, _short_repr(value)))
 
             if len(variables) > 3:
                 variables.append("\n")
@@ -119,53 +287,31 @@ class print_traceback:
                 variables[2] = "No local variables found in all frames."
 
         variables[1] = _local.handler.traceback
+        return "\n".join(variables)
 
-        if not botconfig.PASTEBIN_ERRORS or channels.Main is not channels.Dev:
-            channels.Main.send(messages["error_log"])
-        if botconfig.PASTEBIN_ERRORS and channels.Dev is not None:
-            message = [messages["error_log"]]
-
-            link_uuid = _tracebacks.get("\n".join(variables))
-            if link_uuid is None:
-                bot_id = re.sub(r"[^A-Za-z0-9-]", "-", users.Bot.nick)
-                bot_id = re.sub(r"--+", "-", bot_id).strip("-")
-
-                rand_id = "".join(random.sample(string.ascii_letters + string.digits, 8))
-
-                api_url = "https://ptpb.pw/~{0}-error-{1}".format(bot_id, rand_id)
-
-                data = None
-                with _local.handler:
-                    req = urllib.request.Request(api_url, urllib.parse.urlencode({
-                            "c": "\n".join(variables),  # contents
-                        }).encode("utf-8", "replace"))
+    def __enter__(self):
+        _local.level += 1
+        return self
 
-                    req.add_header("Accept", "application/json")
-                    resp = urllib.request.urlopen(req)
-                    data = json.loads(resp.read().decode("utf-8"))
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is exc_value is tb is None:
+            _local.level -= 1
+            return False
 
-                if data is None: # couldn't fetch the link
-                    message.append(messages["error_pastebin"])
-                    variables[1] = _local.handler.traceback # an error happened; update the stored traceback
-                else:
-                    link, uuid = _tracebacks["\n".join(variables)] = (data["url"] + "/pytb", data.get("uuid"))
-                    message.append(link)
-                    if uuid is None: # if there's no uuid, the paste already exists and we don't have it
-                        message.append("(Already reported by another instance)")
-                    else:
-                        message.append("(uuid: {0})".format(uuid))
+        if not issubclass(exc_type, Exception):
+            _local.level -= 1
+            return False
 
-            else:
-                link, uuid = link_uuid
-                message.append(link)
-                if uuid is None:
-                    message.append("(Previously reported)")
-                else:
-                    message.append("(uuid: {0}-...)".format(uuid[:8]))
+        if _local.level > 1:
+            _local.level -= 1
+            return False # the outermost caller should handle this
 
-            channels.Dev.send(" ".join(message), prefix=botconfig.DEV_PREFIX)
+        if _local.handler is None:
+            _local.handler = chain_exceptions(exc_value)
 
-        errlog("\n".join(variables))
+        error = reporter.check(fingerprint(exc_type, tb))
+        if error is not None: # only bother formatting errors which will be reported
+            reporter.submit(error, self.format(tb))
 
         _local.level -= 1
         if not _local.level: # outermost caller; we're done here
@@ -201,12 +347,189 @@ class handle_error:
         with print_traceback():
             return self.func(*args, **kwargs)
 
+# Command dispatch
+
+def _cached(func):
+    name = func.__name__
+    def get(self):
+        if name not in self._cache:
+            self._cache[name] = func(self)
+        return self._cache[name]
+    get.__doc__ = func.__doc__
+    return property(get)
+
+class CommandContext:
+    """The sender of a message, and everything the command checks need to know about them.
+
+    Each piece is only looked up the first time it's needed, and is then
+    shared by every command the message triggers. Call invalidate() after
+    running anything which may have changed the game state or permissions.
+    """
+
+    def __init__(self, cli, rawnick, chan):
+        self.cli = cli
+        self.rawnick = rawnick
+        self.chan = chan
+        self.user = users._get(rawnick, allow_none=True) # FIXME
+        if users.equals(chan, users.Bot.nick): # PM
+            self.target = users.Bot
+        else:
+            self.target = channels.get(chan, allow_none=True)
+        self.private = self.target is users.Bot
+        self.nick, _, ident, host = parse_nick(rawnick)
+        self.ident = ident or ""
+        self.host = host or ""
+        self._wrapper = None
+        self._cache = {}
+
+    @property
+    def wrapper(self):
+        if self._wrapper is None:
+            self._wrapper = MessageDispatcher(self.user, self.target)
+        return self._wrapper
+
+    def invalidate(self):
+        self._cache.clear()
+
+    @_cached
+    def participant(self):
+        return self.nick in list_participants()
+
+    @_cached
+    def role_set(self):
+        """The sender's role and templates, if they are participating."""
+        return frozenset([get_role(self.nick)] + get_templates(self.nick))
+
+    @_cached
+    def roles(self):
+        """Every entry of var.ROLES the sender is in."""
+        return frozenset(role for role, nicks in var.ROLES.items() if self.nick in nicks) # FIXME: Need to change this once var.ROLES[role] holds User instances
+
+    @_cached
+    def playing(self):
+        return self.nick in list_players() and self.nick not in var.DISCONNECTED
+
+    @_cached
+    def silenced(self):
+        return self.nick in var.SILENCED
+
+    @_cached
+    def is_owner(self):
+        if self.user is None:
+            return is_owner(self.nick, self.ident, self.host)
+        return self.user.is_owner()
+
+    @_cached
+    def is_admin(self):
+        if self.user is None:
+            return is_admin(self.nick, self.ident, self.host)
+        return self.user.is_admin()
+
+    @_cached
+    def flags(self):
+        temp = self._lower()
+        return var.FLAGS[temp[0]] + var.FLAGS_ACCS[temp[1]] # TODO: add flags handling to User
+
+    @_cached
+    def denied(self):
+        temp = self._lower()
+        return var.DENY[temp[0]] | var.DENY_ACCS[temp[1]] # TODO: add denied commands handling to User
+
+    def _lower(self):
+        if self.user is not None:
+            temp = self.user.lower()
+            return temp.rawnick, temp.account
+        acc = None
+        if self.nick in var.USERS and var.USERS[self.nick]["account"] != "*":
+            acc = irc_lower(var.USERS[self.nick]["account"])
+        return irc_lower(self.nick) + "!" + irc_lower(self.ident) + "@" + self.host.lower(), acc
+
+# outcomes of check_command
+IGNORE, RUN, RUN_LOGGED, DENY = range(4)
+
+def check_command(fn, ctx):
+    """Decide whether the sender of a message may use fn, which can be a command or a cmd.
+
+    Returns a (outcome, message key) tuple; the message key is what to tell
+    the user if the outcome is DENY. RUN_LOGGED means the command should be
+    logged to the audit log before running.
+    """
+    if (ctx.private and not fn.pm) or (not ctx.private and not fn.chan):
+        return IGNORE, None # channel or PM command that we don't allow
+
+    if not ctx.private and ctx.target is not channels.Main and not (fn.flag or fn.owner_only):
+        if fn.empty or not fn.alt_allowed:
+            return IGNORE, None # commands not allowed in alt channels
+
+    if fn.empty:
+        return RUN, None
+
+    if fn.phases and var.PHASE not in fn.phases:
+        return IGNORE, None
+
+    if fn.playing and not ctx.playing:
+        return IGNORE, None
+
+    listed = fn.allowed(ctx)
+    if fn.roles:
+        if ctx.roles.isdisjoint(fn.roles):
+            return IGNORE, None
+    elif listed is False:
+        return IGNORE, None
+
+    if fn.silenced and ctx.silenced:
+        return DENY, "silenced"
+
+    if fn.roles or listed:
+        return RUN, None # don't check restrictions for role commands
+
+    if fn.owner_only:
+        if ctx.is_owner:
+            return RUN_LOGGED, None
+        return DENY, "not_owner"
+
+    if fn.flag and (ctx.is_admin or ctx.is_owner):
+        return RUN_LOGGED, None
+
+    if not fn.names.isdisjoint(ctx.denied):
+        return DENY, "invalid_permissions"
+
+    if fn.flag:
+        if fn.flag in ctx.flags:
+            return RUN_LOGGED, None
+        return DENY, "not_an_admin"
+
+    return RUN, None
+
+# phase -> {name: commands which can be used in that phase}
+_phase_tables = {}
+
+def commands_for(name):
+    """Return the commands registered under name which can be used in the current phase."""
+    phase = var.PHASE
+    table = _phase_tables.get(phase)
+    if table is None:
+        table = {}
+        for key, fns in list(COMMANDS.items()):
+            # commands without a name run on every message, whatever the phase
+            fns = tuple(fn for fn in fns if not key or not fn.phases or phase in fn.phases)
+            if fns:
+                table[key] = fns
+        _phase_tables[phase] = table
+    return table.get(name, ())
+
+def commands_changed():
+    """Drop the per-phase command tables; call this after adding or removing commands."""
+    _phase_tables.clear()
+
 class command:
     def __init__(self, *commands, flag=None, owner_only=False, chan=True, pm=False,
                  playing=False, silenced=False, phases=(), roles=(), users=None,
-                 exclusive=False):
+                 exclusive=False, readonly=False, rate_limit=None):
 
         self.commands = frozenset(commands)
+        self.names = self.commands
+        self.empty = "" in self.commands
         self.flag = flag
         self.owner_only = owner_only
         self.chan = chan
@@ -221,6 +544,8 @@ class command:
         self.name = commands[0]
         self.alt_allowed = bool(flag or owner_only)
         self.exclusive = exclusive
+        self.readonly = readonly # if True, running the command does not invalidate cached responses
+        self.rate_limit = rate_limit # (uses, seconds) allowed per user, or None for no limit
 
         alias = False
         self.aliases = []
@@ -242,6 +567,7 @@ class command:
             if alias:
                 self.aliases.append(name)
             alias = True
+        commands_changed()
 
     def __call__(self, func):
         if isinstance(func, command):
@@ -250,87 +576,49 @@ class command:
         self.__doc__ = func.__doc__
         return self
 
+    def remove(self):
+        for name in self.commands:
+            if self in COMMANDS.get(name, ()):
+                COMMANDS[name].remove(self)
+                if not COMMANDS[name]:
+                    del COMMANDS[name]
+        commands_changed()
+
+    def allowed(self, ctx):
+        if self.users is None:
+            return None
+        return ctx.user in self.users
+
     @handle_error
     def caller(self, cli, rawnick, chan, rest):
         _ignore_locals_ = True
-        user = users._get(rawnick, allow_none=True) # FIXME
-
-        if users.equals(chan, users.Bot.nick): # PM
-            target = users.Bot
-        else:
-            target = channels.get(chan, allow_none=True)
-
-        if user is None or target is None:
-            return
-
-        dispatcher = MessageDispatcher(user, target)
-
-        if (not self.pm and dispatcher.private) or (not self.chan and dispatcher.public):
-            return # channel or PM command that we don't allow
-
-        if dispatcher.public and target is not channels.Main and not (self.flag or self.owner_only):
-            if "" in self.commands or not self.alt_allowed:
-                return # commands not allowed in alt channels
-
-        if "" in self.commands:
-            return self.func(var, dispatcher, rest)
-
-        if self.phases and var.PHASE not in self.phases:
-            return
-
-        if self.playing and (user.nick not in list_players() or user.nick in var.DISCONNECTED): # FIXME: Need to change this once list_players() / var.DISCONNECTED use User instances
-            return
-
-        for role in self.roles:
-            if user.nick in var.ROLES[role]: # FIXME: Need to change this once var.ROLES[role] holds User instances
-                break
-        else:
-            if (self.users is not None and user not in self.users) or self.roles:
-                return
+        return self.dispatch(CommandContext(cli, rawnick, chan), rest)
 
-        if self.silenced and user.nick in var.SILENCED: # FIXME: Need to change this once var.SILENCED holds User instances
-            dispatcher.pm(messages["silenced"])
+    @handle_error
+    def dispatch(self, ctx, rest):
+        _ignore_locals_ = True
+        if ctx.user is None or ctx.target is None:
             return
 
-        if self.roles or (self.users is not None and user in self.users):
-            return self.func(var, dispatcher, rest) # don't check restrictions for role commands
-
-        if self.owner_only:
-            if user.is_owner():
-                adminlog(chan, rawnick, self.name, rest)
-                return self.func(var, dispatcher, rest)
-
-            dispatcher.pm(messages["not_owner"])
+        outcome, message = check_command(self, ctx)
+        if outcome == IGNORE:
             return
-
-        temp = user.lower()
-
-        flags = var.FLAGS[temp.rawnick] + var.FLAGS_ACCS[temp.account] # TODO: add flags handling to User
-
-        if self.flag and (user.is_admin() or user.is_owner()):
-            adminlog(chan, rawnick, self.name, rest)
-            return self.func(var, dispatcher, rest)
-
-        denied_commands = var.DENY[temp.rawnick] | var.DENY_ACCS[temp.account] # TODO: add denied commands handling to User
-
-        if self.commands & denied_commands:
-            dispatcher.pm(messages["invalid_permissions"])
+        if self.rate_limit is not None and outcome != DENY and not flood.admit_command(self, ctx.rawnick):
             return
-
-        if self.flag:
-            if self.flag in flags:
-                adminlog(chan, rawnick, self.name, rest)
-                return self.func(var, dispatcher, rest)
-
-            dispatcher.pm(messages["not_an_admin"])
+        if outcome == DENY:
+            ctx.wrapper.pm(messages[message])
             return
-
-        return self.func(var, dispatcher, rest)
+        if outcome == RUN_LOGGED:
+            adminlog(ctx.chan, ctx.rawnick, self.name, rest)
+        if metrics.enabled:
+            with metrics.COMMAND_SECONDS.time(self.name or self.func.__name__):
+                return self.func(var, ctx.wrapper, rest)
+        return self.func(var, ctx.wrapper, rest)
 
 class cmd:
     def __init__(self, *cmds, raw_nick=False, flag=None, owner_only=False,
                  chan=True, pm=False, playing=False, silenced=False,
-                 phases=(), roles=(), nicks=None):
+                 phases=(), roles=(), nicks=None, readonly=False, rate_limit=None):
 
         self.cmds = cmds
         self.raw_nick = raw_nick
@@ -347,6 +635,11 @@ class cmd:
         self.aftergame = False
         self.name = cmds[0]
         self.exclusive = False # for compatibility with new command API
+        self.readonly = readonly
+        self.rate_limit = rate_limit
+        self.names = frozenset(cmds)
+        self.empty = "" in self.names
+        self.alt_allowed = bool(flag or owner_only)
 
         alias = False
         self.aliases = []
@@ -359,9 +652,14 @@ class cmd:
                     raise ValueError("exclusive command already exists for {0}".format(name))
 
             COMMANDS[name].append(self)
+            if name in botconfig.ALLOWED_ALT_CHANNELS_COMMANDS:
+                self.alt_allowed = True
+            if name in getattr(botconfig, "OWNERS_ONLY_COMMANDS", ()):
+                self.owner_only = True
             if alias:
                 self.aliases.append(name)
             alias = True
+        commands_changed()
 
     def __call__(self, func):
         if isinstance(func, cmd):
@@ -370,128 +668,56 @@ class cmd:
         self.__doc__ = self.func.__doc__
         return self
 
+    def remove(self):
+        for name in self.cmds:
+            if self in COMMANDS.get(name, ()):
+                COMMANDS[name].remove(self)
+                if not COMMANDS[name]:
+                    del COMMANDS[name]
+        commands_changed()
+
+    def allowed(self, ctx):
+        if self.nicks is None:
+            return None
+        return ctx.nick in self.nicks
+
     @handle_error
     def caller(self, cli, rawnick, chan, rest):
         _ignore_locals_ = True
-        if users.equals(chan, users.Bot.nick):
-            chan = users.parse_rawnick_as_dict(rawnick)["nick"]
-
-        largs = [cli, rawnick, chan, rest]
-
-        cli, rawnick, chan, rest = largs
-        nick, mode, ident, host = parse_nick(rawnick)
-
-        if ident is None:
-            ident = ""
-
-        if host is None:
-            host = ""
-
-        if not self.raw_nick:
-            largs[1] = nick
-
-        if not self.pm and chan == nick:
-            return # PM command, not allowed
-
-        if not self.chan and chan != nick:
-            return # channel command, not allowed
-
-        if chan.startswith("#") and chan != botconfig.CHANNEL and not (self.flag or self.owner_only):
-            if "" in self.cmds:
-                return # don't have empty commands triggering in other channels
-            for command in self.cmds:
-                if command in botconfig.ALLOWED_ALT_CHANNELS_COMMANDS:
-                    break
-            else:
-                return
+        return self.dispatch(CommandContext(cli, rawnick, chan), rest)
 
+    @handle_error
+    def dispatch(self, ctx, rest):
+        _ignore_locals_ = True
+        nick = ctx.nick
         if nick not in var.USERS and not is_fake_nick(nick):
             return
 
-        if nick in var.USERS and var.USERS[nick]["account"] != "*":
-            acc = irc_lower(var.USERS[nick]["account"])
-        else:
-            acc = None
-        ident = irc_lower(ident)
-        host = host.lower()
-        hostmask = nick + "!" + ident + "@" + host
-
-        if "" in self.cmds:
-            return self.func(*largs)
-
-        if self.phases and var.PHASE not in self.phases:
-            return
-
-        if self.playing and (nick not in list_players() or nick in var.DISCONNECTED):
-            return
-
-        for role in self.roles:
-            if nick in var.ROLES[role]:
-                break
-        else:
-            if (self.nicks is not None and nick not in self.nicks) or self.roles:
-                return
-
-        if self.silenced and nick in var.SILENCED:
-            if chan == nick:
-                pm(cli, nick, messages["silenced"])
-            else:
-                cli.notice(nick, messages["silenced"])
+        outcome, message = check_command(self, ctx)
+        if outcome == IGNORE:
             return
-
-        if self.roles or (self.nicks is not None and nick in self.nicks):
-            return self.func(*largs) # don't check restrictions for role commands
-
-        forced_owner_only = False
-        if hasattr(botconfig, "OWNERS_ONLY_COMMANDS"):
-            for command in self.cmds:
-                if command in botconfig.OWNERS_ONLY_COMMANDS:
-                    forced_owner_only = True
-                    break
-
-        owner = is_owner(nick, ident, host)
-        if self.owner_only or forced_owner_only:
-            if owner:
-                adminlog(chan, rawnick, self.name, rest)
-                return self.func(*largs)
-
-            if chan == nick:
-                pm(cli, nick, messages["not_owner"])
-            else:
-                cli.notice(nick, messages["not_owner"])
+        if self.rate_limit is not None and outcome != DENY and not flood.admit_command(self, ctx.rawnick):
             return
 
-        flags = var.FLAGS[hostmask] + var.FLAGS_ACCS[acc]
-        admin = is_admin(nick, ident, host)
-        if self.flag and (admin or owner):
-            adminlog(chan, rawnick, self.name, rest)
-            return self.func(*largs)
-
-        denied_cmds = var.DENY[hostmask] | var.DENY_ACCS[acc]
-        for command in self.cmds:
-            if command in denied_cmds:
-                if chan == nick:
-                    pm(cli, nick, messages["invalid_permissions"])
-                else:
-                    cli.notice(nick, messages["invalid_permissions"])
-                return
-
-        if self.flag:
-            if self.flag in flags:
-                adminlog(chan, rawnick, self.name, rest)
-                return self.func(*largs)
-            elif chan == nick:
-                pm(cli, nick, messages["not_an_admin"])
+        chan = nick if ctx.private else ctx.chan
+        if outcome == DENY:
+            if ctx.private:
+                pm(ctx.cli, nick, messages[message])
             else:
-                cli.notice(nick, messages["not_an_admin"])
+                ctx.cli.notice(nick, messages[message])
             return
-
-        return self.func(*largs)
+        if outcome == RUN_LOGGED:
+            adminlog(chan, ctx.rawnick, self.name, rest)
+        if metrics.enabled:
+            with metrics.COMMAND_SECONDS.time(self.name or self.func.__name__):
+                return self.func(ctx.cli, ctx.rawnick if self.raw_nick else nick, chan, rest)
+        return self.func(ctx.cli, ctx.rawnick if self.raw_nick else nick, chan, rest)
 
 class hook:
-    def __init__(self, name, hookid=-1):
+    def __init__(self, name, hookid=-1, readonly=False):
         self.name = name
         self.hookid = hookid
+        self.readonly = readonly # if True, running the hook does not invalidate cached responses
         self.func = None
 
         HOOKS[name].append(self)
@@ -509,6 +735,12 @@ class hook:
         _ignore_locals_ = True
         return self.func(*args, **kwargs)
 
+    def remove(self):
+        if self in HOOKS.get(self.name, ()):
+            HOOKS[self.name].remove(self)
+            if not HOOKS[self.name]:
+                del HOOKS[self.name]
+
     @staticmethod
     def unhook(hookid):
         for each in list(HOOKS):
@@ -1,6 +1,10 @@
 # event system
+import time
 from collections import defaultdict
 from types import SimpleNamespace
+
+from src import metrics
+
 EVENT_CALLBACKS = defaultdict(list)
 
 __all__ = ["add_listener", "remove_listener", "Event"]
@@ -23,6 +27,8 @@ class Event:
         self.params = SimpleNamespace(**kwargs)
 
     def dispatch(self, *args, **kwargs):
+        if metrics.enabled:
+            start = time.perf_counter()
         self.stop_processing = False
         self.prevent_default = False
         for item in list(EVENT_CALLBACKS[self.name]):
@@ -30,6 +36,8 @@ class Event:
             if self.stop_processing:
                 break
 
+        if metrics.enabled:
+            metrics.EVENT_SECONDS.observe(time.perf_counter() - start, self.name)
         return not self.prevent_default
 
 # vim: set sw=4 expandtab:
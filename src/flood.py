@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import Counter
+
+from oyoyo.client import TokenBucket
+
+import src.settings as var
+
+__all__ = ["FloodControl", "flood"]
+
+def _sender(rawnick):
+    # key on ident@host, so that changing nicks doesn't get anyone a fresh bucket
+    return rawnick.partition("!")[2].lower() or rawnick.lower()
+
+class FloodControl:
+    """Drop messages from users who send them faster than we're willing to handle.
+
+    Every user has a bucket of USER_MESSAGE_BURST messages, which refills
+    at USER_MESSAGE_RATE messages per second; messages which find the
+    bucket empty are dropped before any command processing happens,
+    unless the caller says the sender is exempt. Commands can also have
+    their own per-user limit, given as the rate_limit=(uses, seconds)
+    argument to @command or @cmd.
+    """
+
+    def __init__(self):
+        self.dropped_total = 0 # messages dropped, ever
+        self.dropped = Counter() # sender -> messages dropped, for as long as their bucket is kept
+        self.dropped_commands = Counter() # command name -> uses dropped
+        self._buckets = {}
+        self._command_buckets = {}
+        self._last_prune = time.time()
+        self._lock = threading.Lock()
+
+    def admit(self, rawnick, exempt=None):
+        """Return True if a message from rawnick should be processed.
+
+        If rawnick is over the limit, exempt (if given) is called with no
+        arguments, and the message is let through anyway if it returns True.
+        """
+        if var.USER_MESSAGE_BURST <= 0:
+            return True
+        sender = _sender(rawnick)
+        with self._lock:
+            self._prune()
+            bucket = self._buckets.get(sender)
+            if bucket is None:
+                bucket = self._buckets[sender] = TokenBucket(var.USER_MESSAGE_BURST, var.USER_MESSAGE_RATE)
+            if bucket.consume(1):
+                return True
+        # outside of the lock, as working out whether they're exempt may have to wait for the game
+        if exempt is not None and exempt():
+            return True
+        with self._lock:
+            self.dropped_total += 1
+            self.dropped[sender] += 1
+        return False
+
+    def admit_command(self, fn, rawnick):
+        """Return True if rawnick may use fn now, as far as its rate_limit goes."""
+        uses, seconds = fn.rate_limit
+        key = (fn.name, _sender(rawnick))
+        with self._lock:
+            bucket = self._command_buckets.get(key)
+            if bucket is None:
+                bucket = self._command_buckets[key] = TokenBucket(uses, uses / seconds)
+            if bucket.consume(1):
+                return True
+            self.dropped_commands[fn.name] += 1
+            return False
+
+    def _prune(self):
+        # forget the buckets of anyone who has been quiet long enough for theirs to refill
+        now = time.time()
+        if now - self._last_prune < var.FLOOD_BUCKET_EXPIRY:
+            return
+        self._last_prune = now
+        for buckets in (self._buckets, self._command_buckets):
+            for key, bucket in list(buckets.items()):
+                idle = now - bucket.timestamp
+                if idle >= var.FLOOD_BUCKET_EXPIRY and bucket.tokens >= bucket.capacity:
+                    del buckets[key]
+                    if buckets is self._buckets:
+                        self.dropped.pop(key, None)
+
+flood = FloodControl()
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,79 @@
+"""Run everything that touches the games in one thread, one thing at a time.
+
+Once the loop is started, the IRC clients' receive loops and the timers
+no longer run anything themselves: messages, server events and expired
+timers are queued to the game loop, which runs them in the order they
+came in. As nothing else changes the game state, GRAVEYARD_LOCK and the
+other locks around it are only ever taken by this one thread, so they
+never make anybody wait; the checks for whether a timer still belongs to
+the current game remain, as a timer can expire and be queued just before
+whatever would have cancelled it.
+
+Lines sent to IRC are only queued from the loop; each client has its own
+thread which sends them, and which waits for the flood limiter (see
+IRCClient.start_sending), so a long message doesn't hold everything else up.
+
+Until the loop is started (as in the simulator), work runs right away in
+whichever thread submitted it, as it always has.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from src import logger, metrics
+from src.decorators import handle_error
+
+__all__ = ["GameLoop", "loop"]
+
+class GameLoop:
+    """A thread running queued work, oldest first."""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if metrics.enabled:
+            metrics.Gauge("lykos_game_loop_queue_length", "Work waiting for the game loop", func=lambda: self.pending)
+        self._thread = threading.Thread(None, self._work, name="game-loop")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Have the game loop call func, or call it right away if that's where this is running.
+
+        kind says what sort of work this is (privmsg, event, timer, ...),
+        for the queue latency metric.
+        """
+        if self._thread is None or threading.current_thread() is self._thread:
+            func(*args, **kwargs)
+            return
+        self._queue.put((time.perf_counter(), kind, handle_error(func), args, kwargs))
+
+    def _work(self):
+        while True:
+            queued, kind, func, args, kwargs = self._queue.get()
+            if metrics.enabled:
+                metrics.QUEUE_SECONDS.observe(time.perf_counter() - queued, kind)
+            try:
+                func(*args, **kwargs)
+            except SystemExit as e:
+                # quitting when the connection is already gone; nothing else would end the process
+                logger.flush()
+                os._exit(e.code if isinstance(e.code, int) else 1)
+
+loop = GameLoop()
+
+# vim: set sw=4 expandtab:
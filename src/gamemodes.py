@@ -10,7 +10,7 @@ import src.settings as var
 from src.utilities import *
 from src.messages import messages
 from src.decorators import handle_error
-from src import events, channels, users
+from src import events, channels, metrics, users
 
 def game_mode(name, minp, maxp, likelihood = 0):
     def decor(c):
@@ -219,7 +219,7 @@ class VillagergameMode(GameMode):
         if rand <= 0 and nspecials > 0:
             transition_day(cli, gameid=gameid)
         else:
-            t = threading.Timer(abs(rand), transition_day, args=(cli,), kwargs={"gameid": gameid})
+            t = metrics.Timer(abs(rand), transition_day, args=(cli,), kwargs={"gameid": gameid})
             t.start()
 
     def transition_day(self, evt, cli, var):
@@ -880,26 +880,17 @@ class SleepyMode(GameMode):
         self.west_cmd = decorators.cmd("west", "w", chan=False, pm=True, playing=True, phases=("night",))(self.west)
 
     def teardown(self):
-        from src import decorators
         events.remove_listener("dullahan_targets", self.dullahan_targets)
         events.remove_listener("transition_night_begin", self.setup_nightmares)
         events.remove_listener("chk_nightdone", self.prolong_night)
         events.remove_listener("transition_day_begin", self.nightmare_kill)
         events.remove_listener("del_player", self.happy_fun_times)
         events.remove_listener("rename_player", self.rename_player)
-        def remove_command(name, command):
-            if len(decorators.COMMANDS[name]) > 1:
-                decorators.COMMANDS[name].remove(command)
-            else:
-                del decorators.COMMANDS[name]
-        remove_command("north", self.north_cmd)
-        remove_command("n", self.north_cmd)
-        remove_command("east", self.east_cmd)
-        remove_command("e", self.east_cmd)
-        remove_command("south", self.south_cmd)
-        remove_command("s", self.south_cmd)
-        remove_command("west", self.west_cmd)
-        remove_command("w", self.west_cmd)
+        # through remove(), so that the per-phase command tables forget them as well
+        self.north_cmd.remove()
+        self.east_cmd.remove()
+        self.south_cmd.remove()
+        self.west_cmd.remove()
 
     def dullahan_targets(self, evt, cli, var, dullahans, max_targets):
         for dull in dullahans:
@@ -909,7 +900,7 @@ class SleepyMode(GameMode):
         if random.random() < 1/5:
             self.having_nightmare = True
             with var.WARNING_LOCK:
-                t = threading.Timer(60, self.do_nightmare, (cli, var, random.choice(list_players()), var.NIGHT_COUNT))
+                t = metrics.Timer(60, self.do_nightmare, (cli, var, random.choice(list_players()), var.NIGHT_COUNT))
                 t.daemon = True
                 t.start()
         else:
@@ -1135,7 +1126,7 @@ class SleepyMode(GameMode):
                 seers = [p for p in var.ROLES["seer"] if p in pl and random.random() < turn_chance]
                 harlots = [p for p in var.ROLES["harlot"] if p in pl and random.random() < turn_chance]
                 cultists = [p for p in var.ROLES["cultist"] if p in pl and random.random() < turn_chance]
-                cli.msg(botconfig.CHANNEL, messages["sleepy_priest_death"])
+                cli.msg(channels.Main.name, messages["sleepy_priest_death"])
                 for seer in seers:
                     var.ROLES["seer"].remove(seer)
                     var.ROLES["doomsayer"].add(seer)
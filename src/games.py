@@ -0,0 +1,281 @@
+"""Keep the state of each game apart, so that games can run in several channels at once.
+
+While a game is running, its state lives where it always has: in var, in
+the role modules, and in whichever settings its game mode changed. Every
+channel with a game gets a Game, which holds on to one copy of that state
+while another game is running. Binding a game (with game: ...) swaps its
+state in, and puts the previously bound game's state away; this only moves
+references around, so it costs the same however big the game is. The
+bound game's channel is channels.Main, and its lock is var.GRAVEYARD_LOCK.
+
+Binding happens wherever something from outside comes in: messages and
+commands are run in the game of the channel they were said in, or of the
+player who sent them, server events likewise, and timers in the game they
+were started from. Only one game is bound at a time, so games in the same
+process take turns rather than run side by side.
+
+Switching games doesn't start up or tear down their game modes: the event
+listeners and commands a mode set up are put away with the rest of its
+game's state, and put back as they were. Of the role modules, only the
+containers and flags with all-caps names (ROLE_STATE = {}, ...) are
+swapped; anything else a role keeps at module level is shared by every
+game, and whatever one game leaves there is seen by the others.
+"""
+
+import copy
+import sys
+import threading
+
+import src.settings as var
+from src import channels, decorators, events, metrics, snapshot
+from src.context import Features, lower
+from src.events import Event
+from src.responses import responses
+
+__all__ = ["GAME_VARS", "Game", "add", "get", "default", "current", "find", "playing", "run_in"]
+
+# everything in var which belongs to one game: what a snapshot saves, plus
+# the timers, the game mode and the settings it changed, votes for starting
+# and for modes, the rate limits of the game's commands, and the game lock
+GAME_VARS = snapshot.GAME_VARS + (
+    "TIMERS", "CURRENT_GAMEMODE", "ORIGINAL_SETTINGS", "START_VOTES", "GAMEMODE_VOTES", "ROLE_DEDUCTION",
+    "RESTART_TRIES", "CAN_START_TIME", "OLD_MODES", "INVESTIGATED", "LASTGIVEN", "LAST_START", "LAST_WAIT",
+    "WAIT_TB_LAST", "WAIT_TB_TOKENS", "LAST_STATS", "LAST_VOTES", "LAST_ADMINS", "LAST_GSTATS", "LAST_PSTATS",
+    "LAST_TIME", "LAST_PING", "ADMIN_PINGING", "PINGING_IFS", "GRAVEYARD_LOCK")
+
+GAMES = {} # lowercased channel name -> Game
+
+_lock = threading.RLock() # held for as long as a game is bound
+_bound = None # the game whose state is in place
+_adopted = False # whether a game has taken over the state var started with
+
+class Game:
+    """The game in one channel.
+
+    Reading an attribute in all caps gives that part of the game's state
+    (game.PHASE, game.ALL_PLAYERS, ...), whether the game is bound or not.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._vars = None # game state from var while not bound; None until first bound
+        self._modules = {} # role module name -> its game state, while not bound
+        self._settings = {} # settings changed by the game mode, while not bound
+        self._mode_hooks = ([], []) # listeners and commands set up by the game mode, while not bound
+        self._outer = [] # games which were bound before this one, when nested
+
+    def __repr__(self):
+        return "{self.__class__.__name__}({self.channel.name!r})".format(self=self)
+
+    def __getattr__(self, name):
+        if not name.isupper():
+            raise AttributeError(name)
+        with _lock:
+            if _bound is self:
+                return getattr(var, name)
+            if name in self._vars:
+                return self._vars[name]
+            if name in self._settings:
+                return self._settings[name]
+            # a setting this game's mode left alone; look past any change the bound game's mode made
+            return var.ORIGINAL_SETTINGS.get(name, getattr(var, name))
+
+    def __enter__(self):
+        _lock.acquire()
+        self._outer.append(_bound)
+        _switch(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        outer = self._outer.pop()
+        if outer is not None:
+            _switch(outer)
+        # otherwise leave this game bound; it's likely to be the next one to run anyway
+        _lock.release()
+        return False
+
+    def has_player(self, nick):
+        nick = lower(nick)
+        return any(lower(player.nick) == nick for player in self.ALL_PLAYERS)
+
+    def _save(self):
+        self._mode_hooks = _detach_mode(var.CURRENT_GAMEMODE)
+        self._vars = {name: getattr(var, name) for name in GAME_VARS if hasattr(var, name)}
+        # put back the settings the game mode changed, for the next game to change its own way
+        self._settings = {attr: getattr(var, attr) for attr in var.ORIGINAL_SETTINGS}
+        for attr, val in var.ORIGINAL_SETTINGS.items():
+            setattr(var, attr, val)
+        self._modules = {name: {attr: val for attr, val in vars(module).items() if _is_state(attr, val)}
+                         for name, module in _role_modules()}
+
+    def _load(self):
+        for name, val in self._vars.items():
+            setattr(var, name, val)
+        for attr, val in self._settings.items():
+            setattr(var, attr, val)
+        for name, module in _role_modules():
+            state = self._modules.get(name)
+            if state is None:
+                state = _fresh_module_state(module) # loaded since this game was last bound
+            for attr, val in state.items():
+                setattr(module, attr, val)
+        _attach_mode(*self._mode_hooks)
+        self._mode_hooks = ([], [])
+
+    def _create(self):
+        """Set up the state for a new game, starting from that of the game bound before."""
+        for name in GAME_VARS:
+            val = getattr(var, name, None)
+            if isinstance(val, (dict, set, list)):
+                val = copy.copy(val)
+                val.clear()
+                setattr(var, name, val)
+        var.GRAVEYARD_LOCK = _new_lock()
+        var.CURRENT_GAMEMODE = var.GAME_MODES["default"][0]()
+        for name, module in _role_modules():
+            for attr, val in _fresh_module_state(module).items():
+                setattr(module, attr, val)
+        self._vars = {}
+        # let everything else (re)initialise the game as if the last one just ended
+        Event("new_game", {}).dispatch(var)
+
+def _switch(game):
+    global _bound
+    if game is _bound:
+        return
+    if _bound is not None:
+        _bound._save()
+    _bound = game
+    channels.Main = game.channel
+    responses.bind(game)
+    if game._vars is None:
+        game._create()
+    else:
+        game._load()
+
+def _detach_mode(mode):
+    """Take the event listeners and commands a game mode set up out of the way, and return them."""
+    # they're all bound methods of the mode
+    listeners = []
+    for event, items in events.EVENT_CALLBACKS.items():
+        for priority, callback in list(items):
+            if getattr(callback, "__self__", None) is mode:
+                items.remove((priority, callback))
+                listeners.append((event, callback, priority))
+    commands = []
+    for fns in decorators.COMMANDS.values():
+        for fn in fns:
+            if getattr(fn.func, "__self__", None) is mode and fn not in commands:
+                commands.append(fn)
+    for fn in commands:
+        fn.remove()
+    return listeners, commands
+
+def _attach_mode(listeners, commands):
+    for event, callback, priority in listeners:
+        events.add_listener(event, callback, priority)
+    for fn in commands:
+        for name in fn.names:
+            decorators.COMMANDS[name].append(fn)
+    if commands:
+        decorators.commands_changed()
+
+def _is_state(attr, val):
+    # the same rule as snapshots use for role modules; see the docstring up top
+    return attr.isupper() and isinstance(val, (dict, set, list, bool))
+
+def _role_modules():
+    for name, module in list(sys.modules.items()):
+        if name.startswith("src.roles.") and module is not None:
+            yield name, module
+
+def _fresh_module_state(module):
+    # copies rather than empty containers, as some of them are constants the
+    # role works out at import; the reset event clears those that are state
+    return {attr: copy.copy(val) for attr, val in vars(module).items() if _is_state(attr, val)}
+
+def _new_lock():
+    lock = threading.RLock()
+    if metrics.enabled:
+        lock = metrics.TimedLock(lock, metrics.LOCK_HOLD_SECONDS)
+    return lock
+
+def add(channel):
+    """Return the game for a channel, creating it if there isn't one yet.
+
+    The first game added takes over the state already in var.
+    """
+    global _bound, _adopted
+    with _lock:
+        game = GAMES.get(lower(channel.name))
+        if game is not None:
+            return game
+        game = GAMES[lower(channel.name)] = Game(channel)
+        if not _adopted:
+            game._vars = {}
+            _bound = game
+            _adopted = True
+            channels.Main = channel
+            responses.bind(game)
+        else:
+            with game:
+                pass
+        return game
+
+def get(name):
+    """Return the game in the channel with the given name, or None."""
+    return GAMES.get(lower(name))
+
+def default():
+    """Return the game in the first channel that got one, or None if there are no games."""
+    return next(iter(GAMES.values()), None)
+
+def current():
+    """Return the game which is bound, or None if there are no games."""
+    return _bound
+
+def find(*targets):
+    """Return the game for something involving the given channels and nicks.
+
+    That is the game in the first of them which is a channel with a game,
+    or else the first game any of the nicks (or nick!ident@host) is playing
+    in, or else the default game. Returns None if there are no games at all.
+    """
+    if len(GAMES) <= 1:
+        return default()
+    with _lock:
+        chantypes = tuple(Features["CHANTYPES"])
+        nicks = []
+        for target in targets:
+            if not isinstance(target, str):
+                continue
+            if target.startswith(chantypes):
+                game = GAMES.get(lower(target))
+                if game is not None:
+                    return game
+            else:
+                nicks.append(target.partition("!")[0])
+        for nick in nicks:
+            for game in GAMES.values():
+                if game.has_player(nick):
+                    return game
+        return default()
+
+def playing(nick):
+    """Return every game nick (or nick!ident@host) is playing in.
+
+    If they aren't playing in any, this is just the bound game (None if
+    there are no games), so that what happens to them is still handled once.
+    """
+    with _lock:
+        nick = nick.partition("!")[0]
+        return [game for game in GAMES.values() if game.has_player(nick)] or [_bound]
+
+def run_in(game, func, *args, **kwargs):
+    """Call func with game bound, or as is if game is None."""
+    if game is None:
+        return func(*args, **kwargs)
+    with game:
+        return func(*args, **kwargs)
+
+# vim: set sw=4 expandtab:
@@ -10,11 +10,14 @@ import functools
 
 import botconfig
 import src.settings as var
-from src import decorators, wolfgame, events, channels, hooks, users, errlog as log, stream_handler as alog
+from src import decorators, wolfgame, events, channels, gameloop, games, hooks, metrics, networks, users, errlog as log, stream_handler as alog
 from src.messages import messages
+from src.responses import responses
+from src.flood import flood
 from src.utilities import reply, list_participants, get_role, get_templates
 from src.dispatcher import MessageDispatcher
 from src.decorators import handle_error
+from src.context import lower
 
 cmd = decorators.cmd
 hook = decorators.hook
@@ -24,17 +27,39 @@ def on_privmsg(cli, rawnick, chan, msg, *, notice=False, force_role=None):
     if notice and "!" not in rawnick or not rawnick: # server notice; we don't care about those
         return
 
-    user = users._get(rawnick, allow_none=True) # FIXME
+    if not flood.admit(rawnick, lambda: _in_game(cli, rawnick)): # shed floods before doing anything else
+        return
 
-    if users.equals(chan, users.Bot.nick): # PM
-        target = users.Bot
-    else:
-        target = channels.get(chan, allow_none=True)
+    gameloop.loop.submit("privmsg", _run_privmsg, cli, rawnick, chan, msg, notice, force_role)
+
+# client -> lowercased nicks of everyone playing a game which is under way there; only
+# the game loop sets it, and it's read without any lock from the thread reading from IRC
+_playing = {}
+
+def _in_game(cli, rawnick):
+    # the players of a game which is under way are always heard, as dropping what
+    # they say would lose their votes and actions, and could even get them idled out
+    return lower(rawnick.partition("!")[0]) in _playing.get(cli, ())
+
+def _publish_players(cli):
+    # called on the game loop after anything which may have changed who is playing
+    _playing[cli] = frozenset(lower(player.nick) for game in games.GAMES.values()
+                              if game.PHASE in game.GAME_PHASES for player in game.ALL_PLAYERS)
+
+def _run_privmsg(cli, rawnick, chan, msg, notice, force_role):
+    # run it in the game of the channel it was said in, or of whoever privately sent it
+    with networks.of(cli):
+        games.run_in(games.find(chan, rawnick), _dispatch_privmsg, cli, rawnick, chan, msg, notice, force_role)
+        _publish_players(cli)
 
-    if user is None or target is None:
+def _dispatch_privmsg(cli, rawnick, chan, msg, notice, force_role):
+    # work out who sent this and what they can do once, for every command it triggers
+    ctx = decorators.CommandContext(cli, rawnick, chan)
+
+    if ctx.user is None or ctx.target is None:
         return
 
-    wrapper = MessageDispatcher(user, target)
+    wrapper = ctx.wrapper
 
     if wrapper.public and botconfig.IGNORE_HIDDEN_COMMANDS and not chan.startswith(tuple(hooks.Features["CHANTYPES"])):
         return
@@ -44,8 +69,11 @@ def on_privmsg(cli, rawnick, chan, msg, *, notice=False, force_role=None):
         return  # not allowed in settings
 
     if force_role is None: # if force_role isn't None, that indicates recursion; don't fire these off twice
-        for fn in decorators.COMMANDS[""]:
-            fn.caller(cli, rawnick, chan, msg)
+        for fn in decorators.commands_for(""):
+            fn.dispatch(ctx, msg)
+            if not fn.readonly:
+                responses.invalidate()
+                ctx.invalidate()
 
     parts = msg.split(sep=" ", maxsplit=1)
     key = parts[0].lower()
@@ -63,18 +91,17 @@ def on_privmsg(cli, rawnick, chan, msg, *, notice=False, force_role=None):
     if not key: # empty key ("") already handled above
         return
 
-    # Don't change this into decorators.COMMANDS[key] even though it's a defaultdict,
-    # as we don't want to insert bogus command keys into the dict.
+    # only the commands which can be used in the current phase
     cmds = []
     phase = var.PHASE
-    if user.nick in list_participants():
-        roles = {get_role(user.nick)} | set(get_templates(user.nick))
+    if ctx.participant:
+        roles = set(ctx.role_set)
         if force_role is not None:
             roles &= {force_role} # only fire off role commands for the forced role
 
         common_roles = set(roles) # roles shared by every eligible role command
         have_role_cmd = False
-        for fn in decorators.COMMANDS.get(key, []):
+        for fn in decorators.commands_for(key):
             if not fn.roles:
                 cmds.append(fn)
                 continue
@@ -115,36 +142,70 @@ def on_privmsg(cli, rawnick, chan, msg, *, notice=False, force_role=None):
             wrapper.pm(messages["ambiguous_command"].format(key, info[0], info[1]))
             return
     elif force_role is None:
-        cmds = decorators.COMMANDS.get(key, [])
+        cmds = decorators.commands_for(key)
 
     for fn in cmds:
         if phase == var.PHASE:
-            # FIXME: pass in var, wrapper, message instead of cli, rawnick, chan, message
-            fn.caller(cli, rawnick, chan, message)
+            # Anything that isn't explicitly read-only may change the game state, so drop
+            # cached responses both before (in case it reads them after changing something)
+            # and after it runs.
+            if not fn.readonly:
+                responses.invalidate()
+            fn.dispatch(ctx, message)
+            if not fn.readonly:
+                responses.invalidate()
+                ctx.invalidate()
 
 def unhandled(cli, prefix, cmd, *args):
-    for fn in decorators.HOOKS.get(cmd, []):
+    gameloop.loop.submit("event", _unhandled, cli, prefix, cmd, *args)
+
+def _unhandled(cli, prefix, cmd, *args):
+    # the hooks are the network's own, so look them up with it bound
+    with networks.of(cli):
+        fns = decorators.HOOKS.get(cmd, [])
+        if fns:
+            # run it in the game of the first channel mentioned, or of the user it's about
+            games.run_in(games.find(*args, prefix), _run_hooks, cli, prefix, fns, args)
+            _publish_players(cli)
+
+def _run_hooks(cli, prefix, fns, args):
+    for fn in fns:
         fn.caller(cli, prefix, *args)
+    # most of what the server tells us (who replies, pings, ban lists, ...) leaves the games alone
+    if not all(fn.readonly for fn in fns):
+        responses.invalidate()
 
 def ping_server(cli):
     cli.send("PING :{0}".format(time.time()))
 
-@cmd("latency", pm=True)
+@cmd("latency", pm=True, rate_limit=(3, 60))
 def latency(cli, nick, chan, rest):
     ping_server(cli)
 
-    @hook("pong", hookid=300)
+    @hook("pong", hookid=300, readonly=True)
     def latency_pong(cli, server, target, ts):
         lat = round(time.time() - float(ts), 3)
         reply(cli, nick, chan, messages["latency"].format(lat, "" if lat == 1 else "s"))
         hook.unhook(300)
 
 def connect_callback(cli):
+    gameloop.loop.submit("connect", _connect_callback, cli)
+
+def _connect_callback(cli):
+    # the hooks and listeners set up here are the network's own
+    with networks.of(cli):
+        _setup_connection(cli)
+
+def _setup_connection(cli):
     regaincount = 0
     releasecount = 0
 
-    @hook("endofmotd", hookid=294)
-    @hook("nomotd", hookid=294)
+    if metrics.enabled:
+        metrics.watch_client(cli)
+        metrics.start_dumping()
+
+    @hook("endofmotd", hookid=294, readonly=True)
+    @hook("nomotd", hookid=294, readonly=True)
     def prepare_stuff(cli, prefix, *args):
         alog("Received end of MOTD from {0}".format(prefix))
 
@@ -158,9 +219,13 @@ def connect_callback(cli):
                             nickserv=var.NICKSERV,
                             command=var.NICKSERV_IDENTIFY_COMMAND)
 
-        channels.Main = channels.add(botconfig.CHANNEL, cli)
+        games.add(channels.add(botconfig.CHANNEL, cli))
         channels.Dummy = channels.add("*", cli)
 
+        if getattr(botconfig, "GAME_CHANNELS", ""):
+            for chan in botconfig.GAME_CHANNELS.split(","):
+                games.add(channels.add(chan, cli))
+
         if botconfig.ALT_CHANNELS:
             for chan in botconfig.ALT_CHANNELS.split(","):
                 channels.add(chan, cli)
@@ -180,7 +245,7 @@ def connect_callback(cli):
             def ping_server_timer(cli):
                 ping_server(cli)
 
-                t = threading.Timer(var.SERVER_PING_INTERVAL, ping_server_timer, args=(cli,))
+                t = metrics.Timer(var.SERVER_PING_INTERVAL, ping_server_timer, args=(cli,))
                 t.daemon = True
                 t.start()
 
@@ -221,25 +286,27 @@ def connect_callback(cli):
         releasecount += 1
         users.Bot.change_nick(botconfig.NICK)
 
-    @hook("unavailresource", hookid=239)
-    @hook("nicknameinuse", hookid=239)
+    @hook("unavailresource", hookid=239, readonly=True)
+    @hook("nicknameinuse", hookid=239, readonly=True)
     def must_use_temp_nick(cli, *etc):
         users.Bot.nick += "_"
         users.Bot.change_nick()
         cli.user(botconfig.NICK, "") # TODO: can we remove this?
 
         hook.unhook(239)
-        hook("unavailresource", hookid=240)(mustrelease)
-        hook("nicknameinuse", hookid=241)(mustregain)
+        hook("unavailresource", hookid=240, readonly=True)(mustrelease)
+        hook("nicknameinuse", hookid=241, readonly=True)(mustregain)
 
-    request_caps = {"account-notify", "extended-join", "multi-prefix"}
+    request_caps = {"account-notify", "away-notify", "extended-join", "multi-prefix", "userhost-in-names"}
 
     if botconfig.SASL_AUTHENTICATION:
         request_caps.add("sasl")
 
     supported_caps = set()
+    var.ENABLED_CAPS.clear()
+    hooks._who_replies.pop(cli, None) # from a WHO the last connection was cut off in the middle of
 
-    @hook("cap")
+    @hook("cap", readonly=True)
     def on_cap(cli, svr, mynick, cmd, caps, star=None):
         if cmd == "LS":
             if caps == "*":
@@ -257,6 +324,7 @@ def connect_callback(cli):
                 if common_caps:
                     cli.send("CAP REQ " ":{0}".format(" ".join(common_caps)))
         elif cmd == "ACK":
+            var.ENABLED_CAPS.update(caps.split())
             if "sasl" in caps:
                 cli.send("AUTHENTICATE PLAIN")
             else:
@@ -267,7 +335,7 @@ def connect_callback(cli):
             alog("Server refused capabilities: {0}".format(" ".join(caps)))
 
     if botconfig.SASL_AUTHENTICATION:
-        @hook("authenticate")
+        @hook("authenticate", readonly=True)
         def auth_plus(cli, something, plus):
             if plus == "+":
                 account = (botconfig.USERNAME or botconfig.NICK).encode("utf-8")
@@ -275,14 +343,14 @@ def connect_callback(cli):
                 auth_token = base64.b64encode(b"\0".join((account, account, password))).decode("utf-8")
                 cli.send("AUTHENTICATE " + auth_token)
 
-        @hook("903")
+        @hook("903", readonly=True)
         def on_successful_auth(cli, blah, blahh, blahhh):
             cli.send("CAP END")
 
-        @hook("904")
-        @hook("905")
-        @hook("906")
-        @hook("907")
+        @hook("904", readonly=True)
+        @hook("905", readonly=True)
+        @hook("906", readonly=True)
+        @hook("907", readonly=True)
         def on_failure_auth(cli, *etc):
             alog("Authentication failed.  Did you fill the account name "
                  "in botconfig.USERNAME if it's different from the bot nick?")
@@ -6,16 +6,22 @@ further in the relevant hook functions.
 
 """
 
+from types import SimpleNamespace
+
 from src.decorators import event_listener, hook
 from src.context import Features
 from src.events import Event
 from src.logger import plog
 
-from src import channels, users, settings as var
+from src import channels, events, games, users, settings as var
 
 ### WHO/WHOX responses handling
 
-@hook("whoreply")
+# client -> replies to its current WHO request so far, as (channel name,
+# user info for users._add_many(), modes, account for the old user list, params)
+_who_replies = {}
+
+@hook("whoreply", readonly=True)
 def who_reply(cli, bot_server, bot_nick, chan, ident, host, server, nick, status, hopcount_gecos):
     """Handle WHO replies for servers without WHOX support.
 
@@ -32,9 +38,8 @@ def who_reply(cli, bot_server, bot_nick, chan, ident, host, server, nick, status
     8 - The status (H = Not away, G = Away, * = IRC operator, @ = Opped in the channel in 4, + = Voiced in the channel in 4)
     9 - The hop count and realname (gecos)
 
-    This fires off the "who_result" event, and dispatches it with three
-    arguments, the game state namespace, a Channel, and a User. Less
-    important attributes can be accessed via the event.params namespace.
+    Replies are kept until the end of the WHO, and then all added at once;
+    see end_who() for the events they give.
 
     """
 
@@ -46,24 +51,10 @@ def who_reply(cli, bot_server, bot_nick, chan, ident, host, server, nick, status
 
     modes = {Features["PREFIX"].get(s) for s in status} - {None}
 
-    user = users._add(cli, nick=nick, ident=ident, host=host, realname=realname) # FIXME
-    ch = channels.add(chan, cli)
-
-    if ch not in user.channels:
-        user.channels[ch] = modes
-        ch.users.add(user)
-        for mode in modes:
-            if mode not in ch.modes:
-                ch.modes[mode] = set()
-            ch.modes[mode].add(user)
+    _who_replies.setdefault(cli, []).append((chan, {"nick": nick, "ident": ident, "host": host, "realname": realname}, modes, "*",
+                                             dict(away=is_away, data=0, ip_address=None, server=server, hop_count=hop, idle_time=None, extended_who=False)))
 
-    event = Event("who_result", {}, away=is_away, data=0, ip_address=None, server=server, hop_count=hop, idle_time=None, extended_who=False)
-    event.dispatch(var, ch, user)
-
-    if ch is channels.Main and not users.exists(nick): # FIXME
-        users.add(nick, ident=ident, host=host, account="*", inchan=True, modes=modes, moded=set())
-
-@hook("whospcrpl")
+@hook("whospcrpl", readonly=True)
 def extended_who_reply(cli, bot_server, bot_nick, data, chan, ident, ip_address, host, server, nick, status, hop, idle, account, realname):
     """Handle WHOX responses for servers that support it.
 
@@ -92,9 +83,8 @@ def extended_who_reply(cli, bot_server, bot_nick, data, chan, ident, ip_address,
     13 - a - The services account name (or 0 if none/not logged in)
     14 - r - The realname (gecos)
 
-    This fires off the "who_result" event, and dispatches it with three
-    arguments, the game state namespace, a Channel, and a User. Less
-    important attributes can be accessed via the event.params namespace.
+    Replies are kept until the end of the WHO, and then all added at once;
+    see end_who() for the events they give.
 
     """
 
@@ -109,22 +99,8 @@ def extended_who_reply(cli, bot_server, bot_nick, data, chan, ident, ip_address,
 
     modes = {Features["PREFIX"].get(s) for s in status} - {None}
 
-    user = users._add(cli, nick=nick, ident=ident, host=host, realname=realname, account=account) # FIXME
-    ch = channels.add(chan, cli)
-
-    if ch not in user.channels:
-        user.channels[ch] = modes
-        ch.users.add(user)
-        for mode in modes:
-            if mode not in ch.modes:
-                ch.modes[mode] = set()
-            ch.modes[mode].add(user)
-
-    event = Event("who_result", {}, away=is_away, data=data, ip_address=ip_address, server=server, hop_count=hop, idle_time=idle, extended_who=True)
-    event.dispatch(var, ch, user)
-
-    if ch is channels.Main and not users.exists(nick): # FIXME
-        users.add(nick, ident=ident, host=host, account=account, inchan=True, modes=modes, moded=set())
+    _who_replies.setdefault(cli, []).append((chan, {"nick": nick, "ident": ident, "host": host, "realname": realname, "account": account}, modes, account,
+                                             dict(away=is_away, data=data, ip_address=ip_address, server=server, hop_count=hop, idle_time=idle, extended_who=True)))
 
 @hook("endofwho")
 def end_who(cli, bot_server, bot_nick, target, rest):
@@ -138,12 +114,27 @@ def end_who(cli, bot_server, bot_nick, target, rest):
     3 - The target the request was made against
     4 - A string containing some information; traditionally "End of /WHO list."
 
-    This fires off the "who_end" event, and dispatches it with two
+    This first adds everyone in the replies to the request to the user and
+    channel lists, in one go, as a WHO on a big channel has a lot of them.
+
+    This then fires off the "who_end" event, and dispatches it with two
     arguments: The game state namespace and the channel or user the
-    request was made to, or None if it could not be resolved.
+    request was made to, or None if it could not be resolved. The replies
+    are in event.params.replies, as (Channel, User, params) tuples, where
+    params is a namespace of the less important attributes of the reply
+    (away, data, ip_address, server, hop_count, idle_time, extended_who);
+    data is the integer given to IRCContext.who(), if the server supports
+    WHOX, and 0 otherwise.
+
+    For listeners which still want them one at a time, the "who_result"
+    event is also fired off for each reply beforehand, and dispatched with
+    three arguments, the game state namespace, a Channel, and a User; the
+    rest of the reply is in the event.params namespace.
 
     """
 
+    replies = _add_who_replies(cli, _who_replies.pop(cli, ()))
+
     try:
         target = channels.get(target)
     except KeyError:
@@ -157,11 +148,90 @@ def end_who(cli, bot_server, bot_nick, target, rest):
                 Event(name, params).dispatch(*args)
             target._pending = None
 
-    Event("who_end", {}).dispatch(var, target)
+    Event("who_end", {}, replies=replies).dispatch(var, target)
+
+def _add_who_replies(cli, replies):
+    """Add the users and channel memberships from a WHO's replies, and return them as (Channel, User, params)."""
+
+    found = users._add_many(cli, [info for chan, info, modes, old_account, params in replies]) # FIXME
+    chans = {}
+    added = []
+
+    for (chan, info, modes, old_account, params), user in zip(replies, found):
+        ch = chans.get(chan)
+        if ch is None:
+            ch = chans[chan] = channels.add(chan, cli)
+
+        if ch not in user.channels:
+            user.channels[ch] = modes
+            ch.users.add(user)
+            for mode in modes:
+                if mode not in ch.modes:
+                    ch.modes[mode] = set()
+                ch.modes[mode].add(user)
+
+        user.away = params["away"]
+
+        if ch is channels.Main and not users.exists(user.nick): # FIXME
+            users.add(user.nick, ident=info["ident"], host=info["host"], account=old_account, inchan=True, modes=modes, moded=set())
+
+        added.append((ch, user, SimpleNamespace(**params)))
+
+    if events.EVENT_CALLBACKS.get("who_result"):
+        for ch, user, params in added:
+            Event("who_result", {}, **vars(params)).dispatch(var, ch, user)
+
+    return added
+
+### NAMES handling
+
+@hook("namreply", readonly=True)
+def names_reply(cli, bot_server, bot_nick, visibility, chan, names):
+    """Handle NAMES replies, if they come with the full hostmask of everyone.
+
+    Ordering and meaning of arguments for a NAMES reply:
+
+    0 - The IRCClient instance (like everywhere else)
+    1 - The server the requester (i.e. the bot) is on
+    2 - The nickname of the requester (i.e. the bot)
+    3 - The channel type (= for public, * for private, @ for secret)
+    4 - The channel the reply is for
+    5 - The users in the channel, space-separated, each with their status prefixes
+
+    With the userhost-in-names capability (we will have requested it when we
+    connected if it was supported), each user is given as nick!ident@host,
+    so the channel's users and their modes are known as soon as the bot
+    joins, without waiting on a WHO. Without it, only nicks are given,
+    and the reply is left for the WHO which always follows a join.
+
+    """
+
+    if "userhost-in-names" not in var.ENABLED_CAPS:
+        return
+
+    ch = channels.add(chan, cli)
+
+    for name in names.split():
+        rawnick = name.lstrip("".join(Features["PREFIX"]))
+        modes = {Features["PREFIX"][s] for s in name[:len(name) - len(rawnick)]}
+        nick, ident, host = users.parse_rawnick(rawnick)
+
+        user = users._add(cli, nick=nick, ident=ident, host=host) # FIXME
+
+        if ch not in user.channels:
+            user.channels[ch] = modes
+            ch.users.add(user)
+            for mode in modes:
+                if mode not in ch.modes:
+                    ch.modes[mode] = set()
+                ch.modes[mode].add(user)
+
+        if ch is channels.Main and not users.exists(nick): # FIXME
+            users.add(nick, ident=ident, host=host, account="*", inchan=True, modes=modes, moded=set())
 
 ### Server PING handling
 
-@hook("ping")
+@hook("ping", readonly=True)
 def on_ping(cli, prefix, server):
     """Send out PONG replies to the server's PING requests.
 
@@ -178,7 +248,7 @@ def on_ping(cli, prefix, server):
 
 ### Fetch and store server information
 
-@hook("featurelist")
+@hook("featurelist", readonly=True)
 def get_features(cli, rawnick, *features):
     """Fetch and store the IRC server features.
 
@@ -231,7 +301,7 @@ def get_features(cli, rawnick, *features):
 
 ### Channel and user MODE handling
 
-@hook("channelmodeis")
+@hook("channelmodeis", readonly=True)
 def current_modes(cli, server, bot_nick, chan, mode, *targets):
     """Update the channel modes with the existing ones.
 
@@ -249,7 +319,7 @@ def current_modes(cli, server, bot_nick, chan, mode, *targets):
     ch = channels.add(chan, cli)
     ch.update_modes(server, mode, targets)
 
-@hook("channelcreate")
+@hook("channelcreate", readonly=True)
 def chan_created(cli, server, bot_nick, chan, timestamp):
     """Update the channel timestamp with the server's information.
 
@@ -309,7 +379,7 @@ def handle_listmode(cli, chan, mode, target, setter, timestamp):
         ch.modes[mode] = {}
     ch.modes[mode][target] = (setter, int(timestamp))
 
-@hook("banlist")
+@hook("banlist", readonly=True)
 def check_banlist(cli, server, bot_nick, chan, target, setter, timestamp):
     """Update the channel ban list with the current one.
 
@@ -327,7 +397,7 @@ def check_banlist(cli, server, bot_nick, chan, target, setter, timestamp):
 
     handle_listmode(cli, chan, "b", target, setter, timestamp)
 
-@hook("quietlist")
+@hook("quietlist", readonly=True)
 def check_quietlist(cli, server, bot_nick, chan, mode, target, setter, timestamp):
     """Update the channel quiet list with the current one.
 
@@ -346,7 +416,7 @@ def check_quietlist(cli, server, bot_nick, chan, mode, target, setter, timestamp
 
     handle_listmode(cli, chan, mode, target, setter, timestamp)
 
-@hook("exceptlist")
+@hook("exceptlist", readonly=True)
 def check_banexemptlist(cli, server, bot_nick, chan, target, setter, timestamp):
     """Update the channel ban exempt list with the current one.
 
@@ -364,7 +434,7 @@ def check_banexemptlist(cli, server, bot_nick, chan, target, setter, timestamp):
 
     handle_listmode(cli, chan, "e", target, setter, timestamp)
 
-@hook("invitelist")
+@hook("invitelist", readonly=True)
 def check_inviteexemptlist(cli, server, bot_nick, chan, target, setter, timestamp):
     """Update the channel invite exempt list with the current one.
 
@@ -388,7 +458,7 @@ def handle_endlistmode(cli, chan, mode):
     ch = channels.add(chan, cli)
     ch.queue("end_listmode", {}, (var, ch, mode))
 
-@hook("endofbanlist")
+@hook("endofbanlist", readonly=True)
 def end_banlist(cli, server, bot_nick, chan, message):
     """Handle the end of the ban list.
 
@@ -404,7 +474,7 @@ def end_banlist(cli, server, bot_nick, chan, message):
 
     handle_endlistmode(cli, chan, "b")
 
-@hook("quietlistend")
+@hook("quietlistend", readonly=True)
 def end_quietlist(cli, server, bot_nick, chan, mode, message):
     """Handle the end of the quiet listing.
 
@@ -421,7 +491,7 @@ def end_quietlist(cli, server, bot_nick, chan, mode, message):
 
     handle_endlistmode(cli, chan, mode)
 
-@hook("endofexceptlist")
+@hook("endofexceptlist", readonly=True)
 def end_banexemptlist(cli, server, bot_nick, chan, message):
     """Handle the end of the ban exempt list.
 
@@ -437,7 +507,7 @@ def end_banexemptlist(cli, server, bot_nick, chan, message):
 
     handle_endlistmode(cli, chan, "e")
 
-@hook("endofinvitelist")
+@hook("endofinvitelist", readonly=True)
 def end_inviteexemptlist(cli, server, bot_nick, chan, message):
     """Handle the end of the invite exempt list.
 
@@ -470,7 +540,8 @@ def on_nick_change(cli, old_rawnick, nick):
     user = users._get(old_rawnick) # FIXME
     user.nick = nick
 
-    Event("nick_change", {}).dispatch(var, user, old_rawnick)
+    for game in games.playing(nick):
+        games.run_in(game, Event("nick_change", {}).dispatch, var, user, old_rawnick)
 
 ### ACCOUNT handling
 
@@ -491,7 +562,37 @@ def on_account_change(cli, rawnick, account):
     user = users._add(cli, nick=rawnick) # FIXME
     user.account = account # We don't pass it to add(), since we want to grab the existing one (if any)
 
-    Event("account_change", {}).dispatch(var, user)
+    for game in games.playing(user.nick):
+        games.run_in(game, Event("account_change", {}).dispatch, var, user)
+
+### AWAY handling
+
+@hook("away", readonly=True)
+def on_away(cli, rawnick, *args):
+    """Handle a user going away or coming back, if enabled.
+
+    Ordering and meaning of arguments for an AWAY notification (with the
+    away-notify capability, which we will have requested when we connected
+    if it was supported):
+
+    0 - The IRCClient instance (like everywhere else)
+    1 - The raw nick (nick!ident@host) of the user
+    2 - The away message; if missing, the user is back
+
+    The RPL_AWAY numeric (301), which the server sends when the bot messages
+    someone who is away, shares the name; its arguments are instead the
+    nickname of the bot, that of the user who is away, and their message.
+
+    """
+
+    if len(args) > 1: # RPL_AWAY
+        user = users._get(args[1], allow_none=True) # FIXME
+        if user is not None:
+            user.away = True
+        return
+
+    user = users._add(cli, nick=rawnick) # FIXME
+    user.away = bool(args)
 
 ### JOIN handling
 
@@ -614,7 +715,8 @@ def on_quit(cli, rawnick, reason):
     """
 
     user = users._add(cli, nick=rawnick) # FIXME
-    Event("server_quit", {}).dispatch(var, user, reason)
+    for game in games.playing(user.nick):
+        games.run_in(game, Event("server_quit", {}).dispatch, var, user, reason)
 
     for chan in set(user.channels):
         if user is users.Bot:
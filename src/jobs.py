@@ -0,0 +1,62 @@
+import queue
+import subprocess
+import threading
+
+import src.settings as var
+from src.decorators import handle_error
+
+__all__ = ["JobRunner", "run_command", "runner"]
+
+class JobRunner:
+    """Runs slow jobs (usually ones that wait on subprocesses) in the background.
+
+    Jobs run on worker threads so that they don't hold up message processing
+    on the IRC thread. At most `limit` jobs run at once; any others wait in
+    line until a worker is free.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._queue = queue.Queue()
+        self._workers = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        self._queue.put((handle_error(func), args, kwargs))
+        with self._lock:
+            if self._workers < max(self.limit, 1):
+                self._workers += 1
+                t = threading.Thread(None, self._work, name="job-{0}".format(self._workers))
+                t.daemon = True
+                t.start()
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            try:
+                func(*args, **kwargs)
+            finally:
+                self._queue.task_done()
+
+def run_command(args, on_line=None):
+    """Run a subprocess, calling on_line with each line of its output as it arrives.
+
+    stdout and stderr are merged, and lines are passed as bytes without the
+    trailing newline. This waits for the process to exit, so it should only
+    be called from a job. Returns the exit status, which is negative if the
+    process was killed by a signal.
+    """
+    child = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    with child.stdout:
+        for line in child.stdout:
+            if on_line is not None:
+                on_line(line.rstrip(b"\r\n"))
+    return child.wait()
+
+runner = JobRunner(var.BACKGROUND_JOB_LIMIT)
+
+# vim: set sw=4 expandtab:
@@ -1,7 +1,135 @@
+import atexit
 import datetime
+import json
+import os
+import queue
+import sys
+import threading
 import time
 
 import botconfig
+import src.settings as var
+
+class LogFile:
+    """A log file which is kept open between writes.
+
+    The file is rotated once it grows past LOG_MAX_SIZE bytes (roughly) or
+    once it has been open for LOG_MAX_AGE seconds, keeping LOG_BACKUP_COUNT
+    older copies around as file.1, file.2, and so on. Only the log writer
+    thread should write to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._size = 0
+        self._opened = 0
+
+    def write(self, data):
+        if self._file is None:
+            self._open()
+        elif self._should_rotate():
+            self._rotate()
+        self._file.write(data)
+        self._size += len(data)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        self._file = open(self.path, "a", errors="replace")
+        self._size = self._file.tell()
+        self._opened = time.time()
+
+    def _should_rotate(self):
+        if var.LOG_MAX_SIZE and self._size >= var.LOG_MAX_SIZE:
+            return True
+        return bool(var.LOG_MAX_AGE) and time.time() - self._opened >= var.LOG_MAX_AGE
+
+    def _rotate(self):
+        self.close()
+        count = var.LOG_BACKUP_COUNT
+        if count > 0:
+            for i in range(count - 1, 0, -1):
+                src = "{0}.{1}".format(self.path, i)
+                if os.path.exists(src):
+                    os.replace(src, "{0}.{1}".format(self.path, i + 1))
+            os.replace(self.path, self.path + ".1")
+        else:
+            open(self.path, "w").close()
+        self._open()
+
+class LogWriter:
+    """Writes log lines to their files from a background thread.
+
+    Lines are queued and written in batches, and files are flushed after
+    every batch. The queue holds at most LOG_BUFFER_SIZE lines; if the
+    writer falls that far behind, logging blocks until it catches up.
+    """
+
+    def __init__(self):
+        self.files = {} # path -> LogFile
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, path, data):
+        if self._thread is None:
+            self._start()
+        self._queue.put((path, data))
+
+    def flush(self):
+        """Block until everything logged so far has been written out."""
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._queue.join()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._queue = queue.Queue(var.LOG_BUFFER_SIZE)
+                self._thread = threading.Thread(None, self._work, name="log-writer")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            touched = set()
+            for path, data in batch:
+                log_file = self.files.get(path)
+                if log_file is None:
+                    log_file = self.files[path] = LogFile(path)
+                try:
+                    log_file.write(data)
+                except OSError as e:
+                    # logging the error would only end up back here
+                    print("Could not write to {0}: {1}".format(path, e), file=sys.stderr)
+                touched.add(log_file)
+
+            for log_file in touched:
+                try:
+                    log_file.flush()
+                except OSError as e:
+                    print("Could not write to {0}: {1}".format(log_file.path, e), file=sys.stderr)
+
+            for _ in batch:
+                self._queue.task_done()
+
+writer = LogWriter()
+flush = writer.flush
+atexit.register(flush)
 
 def logger(file, write=True, display=True):
     if file is not None:
@@ -16,9 +144,11 @@ def logger(file, write=True, display=True):
         if display:
             print(timestamp + output, file=utf8stdout)
         if write and file is not None:
-            with open(file, "a", errors="replace") as f:
-                f.seek(0, 2)
-                f.write(timestamp + output + "\n")
+            if var.LOG_JSON:
+                line = json.dumps({"time": time.time(), "timestamp": timestamp.strip(), "message": output})
+            else:
+                line = timestamp + output
+            writer.write(file, line + "\n")
 
     return log
 
@@ -31,12 +161,20 @@ plog = stream_handler # use this instead of print so that logs have timestamps
 # since windows likes to use weird encodings by default
 utf8stdout = open(1, 'w', errors="replace", closefd=False) # stdout
 
+# the timestamp only changes once a second, so keep the last one around
+_last_timestamp = (None, None)
+
 def get_timestamp(use_utc=None, ts_format=None):
     """Return a timestamp with timezone + offset from UTC."""
+    global _last_timestamp
     if use_utc is None:
         use_utc = botconfig.USE_UTC
     if ts_format is None:
         ts_format = botconfig.TIMESTAMP_FORMAT
+    key = (int(time.time()), use_utc, ts_format)
+    last_key, timestamp = _last_timestamp
+    if key == last_key:
+        return timestamp
     if use_utc:
         tmf = datetime.datetime.utcnow().strftime(ts_format)
         tz = "UTC"
@@ -48,7 +186,9 @@ def get_timestamp(use_utc=None, ts_format=None):
         if datetime.datetime.utcnow().hour > datetime.datetime.now().hour:
             offset = "-"
         offset += str(time.timezone // 36).zfill(4)
-    return tmf.format(tzname=tz, tzoffset=offset).strip().upper() + " "
+    timestamp = tmf.format(tzname=tz, tzoffset=offset).strip().upper() + " "
+    _last_timestamp = (key, timestamp)
+    return timestamp
 
 def stream(output, level="normal"):
     if botconfig.VERBOSE_MODE or botconfig.DEBUG_MODE:
@@ -1,40 +1,150 @@
 import json
 import os
+import pickle
+import string
 
 import src.settings as var
 
 MESSAGES_DIR = os.path.join(os.path.dirname(__file__), "..", "messages")
 ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+CACHE_DIR = os.path.join(MESSAGES_DIR, "__pycache__")
+
+# increment this whenever the layout of the compiled catalog changes
+CATALOG_VERSION = 2
+
+_formatter = string.Formatter()
+
+def placeholders(template):
+    """Return the arguments a template uses, as (positional count, names).
+
+    Raises ValueError if the template can't be formatted at all, such as
+    when it has unbalanced braces or mixes {} with {0}.
+    """
+    auto = 0
+    indexes = set()
+    names = set()
+    for _, field, spec, _ in _formatter.parse(template):
+        if field is None:
+            continue
+        arg = field.split(".", 1)[0].split("[", 1)[0]
+        if arg == "":
+            auto += 1
+        elif arg.isdigit():
+            indexes.add(int(arg))
+        else:
+            names.add(arg)
+        if spec:
+            count, nested = placeholders(spec)
+            auto += count
+            names |= nested
+    if auto and indexes:
+        raise ValueError("cannot mix automatic and manual field numbering")
+    return max(auto, max(indexes, default=-1) + 1), names
+
+def _signature(message):
+    templates = message if isinstance(message, (list, tuple)) else (message,)
+    count, names = 0, set()
+    for template in templates:
+        c, n = placeholders(template)
+        count = max(count, c)
+        names |= n
+    return count, names
 
 class Messages:
     def __init__ (self):
         self.lang = var.LANGUAGE
+        self.warnings = [] # problems with messages.json, logged once logging is set up
         self._load_messages()
 
     def get(self, key):
-        if not self.messages[key.lower()]:
-            raise KeyError("Key {0!r} does not exist! Add it to messages.json".format(key))
-        return self.messages[key.lower()]
+        try:
+            return self.messages[key]
+        except KeyError:
+            pass
+        try:
+            return self.messages[key.lower()]
+        except KeyError:
+            raise KeyError("Key {0!r} does not exist! Add it to messages.json".format(key)) from None
 
     __getitem__ = get
 
+    def _sources(self):
+        sources = []
+        for path in (os.path.join(MESSAGES_DIR, self.lang + ".json"), os.path.join(ROOT_DIR, "messages.json")):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                sources.append((path, None, None))
+            else:
+                sources.append((path, st.st_mtime_ns, st.st_size))
+        return sources
+
     def _load_messages(self):
-        with open(os.path.join(MESSAGES_DIR, self.lang + ".json")) as f:
-            self.messages = json.load(f)
-
-        if not os.path.isfile(os.path.join(ROOT_DIR, "messages.json")):
-            return
-        with open(os.path.join(ROOT_DIR, "messages.json")) as f:
-            custom_msgs = json.load(f)
-
-        if not custom_msgs:
-            return
-
-        for key, message in custom_msgs.items():
-            if key in self.messages:
-                if not isinstance(message, type(self.messages[key.lower()])):
-                    raise TypeError("messages.json: Key {0!r} must be of type {1!r}".format(key, type(self.messages[key.lower()]).__name__))
-            self.messages[key.lower()] = message
+        sources = self._sources()
+        cache = os.path.join(CACHE_DIR, self.lang + ".cache")
+        try:
+            with open(cache, "rb") as f:
+                version, cached_sources, catalog, warnings = pickle.load(f)
+            if version == CATALOG_VERSION and cached_sources == sources:
+                self.messages = catalog
+                self.warnings = warnings
+                return
+        except Exception: # missing, outdated or corrupt; compile a new one
+            pass
+
+        self.messages = self._compile(sources[0][0], sources[1][0])
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(cache + ".tmp", "wb") as f:
+                pickle.dump((CATALOG_VERSION, sources, self.messages, self.warnings), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(cache + ".tmp", cache)
+        except OSError:
+            pass # the cache is only there to speed up the next startup
+
+    def _compile(self, path, custom_path):
+        """Load the messages, with any custom overrides, and check them.
+
+        Keys are lowercased, lists of messages become tuples, and empty
+        messages are dropped. Custom messages must have the same type as the
+        ones they replace. A custom message which uses placeholders that the
+        original doesn't is kept, as the code may pass arguments that the
+        original leaves out, but it is added to warnings, as it fails when
+        formatted if it isn't given them.
+        """
+        with open(path) as f:
+            raw = json.load(f)
+        messages = {}
+        for key, message in raw.items():
+            try:
+                _signature(message)
+            except ValueError as e:
+                raise ValueError("{0}: Key {1!r} is not a valid template: {2}".format(os.path.basename(path), key, e)) from None
+            messages[key.lower()] = message
+
+        custom_msgs = None
+        if os.path.isfile(custom_path):
+            with open(custom_path) as f:
+                custom_msgs = json.load(f)
+
+        for key, message in (custom_msgs or {}).items():
+            key = key.lower()
+            if key in messages:
+                if not isinstance(message, type(messages[key])):
+                    raise TypeError("messages.json: Key {0!r} must be of type {1!r}".format(key, type(messages[key]).__name__))
+                try:
+                    count, names = _signature(message)
+                except ValueError as e:
+                    raise ValueError("messages.json: Key {0!r} is not a valid template: {1}".format(key, e)) from None
+                base_count, base_names = _signature(messages[key])
+                if count > base_count or not names <= base_names:
+                    extra = ["{" + name + "}" for name in sorted(names - base_names)]
+                    extra.extend("{" + str(i) + "}" for i in range(base_count, count))
+                    self.warnings.append("messages.json: Key {0!r} uses placeholders which the original message doesn't: {1}; "
+                                         "this only works if they are given to it".format(key, ", ".join(extra)))
+            messages[key] = message
+
+        return {key: tuple(message) if isinstance(message, list) else message
+                for key, message in messages.items() if message}
 
 messages = Messages()
 
@@ -0,0 +1,255 @@
+import bisect
+import os
+import threading
+import time
+
+import botconfig
+import src.settings as var
+
+__all__ = ["enabled", "Counter", "Gauge", "Histogram", "Timer", "TimedLock",
+           "REGISTRY", "watch_client", "prometheus_text", "dump", "start_dumping", "describe"]
+
+# settings from botconfig haven't been carried over to var yet when this is imported
+enabled = bool(getattr(botconfig, "METRICS_ENABLED", var.METRICS_ENABLED))
+
+REGISTRY = {} # name -> metric
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, label=None, func=None):
+        self.name = name
+        self.help = help
+        self.label = label # name of the label this metric is broken down by, if any
+        self.func = func # called to get the current value, instead of it being recorded here
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def values(self):
+        """Return a dict of label value (None if there's no label) -> current value."""
+        if self.func is not None:
+            value = self.func()
+            return value if isinstance(value, dict) else {None: value}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for label, value in sorted(self.values().items(), key=_label_key):
+            yield self.name, _labels(self.label, label), value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, label=None):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, label=None):
+        with self._lock:
+            self._values[label] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def observe(self, value, label=None):
+        with self._lock:
+            entry = self._values.get(label)
+            if entry is None:
+                entry = self._values[label] = [[0] * (len(self.BUCKETS) + 1), 0.0, 0, 0.0] # buckets, sum, count, max
+            entry[0][bisect.bisect_left(self.BUCKETS, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+            if value > entry[3]:
+                entry[3] = value
+
+    def time(self, label=None):
+        """Return a context manager which observes how long its body takes."""
+        return _Timing(self, label)
+
+    def values(self):
+        with self._lock:
+            return {label: (list(entry[0]), entry[1], entry[2], entry[3]) for label, entry in self._values.items()}
+
+    def samples(self):
+        for label, (buckets, total, count, _) in sorted(self.values().items(), key=_label_key):
+            cumulative = 0
+            for bound, n in zip(self.BUCKETS + ("+Inf",), buckets):
+                cumulative += n
+                yield self.name + "_bucket", _labels(self.label, label, le=bound), cumulative
+            yield self.name + "_sum", _labels(self.label, label), total
+            yield self.name + "_count", _labels(self.label, label), count
+
+class _Timing:
+    __slots__ = ("histogram", "label", "start")
+
+    def __init__(self, histogram, label):
+        self.histogram = histogram
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.histogram.observe(time.perf_counter() - self.start, self.label)
+        return False
+
+def _label_key(item):
+    return "" if item[0] is None else str(item[0])
+
+def _labels(name, value, **extra):
+    pairs = []
+    if name is not None and value is not None:
+        pairs.append((name, value))
+    pairs.extend(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs) + "}"
+
+COMMAND_SECONDS = Histogram("lykos_command_seconds", "Time taken to run a command", label="command")
+EVENT_SECONDS = Histogram("lykos_event_dispatch_seconds", "Time taken by all listeners of an event", label="event")
+DB_QUERY_SECONDS = Histogram("lykos_db_query_seconds", "Time taken by database statements", label="statement")
+LOCK_HOLD_SECONDS = Histogram("lykos_graveyard_lock_hold_seconds", "How long GRAVEYARD_LOCK is held at a time")
+TIMER_LATENESS_SECONDS = Histogram("lykos_timer_lateness_seconds", "How late timers fire", label="timer")
+QUEUE_SECONDS = Histogram("lykos_game_loop_queue_seconds", "How long work waits for the game loop", label="kind")
+
+class Timer(threading.Timer):
+    """A threading.Timer which records how late it fires.
+
+    The function runs in the game loop, in the network and game which were
+    bound when the timer was started.
+    """
+
+    def run(self):
+        self.finished.wait(self.interval)
+        if not self.finished.is_set():
+            if enabled:
+                late = time.time() - self._scheduled
+                TIMER_LATENESS_SECONDS.observe(max(late, 0), getattr(self.function, "__name__", None))
+            self._loop.submit("timer", self._networks.run_in, self._network, self._games.run_in, self._game,
+                              self.function, *self.args, **self.kwargs)
+        self.finished.set()
+
+    def start(self):
+        from src import gameloop, games, networks # these need this module, so can't be imported up top
+        self._loop, self._games, self._networks = gameloop.loop, games, networks
+        self._network = networks.current()
+        self._game = games.current()
+        self._scheduled = time.time() + self.interval
+        super().start()
+
+class TimedLock:
+    """Wrap a reentrant lock, recording how long it's held by the outermost acquirer."""
+
+    def __init__(self, lock, histogram):
+        self._lock = lock
+        self._histogram = histogram
+        self._local = threading.local()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        depth = getattr(self._local, "depth", 0)
+        if not depth:
+            self._local.start = time.perf_counter()
+        self._local.depth = depth + 1
+        return True
+
+    def release(self):
+        self._local.depth -= 1
+        held = None
+        if not self._local.depth:
+            held = time.perf_counter() - self._local.start
+        self._lock.release()
+        if held is not None:
+            self._histogram.observe(held)
+
+    __enter__ = acquire
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+        return False
+
+if enabled:
+    var.GRAVEYARD_LOCK = TimedLock(var.GRAVEYARD_LOCK, LOCK_HOLD_SECONDS)
+
+_clients = [] # every IRCClient being watched
+
+def _per_client(func):
+    return lambda: {cli.host: func(cli) for cli in _clients}
+
+def watch_client(cli):
+    """Export the traffic counters of an IRCClient, labelled with its network."""
+    if cli in _clients: # reconnected
+        return
+    if not _clients:
+        Counter("lykos_irc_lines_received_total", "IRC lines received", label="network",
+                func=_per_client(lambda cli: cli.lines_received))
+        Counter("lykos_irc_lines_sent_total", "IRC lines sent", label="network",
+                func=_per_client(lambda cli: cli.lines_sent))
+        Counter("lykos_irc_send_waits_total", "Times sending had to wait for the flood limiter", label="network",
+                func=_per_client(lambda cli: cli.send_waits))
+        Counter("lykos_irc_send_wait_seconds_total", "Time spent waiting for the flood limiter", label="network",
+                func=_per_client(lambda cli: cli.send_wait_time))
+        Gauge("lykos_irc_send_queue_length", "Lines waiting to be sent", label="network",
+              func=_per_client(lambda cli: cli.send_queue.qsize() if cli.send_queue is not None else 0))
+        Counter("lykos_irc_send_queue_seconds_total", "Time lines spent waiting to be sent, in total", label="network",
+                func=_per_client(lambda cli: cli.send_queue_time))
+    _clients.append(cli)
+
+def prometheus_text():
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append("# HELP {0} {1}".format(name, metric.help))
+        lines.append("# TYPE {0} {1}".format(name, metric.kind))
+        for sample, labels, value in metric.samples():
+            lines.append("{0}{1} {2}".format(sample, labels, value))
+    return "\n".join(lines) + "\n"
+
+_dump_lock = threading.Lock() # !metrics dump and the dump timer share the .tmp file
+
+def dump(path=None):
+    """Write every metric to path (METRICS_FILE by default) in the Prometheus text format."""
+    if path is None:
+        path = var.METRICS_FILE
+    with _dump_lock:
+        with open(path + ".tmp", "w") as f:
+            f.write(prometheus_text())
+        os.replace(path + ".tmp", path)
+
+_dumping = False
+
+def start_dumping():
+    """Start writing the metrics to METRICS_FILE every METRICS_DUMP_INTERVAL seconds, if enabled."""
+    global _dumping
+    if _dumping or not enabled or not var.METRICS_FILE or var.METRICS_DUMP_INTERVAL <= 0:
+        return
+    _dumping = True
+    def dump_timer():
+        try:
+            dump()
+        finally:
+            t = threading.Timer(var.METRICS_DUMP_INTERVAL, dump_timer)
+            t.daemon = True
+            t.start()
+    dump_timer()
+
+def describe(name, limit=10):
+    """Return a summary of a metric as a list of strings, biggest values first."""
+    metric = REGISTRY[name]
+    values = metric.values()
+    if isinstance(metric, Histogram):
+        # sort by total time, as that's what points at what's slowing the bot down
+        items = sorted(values.items(), key=lambda x: -x[1][1])[:limit]
+        return ["{0}: {1} in {2:.0f}ms (avg {3:.1f}ms, max {4:.1f}ms)".format(
+                label or name, count, total * 1000, total * 1000 / count, biggest * 1000)
+                for label, (_, total, count, biggest) in items if count]
+    items = sorted(values.items(), key=lambda x: -x[1])[:limit]
+    return ["{0}: {1:g}".format(label or name, value) for label, value in items]
+
+# vim: set sw=4 expandtab:
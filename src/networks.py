@@ -0,0 +1,170 @@
+"""Keep the state of each IRC network apart, so that one process can be on several at once.
+
+Everything that only makes sense on one network has a Network: the users
+and channels the bot knows about there, its games (see src.games), what
+the server supports (Features, and the settings worked out from it), the
+hooks and event listeners set up for the connection, and the botconfig
+settings which differ between networks (server, nick, channels, ...).
+What doesn't depend on the network is loaded once and shared by all of
+them: the messages, the roles and game modes, the commands, and the
+database, whose connections are pooled between threads (see src.db).
+
+Networks are bound like games are, and by the same lock, so that binding
+one swaps its state in and puts the previous network's away (its bound
+game included). Each client's messages and events are handled with its
+network bound, and timers run in the network they were started from.
+
+The bot starts out on the network set up in botconfig, and connects to
+any others in botconfig.NETWORKS as well; see botconfig.py.example.
+"""
+
+import copy
+from collections import defaultdict
+
+import botconfig
+import src.settings as var
+from src import channels, decorators, events, games, users
+from src.context import Features
+from src.responses import responses
+
+__all__ = ["NETWORK_SETTINGS", "NETWORK_VARS", "Network", "add", "default", "every", "current", "of", "run_in"]
+
+# botconfig settings a network can set differently
+NETWORK_SETTINGS = ("HOST", "PORT", "USE_SSL", "USERNAME", "PASS", "SASL_AUTHENTICATION", "SERVER_PASS",
+                    "NICK", "IDENT", "REALNAME", "CHANNEL", "ALT_CHANNELS", "GAME_CHANNELS", "DEV_CHANNEL")
+
+# everything in var which belongs to one network: the old user list, and
+# what the bot worked out from the server's capabilities, features and account support
+NETWORK_VARS = ("USERS", "ENABLED_CAPS", "DISABLE_ACCOUNTS", "ACCOUNTS_ONLY", "MAX_PRIVMSG_TARGETS", "MODES_PREFIXES",
+                "LISTMODES", "MODES_ALLSET", "MODES_ONLYSET", "MODES_NOSET", "MODELIMIT", "STATUSMSG_PREFIXES",
+                "CASEMAPPING")
+
+# module attributes which belong to one network
+_MODULE_STATE = ((users, ("Bot", "_users", "_ghosts")),
+                 (channels, ("_channels", "Main", "Dummy", "Dev")),
+                 (games, ("GAMES", "_bound")),
+                 (decorators, ("HOOKS",)),
+                 (events, ("EVENT_CALLBACKS",)))
+
+_NETWORKS = []
+_bound = None # the network whose state is in place
+
+# what a network starts out with, before it connects
+_DEFAULT_FEATURES = copy.deepcopy(Features)
+_DEFAULT_VARS = {name: copy.deepcopy(getattr(var, name)) for name in NETWORK_VARS if hasattr(var, name)}
+
+class Network:
+    """One IRC network the bot is on.
+
+    The network's botconfig settings are in settings, and its client is
+    set once wolfbot has created it.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.client = None
+        self._state = None # module attributes and vars while not bound
+        self._features = None # copy of Features while not bound
+        self._outer = [] # networks which were bound before this one, when nested
+
+    def __repr__(self):
+        return "{self.__class__.__name__}({0!r})".format(self.settings.get("HOST"), self=self)
+
+    def __enter__(self):
+        games._lock.acquire()
+        self._outer.append(_bound)
+        _switch(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        outer = self._outer.pop()
+        if outer is not None:
+            _switch(outer)
+        games._lock.release()
+        return False
+
+    def _save(self):
+        # put the bound game away first, while its mode's listeners are still in place to be removed
+        if games._bound is not None:
+            games._bound._save()
+        self._state = {(module, attr): getattr(module, attr) for module, attrs in _MODULE_STATE for attr in attrs}
+        self._state.update(((var, name), getattr(var, name)) for name in NETWORK_VARS if hasattr(var, name))
+        self._state.update(((botconfig, name), getattr(botconfig, name)) for name in NETWORK_SETTINGS if hasattr(botconfig, name))
+        self._features = dict(Features)
+
+    def _load(self):
+        for (module, attr), val in self._state.items():
+            setattr(module, attr, val)
+        # Features is imported by name all over; change it in place
+        Features.clear()
+        Features.update(self._features)
+        if games._bound is not None:
+            games._bound._load()
+
+    def _create(self):
+        """Set up the state for a network which hasn't connected yet."""
+        self._state = {(users, "Bot"): None, (users, "_users"): set(), (users, "_ghosts"): set(),
+                       (channels, "_channels"): {}, (channels, "Main"): None, (channels, "Dummy"): None,
+                       (channels, "Dev"): None, (games, "GAMES"): {}, (games, "_bound"): None}
+        # the hooks and listeners which came with the modules; nothing has connected yet to add its own
+        self._state[decorators, "HOOKS"] = defaultdict(list, {name: list(fns) for name, fns in decorators.HOOKS.items()})
+        self._state[events, "EVENT_CALLBACKS"] = defaultdict(list, {name: list(fns) for name, fns in events.EVENT_CALLBACKS.items()})
+        self._state.update(((var, name), copy.deepcopy(val)) for name, val in _DEFAULT_VARS.items())
+        for name in NETWORK_SETTINGS:
+            if name in self.settings:
+                self._state[botconfig, name] = self.settings[name]
+            elif hasattr(botconfig, name):
+                self._state[botconfig, name] = getattr(botconfig, name)
+        self._features = copy.deepcopy(_DEFAULT_FEATURES)
+
+def _switch(network):
+    global _bound
+    if network is _bound:
+        return
+    _bound._save()
+    _bound = network
+    network._load()
+    responses.bind(games.current())
+
+def add(settings):
+    """Add a network to connect to, given the botconfig settings it changes.
+
+    This must happen before the bot connects anywhere, so that the new
+    network only gets the hooks and listeners every connection starts with.
+    """
+    with games._lock:
+        network = Network(settings)
+        network._create()
+        _NETWORKS.append(network)
+        return network
+
+def default():
+    """Return the network set up in botconfig."""
+    return _NETWORKS[0]
+
+def every():
+    """Return every network, starting with the one set up in botconfig."""
+    return list(_NETWORKS)
+
+def current():
+    """Return the network which is bound."""
+    return _bound
+
+def of(cli):
+    """Return the network of a client, or the default network if it isn't one of them."""
+    if len(_NETWORKS) > 1:
+        for network in _NETWORKS:
+            if network.client is cli:
+                return network
+    return _NETWORKS[0]
+
+def run_in(network, func, *args, **kwargs):
+    """Call func with network bound."""
+    with network:
+        return func(*args, **kwargs)
+
+# the network set up in botconfig takes over the state already in place
+_bound = Network({name: getattr(botconfig, name) for name in NETWORK_SETTINGS if hasattr(botconfig, name)})
+_NETWORKS.append(_bound)
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,103 @@
+import random
+from collections import OrderedDict
+
+import src.settings as var
+from src.events import Event
+from src.utilities import list_players, get_role, mass_privmsg
+
+__all__ = ["Notifier"]
+
+class Notifier:
+    """Collects the role notifications sent out at the start of the night.
+
+    Pieces of information that several roles need (the player list, the
+    role of each player, the wolflist tags of each player, ...) are
+    computed the first time something asks for them and then reused for every
+    other recipient that night.
+
+    Messages added with pm() are held in a per-recipient outbox until flush()
+    is called, which sends everything in a single pass. Each recipient still
+    gets their messages in the order they were added, but identical lines
+    meant for several people are sent as one multi-target PRIVMSG/NOTICE.
+    """
+
+    def __init__(self, cli):
+        self.cli = cli
+        self._outbox = OrderedDict()
+        self._shared = {}
+
+    def pm(self, nick, message):
+        self._outbox.setdefault(nick, []).append(message)
+
+    def flush(self):
+        outbox = self._outbox
+        self._outbox = OrderedDict()
+        index = 0
+        while outbox:
+            batches = OrderedDict()
+            for nick, msgs in list(outbox.items()):
+                if index < len(msgs):
+                    batches.setdefault(msgs[index], []).append(nick)
+                else:
+                    del outbox[nick]
+            for message, targets in batches.items():
+                mass_privmsg(self.cli, targets, message)
+            index += 1
+
+    def shared(self, key, func, *args, **kwargs):
+        """Return the value for key, calling func to compute it the first time."""
+        if key not in self._shared:
+            self._shared[key] = func(*args, **kwargs)
+        return self._shared[key]
+
+    @property
+    def players(self):
+        """All living players, in join order."""
+        return self.shared("players", list_players)
+
+    def player_list(self, *exclude):
+        """The living players in random order, without the given nicks.
+
+        Every call is shuffled on its own; if recipients shared one order,
+        comparing their lists would tell them something about each other.
+        """
+        pl = [p for p in self.players if p not in exclude]
+        random.shuffle(pl)
+        return pl
+
+    def shuffled_players(self, roles):
+        """The living players with any of the given roles, in random order."""
+        pl = self.shared(("players", frozenset(roles)), list_players, roles)[:]
+        random.shuffle(pl)
+        return pl
+
+    def get_role(self, nick):
+        roles = self.shared("roles", self._build_roles)
+        if nick in roles:
+            return roles[nick]
+        return get_role(nick) # special participants (e.g. dead vengeful ghosts)
+
+    def _build_roles(self):
+        roles = {}
+        for role, pl in var.ROLES.items():
+            if role in var.TEMPLATE_RESTRICTIONS:
+                continue
+            for p in pl:
+                roles.setdefault(p, role)
+        return roles
+
+    def wolflist_tags(self, nick):
+        """The wolflist tags (e.g. "cursed") for nick.
+
+        None of the wolflist listeners look at who the list is being shown to,
+        so the tags are only computed once per player, with the player as the
+        viewer.
+        """
+        tags = self.shared("wolflist_tags", dict)
+        if nick not in tags:
+            evt = Event("wolflist", {"tags": set()})
+            evt.dispatch(self.cli, var, nick, nick)
+            tags[nick] = frozenset(evt.data["tags"])
+        return tags[nick]
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,156 @@
+"""Pace the lines sent to IRC to what the server is willing to take.
+
+Servers only read so fast from each client, and how fast depends on the
+network and on the class the bot's connection is in. Lines sent faster
+than that queue up on the server (often on purpose, as "fake lag"), and
+a client whose queue grows too long is disconnected for Excess Flood.
+
+Every client sends through its token bucket (see IRCClient.send), and a
+Pacer adjusts how fast the bucket refills. It measures how long the
+server takes to answer PINGs: the one sent every SERVER_PING_INTERVAL
+seconds gives the round trip time when the bot is quiet, and while the
+bot is busy sending, it adds one of its own every so often. When an
+answer takes more than SEND_LAG_THRESHOLD seconds longer than the
+quickest recent one, our lines are queueing up on the server, so the
+rate is cut, as it is whenever the server warns about flooding; while
+the bot keeps the bucket empty and the answers come back quickly, the
+rate goes up a little at a time, up to SEND_RATE_MAX.
+
+The timestamps are taken in the client's own threads, as lines are
+written to and read from the socket, so that the game loop being busy
+isn't mistaken for the server being slow.
+"""
+
+import threading
+import time
+from collections import deque
+
+from oyoyo.client import TokenBucket
+
+from src import metrics
+from src.logger import plog
+
+__all__ = ["Pacer", "SETTINGS"]
+
+# the settings a pacer takes, in order; a network in botconfig.NETWORKS can set them differently
+SETTINGS = ("SEND_BURST", "SEND_RATE", "SEND_RATE_MIN", "SEND_RATE_MAX", "SEND_LAG_THRESHOLD")
+
+INCREASE = 0.1 # lines per second added after each quick answer, while the bot has more to send
+DECREASE = 0.7 # what the rate is multiplied by when the server is throttling us
+SAMPLES = 20 # how many round trip times to find the quickest among
+
+_pacers = []
+
+class Pacer:
+    """Adjust the sending rate of one IRC client to how fast its server takes lines.
+
+    This replaces the client's token bucket with one which holds burst
+    lines and refills at rate lines per second, which is then kept
+    between floor and ceiling.
+    """
+
+    def __init__(self, cli, burst, rate, floor, ceiling, lag_threshold):
+        self.cli = cli
+        self.floor = floor
+        self.ceiling = max(ceiling, floor)
+        self.lag_threshold = lag_threshold
+        self.penalties = 0 # times the rate was cut
+        self.rtt = None # the last round trip time, in seconds
+        self._samples = deque(maxlen=SAMPLES)
+        self._pings = {} # token -> when the PING with it was written
+        self._probe = None # token of the PING we sent ourselves, while unanswered
+        self._lines = 0 # lines sent since our last PING
+        self._cut = 0.0 # when the rate was last cut
+        self._waits = cli.send_waits
+        self._lock = threading.Lock()
+
+        cli.tokenbucket = TokenBucket(burst, min(max(rate, self.floor), self.ceiling))
+        cli.pacer = self
+
+        if metrics.enabled and not _pacers:
+            metrics.Gauge("lykos_irc_send_rate", "Lines per second the bot lets itself send", label="network",
+                          func=lambda: {pacer.cli.host: pacer.rate for pacer in _pacers})
+            metrics.Gauge("lykos_irc_round_trip_seconds", "How long the server last took to answer a PING", label="network",
+                          func=lambda: {pacer.cli.host: pacer.rtt for pacer in _pacers if pacer.rtt is not None})
+        _pacers.append(self)
+
+    @property
+    def rate(self):
+        return self.cli.tokenbucket.fill_rate
+
+    def sent(self, line):
+        """Note a line written to the server; called by the client, with its lock held."""
+        now = time.monotonic()
+        probe = False
+        with self._lock:
+            if line.startswith(b"PING :"):
+                self._pings[line[6:]] = now
+                if len(self._pings) > SAMPLES: # some were never answered, such as ones cut off by a reconnection
+                    del self._pings[next(iter(self._pings))]
+                self._lines = 0
+                return
+            self._lines += 1
+            if self._probe is not None:
+                # don't wait for the answer to find out that it's late
+                sent = self._pings.get(self._probe)
+                if sent is not None and now - sent > self._baseline() + self.lag_threshold:
+                    del self._pings[self._probe]
+                    self._probe = None
+                    if sent > self._cut:
+                        self._slow_down(now, "no answer to PING in {0:.1f}s".format(now - sent))
+            elif self._lines >= self.cli.tokenbucket.capacity / 2:
+                probe = "{0}".format(time.time())
+                self._probe = probe.encode("utf_8")
+        if probe:
+            self.cli.send("PING :{0}".format(probe))
+
+    def received(self, prefix, command, args):
+        """Look for throttling in a line from the server; called by the client as it's read."""
+        now = time.monotonic()
+        with self._lock:
+            if command == "pong" and args:
+                token = args[-1].encode("utf_8")
+                sent = self._pings.pop(token, None)
+                if sent is None:
+                    return
+                if token == self._probe:
+                    self._probe = None
+                self._answered(now, sent)
+            elif command == "error" and args and "flood" in args[-1].lower():
+                self._slow_down(now, args[-1])
+            elif command == "tryagain" and args:
+                self._slow_down(now, args[-1])
+            elif command == "notice" and prefix is not None and "!" not in prefix and args:
+                message = args[-1].lower()
+                if "flood" in message or "throttl" in message:
+                    self._slow_down(now, args[-1])
+
+    def _baseline(self):
+        return min(self._samples, default=0)
+
+    def _answered(self, now, sent):
+        self.rtt = rtt = now - sent
+        self._samples.append(rtt)
+        if rtt - self._baseline() > self.lag_threshold:
+            # only once per round trip; what was sent before the last cut was sent too fast already
+            if sent > self._cut:
+                self._slow_down(now, "PING answered after {0:.1f}s".format(rtt))
+            return
+        if self.cli.send_waits > self._waits and self.rate < self.ceiling:
+            # we've had to hold lines back, and the server took them all quickly; try going faster
+            bucket = self.cli.tokenbucket
+            bucket.tokens # refill for the time gone by at the old rate, before the new one applies
+            bucket.fill_rate = min(bucket.fill_rate + INCREASE, self.ceiling)
+        self._waits = self.cli.send_waits
+
+    def _slow_down(self, now, reason):
+        self._cut = now
+        bucket = self.cli.tokenbucket
+        bucket.fill_rate = max(bucket.fill_rate * DECREASE, self.floor)
+        bucket._tokens = 0.0 # stop any burst in progress
+        bucket.timestamp = time.time() # and don't refill it for time that went by before now
+        self._waits = self.cli.send_waits
+        self.penalties += 1
+        plog("Server {0} is throttling us ({1}); sending at most {2:.2f} lines per second".format(self.cli.host, reason, bucket.fill_rate))
+
+# vim: set sw=4 expandtab:
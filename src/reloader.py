@@ -0,0 +1,193 @@
+import glob
+import importlib
+import importlib.machinery
+import importlib.util
+import os.path
+import sys
+from collections import defaultdict
+
+import src.settings as var
+from src import channels, decorators, events, games, networks, plog
+from src.responses import responses
+
+__all__ = ["ReloadError", "reloadable_modules", "is_reloadable", "reload_game_modules"]
+
+class ReloadError(Exception):
+    pass
+
+def reloadable_modules():
+    """Return the names of the loaded role and game mode modules.
+
+    Roles come first, as game modes may import them.
+    """
+    names = sorted(name for name, module in sys.modules.items()
+                   if module is not None and name.startswith(("src.roles.", "roles.")))
+    for name in ("src.gamemodes", "gamemodes"):
+        if sys.modules.get(name) is not None:
+            names.append(name)
+    return names
+
+def is_reloadable(path):
+    """Return True if changes to the file at path (relative to the bot's root) can be picked up by reloading."""
+    path = path.replace(os.sep, "/")
+    if path == "src/gamemodes.py":
+        return True
+    return path.startswith("src/roles/") and path.endswith(".py") and path != "src/roles/__init__.py"
+
+def _module_of(obj):
+    # commands, hooks and event listeners all keep the function they wrap in .func
+    func = getattr(obj, "func", obj)
+    return getattr(func, "__module__", None)
+
+def _without(table, names):
+    """Return a copy of a COMMANDS, HOOKS or EVENT_CALLBACKS table, leaving out what names registered."""
+    copied = defaultdict(list)
+    for key, entries in table.items():
+        kept = [entry for entry in entries if _module_of(entry[1] if isinstance(entry, tuple) else entry) not in names]
+        if kept:
+            copied[key] = kept
+    return copied
+
+def _added(table, names):
+    for key, entries in table.items():
+        for entry in entries:
+            if _module_of(entry[1] if isinstance(entry, tuple) else entry) in names:
+                yield key, entry
+
+def _new_role_modules():
+    if "src.roles" not in sys.modules: # custom roles are in use
+        return []
+    if not sys.modules["src.roles"].loaded: # LAZY_ROLES; they'll be loaded along with the rest
+        return []
+    path = os.path.dirname(os.path.abspath(sys.modules["src.roles"].__file__))
+    names = []
+    for f in sorted(glob.glob(os.path.join(path, "*.py"))):
+        n, _ = os.path.splitext(os.path.basename(f))
+        if n != "__init__" and "src.roles." + n not in sys.modules:
+            names.append("src.roles." + n)
+    return names
+
+def _check_syntax(name, path):
+    try:
+        with open(path, "rb") as f:
+            compile(f.read(), path, "exec")
+    except (OSError, SyntaxError) as e:
+        raise ReloadError("{0}: {1}".format(name, e)) from e
+
+def _import(name):
+    # a new module object, rather than importlib.reload(), which would
+    # overwrite the old module even if the import then fails halfway
+    parent, _, child = name.rpartition(".")
+    spec = importlib.machinery.PathFinder.find_spec(name, sys.modules[parent].__path__ if parent else None)
+    if spec is None:
+        raise ImportError("no module named {0!r}".format(name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+def _import_all(names, old):
+    """Import names into new modules, with the commands, hooks, listeners and game modes
+    they register going into copies of those tables. Returns the copies.
+
+    If any of them fails to import, the old modules are put back and
+    ReloadError is raised; nothing the bot is using has changed by then.
+    """
+    live = (decorators.COMMANDS, decorators.HOOKS, events.EVENT_CALLBACKS, var.GAME_MODES)
+    decorators.COMMANDS = _without(live[0], old)
+    decorators.HOOKS = _without(live[1], old)
+    events.EVENT_CALLBACKS = _without(live[2], old)
+    var.GAME_MODES = {mode: info for mode, info in live[3].items() if info[0].__module__ not in old}
+    modules = {name: sys.modules.get(name) for name in names}
+    try:
+        for name in names:
+            _import(name)
+        return decorators.COMMANDS, decorators.HOOKS, events.EVENT_CALLBACKS, var.GAME_MODES
+    except Exception as e:
+        for n, module in modules.items():
+            parent, _, child = n.rpartition(".")
+            if module is None:
+                sys.modules.pop(n, None)
+                if parent and hasattr(sys.modules[parent], child):
+                    delattr(sys.modules[parent], child)
+            else:
+                sys.modules[n] = module
+                if parent:
+                    setattr(sys.modules[parent], child, module)
+        raise ReloadError("{0}: {1}".format(name, e)) from e
+    finally:
+        decorators.COMMANDS, decorators.HOOKS, events.EVENT_CALLBACKS, var.GAME_MODES = live
+
+def _running_game():
+    for network in networks.every():
+        with network:
+            for game in games.GAMES.values():
+                if game.PHASE != "none":
+                    return game
+    return None
+
+def reload_game_modules():
+    """Re-import the role and game mode modules, replacing everything they registered.
+
+    The new modules are imported first, with what they register kept
+    aside; only once all of them have imported are the event listeners,
+    commands and hooks from the old modules swapped for the new ones, on
+    every network. Role files that were added since the last load are
+    imported as well. As the role modules lose all of their state, this
+    refuses to run while any game is. Returns the names of the modules
+    that were loaded.
+    """
+    game = _running_game()
+    if game is not None or var.PHASE != "none":
+        raise ReloadError("a game is running in {0}".format(game.channel.name if game else channels.Main.name))
+
+    names = reloadable_modules()
+    new_names = _new_role_modules()
+    removed = [name for name in names if not os.path.isfile(sys.modules[name].__file__)]
+    names = [name for name in names if name not in removed]
+
+    # make sure everything compiles before importing anything
+    for name in names:
+        _check_syntax(name, sys.modules[name].__file__)
+    path = os.path.dirname(sys.modules["src.roles"].__file__)
+    for name in new_names:
+        _check_syntax(name, os.path.join(path, name.rsplit(".", 1)[1] + ".py"))
+
+    old = set(names) | set(removed)
+    loaded = set(names) | set(new_names)
+    with games._lock:
+        commands, hooks, callbacks, modes = _import_all(names + new_names, old)
+        for name in removed:
+            del sys.modules[name]
+
+        # every network has its own hooks and listeners, but the commands and game modes are shared
+        decorators.COMMANDS.clear()
+        decorators.COMMANDS.update(commands)
+        decorators.commands_changed()
+        var.GAME_MODES.clear()
+        var.GAME_MODES.update(modes)
+        for network in networks.every():
+            with network:
+                var.CURRENT_GAMEMODE.teardown()
+                decorators.HOOKS = _without(decorators.HOOKS, old)
+                events.EVENT_CALLBACKS = _without(events.EVENT_CALLBACKS, old)
+                for name, fn in _added(hooks, loaded):
+                    decorators.HOOKS[name].append(fn)
+                for event, (priority, callback) in _added(callbacks, loaded):
+                    events.add_listener(event, callback, priority)
+                # start every game over with the new modules' state, and the new default mode
+                for game in games.GAMES.values():
+                    if game is not games.current():
+                        game._modules = {}
+                        game._vars["CURRENT_GAMEMODE"] = var.GAME_MODES["default"][0]()
+                        game._mode_hooks = ([], [])
+                var.CURRENT_GAMEMODE = var.GAME_MODES["default"][0]()
+                var.CURRENT_GAMEMODE.startup()
+        responses.clear()
+
+    plog("Reloaded {0} role and game mode modules".format(len(names) + len(new_names)))
+    return names + new_names
+
+# vim: set sw=4 expandtab:
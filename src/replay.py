@@ -0,0 +1,174 @@
+"""Play back IRC traffic recorded with IRC_CAPTURE_FILE, timing how long the bot takes over each line.
+
+A capture has one record per line: a monotonic timestamp, ">" for a line
+the bot sent, "<" for one it received, or "*" where it (re)connected,
+then the raw line. A Replayer takes one connection's worth of records and
+feeds the received lines to a SimClient, through the same parsing and
+handlers as a real connection, from the connect callback onwards; what
+the bot sends is counted and thrown away. The nick and channel it used
+are taken from the capture, and everything else from botconfig, except
+that the replay never identifies to services.
+
+Game timers run on a VirtualClock, in step with the capture: before each
+line, every timer that would have fired by then does. Played back as fast
+as possible, the time between lines is skipped, and the wall clock (as
+the bot reads it, through time.time() and datetime.now()) skips along
+with it, so that waits such as the one before a game can start pass as
+they did live; at the original speed, the replay sleeps through
+that time instead, so it takes as long as it did live.
+Either way, the handling times are real, so the report can be used to
+compare the speed of two versions of the bot on the same traffic.
+
+Run it with ./replay.py, which plays back in a scratch directory so that
+the database and logs aren't touched.
+"""
+
+import datetime
+import sys
+import time
+from collections import defaultdict
+
+import botconfig
+import src.settings as var
+from src import handler, metrics
+from src.simulator import SimClient, VirtualClock
+
+__all__ = ["read_capture", "sessions", "percentile", "Replayer"]
+
+def read_capture(path):
+    """Yield the (timestamp, direction, line) records of a capture file, with line as bytes."""
+    with open(path, "rb") as f:
+        for record in f:
+            stamp, direction, line = record.rstrip(b"\n").split(b" ", 2)
+            yield float(stamp), direction, line
+
+def sessions(records):
+    """Split records into one list per connection."""
+    found = []
+    for record in records:
+        if record[1] == b"*" or not found:
+            found.append([])
+        found[-1].append(record)
+    return found
+
+def percentile(ordered, fraction):
+    """Return the value at the given fraction of the way through a sorted list, or 0 if it's empty."""
+    if not ordered:
+        return 0
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def _follow_clock(clock):
+    """Make the wall clock, as the bot reads it, move with clock instead of in real time."""
+    epoch = time.time()
+    time.time = lambda: epoch + clock.now
+
+    class VirtualDatetimeType(type):
+        def __instancecheck__(cls, obj):
+            return isinstance(obj, datetime.datetime) # what now() returns isn't one of these
+
+    class VirtualDatetime(datetime.datetime, metaclass=VirtualDatetimeType):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.datetime.fromtimestamp(time.time(), tz)
+
+        @classmethod
+        def utcnow(cls):
+            return datetime.datetime.utcfromtimestamp(time.time())
+
+    # the bot does "from datetime import datetime" all over
+    for name, module in list(sys.modules.items()):
+        if name.startswith("src.") and getattr(module, "datetime", None) is datetime.datetime:
+            module.datetime = VirtualDatetime
+
+class Replayer:
+    """Play back one connection's worth of a capture.
+
+    Creating one takes over the process, like a Simulator: game timers run
+    on its clock from then on. With realtime, lines are played back at the
+    pace they were recorded at; otherwise, as fast as possible.
+    """
+
+    def __init__(self, records, realtime=False):
+        self.records = records
+        self.realtime = realtime
+        self.clock = VirtualClock()
+        self.latencies = defaultdict(list) # command -> seconds taken over each line of it
+        self.timer_latencies = []
+        self.sent = 0 # lines the bot sent during the capture
+
+        joined = False
+        for _, direction, line in records:
+            if direction != b">":
+                continue
+            self.sent += 1
+            command, _, rest = line.decode("utf-8", "replace").partition(" ")
+            if command == "NICK":
+                botconfig.NICK = rest.lstrip(":")
+            elif command == "JOIN" and not joined:
+                # the first channel joined is the main one
+                botconfig.CHANNEL = rest.split()[0].split(",")[0]
+                joined = True
+
+        botconfig.PASS = ""
+        botconfig.SASL_AUTHENTICATION = False
+
+        metrics.Timer = self.clock.Timer
+        if not realtime:
+            var.USER_MESSAGE_BURST = 0 # the flood limits would see days' worth of messages arriving at once
+            _follow_clock(self.clock)
+
+        self.cli = SimClient()
+        self.cli.command_handler = {"privmsg": lambda *s: None,
+                                    "notice": lambda *s: None,
+                                    "": handler.unhandled}
+        self._start = records[0][0]
+        self._wall = None
+
+    def play(self):
+        """Play back every received line, and return a report of the time taken over them."""
+        self._wall = time.perf_counter()
+        handler.connect_callback(self.cli)
+        for stamp, direction, line in self.records:
+            if direction != b"<" or not line:
+                continue
+            self._wait(stamp - self._start)
+            command = line.split(b" ", 2)[1 if line.startswith(b":") else 0].decode("ascii", "replace").upper()
+            start = time.perf_counter()
+            self.cli.handle_line(line)
+            self.latencies[command].append(time.perf_counter() - start)
+        return self.report(time.perf_counter() - self._wall)
+
+    def _wait(self, until):
+        """Run the timers due by until (in seconds since the capture started), keeping pace if realtime."""
+        while True:
+            deadline = self.clock.next_deadline()
+            if deadline is None or deadline > until:
+                break
+            self._sleep(deadline)
+            start = time.perf_counter()
+            self.clock.advance()
+            self.timer_latencies.append(time.perf_counter() - start)
+        self._sleep(until)
+        self.clock.now = max(self.clock.now, until)
+
+    def _sleep(self, until):
+        if self.realtime:
+            time.sleep(max(until - (time.perf_counter() - self._wall), 0))
+
+    def report(self, elapsed):
+        """Return the handling time percentiles, per command and overall, as a list of lines."""
+        rows = sorted(self.latencies.items(), key=lambda x: -sum(x[1]))
+        everything = [t for times in self.latencies.values() for t in times]
+        rows.append(("(all lines)", everything))
+        rows.append(("(timers)", self.timer_latencies))
+        lines = ["{0:<16}{1:>8}{2:>9}{3:>9}{4:>9}{5:>9}{6:>10}".format("command", "lines", "p50 ms", "p90 ms", "p99 ms", "max ms", "total ms")]
+        for name, times in rows:
+            ordered = sorted(times)
+            lines.append("{0:<16}{1:>8}{2:>9.3f}{3:>9.3f}{4:>9.3f}{5:>9.3f}{6:>10.1f}".format(
+                name, len(ordered), percentile(ordered, 0.5) * 1000, percentile(ordered, 0.9) * 1000,
+                percentile(ordered, 0.99) * 1000, (ordered[-1] if ordered else 0) * 1000, sum(ordered) * 1000))
+        lines.append("Replayed {0} lines covering {1:.0f}s in {2:.2f}s; the bot sent {3} lines, against {4} in the capture".format(
+            len(everything), self.records[-1][0] - self._start, elapsed, self.cli.lines_sent, self.sent))
+        return lines
+
+# vim: set sw=4 expandtab:
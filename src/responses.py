@@ -0,0 +1,73 @@
+import threading
+
+__all__ = ["ResponseCache", "responses"]
+
+class ResponseCache:
+    """Cache for the output of read-only commands such as !stats and !votes.
+
+    Entries are kept for each game, and keyed by the command, the class of
+    viewer that the output is for (for example "public" or "wolfchat"), and
+    the game's state version. The version is bumped whenever the game state
+    may have changed (commands and IRC hooks that are not read-only, deaths
+    and phase changes), which drops every entry cached for the game at once.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._scope = None # whose responses are served: the bound game (see bind())
+        self._versions = {} # scope -> state version
+        self._entries = {} # scope -> {(command, visibility, version): response}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._versions.get(self._scope, 0)
+
+    def bind(self, scope):
+        """Serve the responses cached for scope from now on; each game has its own."""
+        with self._lock:
+            self._scope = scope
+
+    def invalidate(self):
+        with self._lock:
+            self._versions[self._scope] = self._versions.get(self._scope, 0) + 1
+            self._entries.pop(self._scope, None)
+
+    def clear(self):
+        """Drop the responses cached for every game."""
+        with self._lock:
+            for scope in self._versions:
+                self._versions[scope] += 1
+            self._entries.clear()
+
+    def get(self, command, visibility, func, *args, **kwargs):
+        """Return the cached response, calling func to compute it if needed.
+
+        If func returns None, nothing is cached; this is used for responses
+        that were handled in some other way and need to run every time.
+        """
+        with self._lock:
+            scope = self._scope
+            key = (command, visibility, self._versions.get(scope, 0))
+            entries = self._entries.get(scope, {})
+            if key in entries:
+                self.hits += 1
+                return entries[key]
+            self.misses += 1
+
+        value = func(*args, **kwargs)
+
+        with self._lock:
+            # don't store something computed from a state that's since changed
+            if value is not None and key[2] == self._versions.get(scope, 0):
+                self._entries.setdefault(scope, {})[key] = value
+        return value
+
+    def __repr__(self):
+        return "{self.__class__.__name__}(version={self.version}, entries={0}, hits={self.hits}, misses={self.misses})".format(
+            len(self._entries.get(self._scope, ())), self=self)
+
+responses = ResponseCache()
+
+# vim: set sw=4 expandtab:
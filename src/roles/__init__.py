@@ -2,15 +2,40 @@
 import os.path
 import glob
 import importlib
+import sys
+import threading
+
+import botconfig
+import src.settings as var
 
 path = os.path.dirname(os.path.abspath(__file__))
 search = os.path.join(path, "*.py")
 
-for f in glob.iglob(search):
-    f = os.path.basename(f)
-    n, _ = os.path.splitext(f)
-    if f == "__init__.py":
-        continue
-    importlib.import_module("." + n, package="src.roles")
+_lock = threading.Lock()
+loaded = False
+
+def load_all():
+    """Import every role module which hasn't been imported yet.
+
+    With LAZY_ROLES, this is put off until the first game starts
+    instead of happening on startup. Returns the names of the modules
+    which were imported.
+    """
+    global loaded
+    names = []
+    with _lock:
+        for f in glob.iglob(search):
+            f = os.path.basename(f)
+            n, _ = os.path.splitext(f)
+            if f == "__init__.py" or "src.roles." + n in sys.modules:
+                continue
+            importlib.import_module("." + n, package="src.roles")
+            names.append(n)
+        loaded = True
+    return names
+
+# settings from botconfig haven't been carried over to var yet at this point
+if not getattr(botconfig, "LAZY_ROLES", var.LAZY_ROLES):
+    load_all()
 
 # vim: set sw=4 expandtab:
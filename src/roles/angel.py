@@ -7,7 +7,7 @@ from collections import defaultdict
 import botconfig
 import src.settings as var
 from src.utilities import *
-from src import debuglog, errlog, plog
+from src import channels, debuglog, errlog, plog
 from src.decorators import cmd, event_listener
 from src.messages import messages
 from src.events import Event
@@ -226,26 +226,23 @@ def on_transition_night_begin(evt, cli, var):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     # the messages for angel and guardian angel are different enough to merit individual loops
-    ps = list_players()
     for bg in var.ROLES["bodyguard"]:
-        pl = ps[:]
-        random.shuffle(pl)
-        pl.remove(bg)
+        pl = notify.player_list(bg)
         chance = math.floor(var.BODYGUARD_DIES_CHANCE * 100)
         warning = ""
         if chance > 0:
             warning = messages["bodyguard_death_chance"].format(chance)
 
         if bg in var.PLAYERS and not is_user_simple(bg):
-            pm(cli, bg, messages["bodyguard_notify"].format(warning))
+            notify.pm(bg, messages["bodyguard_notify"].format(warning))
         else:
-            pm(cli, bg, messages["bodyguard_simple"])  # !simple
-        pm(cli, bg, "Players: " + ", ".join(pl))
+            notify.pm(bg, messages["bodyguard_simple"])  # !simple
+        notify.pm(bg, "Players: " + ", ".join(pl))
 
     for gangel in var.ROLES["guardian angel"]:
-        pl = ps[:]
-        random.shuffle(pl)
+        pl = notify.player_list()
         gself = messages["guardian_self_notification"]
         if not var.GUARDIAN_ANGEL_CAN_GUARD_SELF:
             pl.remove(gangel)
@@ -258,10 +255,10 @@ def on_transition_night_end(evt, cli, var):
             warning = messages["bodyguard_death_chance"].format(chance)
 
         if gangel in var.PLAYERS and not is_user_simple(gangel):
-            pm(cli, gangel, messages["guardian_notify"].format(warning, gself))
+            notify.pm(gangel, messages["guardian_notify"].format(warning, gself))
         else:
-            pm(cli, gangel, messages["guardian_simple"])  # !simple
-        pm(cli, gangel, "Players: " + ", ".join(pl))
+            notify.pm(gangel, messages["guardian_simple"])  # !simple
+        notify.pm(gangel, "Players: " + ", ".join(pl))
 
 @event_listener("assassinate")
 def on_assassinate(evt, cli, var, nick, target, prot):
@@ -269,14 +266,14 @@ def on_assassinate(evt, cli, var, nick, target, prot):
         var.ACTIVE_PROTECTIONS[target].remove("angel")
         evt.prevent_default = True
         evt.stop_processing = True
-        cli.msg(botconfig.CHANNEL, messages[evt.params.message_prefix + "angel"].format(nick, target))
+        cli.msg(channels.Main.name, messages[evt.params.message_prefix + "angel"].format(nick, target))
     elif prot == "bodyguard":
         var.ACTIVE_PROTECTIONS[target].remove("bodyguard")
         evt.prevent_default = True
         evt.stop_processing = True
         for bg in var.ROLES["bodyguard"]:
             if GUARDED.get(bg) == target:
-                cli.msg(botconfig.CHANNEL, messages[evt.params.message_prefix + "bodyguard"].format(nick, target, bg))
+                cli.msg(channels.Main.name, messages[evt.params.message_prefix + "bodyguard"].format(nick, target, bg))
                 evt.params.del_player(cli, bg, True, end_game=False, killer_role=evt.params.nickrole, deadlist=evt.params.deadlist, original=evt.params.original, ismain=False)
                 evt.data["pl"] = evt.params.refresh_pl(evt.data["pl"])
                 break
@@ -46,12 +46,13 @@ def on_transition_day_resolve(evt, cli, var, victim):
 
 @event_listener("transition_night_end", priority=5)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     if var.FIRST_NIGHT or var.ALWAYS_PM_ROLE:
         for blessed in var.ROLES["blessed villager"]:
             if blessed in var.PLAYERS and not is_user_simple(blessed):
-                pm(cli, blessed, messages["blessed_notify"])
+                notify.pm(blessed, messages["blessed_notify"])
             else:
-                pm(cli, blessed, messages["blessed_simple"])
+                notify.pm(blessed, messages["blessed_simple"])
 
 @event_listener("desperation_totem")
 def on_desperation(evt, cli, var, votee, target, prot):
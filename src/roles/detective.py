@@ -77,20 +77,18 @@ def on_exchange(evt, cli, var, actor, nick, actor_role, nick_role):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
-    ps = list_players()
+    notify = evt.params.notify
     for dttv in var.ROLES["detective"]:
-        pl = ps[:]
-        random.shuffle(pl)
-        pl.remove(dttv)
+        pl = notify.player_list(dttv)
         chance = math.floor(var.DETECTIVE_REVEALED_CHANCE * 100)
         warning = ""
         if chance > 0:
             warning = messages["detective_chance"].format(chance)
         if dttv in var.PLAYERS and not is_user_simple(dttv):
-            pm(cli, dttv, messages["detective_notify"].format(warning))
+            notify.pm(dttv, messages["detective_notify"].format(warning))
         else:
-            pm(cli, dttv, messages["detective_simple"])  # !simple
-        pm(cli, dttv, "Players: " + ", ".join(pl))
+            notify.pm(dttv, messages["detective_simple"])  # !simple
+        notify.pm(dttv, "Players: " + ", ".join(pl))
 
 
 @event_listener("transition_night_begin")
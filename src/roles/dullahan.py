@@ -5,7 +5,7 @@ from collections import defaultdict, deque
 
 import src.settings as var
 from src.utilities import *
-from src import debuglog, errlog, plog
+from src import channels, debuglog, errlog, plog
 from src.decorators import cmd, event_listener
 from src.messages import messages
 from src.events import Event
@@ -96,9 +96,9 @@ def on_del_player(evt, cli, var, nick, nickrole, nicktpls, death_triggers):
             if var.ROLE_REVEAL in ("on", "team"):
                 role = get_reveal_role(target)
                 an = "n" if role.startswith(("a", "e", "i", "o", "u")) else ""
-                cli.msg(botconfig.CHANNEL, messages["dullahan_die_success"].format(nick, target, an, role))
+                cli.msg(channels.Main.name, messages["dullahan_die_success"].format(nick, target, an, role))
             else:
-                cli.msg(botconfig.CHANNEL, messages["dullahan_die_success_noreveal"].format(nick, target))
+                cli.msg(channels.Main.name, messages["dullahan_die_success_noreveal"].format(nick, target))
             debuglog("{0} ({1}) DULLAHAN ASSASSINATE: {2} ({3})".format(nick, nickrole, target, get_role(target)))
             evt.params.del_player(cli, target, True, end_game=False, killer_role=nickrole, deadlist=evt.params.deadlist, original=evt.params.original, ismain=False)
             evt.data["pl"] = evt.params.refresh_pl(pl)
@@ -169,21 +169,22 @@ def on_chk_nightdone(evt, cli, var):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     for dullahan in var.ROLES["dullahan"]:
         targets = list(TARGETS[dullahan])
         for target in var.DEAD:
             if target in targets:
                 targets.remove(target)
         if not targets: # already all dead
-            pm(cli, dullahan, "{0} {1}".format(messages["dullahan_simple"], messages["dullahan_targets_dead"]))
+            notify.pm(dullahan, "{0} {1}".format(messages["dullahan_simple"], messages["dullahan_targets_dead"]))
             continue
         random.shuffle(targets)
         if dullahan in var.PLAYERS and not is_user_simple(dullahan):
-            pm(cli, dullahan, messages["dullahan_notify"])
+            notify.pm(dullahan, messages["dullahan_notify"])
         else:
-            pm(cli, dullahan, messages["dullahan_simple"])
+            notify.pm(dullahan, messages["dullahan_simple"])
         t = messages["dullahan_targets"] if var.FIRST_NIGHT else messages["dullahan_remaining_targets"]
-        pm(cli, dullahan, t + ", ".join(targets))
+        notify.pm(dullahan, t + ", ".join(targets))
 
 @event_listener("role_assignment")
 def on_role_assignment(evt, cli, var, gamemode, pl, restart):
@@ -122,15 +122,14 @@ def on_exchange_roles(evt, cli, var, actor, nick, actor_role, nick_role):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     for harlot in var.ROLES["harlot"]:
-        pl = list_players()
-        random.shuffle(pl)
-        pl.remove(harlot)
+        pl = notify.player_list(harlot)
         if harlot in var.PLAYERS and not is_user_simple(harlot):
-            pm(cli, harlot, messages["harlot_info"])
+            notify.pm(harlot, messages["harlot_info"])
         else:
-            pm(cli, harlot, messages["harlot_simple"])
-        pm(cli, harlot, "Players: " + ", ".join(pl))
+            notify.pm(harlot, messages["harlot_simple"])
+        notify.pm(harlot, "Players: " + ", ".join(pl))
 
 @event_listener("begin_day")
 def on_begin_day(evt, cli, var):
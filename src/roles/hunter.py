@@ -137,18 +137,16 @@ def on_chk_nightdone(evt, cli, var):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
-    ps = list_players()
+    notify = evt.params.notify
     for hunter in var.ROLES["hunter"]:
         if hunter in HUNTERS:
             continue #already killed
-        pl = ps[:]
-        random.shuffle(pl)
-        pl.remove(hunter)
+        pl = notify.player_list(hunter)
         if hunter in var.PLAYERS and not is_user_simple(hunter):
-            pm(cli, hunter, messages["hunter_notify"])
+            notify.pm(hunter, messages["hunter_notify"])
         else:
-            pm(cli, hunter, messages["hunter_simple"])
-        pm(cli, hunter, "Players: " + ", ".join(pl))
+            notify.pm(hunter, messages["hunter_simple"])
+        notify.pm(hunter, "Players: " + ", ".join(pl))
 
 @event_listener("succubus_visit")
 def on_succubus_visit(evt, cli, var, nick, victim):
@@ -7,7 +7,7 @@ from collections import defaultdict
 import botconfig
 import src.settings as var
 from src.utilities import *
-from src import debuglog, errlog, plog
+from src import channels, debuglog, errlog, plog
 from src.decorators import cmd, event_listener
 from src.messages import messages
 from src.events import Event
@@ -24,7 +24,7 @@ def on_rename_player(evt, cli, var, prefix, nick):
 def on_chk_decision_lynch(evt, cli, var, voters):
     votee = evt.data["votee"]
     if votee in var.ROLES["mayor"] and votee not in REVEALED_MAYORS:
-        cli.msg(botconfig.CHANNEL, messages["mayor_reveal"].format(votee))
+        cli.msg(channels.Main.name, messages["mayor_reveal"].format(votee))
         REVEALED_MAYORS.add(votee)
         evt.data["votee"] = None
         evt.prevent_default = True
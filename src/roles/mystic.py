@@ -37,12 +37,13 @@ def on_exchange(evt, cli, var, actor, nick, actor_role, nick_role):
 
 @event_listener("transition_night_end", priority=2.01)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     # init with all roles that haven't been split yet
     special = set(list_players(("harlot", "priest", "prophet", "matchmaker",
                                 "doctor", "hag", "sorcerer", "turncoat", "clone", "piper")))
     evt2 = Event("get_special", {"special": special})
     evt2.dispatch(cli, var)
-    pl = set(list_players())
+    pl = set(notify.players)
     wolves = set(list_players(var.WOLFTEAM_ROLES))
     neutral = set(list_players(var.TRUE_NEUTRAL_ROLES))
     special = evt2.data["special"]
@@ -51,15 +52,15 @@ def on_transition_night_end(evt, cli, var):
         # if adding this info to !myrole, you will need to save off this count so that they can't get updated info until the next night
         # # of special villagers = # of players - # of villagers - # of wolves - # of neutrals
         numvills = len(special & (pl - wolves - neutral))
-        pm(cli, wolf, messages["wolf_mystic_info"].format("are" if numvills != 1 else "is", numvills, "s" if numvills != 1 else ""))
+        notify.pm(wolf, messages["wolf_mystic_info"].format("are" if numvills != 1 else "is", numvills, "s" if numvills != 1 else ""))
     for mystic in var.ROLES["mystic"]:
         if mystic in var.PLAYERS and not is_user_simple(mystic):
-            pm(cli, mystic, messages["mystic_notify"])
+            notify.pm(mystic, messages["mystic_notify"])
         else:
-            pm(cli, mystic, messages["mystic_simple"])
+            notify.pm(mystic, messages["mystic_simple"])
         # if adding this info to !myrole, you will need to save off this count so that they can't get updated info until the next night
         numevil = len(wolves)
-        pm(cli, mystic, messages["mystic_info"].format("are" if numevil != 1 else "is", numevil, "s" if numevil != 1 else ""))
+        notify.pm(mystic, messages["mystic_info"].format("are" if numevil != 1 else "is", numevil, "s" if numevil != 1 else ""))
 
 @event_listener("get_special")
 def on_get_special(evt, cli, var):
@@ -104,11 +104,10 @@ def on_chk_nightdone(evt, cli, var):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     for seer in list_players(("seer", "oracle", "augur")):
-        pl = list_players()
-        random.shuffle(pl)
-        role = get_role(seer)
-        pl.remove(seer)  # remove self from list
+        pl = notify.player_list(seer)  # remove self from list
+        role = notify.get_role(seer)
 
         a = "a"
         if role in ("oracle", "augur"):
@@ -124,10 +123,10 @@ def on_transition_night_end(evt, cli, var):
             what = messages["seer_role_bug"]
 
         if seer in var.PLAYERS and not is_user_simple(seer):
-            pm(cli, seer, messages["seer_role_info"].format(a, role, what))
+            notify.pm(seer, messages["seer_role_info"].format(a, role, what))
         else:
-            pm(cli, seer, messages["seer_simple"].format(a, role))  # !simple
-        pm(cli, seer, "Players: " + ", ".join(pl))
+            notify.pm(seer, messages["seer_simple"].format(a, role))  # !simple
+        notify.pm(seer, "Players: " + ", ".join(pl))
 
 
 @event_listener("begin_day")
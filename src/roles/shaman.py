@@ -6,7 +6,7 @@ from collections import defaultdict, deque
 import botconfig
 import src.settings as var
 from src.utilities import *
-from src import debuglog, errlog, plog
+from src import channels, debuglog, errlog, plog
 from src.decorators import cmd, event_listener
 from src.messages import messages
 from src.events import Event
@@ -234,14 +234,14 @@ def on_hurry_up(evt, cli, var, force):
 def on_chk_decision_abstain(evt, cli, var, nl):
     for p in nl:
         if p in PACIFISM and p not in var.NO_LYNCH:
-            cli.msg(botconfig.CHANNEL, messages["player_meek_abstain"].format(p))
+            cli.msg(channels.Main.name, messages["player_meek_abstain"].format(p))
 
 @event_listener("chk_decision_lynch", priority=1)
 def on_chk_decision_lynch1(evt, cli, var, voters):
     votee = evt.data["votee"]
     for p in voters:
         if p in IMPATIENCE and p not in var.VOTES[votee]:
-            cli.msg(botconfig.CHANNEL, messages["impatient_vote"].format(p, votee))
+            cli.msg(channels.Main.name, messages["impatient_vote"].format(p, votee))
 
 # mayor is at exactly 3, so we want that to always happen before revealing totem
 @event_listener("chk_decision_lynch", priority=3.1)
@@ -266,7 +266,7 @@ def on_chk_decision_lynch3(evt, cli, var, voters):
                 var.TURNCOATS[votee] = ("none", -1)
 
         an = "n" if role.startswith(("a", "e", "i", "o", "u")) else ""
-        cli.msg(botconfig.CHANNEL, messages["totem_reveal"].format(votee, an, role))
+        cli.msg(channels.Main.name, messages["totem_reveal"].format(votee, an, role))
         evt.data["votee"] = None
         evt.prevent_default = True
         evt.stop_processing = True
@@ -293,7 +293,7 @@ def on_chk_decision_lynch5(evt, cli, var, voters):
                 tmsg = messages["totem_desperation"].format(votee, target, an1, r1)
             else:
                 tmsg = messages["totem_desperation_no_reveal"].format(votee, target)
-            cli.msg(botconfig.CHANNEL, tmsg)
+            cli.msg(channels.Main.name, tmsg)
             # we lie to this function so it doesn't devoice the player yet. instead, we'll let the call further down do it
             evt.data["deadlist"].append(target)
             evt.params.del_player(cli, target, True, end_game=False, killer_role="shaman", deadlist=evt.data["deadlist"], original=target, ismain=False)
@@ -496,12 +496,12 @@ def on_transition_day_end(evt, cli, var):
             player, "ed" if player not in list_players() else "s", "a" if ntotems == 1 else "\u0002{0}\u0002".format(ntotems), "s" if ntotems > 1 else ""))
     for player in brokentotem:
         message.append(messages["totem_broken"].format(player))
-    cli.msg(botconfig.CHANNEL, "\n".join(message))
+    cli.msg(channels.Main.name, "\n".join(message))
 
 @event_listener("transition_night_end", priority=2.01)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     max_totems = defaultdict(int)
-    ps = list_players()
     shamans = list_players(var.TOTEM_ORDER)
     for ix in range(len(var.TOTEM_ORDER)):
         for c in var.TOTEM_CHANCES.values():
@@ -510,11 +510,8 @@ def on_transition_night_end(evt, cli, var):
         if s not in shamans:
             del LASTGIVEN[s]
     for shaman in list_players(var.TOTEM_ORDER):
-        pl = ps[:]
-        random.shuffle(pl)
-        if shaman in LASTGIVEN and LASTGIVEN[shaman] in pl:
-            pl.remove(LASTGIVEN[shaman])
-        role = get_role(shaman)
+        pl = notify.player_list(LASTGIVEN.get(shaman))
+        role = notify.get_role(shaman)
         indx = var.TOTEM_ORDER.index(role)
         target = 0
         rand = random.random() * max_totems[var.TOTEM_ORDER[indx]]
@@ -525,7 +522,7 @@ def on_transition_night_end(evt, cli, var):
                 break
         if shaman in var.PLAYERS and not is_user_simple(shaman):
             if role not in var.WOLFCHAT_ROLES:
-                pm(cli, shaman, messages["shaman_notify"].format(role, "random " if shaman in var.ROLES["crazed shaman"] else ""))
+                notify.pm(shaman, messages["shaman_notify"].format(role, "random " if shaman in var.ROLES["crazed shaman"] else ""))
             if role != "crazed shaman":
                 totem = TOTEMS[shaman]
                 tmsg = messages["shaman_totem"].format(totem)
@@ -533,14 +530,14 @@ def on_transition_night_end(evt, cli, var):
                     tmsg += messages[totem + "_totem"]
                 except KeyError:
                     tmsg += messages["generic_bug_totem"]
-                pm(cli, shaman, tmsg)
+                notify.pm(shaman, tmsg)
         else:
             if role not in var.WOLFCHAT_ROLES:
-                pm(cli, shaman, messages["shaman_simple"].format(role))
+                notify.pm(shaman, messages["shaman_simple"].format(role))
             if role != "crazed shaman":
-                pm(cli, shaman, messages["totem_simple"].format(TOTEMS[shaman]))
+                notify.pm(shaman, messages["totem_simple"].format(TOTEMS[shaman]))
         if role not in var.WOLFCHAT_ROLES:
-            pm(cli, shaman, "Players: " + ", ".join(pl))
+            notify.pm(shaman, "Players: " + ", ".join(pl))
 
 @event_listener("begin_day")
 def on_begin_day(evt, cli, var):
@@ -573,7 +570,7 @@ def on_assassinate(evt, cli, var, nick, target, prot):
         var.ACTIVE_PROTECTIONS[target].remove("totem")
         evt.prevent_default = True
         evt.stop_processing = True
-        cli.msg(botconfig.CHANNEL, messages[evt.params.message_prefix + "totem"].format(nick, target))
+        cli.msg(channels.Main.name, messages[evt.params.message_prefix + "totem"].format(nick, target))
 
 @event_listener("succubus_visit")
 def on_succubus_visit(evt, cli, var, nick, victim):
@@ -204,11 +204,11 @@ def on_del_player(evt, cli, var, nick, nickrole, nicktpls, death_triggers):
                 else:
                     msg.append("\u0002{0}\u0002".format(e))
             if len(msg) == 1:
-                cli.msg(botconfig.CHANNEL, messages["succubus_die_kill"].format(msg[0] + comma))
+                cli.msg(channels.Main.name, messages["succubus_die_kill"].format(msg[0] + comma))
             elif len(msg) == 2:
-                cli.msg(botconfig.CHANNEL, messages["succubus_die_kill"].format(msg[0] + comma + " and " + msg[1] + comma))
+                cli.msg(channels.Main.name, messages["succubus_die_kill"].format(msg[0] + comma + " and " + msg[1] + comma))
             else:
-                cli.msg(botconfig.CHANNEL, messages["succubus_die_kill"].format(", ".join(msg[:-1]) + ", and " + msg[-1] + comma))
+                cli.msg(channels.Main.name, messages["succubus_die_kill"].format(", ".join(msg[:-1]) + ", and " + msg[-1] + comma))
             for e in entranced_alive:
                 # to ensure we do not double-kill someone, notify all child deaths that we'll be
                 # killing off everyone else that is entranced so they don't need to bother
@@ -268,15 +268,14 @@ def on_targeted_command(evt, cli, var, cmd, actor, orig_target, tags):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     for succubus in var.ROLES["succubus"]:
-        pl = list_players()
-        random.shuffle(pl)
-        pl.remove(succubus)
+        pl = notify.player_list(succubus)
         if succubus in var.PLAYERS and not is_user_simple(succubus):
-            pm(cli, succubus, messages["succubus_notify"])
+            notify.pm(succubus, messages["succubus_notify"])
         else:
-            pm(cli, succubus, messages["succubus_simple"])
-        pm(cli, succubus, "Players: " + ", ".join(("{0} ({1})".format(x, get_role(x)) if x in var.ROLES["succubus"] else x for x in pl)))
+            notify.pm(succubus, messages["succubus_simple"])
+        notify.pm(succubus, "Players: " + ", ".join(("{0} ({1})".format(x, notify.get_role(x)) if x in var.ROLES["succubus"] else x for x in pl)))
 
 @event_listener("begin_day")
 def on_begin_day(evt, cli, var):
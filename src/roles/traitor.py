@@ -7,7 +7,7 @@ from collections import defaultdict
 import botconfig
 import src.settings as var
 from src.utilities import *
-from src import debuglog, errlog, plog
+from src import channels, debuglog, errlog, plog
 from src.decorators import cmd, event_listener
 from src.messages import messages
 from src.events import Event
@@ -75,7 +75,8 @@ def on_chk_win(evt, cli, var, rolemap, lpl, lwolves, lrealwolves):
     if did_something:
         if var.PHASE in var.GAME_PHASES:
             var.TRAITOR_TURNED = True
-            cli.msg(botconfig.CHANNEL, messages["traitor_turn_channel"])
+            cli.msg(channels.Main.name, messages["traitor_turn_channel"])
+            Event("traitor_turn", {}).dispatch(var)
         evt.prevent_default = True
         evt.stop_processing = True
 
@@ -200,25 +200,21 @@ def on_chk_nightdone(evt, cli, var):
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
     # alive VGs are messaged as part of villager.py, this handles dead ones
-    ps = list_players()
+    notify = evt.params.notify
     wolves = list_players(var.WOLFTEAM_ROLES)
     for v_ghost, who in GHOSTS.items():
         if who[0] == "!":
             continue
         if who == "wolves":
-            pl = wolves[:]
+            pl = notify.shuffled_players(var.WOLFTEAM_ROLES)
         else:
-            pl = ps[:]
-            for wolf in wolves:
-                pl.remove(wolf)
-
-        random.shuffle(pl)
+            pl = notify.player_list(*wolves)
 
         if not v_ghost.prefers_simple():
-            v_ghost.send(messages["vengeful_ghost_notify"].format(who))
+            notify.pm(v_ghost.nick, messages["vengeful_ghost_notify"].format(who))
         else:
-            v_ghost.send(messages["vengeful_ghost_simple"])
-        v_ghost.send(who.capitalize() + ": " + ", ".join(pl))
+            notify.pm(v_ghost.nick, messages["vengeful_ghost_simple"])
+        notify.pm(v_ghost.nick, who.capitalize() + ": " + ", ".join(pl))
         debuglog("GHOST: {0} (target: {1}) - players: {2}".format(v_ghost.nick, who, ", ".join(pl)))
 
 @event_listener("myrole")
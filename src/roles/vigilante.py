@@ -124,16 +124,14 @@ def on_chk_nightdone(evt, cli, var):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
-    ps = list_players()
+    notify = evt.params.notify
     for vigilante in var.ROLES["vigilante"]:
-        pl = ps[:]
-        random.shuffle(pl)
-        pl.remove(vigilante)
+        pl = notify.player_list(vigilante)
         if vigilante in var.PLAYERS and not is_user_simple(vigilante):
-            pm(cli, vigilante, messages["vigilante_notify"])
+            notify.pm(vigilante, messages["vigilante_notify"])
         else:
-            pm(cli, vigilante, messages["vigilante_simple"])
-        pm(cli, vigilante, "Players: " + ", ".join(pl))
+            notify.pm(vigilante, messages["vigilante_simple"])
+        notify.pm(vigilante, "Players: " + ", ".join(pl))
 
 @event_listener("succubus_visit")
 def on_succubus_visit(evt, cli, var, nick, victim):
@@ -9,6 +9,7 @@ from src.events import Event
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     if var.FIRST_NIGHT or var.ALWAYS_PM_ROLE:
         villroles = var.HIDDEN_VILLAGERS | {"villager"}
         if var.DEFAULT_ROLE == "villager":
@@ -16,9 +17,9 @@ def on_transition_night_end(evt, cli, var):
         villagers = list_players(villroles)
         for villager in villagers:
             if villager in var.PLAYERS and not is_user_simple(villager):
-                pm(cli, villager, messages["villager_notify"])
+                notify.pm(villager, messages["villager_notify"])
             else:
-                pm(cli, villager, messages["villager_simple"])
+                notify.pm(villager, messages["villager_simple"])
 
         cultroles = {"cultist"}
         if var.DEFAULT_ROLE == "cultist":
@@ -26,9 +27,9 @@ def on_transition_night_end(evt, cli, var):
         cultists = list_players(cultroles)
         for cultist in cultists:
             if cultist in var.PLAYERS and not is_user_simple(cultist):
-                pm(cli, cultist, messages["cultist_notify"])
+                notify.pm(cultist, messages["cultist_notify"])
             else:
-                pm(cli, cultist, messages["cultist_simple"])
+                notify.pm(cultist, messages["cultist_simple"])
 
 # No listeners should register before this one
 # This sets up the initial state, based on village/wolfteam/neutral affiliation
@@ -138,11 +138,12 @@ def on_transition_day_begin(evt, cli, var):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
+    notify = evt.params.notify
     for child in var.ROLES["wild child"]:
         if child in var.PLAYERS and not is_user_simple(child):
-            pm(cli, child, messages["child_notify"])
+            notify.pm(child, messages["child_notify"])
         else:
-            pm(cli, child, messages["child_simple"])
+            notify.pm(child, messages["child_simple"])
 
 @event_listener("revealroles_role")
 def on_revealroles_role(evt, var, wrapper, nick, role):
@@ -306,7 +306,7 @@ def on_chk_nightdone2(evt, cli, var):
 
 @event_listener("transition_night_end", priority=2)
 def on_transition_night_end(evt, cli, var):
-    ps = list_players()
+    notify = evt.params.notify
     wolves = list_players(var.WOLFCHAT_ROLES)
     # roles in wolfchat (including those that can only listen in but not speak)
     wcroles = var.WOLFCHAT_ROLES
@@ -338,31 +338,31 @@ def on_transition_night_end(evt, cli, var):
 
     for wolf in wolves:
         normal_notify = wolf in var.PLAYERS and not is_user_simple(wolf)
-        role = get_role(wolf)
-        wevt = Event("wolflist", {"tags": set()})
+        role = notify.get_role(wolf)
+        wtags = frozenset()
         tags = ""
         if role in wcroles:
-            wevt.dispatch(cli, var, wolf, wolf)
-            tags = " ".join(wevt.data["tags"])
+            wtags = notify.wolflist_tags(wolf)
+            tags = " ".join(wtags)
             if tags:
                 tags += " "
 
         if normal_notify:
             msg = "{0}_notify".format(role.replace(" ", "_"))
             cmsg = "cursed_" + msg
-            if "cursed" in wevt.data["tags"]:
+            if "cursed" in wtags:
                 try:
-                    tags2 = " ".join(wevt.data["tags"] - {"cursed"})
+                    tags2 = " ".join(wtags - {"cursed"})
                     if tags2:
                         tags2 += " "
-                    pm(cli, wolf, messages[cmsg].format(tags2))
+                    notify.pm(wolf, messages[cmsg].format(tags2))
                 except KeyError:
-                    pm(cli, wolf, messages[msg].format(tags))
+                    notify.pm(wolf, messages[msg].format(tags))
             else:
-                pm(cli, wolf, messages[msg].format(tags))
+                notify.pm(wolf, messages[msg].format(tags))
 
             if len(wolves) > 1 and wccond is not None and role in talkroles:
-                pm(cli, wolf, messages["wolfchat_notify"].format(wccond))
+                notify.pm(wolf, messages["wolfchat_notify"].format(wccond))
         else:
             an = ""
             if tags:
@@ -370,37 +370,42 @@ def on_transition_night_end(evt, cli, var):
                     an = "n"
             elif role.startswith(("a", "e", "i", "o", "u")):
                 an = "n"
-            pm(cli, wolf, messages["wolf_simple"].format(an, tags, role))  # !simple
+            notify.pm(wolf, messages["wolf_simple"].format(an, tags, role))  # !simple
 
-        pl = ps[:]
-        random.shuffle(pl)
-        pl.remove(wolf)  # remove self from list
+        pl = notify.player_list(wolf)  # remove self from list
         if role in wcroles:
-            for i, player in enumerate(pl):
-                prole = get_role(player)
-                wevt.data["tags"] = set()
-                wevt.dispatch(cli, var, player, wolf)
-                tags = " ".join(wevt.data["tags"])
-                if prole in wcroles:
-                    if tags:
-                        tags += " "
-                    pl[i] = "\u0002{0}\u0002 ({1}{2})".format(player, tags, prole)
-                elif tags:
-                    pl[i] = "{0} ({1})".format(player, tags)
+            entries = notify.shared("wolflist", _get_wolflist_entries, notify, wcroles)
+            pl = [entries[player] for player in pl]
         elif role == "warlock":
             # warlock specifically only sees cursed if they're not in wolfchat
             for i, player in enumerate(pl):
                 if player in var.ROLES["cursed villager"]:
                     pl[i] = player + " (cursed)"
 
-        pm(cli, wolf, "Players: " + ", ".join(pl))
+        notify.pm(wolf, "Players: " + ", ".join(pl))
         if role in CAN_KILL and var.DISEASED_WOLVES:
-            pm(cli, wolf, messages["ill_wolves"])
+            notify.pm(wolf, messages["ill_wolves"])
         # TODO: split the following out into their own files (cub and alpha)
         if not var.DISEASED_WOLVES and var.ANGRY_WOLVES and role in CAN_KILL:
-            pm(cli, wolf, messages["angry_wolves"])
+            notify.pm(wolf, messages["angry_wolves"])
         if var.ALPHA_ENABLED and role == "alpha wolf" and wolf not in var.ALPHA_WOLVES:
-            pm(cli, wolf, messages["wolf_bite"])
+            notify.pm(wolf, messages["wolf_bite"])
+
+def _get_wolflist_entries(notify, wcroles):
+    """Return how each player is shown in the player list sent to wolfchat."""
+    entries = {}
+    for player in notify.players:
+        prole = notify.get_role(player)
+        tags = " ".join(notify.wolflist_tags(player))
+        if prole in wcroles:
+            if tags:
+                tags += " "
+            entries[player] = "\u0002{0}\u0002 ({1}{2})".format(player, tags, prole)
+        elif tags:
+            entries[player] = "{0} ({1})".format(player, tags)
+        else:
+            entries[player] = player
+    return entries
 
 @event_listener("chk_win", priority=1)
 def on_chk_win(evt, cli, var, rolemap, lpl, lwolves, lrealwolves):
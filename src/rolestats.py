@@ -0,0 +1,504 @@
+import math
+from collections import defaultdict
+
+import src.settings as var
+
+__all__ = ["RoleDeduction"]
+
+class RoleDeduction:
+    """Publicly deducible role counts used by the default !stats.
+
+    Instead of looping over the current roles, we start with the original set and apply
+    changes to it as public game events occur. This way, !stats output should duplicate
+    what a player would have if they were manually tracking who is what and did not
+    have any non-public information. The comments below explain the logic such a player
+    would be using to derive the list. Note that this logic is based on the assumption
+    that role reveal is on. If role reveal is off or team, stats type should probably be
+    set to disabled or team respectively instead of this, as this will then leak info.
+
+    The original roles are read when the first event comes in, and every event after
+    that is applied as it happens: died(), exchanged(), wolf_added(), traitors_turned()
+    and renamed(). replay() works out the same thing from the game state all at once,
+    for a game whose events weren't seen (one resumed after a restart).
+    """
+
+    def __init__(self):
+        self.started = False
+        # role: [min, max] -- "we may not necessarily know *exactly* how
+        # many of a particular role there are, but we know that there is
+        # between min and max of them"
+        self.rolecounts = defaultdict(lambda: [0, 0])
+        self.start_roles = set()
+        self.orig_roles = {}
+        self.equiv_sets = {}
+        self.total_immunizations = 0
+        self.extra_lycans = 0
+        self.num_wolves = 0
+        self.num_fallen = 0
+        self._traitors = 0 # traitors at the start
+        self._turned = False
+        # what each chilling howl could have been (see _add_wolf)
+        self._alphas = 0
+        self._angels = 0
+        self._lycan_totem = False
+
+    @classmethod
+    def replay(cls, pl):
+        """Return the deduction for the game so far, given pl, the list of players still alive.
+
+        Traitors turning, role swaps and extra wolves are applied before any
+        death, as the original roles are all that is left of the order things
+        happened in.
+        """
+        self = cls()
+        self._start()
+        if var.TRAITOR_TURNED:
+            self._turn_traitors()
+        for a, b in var.EXCHANGED_ROLES:
+            self.exchanged(a, b)
+        for i in range(var.EXTRA_WOLVES):
+            self._add_wolf()
+        for p in var.ALL_PLAYERS:
+            p = p.nick # FIXME: Need to modify this block to handle User instances
+            if p not in pl:
+                self._remove_dead(self._get_revealed_role(p))
+        return self
+
+    def died(self, nick):
+        """Account for a player's death, as they are revealed."""
+        self._ensure_started()
+        self._remove_dead(self._get_revealed_role(nick))
+
+    def exchanged(self, a, b):
+        """Account for two players swapping roles with the exchange totem."""
+        self._ensure_started()
+        # Step 2. Handle role swaps via exchange totem by modifying self.orig_roles -- the original
+        # roles themselves didn't change, just who has them. To an outsider that doesn't know any
+        # info the role swap might as well never happened and those people simply started with
+        # those roles; they can't really tell the difference.
+        self.orig_roles[a], self.orig_roles[b] = self.orig_roles[b], self.orig_roles[a]
+
+    def wolf_added(self):
+        """Account for a chilling howl, announcing an extra wolf."""
+        self._ensure_started()
+        self._add_wolf()
+
+    def traitors_turned(self):
+        """Account for the traitors turning into wolves."""
+        self._ensure_started()
+        if not self._turned:
+            self._turn_traitors()
+
+    def renamed(self, old, new):
+        if old in self.orig_roles:
+            self.orig_roles[new] = self.orig_roles.pop(old)
+
+    def get_counts(self):
+        """Return a Dict[str, List[int]] of [min, max] counts for every role."""
+        self._ensure_started()
+        rolecounts = defaultdict(lambda: [0, 0])
+        rolecounts.update((role, list(count)) for role, count in self.rolecounts.items())
+        # Step 5. Handle cub growing up. Bot does not send out a message for this, so we need
+        # to puzzle it out ourselves. If there are no amnesiacs or clones
+        # then we can deterministically figure out cubs growing up. Otherwise we don't know for
+        # sure whether or not they grew up.
+        num_realwolves = sum([rolecounts[r][1] for r in var.WOLF_ROLES if r != "wolf cub"])
+        if num_realwolves == 0:
+            # no wolves means cubs may have turned, set the min cub and max wolf appropriately
+            rolecounts["wolf"][1] += rolecounts["wolf cub"][1]
+            if rolecounts["amnesiac"][1] == 0 and rolecounts["clone"][1] == 0:
+                # we know for sure they grew up
+                rolecounts["wolf"][0] += rolecounts["wolf cub"][0]
+                rolecounts["wolf cub"][1] = 0
+            rolecounts["wolf cub"][0] = 0
+        return rolecounts
+
+    def _ensure_started(self):
+        if not self.started:
+            self._start()
+
+    def _start(self):
+        self.started = True
+        # Step 1. Get our starting set of roles. This also calculates the maximum numbers for equivalency sets
+        # (sets of roles that are decremented together because we can't know for sure which actually died).
+        for r, v in var.ORIGINAL_ROLES.items():
+            if r in var.TEMPLATE_RESTRICTIONS.keys():
+                continue
+            if len(v) == 0:
+                continue
+            self.start_roles.add(r)
+            self.rolecounts[r] = [len(v), len(v)]
+            for p in v:
+                if p.startswith("(dced)"):
+                    p = p[6:]
+                self.orig_roles[p] = r
+
+        if var.CURRENT_GAMEMODE.name == "villagergame":
+            # hacky hacks that hack
+            pcount = len(var.ALL_PLAYERS)
+            if pcount >= 8:
+                self.rolecounts["villager"][0] -= 2
+                self.rolecounts["villager"][1] -= 2
+                self.rolecounts["wolf"] = [1, 1]
+                self.rolecounts["traitor"] = [1, 1]
+            elif pcount == 7:
+                self.rolecounts["villager"][0] -= 2
+                self.rolecounts["villager"][1] -= 2
+                self.rolecounts["wolf"] = [1, 1]
+                self.rolecounts["cultist"] = [1, 1]
+            else:
+                self.rolecounts["villager"][0] -= 1
+                self.rolecounts["villager"][1] -= 1
+                self.rolecounts["wolf"] = [1, 1]
+
+        self.total_immunizations = self.rolecounts["doctor"][0] * math.ceil(len(var.ALL_PLAYERS) * var.DOCTOR_IMMUNIZATION_MULTIPLIER)
+        if "amnesiac" in self.start_roles and "doctor" not in var.AMNESIAC_BLACKLIST:
+            self.total_immunizations += self.rolecounts["amnesiac"][0] * math.ceil(len(var.ALL_PLAYERS) * var.DOCTOR_IMMUNIZATION_MULTIPLIER)
+
+        self.extra_lycans = self.rolecounts["lycan"][0] - min(self.total_immunizations, self.rolecounts["lycan"][0])
+
+        self.equiv_sets["traitor_default"] = self.rolecounts["traitor"][0] + self.rolecounts[var.DEFAULT_ROLE][0]
+        self.equiv_sets["lycan_villager"] = min(self.rolecounts["lycan"][0], self.total_immunizations) + self.rolecounts["villager"][0]
+        self.equiv_sets["traitor_lycan_villager"] = self.equiv_sets["traitor_default"] + self.equiv_sets["lycan_villager"] - self.rolecounts[var.DEFAULT_ROLE][0]
+        self.equiv_sets["amnesiac_clone"] = self.rolecounts["amnesiac"][0] + self.rolecounts["clone"][0]
+        self.equiv_sets["amnesiac_clone_cub"] = self.rolecounts["amnesiac"][0] + self.rolecounts["clone"][0] + self.rolecounts["wolf cub"][0]
+        self.equiv_sets["wolf_fallen"] = 0
+        self.equiv_sets["fallen_guardian"] = 0
+        self._traitors = self.rolecounts["traitor"][0]
+
+        # Work out what the people that turn into wolves could have been: alpha wolf, lycan, and
+        # lycanthropy totem all play the same "chilling howl" message, once per additional wolf
+        self._alphas = self.rolecounts["alpha wolf"][0]
+        self._angels = self.rolecounts["guardian angel"][0]
+        if "amnesiac" in self.start_roles and "guardian angel" not in var.AMNESIAC_BLACKLIST:
+            self._angels += self.rolecounts["amnesiac"][0]
+        for idx, shaman in enumerate(var.TOTEM_ORDER):
+            if (shaman in self.start_roles or ("amnesiac" in self.start_roles and shaman not in var.AMNESIAC_BLACKLIST)) and var.TOTEM_CHANCES["lycanthropy"][idx] > 0:
+                self._lycan_totem = True
+
+        self.num_wolves = self.rolecounts["wolf"][0]
+        self.num_fallen = self.rolecounts["fallen angel"][0]
+
+    def _turn_traitors(self):
+        self._turned = True
+        # None of the traitors can die as the default role any more. If they are hidden, the
+        # ones who already did were taken out of these sets then, so only take out those we
+        # know to be alive; otherwise, none of them were ever in with the default role
+        if var.HIDDEN_TRAITOR:
+            # there is at least one, or nobody would have turned
+            self.rolecounts["traitor"][0] = max(self.rolecounts["traitor"][0], min(1, self.rolecounts["traitor"][1]))
+            traitors = self.rolecounts["traitor"][0]
+        else:
+            traitors = self._traitors
+        self.equiv_sets["traitor_default"] -= traitors
+        self.equiv_sets["traitor_lycan_villager"] -= traitors
+        if var.DEFAULT_ROLE == "villager":
+            maxcount = self.equiv_sets["traitor_lycan_villager"]
+        else:
+            maxcount = self.equiv_sets["traitor_default"]
+        if self.rolecounts[var.DEFAULT_ROLE][1] > maxcount:
+            self.rolecounts[var.DEFAULT_ROLE][1] = maxcount
+        self.rolecounts["wolf"][0] += self.rolecounts["traitor"][0]
+        self.rolecounts["wolf"][1] += self.rolecounts["traitor"][1]
+        self.num_wolves += self.rolecounts["traitor"][0]
+        self.rolecounts["traitor"] = [0, 0]
+
+    def _add_wolf(self):
+        # Step 3. Work out who turned into a wolf. An alpha wolf or guardian angel who has
+        # already died can't have had anything to do with it
+        alphas = min(self._alphas, self.rolecounts["alpha wolf"][1])
+        angels = self.rolecounts["guardian angel"][1]
+        if "guardian angel" not in var.AMNESIAC_BLACKLIST:
+            angels += self.rolecounts["amnesiac"][1]
+        self._alphas = alphas
+        self._angels = min(self._angels, angels)
+        if self._alphas == 0 and not self._lycan_totem:
+            # This is easy, all of our extra wolves are actual lycans, and we know this for a fact
+            self.rolecounts["wolf"][0] += 1
+            self.rolecounts["wolf"][1] += 1
+            self.num_wolves += 1
+
+            if self.rolecounts["lycan"][1] > 0:
+                self.rolecounts["lycan"][0] -= 1
+                self.rolecounts["lycan"][1] -= 1
+            else:
+                # amnesiac or clone became lycan and was subsequently turned
+                maxcount = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+
+                self.rolecounts["amnesiac"][0] = max(0, self.rolecounts["amnesiac"][0] - 1)
+                if self.rolecounts["amnesiac"][1] > maxcount:
+                    self.rolecounts["amnesiac"][1] = maxcount
+
+                self.rolecounts["clone"][0] = max(0, self.rolecounts["clone"][0] - 1)
+                if self.rolecounts["clone"][1] > maxcount:
+                    self.rolecounts["clone"][1] = maxcount
+
+                self.equiv_sets["amnesiac_clone"] = maxcount
+
+
+            if self.extra_lycans > 0:
+                self.extra_lycans -= 1
+            else:
+                self.equiv_sets["lycan_villager"] = max(0, self.equiv_sets["lycan_villager"] - 1)
+                self.equiv_sets["traitor_lycan_villager"] = max(0, self.equiv_sets["traitor_lycan_villager"] - 1)
+        elif self._alphas == 0 or self._angels == 0:
+            # We are guaranteed to have gotten an additional wolf, but we can't guarantee it was an actual lycan
+            self.rolecounts["wolf"][0] += 1
+            self.rolecounts["wolf"][1] += 1
+            self.num_wolves += 1
+            self.rolecounts["lycan"][0] = max(0, self.rolecounts["lycan"][0] - 1)
+
+            # apply alphas before lycan totems (in case we don't actually have lycan totems)
+            # this way if we don't have totems and alphas is 0 we hit guaranteed lycans above
+            if self._alphas > 0:
+                self._alphas -= 1
+        else:
+            # We may have gotten an additional wolf or an additional fallen angel, we don't necessarily know which
+            self._alphas -= 1
+            self._angels -= 1
+            self.rolecounts["lycan"][0] = max(0, self.rolecounts["lycan"][0] - 1)
+            self.rolecounts["wolf"][1] += 1
+            self.rolecounts["fallen angel"][1] += 1
+            self.rolecounts["guardian angel"][0] -= 1
+            self.equiv_sets["wolf_fallen"] += 1
+            self.equiv_sets["fallen_guardian"] += 1
+
+    def _get_revealed_role(self, p):
+        # pr should be the role the person gets revealed as should they die
+        pr = self.orig_roles[p]
+        if p in var.FINAL_ROLES and pr not in ("amnesiac", "clone"):
+            pr = var.FINAL_ROLES[p]
+        elif pr == "amnesiac" and not var.HIDDEN_AMNESIAC and p in var.FINAL_ROLES:
+            pr = var.FINAL_ROLES[p]
+        elif pr == "clone" and not var.HIDDEN_CLONE and p in var.FINAL_ROLES:
+            pr = var.FINAL_ROLES[p]
+        elif pr == "traitor" and var.TRAITOR_TURNED:
+            # we turned every traitor into wolf above, which means even though
+            # this person died as traitor, we need to deduct the count from wolves
+            pr = "wolf"
+        elif pr == "traitor" and var.HIDDEN_TRAITOR:
+            pr = var.DEFAULT_ROLE
+        return pr
+
+    def _remove_dead(self, pr):
+        # Step 4. Remove a dead player
+        # When rolesets are a thing (e.g. one of x, y, or z), those will be resolved here as well
+        # set to true if we kill more people than exist in a given role,
+        # which means that amnesiac or clone must have became that role
+        overkill = False
+
+        if pr == var.DEFAULT_ROLE:
+            # the person that died could have been traitor or an immunized lycan
+            if var.DEFAULT_ROLE == "villager":
+                maxcount = self.equiv_sets["traitor_lycan_villager"]
+            else:
+                maxcount = self.equiv_sets["traitor_default"]
+
+            if maxcount == 0:
+                overkill = True
+
+            maxcount = max(0, maxcount - 1)
+            if var.HIDDEN_TRAITOR and not var.TRAITOR_TURNED:
+                self.rolecounts["traitor"][0] = max(0, self.rolecounts["traitor"][0] - 1)
+                if self.rolecounts["traitor"][1] > maxcount:
+                    self.rolecounts["traitor"][1] = maxcount
+
+            if var.DEFAULT_ROLE == "villager" and self.total_immunizations > 0:
+                self.total_immunizations -= 1
+                self.rolecounts["lycan"][0] = max(0, self.rolecounts["lycan"][0] - 1)
+                if self.rolecounts["lycan"][1] > maxcount + self.extra_lycans:
+                    self.rolecounts["lycan"][1] = maxcount + self.extra_lycans
+
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            if self.rolecounts[pr][1] > maxcount:
+                self.rolecounts[pr][1] = maxcount
+
+            if var.DEFAULT_ROLE == "villager":
+                self.equiv_sets["traitor_lycan_villager"] = maxcount
+            else:
+                self.equiv_sets["traitor_default"] = maxcount
+        elif pr == "villager":
+            # the villager that died could have been an immunized lycan
+            maxcount = max(0, self.equiv_sets["lycan_villager"] - 1)
+
+            if self.equiv_sets["lycan_villager"] == 0:
+                overkill = True
+
+            if self.total_immunizations > 0:
+                self.total_immunizations -= 1
+                self.rolecounts["lycan"][0] = max(0, self.rolecounts["lycan"][0] - 1)
+                if self.rolecounts["lycan"][1] > maxcount + self.extra_lycans:
+                    self.rolecounts["lycan"][1] = maxcount + self.extra_lycans
+
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            if self.rolecounts[pr][1] > maxcount:
+                self.rolecounts[pr][1] = maxcount
+
+            self.equiv_sets["lycan_villager"] = maxcount
+        elif pr == "lycan":
+            # non-immunized lycan, reduce counts appropriately
+            if self.rolecounts[pr][1] == 0:
+                overkill = True
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            self.rolecounts[pr][1] = max(0, self.rolecounts[pr][1] - 1)
+
+            if self.extra_lycans > 0:
+                self.extra_lycans -= 1
+            else:
+                self.equiv_sets["lycan_villager"] = max(0, self.equiv_sets["lycan_villager"] - 1)
+                self.equiv_sets["traitor_lycan_villager"] = max(0, self.equiv_sets["traitor_lycan_villager"] - 1)
+        elif pr == "wolf":
+            # person that died could have possibly been turned by alpha
+            if self.rolecounts[pr][1] == 0:
+                # this overkill either means that we're hitting amnesiac/clone or that cubs turned
+                overkill = True
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            self.rolecounts[pr][1] = max(0, self.rolecounts[pr][1] - 1)
+
+            if self.num_wolves > 0:
+                self.num_wolves -= 1
+            elif self.equiv_sets["wolf_fallen"] > 0:
+                self.equiv_sets["wolf_fallen"] -= 1
+                self.equiv_sets["fallen_guardian"] = max(0, self.equiv_sets["fallen_guardian"] - 1)
+                self.rolecounts["fallen angel"][1] = max(0, self.rolecounts["fallen angel"][1] - 1)
+                self.rolecounts["guardian angel"][0] = max(self.rolecounts["guardian angel"][0] + 1, self.rolecounts["guardian angel"][1])
+                self.rolecounts["fallen angel"][0] = min(self.rolecounts["fallen angel"][0], self.rolecounts["fallen angel"][1])
+        elif pr == "fallen angel":
+            # person that died could have possibly been turned by alpha
+            if self.rolecounts[pr][1] == 0:
+                overkill = True
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            self.rolecounts[pr][1] = max(0, self.rolecounts[pr][1] - 1)
+
+            if self.num_fallen > 0:
+                self.num_fallen -= 1
+            elif self.equiv_sets["wolf_fallen"] > 0:
+                self.equiv_sets["wolf_fallen"] -= 1
+                self.equiv_sets["fallen_guardian"] = max(0, self.equiv_sets["fallen_guardian"] - 1)
+                self.rolecounts["wolf"][1] = max(0, self.rolecounts["wolf"][1] - 1)
+                self.rolecounts["wolf"][0] = min(self.rolecounts["wolf"][0], self.rolecounts["wolf"][1])
+                # this also means a GA died for sure (we lowered the lower bound previously)
+                self.rolecounts["guardian angel"][1] = max(0, self.rolecounts["guardian angel"][1] - 1)
+        elif pr == "guardian angel":
+            if self.rolecounts[pr][1] == 0:
+                overkill = True
+            if self.rolecounts[pr][1] <= self.equiv_sets["fallen_guardian"] and self.equiv_sets["fallen_guardian"] > 0:
+                # we got rid of a GA that was an FA candidate, so get rid of the FA as well
+                # (this also means that there is a guaranteed wolf so add that in)
+                self.equiv_sets["fallen_guardian"] = max(0, self.equiv_sets["fallen_guardian"] - 1)
+                self.equiv_sets["wolf_fallen"] = max(0, self.equiv_sets["wolf_fallen"] - 1)
+                self.rolecounts["fallen angel"][1] = max(self.rolecounts["fallen angel"][0], self.rolecounts["fallen angel"][1] - 1)
+                self.rolecounts["wolf"][0] = min(self.rolecounts["wolf"][0] + 1, self.rolecounts["wolf"][1])
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            self.rolecounts[pr][1] = max(0, self.rolecounts[pr][1] - 1)
+        elif pr == "wolf cub":
+            if self.rolecounts[pr][1] == 0:
+                overkill = True
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            self.rolecounts[pr][1] = max(0, self.rolecounts[pr][1] - 1)
+            self.equiv_sets["amnesiac_clone_cub"] = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+        else:
+            # person that died is guaranteed to be that role (e.g. not in an equiv_set)
+            if self.rolecounts[pr][1] == 0:
+                overkill = True
+            self.rolecounts[pr][0] = max(0, self.rolecounts[pr][0] - 1)
+            self.rolecounts[pr][1] = max(0, self.rolecounts[pr][1] - 1)
+
+        if overkill:
+            # we tried killing more people than exist in a role, so deduct from amnesiac/clone count instead
+            if var.CURRENT_GAMEMODE.name == "sleepy" and pr == "doomsayer":
+                self.rolecounts["seer"][0] = max(0, self.rolecounts["seer"][0] - 1)
+                self.rolecounts["seer"][1] = max(0, self.rolecounts["seer"][1] - 1)
+            elif var.CURRENT_GAMEMODE.name == "sleepy" and pr == "demoniac":
+                self.rolecounts["cultist"][0] = max(0, self.rolecounts["cultist"][0] - 1)
+                self.rolecounts["cultist"][1] = max(0, self.rolecounts["cultist"][1] - 1)
+            elif var.CURRENT_GAMEMODE.name == "sleepy" and pr == "succubus":
+                self.rolecounts["harlot"][0] = max(0, self.rolecounts["harlot"][0] - 1)
+                self.rolecounts["harlot"][1] = max(0, self.rolecounts["harlot"][1] - 1)
+            elif pr == "clone":
+                # in this case, it means amnesiac became a clone (clone becoming amnesiac is impossible so we
+                # do not have the converse check in here - clones always inherit what amnesiac turns into).
+                self.equiv_sets["amnesiac_clone"] = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+                self.equiv_sets["amnesiac_clone_cub"] = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+                self.rolecounts["amnesiac"][0] = max(0, self.rolecounts["amnesiac"][0] - 1)
+                self.rolecounts["amnesiac"][1] = max(0, self.rolecounts["amnesiac"][1] - 1)
+            elif pr == "wolf":
+                # This could potentially be caused by a cub, not necessarily amnesiac/clone
+                # as such we use a different equiv_set to reflect this
+                maybe_cub = True
+                num_realwolves = sum([self.rolecounts[r][1] for r in var.WOLF_ROLES if r != "wolf cub"])
+                if self.rolecounts["wolf cub"][1] == 0 or num_realwolves > 0:
+                    maybe_cub = False
+
+                if (var.HIDDEN_AMNESIAC or self.rolecounts["amnesiac"][1] == 0) and (var.HIDDEN_CLONE or self.rolecounts["clone"][1] == 0):
+                    # guaranteed to be cub
+                    self.equiv_sets["amnesiac_clone_cub"] = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+                    self.rolecounts["wolf cub"][0] = max(0, self.rolecounts["wolf cub"][0] - 1)
+                    self.rolecounts["wolf cub"][1] = max(0, self.rolecounts["wolf cub"][1] - 1)
+                elif (var.HIDDEN_CLONE or self.rolecounts["clone"][1] == 0) and not maybe_cub:
+                    # guaranteed to be amnesiac
+                    self.equiv_sets["amnesiac_clone"] = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+                    self.equiv_sets["amnesiac_clone_cub"] = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+                    self.rolecounts["amnesiac"][0] = max(0, self.rolecounts["amnesiac"][0] - 1)
+                    self.rolecounts["amnesiac"][1] = max(0, self.rolecounts["amnesiac"][1] - 1)
+                elif (var.HIDDEN_AMNESIAC or self.rolecounts["amnesiac"][1] == 0) and not maybe_cub:
+                    # guaranteed to be clone
+                    self.equiv_sets["amnesiac_clone"] = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+                    self.equiv_sets["amnesiac_clone_cub"] = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+                    self.rolecounts["clone"][0] = max(0, self.rolecounts["clone"][0] - 1)
+                    self.rolecounts["clone"][1] = max(0, self.rolecounts["clone"][1] - 1)
+                else:
+                    # could be anything, how exciting!
+                    if maybe_cub:
+                        maxcount = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+                    else:
+                        maxcount = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+
+                    self.rolecounts["amnesiac"][0] = max(0, self.rolecounts["amnesiac"][0] - 1)
+                    if self.rolecounts["amnesiac"][1] > maxcount:
+                        self.rolecounts["amnesiac"][1] = maxcount
+
+                    self.rolecounts["clone"][0] = max(0, self.rolecounts["clone"][0] - 1)
+                    if self.rolecounts["clone"][1] > maxcount:
+                        self.rolecounts["clone"][1] = maxcount
+
+                    if maybe_cub:
+                        self.rolecounts["wolf cub"][0] = max(0, self.rolecounts["wolf cub"][0] - 1)
+                        if self.rolecounts["wolf cub"][1] > maxcount:
+                            self.rolecounts["wolf cub"][1] = maxcount
+
+                    if maybe_cub:
+                        self.equiv_sets["amnesiac_clone_cub"] = maxcount
+                        self.equiv_sets["amnesiac_clone"] = min(self.equiv_sets["amnesiac_clone"], maxcount)
+                    else:
+                        self.equiv_sets["amnesiac_clone"] = maxcount
+                        self.equiv_sets["amnesiac_clone_cub"] = max(maxcount, self.equiv_sets["amnesiac_clone_cub"] - 1)
+
+            elif not var.HIDDEN_AMNESIAC and (var.HIDDEN_CLONE or self.rolecounts["clone"][1] == 0):
+                # guaranteed to be amnesiac overkilling as clone reports as clone
+                self.equiv_sets["amnesiac_clone"] = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+                self.equiv_sets["amnesiac_clone_cub"] = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+                self.rolecounts["amnesiac"][0] = max(0, self.rolecounts["amnesiac"][0] - 1)
+                self.rolecounts["amnesiac"][1] = max(0, self.rolecounts["amnesiac"][1] - 1)
+            elif not var.HIDDEN_CLONE and (var.HIDDEN_AMNESIAC or self.rolecounts["amnesiac"][1] == 0):
+                # guaranteed to be clone overkilling as amnesiac reports as amnesiac
+                self.equiv_sets["amnesiac_clone"] = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+                self.equiv_sets["amnesiac_clone_cub"] = max(0, self.equiv_sets["amnesiac_clone_cub"] - 1)
+                self.rolecounts["clone"][0] = max(0, self.rolecounts["clone"][0] - 1)
+                self.rolecounts["clone"][1] = max(0, self.rolecounts["clone"][1] - 1)
+            else:
+                # could be either
+                maxcount = max(0, self.equiv_sets["amnesiac_clone"] - 1)
+
+                self.rolecounts["amnesiac"][0] = max(0, self.rolecounts["amnesiac"][0] - 1)
+                if self.rolecounts["amnesiac"][1] > maxcount:
+                    self.rolecounts["amnesiac"][1] = maxcount
+
+                self.rolecounts["clone"][0] = max(0, self.rolecounts["clone"][0] - 1)
+                if self.rolecounts["clone"][1] > maxcount:
+                    self.rolecounts["clone"][1] = maxcount
+
+                self.equiv_sets["amnesiac_clone"] = maxcount
+                self.equiv_sets["amnesiac_clone_cub"] = max(maxcount, self.equiv_sets["amnesiac_clone_cub"] - 1)
+
+# vim: set sw=4 expandtab:
@@ -23,6 +23,11 @@ TIME_RATE_LIMIT = 10
 START_RATE_LIMIT = 10 # (per-user)
 WAIT_RATE_LIMIT = 10  # (per-user)
 GOAT_RATE_LIMIT = 300 # (per-user)
+# Messages from any one user (by ident@host) beyond a burst of USER_MESSAGE_BURST are dropped unless
+# they are at most USER_MESSAGE_RATE per second; set USER_MESSAGE_BURST to 0 to turn this off
+USER_MESSAGE_BURST = 10
+USER_MESSAGE_RATE = 1
+FLOOD_BUCKET_EXPIRY = 600 # forget about users who haven't said anything for this many seconds
 SHOTS_MULTIPLIER = .12  # ceil(shots_multiplier * len_players) = bullets given
 SHARPSHOOTER_MULTIPLIER = 0.06
 MIN_PLAYERS = 4
@@ -49,10 +54,30 @@ PART_GRACE_TIME = 30
 QUIT_GRACE_TIME = 60
 ACC_GRACE_TIME = 30
 START_QUIT_DELAY = 10
+# The game in progress is saved at every phase change (and on !restart), and resumed when the bot comes
+# back if the save is at most this many seconds old. Set to 0 to disable saving and resuming games.
+GAME_SNAPSHOT_EXPIRY = 900
+# How many background jobs (such as the git commands run by !pull and !update) may run at once
+BACKGROUND_JOB_LIMIT = 1
+# Files the bot writes for itself (such as the wiki cache) go in DATA_DIR, which is created the first time one is
+# written. Relative paths here and in WIKI_CACHE_FILE/WIKI_CACHE_DUMP are taken from the bot's directory, not the cwd.
+DATA_DIR = "data"
+# !wiki answers are cached in WIKI_CACHE_FILE (in DATA_DIR) and refreshed in the background once they're older than
+# WIKI_CACHE_TTL seconds. If WIKI_CACHE_DUMP exists (same format as the cache file), it is used to fill the cache
+# the first time !wiki is used.
+WIKI_CACHE_FILE = "wiki_cache.json"
+WIKI_CACHE_DUMP = "wiki_dump.json"
+WIKI_CACHE_TTL = 86400
+WIKI_REQUEST_TIMEOUT = 2
 #  controls how many people it does in one /msg; only works for messages that are the same
 MAX_PRIVMSG_TARGETS = 4
 # how many mode values can be specified at once; used only as fallback
 MODELIMIT = 3
+# Game mode changes (voices, quiets, +m, ...) are collected for MODE_BATCH_DELAY seconds and then only those the
+# channel isn't already in the state of are sent, as few MODE lines as possible; 0 sends each batch right away.
+# Changes the bot sent are assumed to be on their way for MODE_CONFIRM_TIMEOUT seconds, until the server confirms them.
+MODE_BATCH_DELAY = 0.5
+MODE_CONFIRM_TIMEOUT = 10
 QUIET_DEAD_PLAYERS = False
 DEVOICE_DURING_NIGHT = False
 ALWAYS_PM_ROLE = False
@@ -204,10 +229,55 @@ DEV_PREFIX = ""
 PASTEBIN_ERRORS = False
 
 TRACEBACK_VERBOSITY = 2 # 0 = no locals at all, 1 = innermost frame's locals, 2 = all locals
+TRACEBACK_REPR_LIMIT = 300 # local variables with longer reprs are cut short
+# Errors are reported from a background thread; at most this many can be waiting to be reported.
+# Identical errors (same exception type raised from the same place) are only reported once every
+# TRACEBACK_REPEAT_INTERVAL seconds, and no more than TRACEBACK_RATE_LIMIT errors are reported each minute.
+# Errors over those limits are counted, and the count is included in the next report.
+# Each of them still gets a line in the error log. The counts are kept for at most
+# TRACEBACK_MAX_ERRORS different errors; the ones seen least recently are forgotten first.
+TRACEBACK_QUEUE_SIZE = 20
+TRACEBACK_REPEAT_INTERVAL = 300
+TRACEBACK_RATE_LIMIT = 10
+TRACEBACK_MAX_ERRORS = 500
+# Where to paste tracebacks if PASTEBIN_ERRORS is on; {bot} is the bot's nick and {id} a random id.
+TRACEBACK_PASTE_URL = "https://ptpb.pw/~{bot}-error-{id}"
+
+# Log files are written from a background thread, which can fall at most LOG_BUFFER_SIZE lines behind.
+LOG_BUFFER_SIZE = 10000
+LOG_MAX_SIZE = 0 # rotate log files once they grow past this many bytes, 0 to never rotate by size
+LOG_MAX_AGE = 0 # rotate log files after this many seconds, 0 to never rotate by age
+LOG_BACKUP_COUNT = 5 # how many rotated logs to keep (as errors.log.1, errors.log.2, and so on)
+LOG_JSON = False # write log files as JSON lines instead of plain text
+
+# Collect metrics on commands, events, database queries, timers and IRC traffic, for !fmetrics
+# This adds a little overhead to all of those, and can only be changed by restarting
+METRICS_ENABLED = False
+METRICS_FILE = "" # if set, write the metrics there in the Prometheus text format every METRICS_DUMP_INTERVAL seconds
+METRICS_DUMP_INTERVAL = 60
+
+# Record every line sent to and received from IRC at the end of this file, to play back with ./replay.py
+# Each extra network in botconfig.NETWORKS records to its own file, named after this one with the host appended
+# Passwords sent to the server and to NickServ are left out, but everything else is kept, including users' private messages to the bot
+IRC_CAPTURE_FILE = ""
+
+# Put off importing the role modules until the first game starts, to speed up startup
+LAZY_ROLES = False
 
 # How often to ping the server (in seconds) to detect unclean disconnection
 SERVER_PING_INTERVAL = 120
 
+# Lines are sent to IRC in bursts of at most SEND_BURST, then at SEND_RATE lines per second. The rate is cut
+# whenever the server shows signs of throttling the bot (answering PINGs over SEND_LAG_THRESHOLD seconds slower
+# than usual, or warning about flooding), and raised while the bot has more to send and the server keeps up,
+# staying between SEND_RATE_MIN and SEND_RATE_MAX; set both to SEND_RATE to keep it fixed.
+# Each network in botconfig.NETWORKS can set these differently; see src/pacing.py.
+SEND_BURST = 23
+SEND_RATE = 1.73
+SEND_RATE_MIN = 0.5
+SEND_RATE_MAX = 3
+SEND_LAG_THRESHOLD = 2
+
 # Shorthand for naming roles, used to set up command aliases as well as be valid targets when
 # specifying role names for things (such as !pstats or prophet's !pray)
 ROLE_ALIASES = {
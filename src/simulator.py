@@ -0,0 +1,385 @@
+"""Play whole games without an IRC server, as fast as the game logic allows.
+
+Every player is a FakeUser, the IRC client only counts the lines it would
+have sent, and the game timers run on a virtual clock: whenever nobody has
+anything left to do, the clock jumps straight to the next timer instead of
+waiting for it. Players act by sending commands through the same dispatch
+as real messages, following a policy (random legal moves by default).
+
+Run it with ./simulate.py; each worker process plays its games in its own
+scratch directory, so its database and logs never touch the real ones.
+Every game starts from the same state, whichever worker plays it and
+whatever that worker played before, so --seed replays the same games.
+It also sets the workers' PYTHONHASHSEED, as the game iterates over sets
+of nicks in a few places.
+"""
+
+import heapq
+import itertools
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import botconfig
+import src.settings as var
+from oyoyo.client import IRCClient
+from src import channels, db, decorators, games, handler, metrics, networks, users, wolfgame
+from src.utilities import list_players
+
+__all__ = ["VirtualClock", "SimClient", "RandomPolicy", "ScriptedPolicy",
+           "Simulator", "game_sizes", "run"]
+
+SIM_SERVER = "sim.invalid"
+SIM_IDENT = "sim"
+SIM_HOST = "players.sim.invalid"
+
+# what a typical server would advertise
+SIM_FEATURES = ("PREFIX=(ov)@+", "CHANTYPES=#", "CHANMODES=eIbq,k,flj,CFLMPQScgimnprstz",
+                "MODES=4", "CASEMAPPING=rfc1459", "TARGMAX=NAMES:1,LIST:1,KICK:1,WHOIS:1,PRIVMSG:4,NOTICE:4")
+
+# give up on games which haven't ended after this many days, or which
+# have been stuck in the same phase for this many (virtual) seconds
+MAX_DAYS = 50
+MAX_PHASE_TIME = 3600
+
+class VirtualTimer:
+    """Stands in for metrics.Timer (a threading.Timer) under a VirtualClock."""
+
+    def __init__(self, clock, interval, function, args=None, kwargs=None):
+        self.clock = clock
+        self.interval = interval
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.daemon = True
+        self.cancelled = False
+        self.done = False
+
+    def start(self):
+        self.network = networks.current()
+        self.game = games.current()
+        self.clock.schedule(self)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_alive(self):
+        return not (self.cancelled or self.done)
+
+    def run(self):
+        self.done = True
+        networks.run_in(self.network, games.run_in, self.game, self.function, *self.args, **self.kwargs)
+
+class VirtualClock:
+    """Keep time for the game timers, without ever waiting for them.
+
+    Install it by pointing metrics.Timer at its Timer method; after that,
+    timers only fire when advance() is called.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self._pending = [] # heap of (deadline, sequence, timer)
+        self._sequence = itertools.count()
+
+    def Timer(self, interval, function, args=None, kwargs=None):
+        return VirtualTimer(self, interval, function, args, kwargs)
+
+    def schedule(self, timer):
+        heapq.heappush(self._pending, (self.now + timer.interval, next(self._sequence), timer))
+
+    def next_deadline(self):
+        """Return when the next pending timer is due, or None if there are none."""
+        while self._pending and self._pending[0][2].cancelled:
+            heapq.heappop(self._pending)
+        return self._pending[0][0] if self._pending else None
+
+    def advance(self):
+        """Move to the next pending timer and run it. Return False if there are none."""
+        while self._pending:
+            deadline, _, timer = heapq.heappop(self._pending)
+            if timer.cancelled:
+                continue
+            self.now = max(self.now, deadline)
+            timer.run()
+            return True
+        return False
+
+    def clear(self):
+        for deadline, sequence, timer in self._pending:
+            timer.cancel()
+        self._pending.clear()
+
+    def reset(self):
+        """Cancel every pending timer and turn the clock back to zero."""
+        self.clear()
+        self.now = 0.0
+        self._sequence = itertools.count()
+
+class SimClient(IRCClient):
+    """An IRCClient which counts the lines it would send instead of sending them."""
+
+    def __init__(self):
+        super().__init__({}, nickname=botconfig.NICK, ident=botconfig.IDENT, real_name=botconfig.REALNAME)
+        self.transcript = None # set to a list to keep every line
+
+    def send(self, *args, **kwargs):
+        self.lines_sent += 1
+        if self.transcript is not None:
+            self.transcript.append(" ".join(str(arg) for arg in args if arg is not None))
+
+class RandomPolicy:
+    """Make random moves, leaving it to the commands to refuse illegal ones.
+
+    Every night, each living player uses one of their role's night commands
+    on another random living player. Every day, each living player abstains
+    with the given probability, or else votes to lynch someone: whoever has
+    the most votes so far with the bandwagon probability, so that days can
+    end by majority, or a random living player otherwise. Anything refused
+    simply doesn't happen, and the phase ends on its timer instead.
+    """
+
+    def __init__(self, abstain=0.0, bandwagon=0.5):
+        self.abstain = abstain
+        self.bandwagon = bandwagon
+
+    def actions(self, sim, phase, number):
+        for nick in list_players():
+            alive = list_players() # someone may have died since the last move
+            others = [p for p in alive if p != nick]
+            if nick not in alive or not others:
+                continue
+            if phase == "night":
+                names = sim.role_commands(nick, phase)
+                if names:
+                    yield nick, "{0} {1}".format(random.choice(names), random.choice(others))
+            elif random.random() < self.abstain:
+                yield nick, botconfig.CMD_CHAR + "abstain"
+            else:
+                if var.VOTES and random.random() < self.bandwagon:
+                    most = max(len(voters) for voters in var.VOTES.values())
+                    others = [p for p, voters in var.VOTES.items() if len(voters) == most and p != nick] or others
+                yield nick, "{0}lynch {1}".format(botconfig.CMD_CHAR, random.choice(others))
+
+class ScriptedPolicy:
+    """Play out a script, for reproducing a particular game.
+
+    The script maps (phase, number) to the (nick, message) pairs to send
+    during that phase, in order; messages starting with the command prefix
+    are said in the channel, and the others are sent to the bot privately:
+
+        {("night", 1): [("1", "kill 3"), ("2", "see 1")],
+         ("day", 1): [("2", "!lynch 1"), ("3", "!lynch 1")]}
+
+    Phases which aren't in the script are left to the fallback policy, or
+    run out their timers if there is none.
+    """
+
+    def __init__(self, script, fallback=None):
+        self.script = script
+        self.fallback = fallback
+
+    def actions(self, sim, phase, number):
+        if (phase, number) in self.script:
+            return iter(self.script[phase, number])
+        if self.fallback is not None:
+            return self.fallback.actions(sim, phase, number)
+        return iter(())
+
+class Simulator:
+    """Play games one after another in this process.
+
+    Creating one takes over the process: game timers run on its virtual
+    clock from then on, and it sets up the bot as if it had just connected
+    to a server, with flood control turned off.
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or RandomPolicy()
+        self.clock = VirtualClock()
+        self.cli = SimClient()
+        self._players = {} # nick -> FakeUser, for everyone who has played in this process
+
+        metrics.Timer = self.clock.Timer
+        var.USER_MESSAGE_BURST = 0 # the players are as spammy as we make them
+
+        users.Bot = users.BotUser(self.cli, botconfig.NICK)
+        users.Bot.ident = botconfig.IDENT
+        users.Bot.host = SIM_SERVER
+        handler.unhandled(self.cli, SIM_SERVER, "featurelist", botconfig.NICK, *SIM_FEATURES, "are supported by this server")
+        games.add(channels.add(botconfig.CHANNEL, self.cli))
+        db.init_vars()
+
+    def add_player(self, nick):
+        """Put a fake player in the channel, creating them if they don't exist yet."""
+        user = self._players.get(nick)
+        if user is None:
+            user = self._players[nick] = users._add(self.cli, nick=nick)
+        channels.Main.users.add(user)
+        user.channels[channels.Main] = set()
+        # the old user list is still what ends up in the game stats
+        var.USERS[nick] = {"ident": SIM_IDENT, "host": SIM_HOST, "account": None,
+                           "inchan": True, "modes": set(), "moded": set()}
+
+    def reset_channel(self, nicks):
+        """Leave only the given players in the channel, with no modes set or waiting to be.
+
+        The server never confirms the bot's mode changes here, so without
+        this, a game would see whatever the games before it left behind.
+        """
+        chan = channels.Main
+        if chan._mode_timer is not None:
+            chan._mode_timer.cancel()
+            chan._mode_timer = None
+        chan._desired.clear()
+        chan._sent.clear()
+        chan.modes.clear()
+        for nick, user in self._players.items():
+            if nick not in nicks and user in chan.users:
+                chan.users.discard(user)
+                del user.channels[chan]
+                var.USERS[nick]["inchan"] = False
+        for nick in nicks:
+            self.add_player(nick)
+
+    def role_commands(self, nick, phase):
+        """Return the names of the role commands nick can use privately in the given phase."""
+        roles = decorators.CommandContext(self.cli, nick, users.Bot.nick).role_set
+        names = set()
+        for fns in decorators.COMMANDS.values():
+            for fn in fns:
+                if fn.roles and fn.pm and phase in fn.phases and roles.intersection(fn.roles):
+                    names.add(fn.name)
+        return sorted(names)
+
+    def say(self, nick, message):
+        """Send a message as nick; to the channel if it starts with the command prefix, else to the bot."""
+        if message.startswith(botconfig.CMD_CHAR):
+            handler.on_privmsg(self.cli, nick, botconfig.CHANNEL, message)
+        else:
+            handler.on_privmsg(self.cli, nick, users.Bot.nick, message)
+
+    def play(self, mode, size, seed=None):
+        """Play one game of the given mode and size, and return a summary of it."""
+        # start every game the same way, whichever games this process played before
+        self.clock.reset()
+        if seed is not None:
+            random.seed(seed)
+        nicks = [str(i) for i in range(1, size + 1)]
+        self.reset_channel(nicks)
+
+        errors = _error_count()
+        lines = self.cli.lines_sent
+        started = self.clock.now
+        wall = time.perf_counter()
+
+        for nick in nicks:
+            self.say(nick, botconfig.CMD_CHAR + "join")
+        if wolfgame.cgamemode(self.cli, mode):
+            var.FGAMED = True
+            wolfgame.start(self.cli, nicks[0], botconfig.CHANNEL, forced=True)
+
+        played = var.PHASE in ("day", "night")
+        stalled = False
+        acted = None
+        while var.PHASE in ("day", "night"):
+            if var.DAY_COUNT > MAX_DAYS:
+                stalled = True
+                break
+            number = var.DAY_COUNT if var.PHASE == "day" else var.NIGHT_COUNT
+            current = (var.PHASE, number)
+            if current != acted:
+                acted = current
+                phase_start = self.clock.now
+                for nick, message in self.policy.actions(self, *current):
+                    if (var.PHASE, number) != current:
+                        break # the phase ended early, usually because everyone has acted
+                    self.say(nick, message)
+                continue
+            if self.clock.now - phase_start > MAX_PHASE_TIME or not self.clock.advance():
+                stalled = True
+                break
+
+        if var.PHASE != "none":
+            # stalled, or it never got past joining; clean up like !fstop would
+            wolfgame.reset_modes_timers(var)
+            wolfgame.reset()
+        self.clock.clear()
+
+        gameid, winner = db.get_last_game()
+        recorded = played and not stalled and gameid != getattr(self, "_last_gameid", None)
+        self._last_gameid = gameid
+        if recorded:
+            # read back what the game recorded, so that it can be compared like for like with real games
+            results = [row[2:] for row in db.get_game_results(gameid=gameid)]
+        else:
+            winner = None
+            results = []
+
+        return {"mode": mode,
+                "size": size,
+                "seed": seed,
+                "played": played,
+                "stalled": stalled,
+                "winner": winner,
+                "results": results, # (gamesize, winner, role, team_win, indiv_win) for every role played
+                "days": var.DAY_COUNT,
+                "nights": var.NIGHT_COUNT,
+                "game_time": self.clock.now - started,
+                "wall_time": time.perf_counter() - wall,
+                "lines": self.cli.lines_sent - lines,
+                "errors": _error_count() - errors}
+
+def _error_count():
+    return decorators.reporter.total
+
+def game_sizes(mode):
+    """Return the range of player counts a game mode can be played with."""
+    _, minp, maxp, _ = var.GAME_MODES[mode]
+    return range(minp, maxp + 1)
+
+_simulator = None
+
+def _init_worker(workdir, policy):
+    global _simulator
+    os.chdir(tempfile.mkdtemp(prefix="worker-", dir=workdir))
+    # the bot logs everything to the console as well; keep it out of the report
+    os.dup2(os.open("console.log", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644), 1)
+    db.init()
+    _simulator = Simulator(policy)
+
+def _play(task):
+    return _simulator.play(*task)
+
+def run(tasks, *, processes=None, policy=None, workdir=None, chunksize=8, hashseed=None):
+    """Play every (mode, size, seed) in tasks across a pool of processes.
+
+    Results are yielded as the games finish, which isn't necessarily the
+    order they were given in. Each worker gets a scratch directory for its
+    database and logs under workdir (a new temporary directory by default),
+    which is left behind for inspection. If hashseed is given, the workers
+    use it as their PYTHONHASHSEED, so that they iterate over sets of nicks
+    in the same order every run.
+    """
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix="lykos-sim-")
+    os.makedirs(workdir, exist_ok=True)
+    # spawn rather than fork, as the log and error reporting threads don't survive a fork
+    context = multiprocessing.get_context("spawn")
+    old_hashseed = os.environ.get("PYTHONHASHSEED")
+    if hashseed is not None:
+        os.environ["PYTHONHASHSEED"] = str(hashseed)
+    try:
+        pool = context.Pool(processes, _init_worker, (os.path.abspath(workdir), policy))
+    finally:
+        if hashseed is not None:
+            if old_hashseed is None:
+                del os.environ["PYTHONHASHSEED"]
+            else:
+                os.environ["PYTHONHASHSEED"] = old_hashseed
+    with pool:
+        yield from pool.imap_unordered(_play, tasks, chunksize)
+
+# vim: set sw=4 expandtab:
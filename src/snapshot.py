@@ -0,0 +1,180 @@
+import json
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import src.settings as var
+from src import users
+
+__all__ = ["SNAPSHOT_VERSION", "GAME_VARS", "SnapshotError", "capture", "restore", "dumps", "loads"]
+
+# increment this whenever the layout of a snapshot changes; snapshots from any
+# other version are discarded instead of being resumed
+SNAPSHOT_VERSION = 1
+
+# everything in var which describes the game in progress
+GAME_VARS = ("PHASE", "GAMEPHASE", "GAME_ID", "GAME_START_TIME", "ROLES", "ORIGINAL_ROLES", "FINAL_ROLES",
+             "ALL_PLAYERS", "PLAYERS", "DCED_PLAYERS", "DISCONNECTED", "DEAD", "DEADCHAT_PLAYERS",
+             "SPECTATING_WOLFCHAT", "SPECTATING_DEADCHAT", "JOINED_THIS_GAME", "JOINED_THIS_GAME_ACCS",
+             "PINGED_ALREADY", "PINGED_ALREADY_ACCS", "LAST_SAID_TIME", "IDLE_WARNED", "IDLE_WARNED_PM",
+             "FGAMED", "ROLE_STATS", "ROLE_SETS", "DAY_COUNT", "NIGHT_COUNT", "FIRST_DAY", "FIRST_NIGHT",
+             "DAY_ID", "NIGHT_ID", "DAY_START_TIME", "NIGHT_START_TIME", "DAY_TIMEDELTA", "NIGHT_TIMEDELTA",
+             "STARTED_DAY_PLAYERS", "VOTES", "NO_LYNCH", "ABSTAINED", "KILLER", "PASSED", "HEXED", "LASTHEXED",
+             "CURSED", "OBSERVED", "CHARMERS", "CHARMED", "TOBECHARMED", "SILENCED", "TOBESILENCED",
+             "CONSECRATING", "HVISITED", "PRAYED", "PRIESTS", "TARGETED", "MATCHMAKERS", "LOVERS",
+             "ORIGINAL_LOVERS", "CLONED", "AMNESIACS", "AMNESIAC_ROLES", "TURNCOATS", "JESTERS", "GUNNERS",
+             "WOUNDED", "DOCTORS", "IMMUNIZED", "CURED_LYCANS", "LYCANTHROPES", "LYCAN_ROLES", "LUCKY",
+             "DISEASED", "DISEASED_WOLVES", "MISDIRECTED", "EXCHANGED", "EXCHANGED_ROLES", "DYING",
+             "ACTIVE_PROTECTIONS", "ALPHA_ENABLED", "ALPHA_WOLVES", "ANGRY_WOLVES", "BITE_PREFERENCES",
+             "BITTEN_ROLES", "EXTRA_WOLVES", "TRAITOR_TURNED", "LAST_GOAT")
+
+# phase timers which can be rebuilt after a restart
+TIMER_NAMES = ("day", "day_warn", "night", "night_warn")
+
+_FACTORIES = {"list": list, "set": set, "dict": dict, "int": int, "bool": bool, "str": str}
+
+class SnapshotError(Exception):
+    pass
+
+def capture():
+    """Return the current game state as a dict that can be passed to dumps().
+
+    This contains the game state kept in var, the running game mode and
+    the settings it changed, the state of every role module (any of their
+    module-level names in all caps), and how far along the phase timers are.
+    """
+    now = time.time()
+    modules = {}
+    for name, module in list(sys.modules.items()):
+        if name.startswith("src.roles.") and module is not None:
+            modules[name] = {attr: val for attr, val in vars(module).items()
+                             if attr.isupper() and isinstance(val, (dict, set, list, bool))}
+
+    timers = {}
+    for name in TIMER_NAMES:
+        if name in var.TIMERS:
+            timer, start, duration = var.TIMERS[name]
+            timers[name] = (min(now - start, duration), duration)
+
+    return {"time": now,
+            "gamemode": var.CURRENT_GAMEMODE.name,
+            "settings": {attr: getattr(var, attr) for attr in var.ORIGINAL_SETTINGS},
+            "vars": {name: getattr(var, name) for name in GAME_VARS if hasattr(var, name)},
+            "modules": modules,
+            "timers": timers}
+
+def restore(state):
+    """Put the game state from a snapshot back in place.
+
+    Only the state is restored; restarting timers and fixing channel modes
+    is up to the caller. Internal state kept on the game mode object itself
+    is not part of the snapshot, the mode is set up as if it just started.
+    """
+    var.CURRENT_GAMEMODE.teardown()
+    gm = var.GAME_MODES[state["gamemode"]][0]()
+    gm.startup()
+    var.CURRENT_GAMEMODE = gm
+    for attr, val in state["settings"].items():
+        var.ORIGINAL_SETTINGS[attr] = getattr(var, attr)
+        setattr(var, attr, val)
+
+    for name, val in state["vars"].items():
+        _assign(var, name, val)
+
+    for modname, values in state["modules"].items():
+        module = sys.modules.get(modname)
+        if module is None:
+            continue
+        for name, val in values.items():
+            _assign(module, name, val)
+
+def _assign(obj, name, val):
+    # update containers in place, as other modules may hold a reference to them
+    cur = getattr(obj, name, None)
+    if type(cur) is type(val) and isinstance(cur, (dict, set)):
+        cur.clear()
+        cur.update(val)
+    elif type(cur) is type(val) and isinstance(cur, list):
+        cur[:] = val
+    else:
+        setattr(obj, name, val)
+
+def dumps(state):
+    data = json.dumps({"version": SNAPSHOT_VERSION, "state": _encode(state)}, separators=(",", ":"))
+    return zlib.compress(data.encode("utf-8"))
+
+def loads(data):
+    """Turn the output of dumps() back into a game state.
+
+    Raises SnapshotError if the snapshot is unreadable, from a different
+    version, or refers to users that are no longer around.
+    """
+    try:
+        obj = json.loads(zlib.decompress(data).decode("utf-8"))
+    except (zlib.error, UnicodeDecodeError, ValueError) as e:
+        raise SnapshotError("corrupt snapshot: {0}".format(e))
+    if obj.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError("snapshot version {0} is not supported".format(obj.get("version")))
+    return _decode(obj["state"])
+
+def _encode(obj):
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, users.User):
+        return {"u": obj.nick}
+    if isinstance(obj, list):
+        return [_encode(x) for x in obj]
+    if isinstance(obj, tuple):
+        return {"t": [_encode(x) for x in obj]}
+    if isinstance(obj, frozenset):
+        return {"f": [_encode(x) for x in obj]}
+    if isinstance(obj, set):
+        return {"s": [_encode(x) for x in obj]}
+    if isinstance(obj, datetime):
+        return {"dt": obj.timestamp()}
+    if isinstance(obj, timedelta):
+        return {"td": obj.total_seconds()}
+    if isinstance(obj, range):
+        return {"r": [obj.start, obj.stop, obj.step]}
+    if isinstance(obj, Counter):
+        return {"c": [[_encode(k), v] for k, v in obj.items()]}
+    if isinstance(obj, defaultdict):
+        factory = getattr(obj.default_factory, "__name__", None)
+        if _FACTORIES.get(factory) is not obj.default_factory:
+            raise SnapshotError("cannot snapshot defaultdict({0!r})".format(obj.default_factory))
+        return {"dd": factory, "d": [[_encode(k), _encode(v)] for k, v in obj.items()]}
+    if isinstance(obj, dict):
+        return {"d": [[_encode(k), _encode(v)] for k, v in obj.items()]}
+    raise SnapshotError("cannot snapshot {0} object".format(type(obj).__name__))
+
+def _decode(obj):
+    if isinstance(obj, list):
+        return [_decode(x) for x in obj]
+    if not isinstance(obj, dict):
+        return obj
+    if "u" in obj:
+        user = users._get(obj["u"], allow_none=True)
+        if user is None:
+            raise SnapshotError("user {0} is no longer around".format(obj["u"]))
+        return user
+    if "t" in obj:
+        return tuple(_decode(x) for x in obj["t"])
+    if "f" in obj:
+        return frozenset(_decode(x) for x in obj["f"])
+    if "s" in obj:
+        return {_decode(x) for x in obj["s"]}
+    if "dt" in obj:
+        return datetime.fromtimestamp(obj["dt"])
+    if "td" in obj:
+        return timedelta(seconds=obj["td"])
+    if "r" in obj:
+        return range(*obj["r"])
+    if "c" in obj:
+        return Counter({_decode(k): v for k, v in obj["c"]})
+    if "dd" in obj:
+        return defaultdict(_FACTORIES[obj["dd"]], ((_decode(k), _decode(v)) for k, v in obj["d"]))
+    return {_decode(k): _decode(v) for k, v in obj["d"]}
+
+# vim: set sw=4 expandtab:
@@ -1,4 +1,5 @@
 import fnmatch
+import itertools
 import re
 
 from src.context import IRCContext, Features, lower, equals
@@ -114,6 +115,44 @@ def _add(cli, *, nick, ident=None, host=None, realname=None, account=None):
 
     return new
 
+def _add_many(cli, entries):
+    """Add users in bulk, and return them in the same order.
+
+    Each entry is a dict of the keyword arguments to _add(), and gives the
+    same user as _add() would. Users with a known ident and host are looked
+    up in an index of the user list, built once for the lot, instead of in
+    the whole list for each of them; this is what makes adding everyone in
+    a big channel at once affordable.
+
+    """
+
+    index = {}
+    for user in itertools.chain(_users, (Bot,)):
+        try:
+            index[user] = user
+        except (TypeError, ValueError):
+            pass # no ident or host yet
+
+    added = []
+    for entry in entries:
+        if entry.get("ident") is None or entry.get("host") is None:
+            added.append(_add(cli, **entry))
+            continue
+
+        cls = User
+        if predicate(entry["nick"]):
+            cls = FakeUser
+
+        new = cls(cli, entry["nick"], entry["ident"], entry["host"], entry.get("realname"), entry.get("account"), _index=index)
+
+        if new is not Bot:
+            _users.add(new)
+            index[new] = new
+
+        added.append(new)
+
+    return added
+
 def add(nick, **blah): # backwards-compatible API
     var.USERS[nick] = blah
     return _user(nick)
@@ -209,7 +248,7 @@ class User(IRCContext):
 
     is_user = True
 
-    def __new__(cls, cli, nick, ident, host, realname, account):
+    def __new__(cls, cli, nick, ident, host, realname, account, *, _index=None):
         self = super().__new__(cls)
         super(__class__, self).__init__(nick, cli)
 
@@ -218,6 +257,7 @@ class User(IRCContext):
         self.realname = realname
         self.account = account
         self.channels = {}
+        self.away = False # kept up to date by WHO replies, and with away-notify by AWAY messages
 
         if Bot is not None and Bot.nick == nick and {Bot.ident, Bot.host, Bot.realname, Bot.account} == {None}:
             self = Bot
@@ -226,6 +266,10 @@ class User(IRCContext):
             self.realname = realname
             self.account = account
 
+        elif ident is not None and host is not None and _index is not None:
+            # the same as below, from a prebuilt index of the user list (see _add_many)
+            self = _index.get(self, self)
+
         elif ident is not None and host is not None:
             users = set(_users)
             users.add(Bot)
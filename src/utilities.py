@@ -4,7 +4,7 @@ import re
 
 import botconfig
 import src.settings as var
-from src import proxy, debuglog
+from src import channels, proxy, debuglog
 from src.events import Event
 from src.messages import messages
 
@@ -32,21 +32,7 @@ is_fake_nick = re.compile(r"^[0-9]+$").search
 
 def mass_mode(cli, md_param, md_plain):
     """ Example: mass_mode(cli, [('+v', 'asdf'), ('-v','wobosd')], ['-m']) """
-    lmd = len(md_param)  # store how many mode changes to do
-    if md_param:
-        for start_i in range(0, lmd, var.MODELIMIT):  # 4 mode-changes at a time
-            if start_i + var.MODELIMIT > lmd:  # If this is a remainder (mode-changes < 4)
-                z = list(zip(*md_param[start_i:]))  # zip this remainder
-                ei = lmd % var.MODELIMIT  # len(z)
-            else:
-                z = list(zip(*md_param[start_i:start_i+var.MODELIMIT])) # zip four
-                ei = var.MODELIMIT # len(z)
-            # Now z equal something like [('+v', '-v'), ('asdf', 'wobosd')]
-            arg1 = "".join(md_plain) + "".join(z[0])
-            arg2 = " ".join(z[1])  # + " " + " ".join([x+"!*@*" for x in z[1]])
-            cli.mode(botconfig.CHANNEL, arg1, arg2)
-    elif md_plain:
-            cli.mode(botconfig.CHANNEL, "".join(md_plain))
+    channels.Main.set_modes(*md_plain, *md_param)
 
 def mass_privmsg(cli, targets, msg, notice=False, privmsg=False):
     if not targets:
@@ -94,7 +80,7 @@ def mass_privmsg(cli, targets, msg, notice=False, privmsg=False):
 def reply(cli, nick, chan, msg, private=False, prefix_nick=False):
     if chan == nick:
         pm(cli, nick, msg)
-    elif private or (chan == botconfig.CHANNEL and
+    elif private or (chan == channels.Main.name and
             ((nick not in list_players() and var.PHASE in var.GAME_PHASES) or
              (var.DEVOICE_DURING_NIGHT and var.PHASE == "night"))):
         cli.notice(nick, msg)
@@ -434,7 +420,7 @@ def complete_one_match(string, matches):
 
 #wrapper around complete_match() used for roles
 def get_victim(cli, nick, victim, in_chan, self_in_list=False, bot_in_list=False):
-    chan = botconfig.CHANNEL if in_chan else nick
+    chan = channels.Main.name if in_chan else nick
     if not victim:
         reply(cli, nick, chan, messages["not_enough_parameters"], private=True)
         return
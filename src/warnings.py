@@ -53,7 +53,7 @@ def expire_tempbans():
         cmodes.append(("-b", "{0}{1}".format(var.ACCOUNT_PREFIX, acc)))
     for hm in hmlist:
         cmodes.append(("-b", "*!*@{0}".format(hm.split("@")[1])))
-    channels.Main.mode(*cmodes)
+    channels.Main.set_modes(*cmodes)
 
 def parse_warning_target(target, lower=False):
     if target[0] == "=":
@@ -203,9 +203,9 @@ def add_warning(cli, target, amount, actor, reason, notes=None, expires=None, sa
         mass_mode(cli, cmodes, [])
         for (nick, user) in var.USERS.items():
             if user["account"] in acclist:
-                cli.kick(botconfig.CHANNEL, nick, messages["tempban_kick"].format(nick=nick, botnick=botconfig.NICK, reason=reason))
+                cli.kick(channels.Main.name, nick, messages["tempban_kick"].format(nick=nick, botnick=botconfig.NICK, reason=reason))
             elif user["host"] in hmlist:
-                cli.kick(botconfig.CHANNEL, nick, messages["tempban_kick"].format(nick=nick, botnick=botconfig.NICK, reason=reason))
+                cli.kick(channels.Main.name, nick, messages["tempban_kick"].format(nick=nick, botnick=botconfig.NICK, reason=reason))
 
     # Update any tracking vars that may have changed due to this
     db.init_vars()
@@ -0,0 +1,193 @@
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import src.settings as var
+from src import debuglog
+from src.jobs import JobRunner
+from src.messages import messages
+
+__all__ = ["WikiError", "WikiCache", "fetch_page", "wiki_cache"]
+
+WIKI_URL = "https://werewolf.chat"
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+class WikiError(Exception):
+    pass
+
+def _get_json(url):
+    try:
+        response = urllib.request.urlopen(url, timeout=var.WIKI_REQUEST_TIMEOUT).read().decode("utf-8", errors="replace")
+    except (urllib.error.URLError, socket.timeout):
+        raise WikiError(messages["wiki_request_timed_out"])
+    try:
+        parsed = json.loads(response) if response else None
+    except ValueError:
+        parsed = None
+    if not parsed:
+        raise WikiError(messages["wiki_open_failure"])
+    return parsed
+
+def fetch_page(term, base=WIKI_URL):
+    """Look term up on the wiki.
+
+    Returns a (title, first paragraph) tuple, or None if the wiki has
+    nothing on that topic. Raises WikiError if the wiki can't be reached.
+    """
+    # Get suggestions, for autocompletion
+    suggestions = _get_json("{0}/w/api.php?action=opensearch&format=json&search={1}".format(base, urllib.parse.quote(term)))
+
+    # Parse suggested pages, take the first result
+    try:
+        suggestion = suggestions[1][0].replace(" ", "_")
+    except IndexError:
+        return None
+
+    # Fetch a page from the api, in json format
+    pagejson = _get_json("{0}/w/api.php?action=query&prop=extracts&exintro=true&explaintext=true&titles={1}&format=json".format(base, urllib.parse.quote(suggestion)))
+    try:
+        page = pagejson["query"]["pages"].popitem()[1]["extract"]
+    except (KeyError, IndexError):
+        return None
+
+    # We only want the first paragraph
+    if page.find("\n") >= 0:
+        page = page[:page.find("\n")]
+
+    return (suggestion, page)
+
+class WikiCache:
+    """Local cache of wiki lookups, kept on disk between restarts.
+
+    Entries younger than `ttl` seconds are served as they are. Older ones
+    are still served right away, but are refreshed in the background for
+    the next time. Lookups that aren't cached at all are fetched on a
+    worker thread, and the callback is called from there once they're done.
+    """
+
+    def __init__(self, path, ttl, fetch=fetch_page, workers=2):
+        self.path = path
+        self.ttl = ttl
+        self.fetch = fetch
+        self._entries = {} # term -> (time fetched, result)
+        self._callbacks = {} # term -> callbacks waiting on the fetch in progress
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # saves happen on every worker; one at a time
+        self._runner = JobRunner(workers)
+        self._load(path)
+
+    def _load(self, path, *, fetched=None):
+        if not path or not os.path.isfile(path):
+            return 0
+        try:
+            with open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            debuglog("Could not load wiki cache from {0}: {1}".format(path, e))
+            return 0
+        if not isinstance(data, dict):
+            debuglog("Could not load wiki cache from {0}: not a JSON object".format(path))
+            return 0
+        count = 0
+        with self._lock:
+            for term, entry in data.items():
+                try:
+                    ts, result = entry
+                    ts = float(ts)
+                except (TypeError, ValueError):
+                    continue # not something we wrote
+                if fetched is not None:
+                    ts = fetched
+                if term not in self._entries or self._entries[term][0] < ts:
+                    self._entries[term] = (ts, tuple(result) if result is not None else None)
+                    count += 1
+        return count
+
+    def prewarm(self, path):
+        """Load entries from a JSON dump, such as one bundled with the bot.
+
+        These count as stale, so they're served right away but refreshed
+        the first time they're used. Returns how many entries were loaded.
+        """
+        return self._load(path, fetched=0)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._save_lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with self._lock:
+                data = json.dumps({term: list(entry) for term, entry in self._entries.items()})
+            tmp = self.path + ".tmp"
+            with open(tmp, "wt", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+
+    @staticmethod
+    def normalize(term):
+        return term.replace(" ", "_").lower()
+
+    def lookup(self, term, callback):
+        """Look term up, calling callback(result, error) with the outcome.
+
+        result is what fetch_page() returned; error is a message to show
+        the user if the wiki couldn't be reached. If the term is cached, the
+        callback is called before this returns.
+        """
+        term = self.normalize(term)
+        with self._lock:
+            entry = self._entries.get(term)
+            stale = entry is None or time.time() - entry[0] > self.ttl
+            if stale:
+                if term in self._callbacks: # already being fetched
+                    if entry is None:
+                        self._callbacks[term].append(callback)
+                        return
+                    stale = False
+                else:
+                    self._callbacks[term] = [] if entry is not None else [callback]
+
+        if stale:
+            self._runner.submit(self._refresh, term)
+        if entry is not None:
+            callback(entry[1], None)
+
+    def _refresh(self, term):
+        error = None
+        try:
+            result = self.fetch(term)
+        except WikiError as e:
+            result, error = None, str(e)
+
+        with self._lock:
+            callbacks = self._callbacks.pop(term, [])
+            if error is None:
+                self._entries[term] = (time.time(), result)
+
+        for callback in callbacks:
+            callback(result, error)
+        if error is None:
+            self.save()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def wiki_cache():
+    """Return the bot's wiki cache, loading it the first time it's needed."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            path = var.WIKI_CACHE_FILE
+            if path:
+                path = os.path.join(ROOT_DIR, var.DATA_DIR, path)
+            _cache = WikiCache(path, var.WIKI_CACHE_TTL)
+            if var.WIKI_CACHE_DUMP:
+                _cache.prewarm(os.path.join(ROOT_DIR, var.WIKI_CACHE_DUMP))
+        return _cache
+
+# vim: set sw=4 expandtab:
@@ -29,16 +29,13 @@ import platform
 import random
 import re
 import signal
-import socket
 import string
 import subprocess
 import sys
 import threading
 import time
 import traceback
-import urllib.request
 from collections import defaultdict, deque, Counter
-import json
 from datetime import datetime, timedelta
 
 from oyoyo.parse import parse_nick
@@ -47,11 +44,16 @@ import botconfig
 import src
 import src.settings as var
 from src.utilities import *
-from src import db, events, dispatcher, channels, users, hooks, logger, proxy, debuglog, errlog, plog
-from src.decorators import command, cmd, hook, handle_error, event_listener, COMMANDS
+from src import db, events, dispatcher, channels, gameloop, games, networks, users, hooks, jobs, logger, metrics, proxy, reloader, snapshot, debuglog, errlog, plog
+from src.decorators import command, cmd, hook, handle_error, event_listener, commands_changed, COMMANDS
 from src.messages import messages
 from src.warnings import *
 from src.context import IRCContext
+from src.responses import responses
+from src.rolestats import RoleDeduction
+from src.notify import Notifier
+from src.wiki import wiki_cache
+from src.flood import flood
 
 # done this way so that events is accessible in !eval (useful for debugging)
 Event = events.Event
@@ -91,6 +93,8 @@ var.STARTED_DAY_PLAYERS = 0
 
 var.DISCONNECTED = {}  # players who got disconnected
 
+var.ENABLED_CAPS = set() # IRCv3 capabilities the server agreed to
+
 var.RESTARTING = False
 
 #var.OPPED = False  # Keeps track of whether the bot is opped
@@ -134,11 +138,13 @@ def connect_callback():
     SIGUSR2 = getattr(signal, "SIGUSR2", None)
 
     def sighandler(signum, frame):
-        wrapper = dispatcher.MessageDispatcher(users.FakeUser.from_nick("<console>"), channels.Main)
         if signum == signal.SIGINT:
             # Exit immediately if Ctrl-C is pressed twice
             signal.signal(signal.SIGINT, signal.SIG_DFL)
+        gameloop.loop.submit("signal", handle_signal, signum)
 
+    def handle_signal(signum):
+        wrapper = dispatcher.MessageDispatcher(users.FakeUser.from_nick("<console>"), channels.Main)
         if signum in (signal.SIGINT, signal.SIGTERM):
             forced_exit.func(var, wrapper, "")
         elif signum == SIGUSR1:
@@ -164,11 +170,23 @@ def connect_callback():
                 var.DISABLE_ACCOUNTS = True
                 var.ACCOUNTS_ONLY = False
 
-            # Devoice all on connect
+            resumed = resume_game(channels.Main.client)
+
+            # Devoice all on connect, except for the players of a resumed game
             mode = hooks.Features["PREFIX"]["+"]
+            voiced = channels.Main.modes.get(mode, ())
+            pl = ()
+            if resumed and not (var.DEVOICE_DURING_NIGHT and var.PHASE == "night"):
+                pl = list_players()
             pending = []
-            for user in channels.Main.modes.get(mode, ()):
-                pending.append(("-" + mode, user))
+            for user in voiced:
+                if user.nick not in pl:
+                    pending.append(("-" + mode, user))
+            for user in channels.Main.users:
+                if user.nick in pl and user not in voiced:
+                    pending.append(("+" + mode, user))
+            if resumed:
+                pending.append("+m")
             accumulator.send(pending)
             next(accumulator, None)
 
@@ -176,7 +194,10 @@ def connect_callback():
             expire_tempbans()
 
             players = db.get_pre_restart_state()
-            if players:
+            if resumed:
+                channels.Main.send(*list_players(), first="PING! ")
+                channels.Main.send(messages["game_resumed"].format(var.PHASE))
+            elif players:
                 channels.Main.send(*players, first="PING! ")
                 channels.Main.send(messages["game_restart_cancel"])
 
@@ -212,7 +233,7 @@ def connect_callback():
             yield i
 
         if modes:
-            channels.Main.mode(*modes)
+            channels.Main.set_modes(*modes)
 
     accumulator = accumulate_cmodes(3)
     accumulator.send(None)
@@ -220,7 +241,7 @@ def connect_callback():
 @hook("mode") # XXX Get rid of this when the user/channel refactor is done
 def check_for_modes(cli, rnick, chan, modeaction, *target):
     nick = parse_nick(rnick)[0]
-    if chan != botconfig.CHANNEL:
+    if chan != channels.Main.name:
         return
     oldpref = ""
     trgt = ""
@@ -292,7 +313,7 @@ def reset_modes_timers(var):
         for deadguy in var.DEAD:
             if not is_fake_nick(deadguy):
                 cmodes.append(("-{0}".format(var.QUIET_MODE), var.QUIET_PREFIX+deadguy+"!*@*"))
-    channels.Main.mode("-m", *cmodes)
+    channels.Main.set_modes("-m", *cmodes)
 
 def reset():
     var.PHASE = "none" # "join", "day", or "night"
@@ -312,6 +333,7 @@ def reset():
     var.LOVERS = {} # need to be here for purposes of random
     var.ROLE_STATS = frozenset() # type: FrozenSet[FrozenSet[Tuple[str, int]]]
     var.ROLE_SETS = [] # type: List[Tuple[Counter[str], int]]
+    var.ROLE_DEDUCTION = RoleDeduction()
 
     reset_settings()
 
@@ -325,8 +347,16 @@ def reset():
     evt = Event("reset", {})
     evt.dispatch(var)
 
+    responses.invalidate()
+
 reset()
 
+@event_listener("new_game")
+def on_new_game(evt, var):
+    # load every role now, rather than in the middle of another channel's game
+    load_roles()
+    reset()
+
 @command("sync", "fsync", flag="m", pm=True)
 def fsync(var, wrapper, message):
     """Makes the bot apply the currently appropriate channel modes."""
@@ -351,7 +381,116 @@ def sync_modes(var):
     else:
         voices[0] = "-m"
 
-    channels.Main.mode(*voices)
+    channels.Main.set_modes(*voices)
+
+def save_game_state():
+    """Save the game in progress so that it can be resumed after a restart or crash."""
+    if var.PHASE not in var.GAME_PHASES or var.GAME_SNAPSHOT_EXPIRY <= 0:
+        return False
+    if games.current() is not games.default(): # only the main channel's game is resumed
+        return False
+    try:
+        data = snapshot.dumps(snapshot.capture())
+    except snapshot.SnapshotError as e:
+        errlog("Could not save the game state: {0}".format(e))
+        return False
+    db.set_game_state(data)
+    return True
+
+def load_roles():
+    """Import the role modules which were put off by LAZY_ROLES, if any."""
+    roles = sys.modules.get("src.roles") # custom roles replace src.roles entirely
+    if roles is not None and not roles.loaded:
+        start = time.perf_counter()
+        names = roles.load_all()
+        plog("Loaded {0} role modules in {1:.0f}ms".format(len(names), (time.perf_counter() - start) * 1000))
+
+def resume_game(cli):
+    """Resume the game from the last saved state, if there is a recent enough one.
+
+    Channel modes are left for the caller to fix up.
+    """
+    data = db.get_game_state()
+    if data is None:
+        return False
+    # never try to resume the same state twice, in case it's what made us crash
+    db.set_game_state(None)
+    if var.PHASE != "none":
+        return False
+    try:
+        state = snapshot.loads(data)
+    except snapshot.SnapshotError as e:
+        plog("Not resuming the game: {0}".format(e))
+        return False
+    if time.time() - state["time"] > var.GAME_SNAPSHOT_EXPIRY:
+        plog("Not resuming the game: saved state is too old")
+        return False
+
+    load_roles()
+    with var.GRAVEYARD_LOCK:
+        snapshot.restore(state)
+        var.ROLE_DEDUCTION = RoleDeduction.replay(list_players())
+        responses.invalidate()
+
+        callbacks = {"day": (hurry_up, (cli, var.DAY_ID, True)),
+                     "day_warn": (hurry_up, (cli, var.DAY_ID, False)),
+                     "night": (transition_day, (cli, var.NIGHT_ID)),
+                     "night_warn": (night_warn, (cli, var.NIGHT_ID))}
+        var.TIMERS = {}
+        now = time.time()
+        for name, (elapsed, duration) in state["timers"].items():
+            func, args = callbacks[name]
+            t = metrics.Timer(duration - elapsed, func, args)
+            var.TIMERS[name] = (t, now - elapsed, duration)
+            t.daemon = True
+            t.start()
+
+        reaper(cli, var.GAME_ID)
+
+    plog("Resumed the game from the saved state ({0} {1})".format(var.PHASE,
+         var.DAY_COUNT if var.PHASE == "day" else var.NIGHT_COUNT))
+    return True
+
+@command("fflood", flag="D", pm=True, readonly=True)
+def flood_stats(var, wrapper, message):
+    """Shows how many messages and commands were dropped for flooding."""
+    if not flood.dropped_total and not flood.dropped_commands:
+        wrapper.pm(messages["flood_none"])
+        return
+    total = flood.dropped_total
+    senders = ", ".join("{0} ({1})".format(sender, count) for sender, count in flood.dropped.most_common(5))
+    cmds = ", ".join("{0} ({1})".format(name, count) for name, count in flood.dropped_commands.most_common())
+    wrapper.pm(messages["flood_stats"].format(total, "" if total == 1 else "s", len(flood.dropped),
+               "" if len(flood.dropped) == 1 else "s", senders or "-", cmds or "-"))
+
+@command("fmetrics", flag="D", pm=True, readonly=True)
+def show_metrics(var, wrapper, message):
+    """Shows the slowest commands, events and so on. Use "dump" to write all metrics to a file."""
+    if not metrics.enabled:
+        wrapper.pm(messages["metrics_disabled"])
+        return
+
+    name = message.strip()
+    if name == "dump":
+        path = var.METRICS_FILE or "metrics.prom"
+        metrics.dump(path)
+        wrapper.pm(messages["metrics_dumped"].format(path))
+        return
+
+    if name:
+        names = [n for n in metrics.REGISTRY if name in n]
+        if not names:
+            wrapper.pm(messages["metrics_unknown"].format(name))
+            return
+        limit = 10
+    else:
+        names = sorted(metrics.REGISTRY)
+        limit = 3
+
+    for name in names:
+        lines = metrics.describe(name, limit)
+        if lines:
+            wrapper.pm("\u0002{0}\u0002: {1}".format(name, "; ".join(lines)))
 
 @command("refreshdb", flag="m", pm=True)
 def refreshdb(var, wrapper, message):
@@ -398,6 +537,7 @@ def forced_exit(var, wrapper, message):
 
 def _restart_program(mode=None):
     plog("RESTARTING")
+    logger.flush() # the writer thread doesn't survive the exec
 
     python = sys.executable
 
@@ -425,7 +565,8 @@ def restart_program(var, wrapper, message):
     if var.PHASE in var.GAME_PHASES:
         if var.PHASE == "join" or force:
             stop_game(wrapper.client, log=False)
-        else:
+        elif not save_game_state():
+            # the game is resumed once we're back, unless it couldn't be saved
             wrapper.pm(messages["stop_bot_ingame_safeguard"].format(
                 what="restart", cmd="frestart", prefix=botconfig.CMD_CHAR))
             return
@@ -589,7 +730,7 @@ def replace(var, wrapper, message):
 
         if not var.DEVOICE_DURING_NIGHT or var.PHASE != "night":
             mode = hooks.Features["PREFIX"]["+"]
-            channels.Main.mode(("-" + mode, target), ("+" + mode, wrapper.source))
+            channels.Main.set_modes(("-" + mode, target), ("+" + mode, wrapper.source))
 
         channels.Main.send(messages["player_swap"].format(wrapper.source, target))
         myrole.caller(wrapper.source.client, wrapper.source.nick, wrapper.target.name, "") # FIXME: Old API
@@ -686,8 +827,8 @@ def join_timer_handler(var):
             var.PINGING_IFS = False
             return
 
-        def get_altpingers(event, var, chan, user):
-            if event.params.away or user.stasis_count() or not var.PINGING_IFS or user is users.Bot or user.nick in pl: # FIXME: Fix this when list_players() returns User instances
+        def consider(user, away):
+            if away or user.stasis_count() or not var.PINGING_IFS or user is users.Bot or user.nick in pl: # FIXME: Fix this when list_players() returns User instances
                 return
 
             temp = user.lower()
@@ -702,21 +843,30 @@ def join_timer_handler(var):
                     to_ping.append(temp)
                     var.PINGED_ALREADY.add(temp.userhost)
 
+        def ping():
+            var.PINGING_IFS = False
+            if to_ping:
+                to_ping.sort(key=lambda x: x.nick)
+                user_list = [(user.ref or user).nick for user in to_ping]
+
+                msg_prefix = messages["ping_player"].format(len(pl), "" if len(pl) == 1 else "s")
+                channels.Main.send(*user_list, first=msg_prefix)
+                del to_ping[:]
+
+        if "away-notify" in var.ENABLED_CAPS:
+            # everyone's away status is kept current, so there's no need to ask the server
+            for user in list(channels.Main.users):
+                consider(user, user.away)
+            ping()
+            return
+
         def ping_altpingers(event, var, request):
             if request is channels.Main:
-                var.PINGING_IFS = False
-                if to_ping:
-                    to_ping.sort(key=lambda x: x.nick)
-                    user_list = [(user.ref or user).nick for user in to_ping]
-
-                    msg_prefix = messages["ping_player"].format(len(pl), "" if len(pl) == 1 else "s")
-                    channels.Main.send(*user_list, first=msg_prefix)
-                    del to_ping[:]
-
-                events.remove_listener("who_result", get_altpingers)
+                for chan, user, params in event.params.replies:
+                    consider(user, params.away)
+                ping()
                 events.remove_listener("who_end", ping_altpingers)
 
-        events.add_listener("who_result", get_altpingers)
         events.add_listener("who_end", ping_altpingers)
 
         channels.Main.who()
@@ -840,6 +990,12 @@ def join_player(var, wrapper, who=None, forced=False, *, sanity=True):
     if wrapper.target is not channels.Main:
         return False
 
+    # PMs and server events about a player go to the one game they play in
+    for game in games.GAMES.values():
+        if game is not games.current() and game.has_player(wrapper.source.nick):
+            who.send(messages["playing_elsewhere"].format("You" if who is wrapper.source else "They", game.channel.name), notice=True)
+            return False
+
     stasis = wrapper.source.stasis_count()
 
     if stasis > 0:
@@ -860,6 +1016,7 @@ def join_player(var, wrapper, who=None, forced=False, *, sanity=True):
 
     cmodes = [("+" + hooks.Features["PREFIX"]["+"], wrapper.source)]
     if var.PHASE == "none":
+        load_roles()
         if not wrapper.source.is_fake or not botconfig.DEBUG_MODE:
             for mode in var.AUTO_TOGGLE_MODES & wrapper.source.channels[channels.Main]:
                 cmodes.append(("-" + mode, wrapper.source))
@@ -882,7 +1039,7 @@ def join_player(var, wrapper, who=None, forced=False, *, sanity=True):
 
         # Set join timer
         if var.JOIN_TIME_LIMIT > 0:
-            t = threading.Timer(var.JOIN_TIME_LIMIT, kill_join, [var, wrapper])
+            t = metrics.Timer(var.JOIN_TIME_LIMIT, kill_join, [var, wrapper])
             var.TIMERS["join"] = (t, time.time(), var.JOIN_TIME_LIMIT)
             t.daemon = True
             t.start()
@@ -950,13 +1107,13 @@ def join_player(var, wrapper, who=None, forced=False, *, sanity=True):
         if "join_pinger" in var.TIMERS:
             var.TIMERS["join_pinger"][0].cancel()
 
-        t = threading.Timer(10, join_timer_handler, (var,))
+        t = metrics.Timer(10, join_timer_handler, (var,))
         var.TIMERS["join_pinger"] = (t, time.time(), 10)
         t.daemon = True
         t.start()
 
     if not wrapper.source.is_fake or not botconfig.DEBUG_MODE:
-        channels.Main.mode(*cmodes)
+        channels.Main.set_modes(*cmodes)
 
     return True
 
@@ -1067,7 +1224,7 @@ def fleave(cli, nick, chan, rest):
         dcl = [user.nick for user in var.DEADCHAT_PLAYERS] if var.PHASE != "join" else []
         dcll = [x.lower() for x in dcl]
         if a.lower() in pll:
-            if chan != botconfig.CHANNEL:
+            if chan != channels.Main.name:
                 reply(cli, nick, chan, messages["fquit_fail"], private=True)
                 return
             a = pl[pll.index(a.lower())]
@@ -1106,8 +1263,8 @@ def fleave(cli, nick, chan, rest):
 @cmd("fstart", flag="A", phases=("join",))
 def fstart(cli, nick, chan, rest):
     """Forces the game to start immediately."""
-    cli.msg(botconfig.CHANNEL, messages["fstart_success"].format(nick))
-    start(cli, nick, botconfig.CHANNEL, forced = True)
+    cli.msg(channels.Main.name, messages["fstart_success"].format(nick))
+    start(cli, nick, channels.Main.name, forced = True)
 
 @event_listener("chan_kick")
 def kicked_modes(evt, var, chan, actor, target, reason):
@@ -1121,7 +1278,7 @@ def parted_modes(evt, var, chan, user, reason):
         chan.join()
     var.OLD_MODES.pop(user, None)
 
-@cmd("stats", "players", pm=True, phases=("join", "day", "night"))
+@cmd("stats", "players", pm=True, phases=("join", "day", "night"), readonly=True)
 def stats(cli, nick, chan, rest):
     """Displays the player statistics."""
 
@@ -1150,9 +1307,25 @@ def stats(cli, nick, chan, rest):
     role = None
     if nick in pl:
         role = get_role(nick)
-    if chan == nick and role in badguys | {"warlock"}:
+    visibility = "public"
+    if chan == nick and role in badguys:
+        visibility = "wolfchat"
+    elif chan == nick and role == "warlock":
+        visibility = "warlock"
+
+    # everyone in the same visibility class sees the same list, so only build it once
+    msg = responses.get("stats", visibility, _stats_player_list, cli, nick, pl, visibility, badguys)
+    reply(cli, nick, chan, _nick + msg)
+
+    if var.PHASE == "join" or var.STATS_TYPE == "disabled":
+        return
+
+    reply(cli, nick, chan, _nick + responses.get("stats", "roles", _stats_role_counts, pl))
+
+def _stats_player_list(cli, nick, pl, visibility, badguys):
+    if visibility in ("wolfchat", "warlock"):
         ps = pl[:]
-        if role in badguys:
+        if visibility == "wolfchat":
             for i, player in enumerate(ps):
                 prole = get_role(player)
                 wevt = Event("wolflist", {"tags": set()})
@@ -1164,418 +1337,26 @@ def stats(cli, nick, chan, rest):
                     ps[i] = "\u0002{0}\u0002 ({1}{2})".format(player, tags, prole)
                 elif tags:
                     ps[i] = "{0} ({1})".format(player, tags)
-        elif role == "warlock":
+        else:
             # warlock not in wolfchat explicitly only sees cursed
             for i, player in enumerate(pl):
                 if player in var.ROLES["cursed villager"]:
                     ps[i] = player + " (cursed)"
-        msg = "\u0002{0}\u0002 players: {1}".format(len(pl), ", ".join(ps))
+        return "\u0002{0}\u0002 players: {1}".format(len(pl), ", ".join(ps))
     elif len(pl) > 1:
-        msg = "{0}\u0002{1}\u0002 players: {2}".format(_nick,
-            len(pl), ", ".join(pl))
+        return "\u0002{0}\u0002 players: {1}".format(len(pl), ", ".join(pl))
     else:
-        msg = "{0}\u00021\u0002 player: {1}".format(_nick, pl[0])
-
-    reply(cli, nick, chan, msg)
-
-    if var.PHASE == "join" or var.STATS_TYPE == "disabled":
-        return
+        return "\u00021\u0002 player: {0}".format(pl[0])
 
+def _stats_role_counts(pl):
     message = []
 
-    # Instead of looping over the current roles, we start with the original set and apply
-    # changes to it as public game events occur. This way, !stats output should duplicate
-    # what a player would have if they were manually tracking who is what and did not
-    # have any non-public information. The comments below explain the logic such a player
-    # would be using to derive the list. Note that this logic is based on the assumption
-    # that role reveal is on. If role reveal is off or team, stats type should probably be
-    # set to disabled or team respectively instead of this, as this will then leak info.
+    # The default stats only use information that is public to every player; see
+    # src/rolestats.py for how it is derived. The deduction is updated as players
+    # die, so all we need to do here is format it.
     if var.STATS_TYPE == "default":
-        # role: [min, max] -- "we may not necessarily know *exactly* how
-        # many of a particular role there are, but we know that there is
-        # between min and max of them"
-        rolecounts = defaultdict(lambda: [0, 0])
-        start_roles = set()
-        orig_roles = {}
-        equiv_sets = {}
-        total_immunizations = 0
-        extra_lycans = 0
-        # Step 1. Get our starting set of roles. This also calculates the maximum numbers for equivalency sets
-        # (sets of roles that are decremented together because we can't know for sure which actually died).
-        for r, v in var.ORIGINAL_ROLES.items():
-            if r in var.TEMPLATE_RESTRICTIONS.keys():
-                continue
-            if len(v) == 0:
-                continue
-            start_roles.add(r)
-            rolecounts[r] = [len(v), len(v)]
-            for p in v:
-                if p.startswith("(dced)"):
-                    p = p[6:]
-                orig_roles[p] = r
-
-        if var.CURRENT_GAMEMODE.name == "villagergame":
-            # hacky hacks that hack
-            pcount = len(var.ALL_PLAYERS)
-            if pcount >= 8:
-                rolecounts["villager"][0] -= 2
-                rolecounts["villager"][1] -= 2
-                rolecounts["wolf"] = [1, 1]
-                rolecounts["traitor"] = [1, 1]
-            elif pcount == 7:
-                rolecounts["villager"][0] -= 2
-                rolecounts["villager"][1] -= 2
-                rolecounts["wolf"] = [1, 1]
-                rolecounts["cultist"] = [1, 1]
-            else:
-                rolecounts["villager"][0] -= 1
-                rolecounts["villager"][1] -= 1
-                rolecounts["wolf"] = [1, 1]
-
-        total_immunizations = rolecounts["doctor"][0] * math.ceil(len(var.ALL_PLAYERS) * var.DOCTOR_IMMUNIZATION_MULTIPLIER)
-        if "amnesiac" in start_roles and "doctor" not in var.AMNESIAC_BLACKLIST:
-            total_immunizations += rolecounts["amnesiac"][0] * math.ceil(len(var.ALL_PLAYERS) * var.DOCTOR_IMMUNIZATION_MULTIPLIER)
-
-        extra_lycans = rolecounts["lycan"][0] - min(total_immunizations, rolecounts["lycan"][0])
-
-        equiv_sets["traitor_default"] = rolecounts["traitor"][0] + rolecounts[var.DEFAULT_ROLE][0]
-        equiv_sets["lycan_villager"] = min(rolecounts["lycan"][0], total_immunizations) + rolecounts["villager"][0]
-        equiv_sets["traitor_lycan_villager"] = equiv_sets["traitor_default"] + equiv_sets["lycan_villager"] - rolecounts[var.DEFAULT_ROLE][0]
-        equiv_sets["amnesiac_clone"] = rolecounts["amnesiac"][0] + rolecounts["clone"][0]
-        equiv_sets["amnesiac_clone_cub"] = rolecounts["amnesiac"][0] + rolecounts["clone"][0] + rolecounts["wolf cub"][0]
-        equiv_sets["wolf_fallen"] = 0
-        equiv_sets["fallen_guardian"] = 0
-        if var.TRAITOR_TURNED:
-            equiv_sets["traitor_default"] -= rolecounts["traitor"][0]
-            equiv_sets["traitor_lycan_villager"] -= rolecounts["traitor"][0]
-            rolecounts["wolf"][0] += rolecounts["traitor"][0]
-            rolecounts["wolf"][1] += rolecounts["traitor"][1]
-            rolecounts["traitor"] = [0, 0]
-        # Step 2. Handle role swaps via exchange totem by modifying orig_roles -- the original
-        # roles themselves didn't change, just who has them. By doing the swap early on we greatly
-        # simplify the death logic below in step 3 -- to an outsider that doesn't know any info
-        # the role swap might as well never happened and those people simply started with those roles;
-        # they can't really tell the difference.
-        for a, b in var.EXCHANGED_ROLES:
-            orig_roles[a], orig_roles[b] = orig_roles[b], orig_roles[a]
-        # Step 3. Work out people that turned into wolves via either alpha wolf, lycan, or lycanthropy totem
-        # All three of those play the same "chilling howl" message, once per additional wolf
-        num_alpha = rolecounts["alpha wolf"][0]
-        num_angel = rolecounts["guardian angel"][0]
-        if "amnesiac" in start_roles and "guardian angel" not in var.AMNESIAC_BLACKLIST:
-            num_angel += rolecounts["amnesiac"][0]
-        have_lycan_totem = False
-        for idx, shaman in enumerate(var.TOTEM_ORDER):
-            if (shaman in start_roles or ("amnesiac" in start_roles and shaman not in var.AMNESIAC_BLACKLIST)) and var.TOTEM_CHANCES["lycanthropy"][idx] > 0:
-                have_lycan_totem = True
-
-        extra_wolves = var.EXTRA_WOLVES
-        num_wolves = rolecounts["wolf"][0]
-        num_fallen = rolecounts["fallen angel"][0]
-        while extra_wolves > 0:
-            extra_wolves -= 1
-            if num_alpha == 0 and not have_lycan_totem:
-                # This is easy, all of our extra wolves are actual lycans, and we know this for a fact
-                rolecounts["wolf"][0] += 1
-                rolecounts["wolf"][1] += 1
-                num_wolves += 1
-
-                if rolecounts["lycan"][1] > 0:
-                    rolecounts["lycan"][0] -= 1
-                    rolecounts["lycan"][1] -= 1
-                else:
-                    # amnesiac or clone became lycan and was subsequently turned
-                    maxcount = max(0, equiv_sets["amnesiac_clone"] - 1)
-
-                    rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
-                    if rolecounts["amnesiac"][1] > maxcount:
-                        rolecounts["amnesiac"][1] = maxcount
-
-                    rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
-                    if rolecounts["clone"][1] > maxcount:
-                        rolecounts["clone"][1] = maxcount
-
-                    equiv_sets["amnesiac_clone"] = maxcount
-
-
-                if extra_lycans > 0:
-                    extra_lycans -= 1
-                else:
-                    equiv_sets["lycan_villager"] = max(0, equiv_sets["lycan_villager"] - 1)
-                    equiv_sets["traitor_lycan_villager"] = max(0, equiv_sets["traitor_lycan_villager"] - 1)
-            elif num_alpha == 0 or num_angel == 0:
-                # We are guaranteed to have gotten an additional wolf, but we can't guarantee it was an actual lycan
-                rolecounts["wolf"][0] += 1
-                rolecounts["wolf"][1] += 1
-                num_wolves += 1
-                rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
-
-                # apply alphas before lycan totems (in case we don't actually have lycan totems)
-                # this way if we don't have totems and alphas is 0 we hit guaranteed lycans above
-                if num_alpha > 0:
-                    num_alpha -= 1
-            else:
-                # We may have gotten an additional wolf or an additional fallen angel, we don't necessarily know which
-                num_alpha -= 1
-                num_angel -= 1
-                rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
-                rolecounts["wolf"][1] += 1
-                rolecounts["fallen angel"][1] += 1
-                rolecounts["guardian angel"][0] -= 1
-                equiv_sets["wolf_fallen"] += 1
-                equiv_sets["fallen_guardian"] += 1
-
-        # Step 4. Remove all dead players
-        # When rolesets are a thing (e.g. one of x, y, or z), those will be resolved here as well
-        for p in var.ALL_PLAYERS:
-            p = p.nick # FIXME: Need to modify this block to handle User instances
-            if p in pl:
-                continue
-            # pr should be the role the person gets revealed as should they die
-            pr = orig_roles[p]
-            if p in var.FINAL_ROLES and pr not in ("amnesiac", "clone"):
-                pr = var.FINAL_ROLES[p]
-            elif pr == "amnesiac" and not var.HIDDEN_AMNESIAC and p in var.FINAL_ROLES:
-                pr = var.FINAL_ROLES[p]
-            elif pr == "clone" and not var.HIDDEN_CLONE and p in var.FINAL_ROLES:
-                pr = var.FINAL_ROLES[p]
-            elif pr == "traitor" and var.TRAITOR_TURNED:
-                # we turned every traitor into wolf above, which means even though
-                # this person died as traitor, we need to deduct the count from wolves
-                pr = "wolf"
-            elif pr == "traitor" and var.HIDDEN_TRAITOR:
-                pr = var.DEFAULT_ROLE
-
-            # set to true if we kill more people than exist in a given role,
-            # which means that amnesiac or clone must have became that role
-            overkill = False
-
-            if pr == var.DEFAULT_ROLE:
-                # the person that died could have been traitor or an immunized lycan
-                if var.DEFAULT_ROLE == "villager":
-                    maxcount = equiv_sets["traitor_lycan_villager"]
-                else:
-                    maxcount = equiv_sets["traitor_default"]
-
-                if maxcount == 0:
-                    overkill = True
-
-                maxcount = max(0, maxcount - 1)
-                if var.HIDDEN_TRAITOR and not var.TRAITOR_TURNED:
-                    rolecounts["traitor"][0] = max(0, rolecounts["traitor"][0] - 1)
-                    if rolecounts["traitor"][1] > maxcount:
-                        rolecounts["traitor"][1] = maxcount
-
-                if var.DEFAULT_ROLE == "villager" and total_immunizations > 0:
-                    total_immunizations -= 1
-                    rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
-                    if rolecounts["lycan"][1] > maxcount + extra_lycans:
-                        rolecounts["lycan"][1] = maxcount + extra_lycans
-
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                if rolecounts[pr][1] > maxcount:
-                    rolecounts[pr][1] = maxcount
-
-                if var.DEFAULT_ROLE == "villager":
-                    equiv_sets["traitor_lycan_villager"] = maxcount
-                else:
-                    equiv_sets["traitor_default"] = maxcount
-            elif pr == "villager":
-                # the villager that died could have been an immunized lycan
-                maxcount = max(0, equiv_sets["lycan_villager"] - 1)
-
-                if equiv_sets["lycan_villager"] == 0:
-                    overkill = True
-
-                if total_immunizations > 0:
-                    total_immunizations -= 1
-                    rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
-                    if rolecounts["lycan"][1] > maxcount + extra_lycans:
-                        rolecounts["lycan"][1] = maxcount + extra_lycans
-
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                if rolecounts[pr][1] > maxcount:
-                    rolecounts[pr][1] = maxcount
-
-                equiv_sets["lycan_villager"] = maxcount
-            elif pr == "lycan":
-                # non-immunized lycan, reduce counts appropriately
-                if rolecounts[pr][1] == 0:
-                    overkill = True
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
-
-                if extra_lycans > 0:
-                    extra_lycans -= 1
-                else:
-                    equiv_sets["lycan_villager"] = max(0, equiv_sets["lycan_villager"] - 1)
-                    equiv_sets["traitor_lycan_villager"] = max(0, equiv_sets["traitor_lycan_villager"] - 1)
-            elif pr == "wolf":
-                # person that died could have possibly been turned by alpha
-                if rolecounts[pr][1] == 0:
-                    # this overkill either means that we're hitting amnesiac/clone or that cubs turned
-                    overkill = True
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
-
-                if num_wolves > 0:
-                    num_wolves -= 1
-                elif equiv_sets["wolf_fallen"] > 0:
-                    equiv_sets["wolf_fallen"] -= 1
-                    equiv_sets["fallen_guardian"] = max(0, equiv_sets["fallen_guardian"] - 1)
-                    rolecounts["fallen angel"][1] = max(0, rolecounts["fallen angel"][1] - 1)
-                    rolecounts["guardian angel"][0] = max(rolecounts["guardian angel"][0] + 1, rolecounts["guardian angel"][1])
-                    rolecounts["fallen angel"][0] = min(rolecounts["fallen angel"][0], rolecounts["fallen angel"][1])
-            elif pr == "fallen angel":
-                # person that died could have possibly been turned by alpha
-                if rolecounts[pr][1] == 0:
-                    overkill = True
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
-
-                if num_fallen > 0:
-                    num_fallen -= 1
-                elif equiv_sets["wolf_fallen"] > 0:
-                    equiv_sets["wolf_fallen"] -= 1
-                    equiv_sets["fallen_guardian"] = max(0, equiv_sets["fallen_guardian"] - 1)
-                    rolecounts["wolf"][1] = max(0, rolecounts["wolf"][1] - 1)
-                    rolecounts["wolf"][0] = min(rolecounts["wolf"][0], rolecounts["wolf"][1])
-                    # this also means a GA died for sure (we lowered the lower bound previously)
-                    rolecounts["guardian angel"][1] = max(0, rolecounts["guardian angel"][1] - 1)
-            elif pr == "guardian angel":
-                if rolecounts[pr][1] == 0:
-                    overkill = True
-                if rolecounts[pr][1] <= equiv_sets["fallen_guardian"] and equiv_sets["fallen_guardian"] > 0:
-                    # we got rid of a GA that was an FA candidate, so get rid of the FA as well
-                    # (this also means that there is a guaranteed wolf so add that in)
-                    equiv_sets["fallen_guardian"] = max(0, equiv_sets["fallen_guardian"] - 1)
-                    equiv_sets["wolf_fallen"] = max(0, equiv_sets["wolf_fallen"] - 1)
-                    rolecounts["fallen angel"][1] = max(rolecounts["fallen angel"][0], rolecounts["fallen angel"][1] - 1)
-                    rolecounts["wolf"][0] = min(rolecounts["wolf"][0] + 1, rolecounts["wolf"][1])
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
-            elif pr == "wolf cub":
-                if rolecounts[pr][1] == 0:
-                    overkill = True
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
-                equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-            else:
-                # person that died is guaranteed to be that role (e.g. not in an equiv_set)
-                if rolecounts[pr][1] == 0:
-                    overkill = True
-                rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
-                rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
-
-            if overkill:
-                # we tried killing more people than exist in a role, so deduct from amnesiac/clone count instead
-                if var.CURRENT_GAMEMODE.name == "sleepy" and pr == "doomsayer":
-                    rolecounts["seer"][0] = max(0, rolecounts["seer"][0] - 1)
-                    rolecounts["seer"][1] = max(0, rolecounts["seer"][1] - 1)
-                elif var.CURRENT_GAMEMODE.name == "sleepy" and pr == "demoniac":
-                    rolecounts["cultist"][0] = max(0, rolecounts["cultist"][0] - 1)
-                    rolecounts["cultist"][1] = max(0, rolecounts["cultist"][1] - 1)
-                elif var.CURRENT_GAMEMODE.name == "sleepy" and pr == "succubus":
-                    rolecounts["harlot"][0] = max(0, rolecounts["harlot"][0] - 1)
-                    rolecounts["harlot"][1] = max(0, rolecounts["harlot"][1] - 1)
-                elif pr == "clone":
-                    # in this case, it means amnesiac became a clone (clone becoming amnesiac is impossible so we
-                    # do not have the converse check in here - clones always inherit what amnesiac turns into).
-                    equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
-                    equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-                    rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
-                    rolecounts["amnesiac"][1] = max(0, rolecounts["amnesiac"][1] - 1)
-                elif pr == "wolf":
-                    # This could potentially be caused by a cub, not necessarily amnesiac/clone
-                    # as such we use a different equiv_set to reflect this
-                    maybe_cub = True
-                    num_realwolves = sum([rolecounts[r][1] for r in var.WOLF_ROLES if r != "wolf cub"])
-                    if rolecounts["wolf cub"][1] == 0 or num_realwolves > 0:
-                        maybe_cub = False
-
-                    if (var.HIDDEN_AMNESIAC or rolecounts["amnesiac"][1] == 0) and (var.HIDDEN_CLONE or rolecounts["clone"][1] == 0):
-                        # guaranteed to be cub
-                        equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-                        rolecounts["wolf cub"][0] = max(0, rolecounts["wolf cub"][0] - 1)
-                        rolecounts["wolf cub"][1] = max(0, rolecounts["wolf cub"][1] - 1)
-                    elif (var.HIDDEN_CLONE or rolecounts["clone"][1] == 0) and not maybe_cub:
-                        # guaranteed to be amnesiac
-                        equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
-                        equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-                        rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
-                        rolecounts["amnesiac"][1] = max(0, rolecounts["amnesiac"][1] - 1)
-                    elif (var.HIDDEN_AMNESIAC or rolecounts["amnesiac"][1] == 0) and not maybe_cub:
-                        # guaranteed to be clone
-                        equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
-                        equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-                        rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
-                        rolecounts["clone"][1] = max(0, rolecounts["clone"][1] - 1)
-                    else:
-                        # could be anything, how exciting!
-                        if maybe_cub:
-                            maxcount = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-                        else:
-                            maxcount = max(0, equiv_sets["amnesiac_clone"] - 1)
-
-                        rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
-                        if rolecounts["amnesiac"][1] > maxcount:
-                            rolecounts["amnesiac"][1] = maxcount
-
-                        rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
-                        if rolecounts["clone"][1] > maxcount:
-                            rolecounts["clone"][1] = maxcount
-
-                        if maybe_cub:
-                            rolecounts["wolf cub"][0] = max(0, rolecounts["wolf cub"][0] - 1)
-                            if rolecounts["wolf cub"][1] > maxcount:
-                                rolecounts["wolf cub"][1] = maxcount
-
-                        if maybe_cub:
-                            equiv_sets["amnesiac_clone_cub"] = maxcount
-                            equiv_sets["amnesiac_clone"] = min(equiv_sets["amnesiac_clone"], maxcount)
-                        else:
-                            equiv_sets["amnesiac_clone"] = maxcount
-                            equiv_sets["amnesiac_clone_cub"] = max(maxcount, equiv_sets["amnesiac_clone_cub"] - 1)
-
-                elif not var.HIDDEN_AMNESIAC and (var.HIDDEN_CLONE or rolecounts["clone"][1] == 0):
-                    # guaranteed to be amnesiac overkilling as clone reports as clone
-                    equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
-                    equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-                    rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
-                    rolecounts["amnesiac"][1] = max(0, rolecounts["amnesiac"][1] - 1)
-                elif not var.HIDDEN_CLONE and (var.HIDDEN_AMNESIAC or rolecounts["amnesiac"][1] == 0):
-                    # guaranteed to be clone overkilling as amnesiac reports as amnesiac
-                    equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
-                    equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
-                    rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
-                    rolecounts["clone"][1] = max(0, rolecounts["clone"][1] - 1)
-                else:
-                    # could be either
-                    maxcount = max(0, equiv_sets["amnesiac_clone"] - 1)
-
-                    rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
-                    if rolecounts["amnesiac"][1] > maxcount:
-                        rolecounts["amnesiac"][1] = maxcount
-
-                    rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
-                    if rolecounts["clone"][1] > maxcount:
-                        rolecounts["clone"][1] = maxcount
-
-                    equiv_sets["amnesiac_clone"] = maxcount
-                    equiv_sets["amnesiac_clone_cub"] = max(maxcount, equiv_sets["amnesiac_clone_cub"] - 1)
-        # Step 5. Handle cub growing up. Bot does not send out a message for this, so we need
-        # to puzzle it out ourselves. If there are no amnesiacs or clones
-        # then we can deterministically figure out cubs growing up. Otherwise we don't know for
-        # sure whether or not they grew up.
-        num_realwolves = sum([rolecounts[r][1] for r in var.WOLF_ROLES if r != "wolf cub"])
-        if num_realwolves == 0:
-            # no wolves means cubs may have turned, set the min cub and max wolf appropriately
-            rolecounts["wolf"][1] += rolecounts["wolf cub"][1]
-            if rolecounts["amnesiac"][1] == 0 and rolecounts["clone"][1] == 0:
-                # we know for sure they grew up
-                rolecounts["wolf"][0] += rolecounts["wolf cub"][0]
-                rolecounts["wolf cub"][1] = 0
-            rolecounts["wolf cub"][0] = 0
+        rolecounts = var.ROLE_DEDUCTION.get_counts()
+        start_roles = var.ROLE_DEDUCTION.start_roles
         # Finally, combine all of our rolecounts into a message, with the default role last
         order = [r for r in role_order() if r in rolecounts]
         if var.DEFAULT_ROLE in order:
@@ -1698,12 +1479,10 @@ def stats(cli, nick, chan, rest):
         message.append("\u0002{0}\u0002 {1}".format(neutral if neutral else "\u0002no\u0002", "neutral player" if neutral == 1 else "neutral players"))
         vb = "is" if wolfteam == 1 else "are"
 
-    stats_mssg =  "{0}It is currently {4}. There {3} {1}, and {2}.".format(_nick,
-                                                        ", ".join(message[0:-1]),
-                                                        message[-1],
-                                                        vb,
-                                                        var.PHASE)
-    reply(cli, nick, chan, stats_mssg)
+    return "It is currently {3}. There {2} {0}, and {1}.".format(", ".join(message[0:-1]),
+                                                                 message[-1],
+                                                                 vb,
+                                                                 var.PHASE)
 
 @handle_error
 def hurry_up(cli, gameid, change):
@@ -1712,7 +1491,7 @@ def hurry_up(cli, gameid, change):
         if gameid != var.DAY_ID:
             return
 
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
 
     if not change:
         cli.msg(chan, messages["daylight_warning"])
@@ -1790,7 +1569,7 @@ def chk_decision(cli, force=""):
             return
         # Even if the lynch fails, we want to go to night phase if we are forcing a lynch (day timeout)
         do_night_transision = True if force else False
-        chan = botconfig.CHANNEL
+        chan = channels.Main.name
         pl = set(list_players()) - (var.WOUNDED | var.CONSECRATING)
         evt = Event("get_voters", {"voters": pl})
         evt.dispatch(cli, var)
@@ -1819,11 +1598,11 @@ def chk_decision(cli, force=""):
             if botconfig.NICK in votelist:
                 if len(votelist[botconfig.NICK]) == avail:
                     if gm == "default":
-                        cli.msg(botconfig.CHANNEL, messages["villagergame_nope"])
+                        cli.msg(channels.Main.name, messages["villagergame_nope"])
                         stop_game(cli, "wolves")
                         return
                     else:
-                        cli.msg(botconfig.CHANNEL, messages["villagergame_win"])
+                        cli.msg(channels.Main.name, messages["villagergame_win"])
                         stop_game(cli, "villagers")
                         return
                 else:
@@ -1834,7 +1613,7 @@ def chk_decision(cli, force=""):
         if len(not_lynching) >= math.ceil(avail / 2):
             abs_evt = Event("chk_decision_abstain", {}, votelist=votelist, numvotes=numvotes)
             abs_evt.dispatch(cli, var, not_lynching)
-            cli.msg(botconfig.CHANNEL, messages["village_abstain"])
+            cli.msg(channels.Main.name, messages["village_abstain"])
             var.ABSTAINED = True
             event.data["transition_night"](cli)
             return
@@ -1860,7 +1639,7 @@ def chk_decision(cli, force=""):
                         # point: games with role reveal turned off will still call out fool
                         # games with team reveal will be inconsistent, but this is by design, not a bug
                         lmsg = random.choice(messages["lynch_reveal"]).format(votee, "", get_role(votee))
-                        cli.msg(botconfig.CHANNEL, lmsg)
+                        cli.msg(channels.Main.name, lmsg)
                         if chk_win(cli, winner="@" + votee):
                             return
                     deadlist.append(votee)
@@ -1874,7 +1653,7 @@ def chk_decision(cli, force=""):
                         lmsg = random.choice(messages["lynch_reveal"]).format(votee, an, rrole)
                     else:
                         lmsg = random.choice(messages["lynch_no_reveal"]).format(votee)
-                    cli.msg(botconfig.CHANNEL, lmsg)
+                    cli.msg(channels.Main.name, lmsg)
                     if not del_player(cli, votee, True, killer_role="villager", deadlist=deadlist, original=votee):
                         return
                 do_night_transision = True
@@ -1882,35 +1661,13 @@ def chk_decision(cli, force=""):
         if do_night_transision:
             event.data["transition_night"](cli)
 
-@cmd("votes", pm=True, phases=("join", "day", "night"))
+@cmd("votes", pm=True, phases=("join", "day", "night"), readonly=True)
 def show_votes(cli, nick, chan, rest):
     """Displays the voting statistics."""
 
     pl = list_players()
     if var.PHASE == "join":
-        #get gamemode votes in a dict (key = mode, value = number of votes)
-        gamemode_votes = {}
-        for vote in var.GAMEMODE_VOTES.values():
-            gamemode_votes[vote] = gamemode_votes.get(vote, 0) + 1
-
-        votelist = []
-        majority = False
-        for gamemode,num_votes in sorted(gamemode_votes.items(), key=lambda x: x[1], reverse=True):
-            #bold the game mode if: we have the right number of players, another game mode doesn't already have the majority, and this gamemode can be picked randomly or has the majority
-            if (len(pl) >= var.GAME_MODES[gamemode][1] and len(pl) <= var.GAME_MODES[gamemode][2] and
-               (not majority or num_votes >= len(pl)/2) and (var.GAME_MODES[gamemode][3] > 0 or num_votes >= len(pl)/2)):
-                votelist.append("\u0002{0}\u0002: {1}".format(gamemode, num_votes))
-                if num_votes >= len(pl)/2:
-                    majority = True
-            else:
-                votelist.append("{0}: {1}".format(gamemode, num_votes))
-        the_message = ", ".join(votelist)
-        if len(pl) >= var.MIN_PLAYERS:
-            the_message += messages["majority_votes"].format("; " if votelist else "", int(math.ceil(len(pl)/2)))
-
-        with var.WARNING_LOCK:
-            if var.START_VOTES:
-                the_message += messages["start_votes"].format(len(var.START_VOTES), ', '.join(var.START_VOTES))
+        the_message = responses.get("votes", "join", _gamemode_votes_message, pl)
 
     elif var.PHASE == "night":
         cli.notice(nick, messages["voting_daytime_only"])
@@ -1929,40 +1686,73 @@ def show_votes(cli, nick, chan, rest):
         if chan != nick and nick in pl:
             var.LAST_VOTES = datetime.now()
 
-        if not var.VOTES.values():
+        votelist, num_players, votesneeded, avail, not_voting = responses.get("votes", "day", _lynch_votes_info, cli)
+
+        if not votelist:
             msg = _nick + messages["no_votes"]
 
             if nick in pl:
                 var.LAST_VOTES = None  # reset
         else:
-            votelist = ["{0}: {1} ({2})".format(votee,
-                                             len(var.VOTES[votee]),
-                                             " ".join(var.VOTES[votee]))
-                        for votee in var.VOTES.keys()]
-            msg = "{0}{1}".format(_nick, ", ".join(votelist))
+            msg = "{0}{1}".format(_nick, votelist)
 
         reply(cli, nick, chan, msg)
 
-        pl = set(list_players()) - (var.WOUNDED | var.CONSECRATING)
-        evt = Event("get_voters", {"voters": pl})
-        evt.dispatch(cli, var)
-        pl = evt.data["voters"]
-
-        avail = len(pl)
-        votesneeded = avail // 2 + 1
-        not_voting = len(var.NO_LYNCH)
         if not_voting == 1:
             plural = " has"
         else:
             plural = "s have"
-        the_message = messages["vote_stats"].format(_nick, len(list_players()), votesneeded, avail)
+        the_message = messages["vote_stats"].format(_nick, num_players, votesneeded, avail)
         if var.ABSTAIN_ENABLED:
             the_message += messages["vote_stats_abstain"].format(not_voting, plural)
 
     reply(cli, nick, chan, the_message)
 
+def _gamemode_votes_message(pl):
+    #get gamemode votes in a dict (key = mode, value = number of votes)
+    gamemode_votes = {}
+    for vote in var.GAMEMODE_VOTES.values():
+        gamemode_votes[vote] = gamemode_votes.get(vote, 0) + 1
+
+    votelist = []
+    majority = False
+    for gamemode,num_votes in sorted(gamemode_votes.items(), key=lambda x: x[1], reverse=True):
+        #bold the game mode if: we have the right number of players, another game mode doesn't already have the majority, and this gamemode can be picked randomly or has the majority
+        if (len(pl) >= var.GAME_MODES[gamemode][1] and len(pl) <= var.GAME_MODES[gamemode][2] and
+           (not majority or num_votes >= len(pl)/2) and (var.GAME_MODES[gamemode][3] > 0 or num_votes >= len(pl)/2)):
+            votelist.append("\u0002{0}\u0002: {1}".format(gamemode, num_votes))
+            if num_votes >= len(pl)/2:
+                majority = True
+        else:
+            votelist.append("{0}: {1}".format(gamemode, num_votes))
+    the_message = ", ".join(votelist)
+    if len(pl) >= var.MIN_PLAYERS:
+        the_message += messages["majority_votes"].format("; " if votelist else "", int(math.ceil(len(pl)/2)))
+
+    with var.WARNING_LOCK:
+        if var.START_VOTES:
+            the_message += messages["start_votes"].format(len(var.START_VOTES), ', '.join(var.START_VOTES))
+
+    return the_message
+
+def _lynch_votes_info(cli):
+    votelist = ", ".join("{0}: {1} ({2})".format(votee,
+                                                 len(var.VOTES[votee]),
+                                                 " ".join(var.VOTES[votee]))
+                         for votee in var.VOTES.keys())
+
+    pl = set(list_players()) - (var.WOUNDED | var.CONSECRATING)
+    evt = Event("get_voters", {"voters": pl})
+    evt.dispatch(cli, var)
+    pl = evt.data["voters"]
+
+    avail = len(pl)
+    votesneeded = avail // 2 + 1
+    return votelist, len(list_players()), votesneeded, avail, len(var.NO_LYNCH)
+
 def stop_game(cli, winner="", abort=False, additional_winners=None, log=True):
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
+    db.set_game_state(None) # the game is over, so there's nothing left to resume
     if abort:
         cli.msg(chan, messages["role_attribution_failed"])
     if var.DAY_START_TIME:
@@ -2248,7 +2038,7 @@ def stop_game(cli, winner="", abort=False, additional_winners=None, log=True):
 @proxy.impl
 def chk_win(cli, end_game=True, winner=None):
     """ Returns True if someone won """
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
     lpl = len(list_players())
 
     if var.PHASE == "join":
@@ -2274,7 +2064,7 @@ def chk_win(cli, end_game=True, winner=None):
 
 def chk_win_conditions(cli, rolemap, end_game=True, winner=None):
     """Internal handler for the chk_win function."""
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
     with var.GRAVEYARD_LOCK:
         if var.PHASE == "day":
             pl = set(list_players()) - (var.WOUNDED | var.CONSECRATING)
@@ -2476,7 +2266,7 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
                             message = messages["lover_suicide"].format(other, an, role)
                         else:
                             message = messages["lover_suicide_no_reveal"].format(other)
-                        cli.msg(botconfig.CHANNEL, message)
+                        cli.msg(channels.Main.name, message)
                         debuglog("{0} ({1}) LOVE SUICIDE: {2} ({3})".format(other, get_role(other), nick, nickrole))
                         del_player(cli, other, True, end_game = False, killer_role = killer_role, deadlist = deadlist, original = original, ismain = False)
                         pl = refresh_pl(pl)
@@ -2510,7 +2300,7 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
                                     message = messages["assassin_success"].format(nick, target, an, role)
                                 else:
                                     message = messages["assassin_success_no_reveal"].format(nick, target)
-                                cli.msg(botconfig.CHANNEL, message)
+                                cli.msg(channels.Main.name, message)
                                 debuglog("{0} ({1}) ASSASSINATE: {2} ({3})".format(nick, nickrole, target, get_role(target)))
                                 del_player(cli, target, True, end_game = False, killer_role = nickrole, deadlist = deadlist, original = original, ismain = False)
                                 pl = refresh_pl(pl)
@@ -2533,32 +2323,32 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
                     var.SHORT_DAY_WARN = var.TIME_LORD_DAY_WARN
                     var.NIGHT_TIME_LIMIT = var.TIME_LORD_NIGHT_LIMIT
                     var.NIGHT_TIME_WARN = var.TIME_LORD_NIGHT_WARN
-                    cli.msg(botconfig.CHANNEL, messages["time_lord_dead"].format(var.TIME_LORD_DAY_LIMIT, var.TIME_LORD_NIGHT_LIMIT))
+                    cli.msg(channels.Main.name, messages["time_lord_dead"].format(var.TIME_LORD_DAY_LIMIT, var.TIME_LORD_NIGHT_LIMIT))
                     if var.GAMEPHASE == "day" and timeleft_internal("day") > var.DAY_TIME_LIMIT and var.DAY_TIME_LIMIT > 0:
                         if "day" in var.TIMERS:
                             var.TIMERS["day"][0].cancel()
-                        t = threading.Timer(var.DAY_TIME_LIMIT, hurry_up, [cli, var.DAY_ID, True])
+                        t = metrics.Timer(var.DAY_TIME_LIMIT, hurry_up, [cli, var.DAY_ID, True])
                         var.TIMERS["day"] = (t, time.time(), var.DAY_TIME_LIMIT)
                         t.daemon = True
                         t.start()
                         # Don't duplicate warnings, e.g. only set the warn timer if a warning was not already given
-                        if "day_warn" in var.TIMERS and var.TIMERS["day_warn"][0].isAlive():
+                        if "day_warn" in var.TIMERS and var.TIMERS["day_warn"][0].is_alive():
                             var.TIMERS["day_warn"][0].cancel()
-                            t = threading.Timer(var.DAY_TIME_WARN, hurry_up, [cli, var.DAY_ID, False])
+                            t = metrics.Timer(var.DAY_TIME_WARN, hurry_up, [cli, var.DAY_ID, False])
                             var.TIMERS["day_warn"] = (t, time.time(), var.DAY_TIME_WARN)
                             t.daemon = True
                             t.start()
                     elif var.GAMEPHASE == "night" and timeleft_internal("night") > var.NIGHT_TIME_LIMIT and var.NIGHT_TIME_LIMIT > 0:
                         if "night" in var.TIMERS:
                             var.TIMERS["night"][0].cancel()
-                        t = threading.Timer(var.NIGHT_TIME_LIMIT, hurry_up, [cli, var.NIGHT_ID, True])
+                        t = metrics.Timer(var.NIGHT_TIME_LIMIT, hurry_up, [cli, var.NIGHT_ID, True])
                         var.TIMERS["night"] = (t, time.time(), var.NIGHT_TIME_LIMIT)
                         t.daemon = True
                         t.start()
                         # Don't duplicate warnings, e.g. only set the warn timer if a warning was not already given
-                        if "night_warn" in var.TIMERS and var.TIMERS["night_warn"][0].isAlive():
+                        if "night_warn" in var.TIMERS and var.TIMERS["night_warn"][0].is_alive():
                             var.TIMERS["night_warn"][0].cancel()
-                            t = threading.Timer(var.NIGHT_TIME_WARN, hurry_up, [cli, var.NIGHT_ID, False])
+                            t = metrics.Timer(var.NIGHT_TIME_WARN, hurry_up, [cli, var.NIGHT_ID, False])
                             var.TIMERS["night_warn"] = (t, time.time(), var.NIGHT_TIME_WARN)
                             t.daemon = True
                             t.start()
@@ -2608,7 +2398,7 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
                                 tmsg = messages["mad_scientist_kill"].format(nick, target1, an1, r1, target2, an2, r2)
                             else:
                                 tmsg = messages["mad_scientist_kill_no_reveal"].format(nick, target1, target2)
-                            cli.msg(botconfig.CHANNEL, tmsg)
+                            cli.msg(channels.Main.name, tmsg)
                             debuglog(nick, "(mad scientist) KILL: {0} ({1}) - {2} ({3})".format(target1, get_role(target1.nick), target2, get_role(target2.nick)))
                             deadlist1 = copy.copy(deadlist)
                             deadlist1.append(target2)
@@ -2624,7 +2414,7 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
                                 tmsg = messages["mad_scientist_kill_single"].format(nick, target1, an1, r1)
                             else:
                                 tmsg = messages["mad_scientist_kill_single_no_reveal"].format(nick, target1)
-                            cli.msg(botconfig.CHANNEL, tmsg)
+                            cli.msg(channels.Main.name, tmsg)
                             debuglog(nick, "(mad scientist) KILL: {0} ({1})".format(target1, get_role(target1.nick)))
                             del_player(cli, target1.nick, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
                             pl = refresh_pl(pl)
@@ -2636,13 +2426,13 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
                                 tmsg = messages["mad_scientist_kill_single"].format(nick, target2, an2, r2)
                             else:
                                 tmsg = messages["mad_scientist_kill_single_no_reveal"].format(nick, target2)
-                            cli.msg(botconfig.CHANNEL, tmsg)
+                            cli.msg(channels.Main.name, tmsg)
                             debuglog(nick, "(mad scientist) KILL: {0} ({1})".format(target2, get_role(target2.nick)))
                             del_player(cli, target2.nick, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
                             pl = refresh_pl(pl)
                         else:
                             tmsg = messages["mad_scientist_fail"].format(nick)
-                            cli.msg(botconfig.CHANNEL, tmsg)
+                            cli.msg(channels.Main.name, tmsg)
                             debuglog(nick, "(mad scientist) KILL FAIL")
 
             pl = refresh_pl(pl)
@@ -2687,6 +2477,11 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
                             newstats.add(frozenset(d.items()))
             var.ROLE_STATS = frozenset(newstats)
 
+            responses.invalidate()
+            # account for the death in the default !stats deduction now, rather than on demand
+            if var.PHASE in var.GAME_PHASES:
+                var.ROLE_DEDUCTION.died(nick)
+
             if devoice and (var.PHASE != "night" or not var.DEVOICE_DURING_NIGHT):
                 cmode.append(("-v", nick))
             if users.exists(nick):
@@ -2765,15 +2560,19 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
 
 @handle_error
 def reaper(cli, gameid):
-    # check to see if idlers need to be killed.
+    # check to see if idlers need to be killed, every 10 seconds until the game ends
     var.IDLE_WARNED    = set()
     var.IDLE_WARNED_PM = set()
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
 
     last_day_id = var.DAY_COUNT
     num_night_iters = 0
 
-    while gameid == var.GAME_ID:
+    @handle_error
+    def reap():
+        nonlocal last_day_id, num_night_iters
+        if gameid != var.GAME_ID:
+            return
         skip = False
         with var.GRAVEYARD_LOCK:
             # Terminate reaper when game ends
@@ -2872,13 +2671,20 @@ def reaper(cli, gameid):
                         add_warning(cli, dcedplayer, var.ACC_PENALTY, botconfig.NICK, messages["acc_warning"], expires=var.ACC_EXPIRY)
                     if not del_player(cli, dcedplayer, devoice = False, death_triggers = False):
                         return
-        time.sleep(10)
+        schedule(10)
+
+    def schedule(delay):
+        t = metrics.Timer(delay, reap)
+        t.daemon = True
+        t.start()
+
+    schedule(0)
 
 
 
-@cmd("")  # update last said
+@cmd("", readonly=True)  # update last said
 def update_last_said(cli, nick, chan, rest):
-    if chan != botconfig.CHANNEL:
+    if chan != channels.Main.name:
         return
 
     if var.PHASE not in ("join", "none"):
@@ -2918,15 +2724,15 @@ def on_join(cli, raw_nick, chan, acc="*", rname=""):
     if nick == botconfig.NICK:
         plog("Joined {0}".format(chan))
     elif not users.exists(nick):
-        users.add(nick, ident=ident,host=host,account=acc,inchan=(chan == botconfig.CHANNEL),modes=set(),moded=set())
+        users.add(nick, ident=ident,host=host,account=acc,inchan=(chan == channels.Main.name),modes=set(),moded=set())
     else:
         users.get(nick).ident = ident
         users.get(nick).host = host
         users.get(nick).account = acc
         if not users.get(nick).inchan:
             # Will be True if the user joined the main channel, else False
-            users.get(nick).inchan = (chan == botconfig.CHANNEL)
-    if chan != botconfig.CHANNEL:
+            users.get(nick).inchan = (chan == channels.Main.name)
+    if chan != channels.Main.name:
         return
     with var.GRAVEYARD_LOCK:
         hostmask = irc_lower(ident) + "@" + host.lower()
@@ -2936,7 +2742,7 @@ def on_join(cli, raw_nick, chan, acc="*", rname=""):
             act = var.DISCONNECTED[nick][0]
             if (lacc == act and not var.DISABLE_ACCOUNTS) or (hostmask == hm and not var.ACCOUNTS_ONLY):
                 if not var.DEVOICE_DURING_NIGHT or var.PHASE != "night":
-                    cli.mode(chan, "+v", nick, nick+"!*@*")
+                    channels.Main.set_modes(("+v", nick))
                 del var.DISCONNECTED[nick]
                 var.LAST_SAID_TIME[nick] = datetime.now()
                 cli.msg(chan, messages["player_return"].format(nick))
@@ -2951,7 +2757,7 @@ def on_join(cli, raw_nick, chan, acc="*", rname=""):
         #var.OPPED = False
         cli.send("NAMES " + chan)
     #if nick == var.CHANSERV and not var.OPPED and var.CHANSERV_OP_COMMAND:
-    #    cli.msg(var.CHANSERV, var.CHANSERV_OP_COMMAND.format(channel=botconfig.CHANNEL))
+    #    cli.msg(var.CHANSERV, var.CHANSERV_OP_COMMAND.format(channel=channels.Main.name))
 
 #@hook("namreply")
 #def on_names(cli, _, __, *names):
@@ -3012,7 +2818,7 @@ def return_to_village(var, chan, target, *, show_message):
                     var.PLAYERS[temp.nick] = var.DCED_PLAYERS.pop(temp.nick)
 
                 if show_message:
-                    channels.Main.mode(("+" + hooks.Features["PREFIX"]["+"], target))
+                    channels.Main.set_modes(("+" + hooks.Features["PREFIX"]["+"], target))
                     channels.Main.send(messages["player_return"].format(target))
 
 def rename_player(var, user, prefix):
@@ -3110,6 +2916,7 @@ def rename_player(var, user, prefix):
                 if b == prefix:
                     b = nick
                 var.EXCHANGED_ROLES[idx] = (a, b)
+            var.ROLE_DEDUCTION.renamed(prefix, nick)
             for setvar in (var.HEXED, var.SILENCED, var.MATCHMAKERS, var.PASSED,
                            var.JESTERS, var.AMNESIACS, var.LYCANTHROPES, var.LUCKY, var.DISEASED,
                            var.MISDIRECTED, var.EXCHANGED, var.IMMUNIZED, var.CURED_LYCANS,
@@ -3168,7 +2975,7 @@ def account_change(evt, var, user):
         if var.PHASE == "join":
             user.send(messages["account_midgame_change"], notice=True)
         else:
-            channels.Main.mode(["-" + voice, user.nick])
+            channels.Main.set_modes(["-" + voice, user.nick])
             user.send(messages["account_reidentify"].format(user.account), notice=True)
 
     if user.nick in var.DISCONNECTED: # FIXME: need to change this when var.DISCONNECTED holds User instances
@@ -3176,7 +2983,7 @@ def account_change(evt, var, user):
         if users.equals(user.account, account):
             with var.GRAVEYARD_LOCK:
                 if not var.DISABLE_ACCOUNTS or not var.ACCOUNTS_ONLY and user.match_hostmask(hostmask):
-                    channels.Main.mode(["+" + voice, user.nick])
+                    channels.Main.set_modes(["+" + voice, user.nick])
                     del var.DISCONNECTED[user.nick]
                     var.LAST_SAID[user.nick] = datetime.now() # FIXME: need updating when var.LAST_SAID holds User instances
                     channels.Main.send(messages["player_return"].format(user))
@@ -3195,7 +3002,7 @@ def nick_change(evt, var, user, old_rawnick):
 
     if user.nick not in var.DISCONNECTED and nick in list_players() and re.search(var.GUEST_NICK_PATTERN, user.nick): # FIXME: Fix this once var.DISCONNECTED and list_players() hold User instances
         if var.PHASE != "join":
-            channels.Main.mode(["-" + hooks.Features["PREFIX"]["+"], user.nick])
+            channels.Main.set_modes(["-" + hooks.Features["PREFIX"]["+"], user.nick])
         temp = users.FakeUser(None, nick, user.ident, user.host, user.realname, user.account)
         leave(var, "badnick", temp) # pass in a fake user with the old nick (since the user holds the new nick)
         return # Don't do anything else; they're using a guest/away nick
@@ -3210,6 +3017,14 @@ def nick_change(evt, var, user, old_rawnick):
 def cleanup_user(evt, var, user):
     var.LAST_GOAT.pop(user, None)
 
+@event_listener("exchange_roles", priority=1)
+def exchange_deduction(evt, cli, var, actor, nick, actor_role, nick_role):
+    var.ROLE_DEDUCTION.exchanged(actor, nick)
+
+@event_listener("traitor_turn")
+def traitor_turn_deduction(evt, var):
+    var.ROLE_DEDUCTION.traitors_turned()
+
 @event_listener("nick_change")
 def update_users(evt, var, user, old_rawnick): # FIXME: This is a temporary hack while var.USERS still exists
     nick = users.parse_rawnick_as_dict(old_rawnick)["nick"]
@@ -3281,7 +3096,7 @@ def leave(var, what, user, why=None):
     if reason in grace_times and (grace_times[reason] <= 0 or var.PHASE == "join"):
         msg = messages["{0}_death{1}".format(reason, reveal)]
     elif what != "kick": # There's time for the player to rejoin the game
-        user.send(messages["part_grace_time_notice"].format(botconfig.CHANNEL, var.PART_GRACE_TIME))
+        user.send(messages["part_grace_time_notice"].format(channels.Main.name, var.PART_GRACE_TIME))
         msg = messages["player_missing"]
         population = ""
         killplayer = False
@@ -3304,7 +3119,7 @@ def leave(var, what, user, why=None):
 @cmd("quit", "leave", pm=True, phases=("join", "day", "night"))
 def leave_game(cli, nick, chan, rest):
     """Quits the game."""
-    if chan == botconfig.CHANNEL:
+    if chan == channels.Main.name:
         if nick not in list_players():
             return
         if var.PHASE == "join":
@@ -3330,16 +3145,16 @@ def leave_game(cli, nick, chan, rest):
         an = "n" if role.startswith(("a", "e", "i", "o", "u")) else ""
         if var.DYNQUIT_DURING_GAME:
             lmsg = random.choice(messages["quit"]).format(nick, an, role)
-            cli.msg(botconfig.CHANNEL, lmsg)
+            cli.msg(channels.Main.name, lmsg)
         else:
-            cli.msg(botconfig.CHANNEL, (messages["static_quit"] + "{2}").format(nick, role, population))
+            cli.msg(channels.Main.name, (messages["static_quit"] + "{2}").format(nick, role, population))
     else:
         # DYNQUIT_DURING_GAME should not have any effect during the join phase, so only check if we aren't in that
         if var.PHASE != "join" and not var.DYNQUIT_DURING_GAME:
-            cli.msg(botconfig.CHANNEL, (messages["static_quit_no_reveal"] + "{1}").format(nick, population))
+            cli.msg(channels.Main.name, (messages["static_quit_no_reveal"] + "{1}").format(nick, population))
         else:
             lmsg = random.choice(messages["quit_no_reveal"]).format(nick) + population
-            cli.msg(botconfig.CHANNEL, lmsg)
+            cli.msg(channels.Main.name, lmsg)
     if var.PHASE != "join":
         for r, rset in var.ORIGINAL_ROLES.items():
             if nick in rset:
@@ -3353,7 +3168,7 @@ def leave_game(cli, nick, chan, rest):
     del_player(cli, nick, death_triggers = False)
 
 def begin_day(cli):
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
 
     # Reset nighttime variables
     var.GAMEPHASE = "day"
@@ -3376,10 +3191,10 @@ def begin_day(cli):
     var.DAY_ID = time.time()
     if var.DAY_TIME_WARN > 0:
         if var.STARTED_DAY_PLAYERS <= var.SHORT_DAY_PLAYERS:
-            t1 = threading.Timer(var.SHORT_DAY_WARN, hurry_up, [cli, var.DAY_ID, False])
+            t1 = metrics.Timer(var.SHORT_DAY_WARN, hurry_up, [cli, var.DAY_ID, False])
             l = var.SHORT_DAY_WARN
         else:
-            t1 = threading.Timer(var.DAY_TIME_WARN, hurry_up, [cli, var.DAY_ID, False])
+            t1 = metrics.Timer(var.DAY_TIME_WARN, hurry_up, [cli, var.DAY_ID, False])
             l = var.DAY_TIME_WARN
         var.TIMERS["day_warn"] = (t1, var.DAY_ID, l)
         t1.daemon = True
@@ -3387,10 +3202,10 @@ def begin_day(cli):
 
     if var.DAY_TIME_LIMIT > 0:  # Time limit enabled
         if var.STARTED_DAY_PLAYERS <= var.SHORT_DAY_PLAYERS:
-            t2 = threading.Timer(var.SHORT_DAY_LIMIT, hurry_up, [cli, var.DAY_ID, True])
+            t2 = metrics.Timer(var.SHORT_DAY_LIMIT, hurry_up, [cli, var.DAY_ID, True])
             l = var.SHORT_DAY_LIMIT
         else:
-            t2 = threading.Timer(var.DAY_TIME_LIMIT, hurry_up, [cli, var.DAY_ID, True])
+            t2 = metrics.Timer(var.DAY_TIME_LIMIT, hurry_up, [cli, var.DAY_ID, True])
             l = var.DAY_TIME_LIMIT
         var.TIMERS["day"] = (t2, var.DAY_ID, l)
         t2.daemon = True
@@ -3404,6 +3219,7 @@ def begin_day(cli):
 
     event = Event("begin_day", {})
     event.dispatch(cli, var)
+    save_game_state()
     # induce a lynch if we need to (due to lots of pacifism/impatience totems or whatever)
     chk_decision(cli)
 
@@ -3415,7 +3231,7 @@ def night_warn(cli, gameid):
     if var.PHASE != "night":
         return
 
-    cli.msg(botconfig.CHANNEL, (messages["twilight_warning"]))
+    cli.msg(channels.Main.name, (messages["twilight_warning"]))
 
 @handle_error
 def transition_day(cli, gameid=0):
@@ -3428,12 +3244,13 @@ def transition_day(cli, gameid=0):
         return
 
     var.PHASE = "day"
+    responses.invalidate()
     var.DAY_COUNT += 1
     var.FIRST_DAY = (var.DAY_COUNT == 1)
     var.DAY_START_TIME = datetime.now()
     var.VOTES = {}
 
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
 
     event_begin = Event("transition_day_begin", {})
     event_begin.dispatch(cli, var)
@@ -3695,6 +3512,7 @@ def transition_day(cli, gameid=0):
     if new_wolf:
         message.append(messages["new_wolf"])
         var.EXTRA_WOLVES += 1
+        var.ROLE_DEDUCTION.wolf_added()
         novictmsg = False
 
     revt = Event("transition_day_resolve", {
@@ -3722,6 +3540,7 @@ def transition_day(cli, gameid=0):
             if vrole not in var.WOLFCHAT_ROLES:
                 revt.data["message"].append(messages["new_wolf"])
                 var.EXTRA_WOLVES += 1
+                var.ROLE_DEDUCTION.wolf_added()
                 pm(cli, victim, messages["lycan_turn"])
                 var.LYCAN_ROLES[victim] = vrole
                 var.ROLES[vrole].remove(victim)
@@ -3974,7 +3793,7 @@ def chk_nightdone(cli):
 @cmd("nolynch", "nl", "novote", "nv", "abstain", "abs", playing=True, phases=("day",))
 def no_lynch(cli, nick, chan, rest):
     """Allows you to abstain from voting for the day."""
-    if chan == botconfig.CHANNEL:
+    if chan == channels.Main.name:
         evt = Event("abstain", {})
         if not var.ABSTAIN_ENABLED:
             cli.notice(nick, messages["command_disabled"])
@@ -4011,7 +3830,7 @@ def lynch(cli, nick, chan, rest):
     if not rest:
         show_votes.caller(cli, nick, chan, rest)
         return
-    if chan != botconfig.CHANNEL:
+    if chan != channels.Main.name:
         return
 
     rest = re.split(" +",rest)[0].strip()
@@ -4298,14 +4117,14 @@ def check_exchange(cli, actor, nick):
 def retract(cli, nick, chan, rest):
     """Takes back your vote during the day (for whom to lynch)."""
 
-    if chan != botconfig.CHANNEL:
+    if chan != channels.Main.name:
         return
     if nick not in list_players() or nick in var.DISCONNECTED.keys():
         return
 
     with var.GRAVEYARD_LOCK, var.WARNING_LOCK:
         if var.PHASE == "join":
-            if chan == botconfig.CHANNEL:
+            if chan == channels.Main.name:
                 if not nick in var.START_VOTES:
                     cli.notice(nick, messages["start_novote"])
                 else:
@@ -5069,7 +4888,7 @@ def on_targeted_command(evt, cli, var, cmd, actor, orig_target, tags):
         evt.stop_processing = True
         evt.prevent_default = True
 
-@hook("featurelist")  # For multiple targets with PRIVMSG
+@hook("featurelist", readonly=True)  # For multiple targets with PRIVMSG
 def getfeatures(cli, nick, *rest):
     for r in rest:
         if r.startswith("TARGMAX="):
@@ -5136,17 +4955,16 @@ def getfeatures(cli, nick, *rest):
                 errlog("Unsupported case mapping: {0!r}; falling back to rfc1459.".format(var.CASEMAPPING))
                 var.CASEMAPPING = "rfc1459"
 
-@command("", chan=False, pm=True)
+@command("", chan=False, pm=True, readonly=True)
 def relay(var, wrapper, message):
     """Wolfchat and Deadchat"""
     if message.startswith("\u0001PING"):
         wrapper.pm(message, notice=True)
         return
     if message == "\u0001VERSION\u0001":
-        try:
-            ans = subprocess.check_output(["git", "log", "-n", "1", "--pretty=format:%h"])
-            reply = "\u0001VERSION lykos {0}, Python {1} -- https://github.com/lykoss/lykos\u0001".format(str(ans.decode()), platform.python_version())
-        except (OSError, subprocess.CalledProcessError):
+        if _git_revision is not None:
+            reply = "\u0001VERSION lykos {0}, Python {1} -- https://github.com/lykoss/lykos\u0001".format(_git_revision, platform.python_version())
+        else:
             reply = "\u0001VERSION lykos, Python {0} -- https://github.com/lykoss/lykos\u0001".format(platform.python_version())
         wrapper.pm(reply, notice=True)
         return
@@ -5212,6 +5030,7 @@ def transition_night(cli):
     if var.PHASE == "night":
         return
     var.PHASE = "night"
+    responses.invalidate()
     var.GAMEPHASE = "night"
 
     var.NIGHT_START_TIME = datetime.now()
@@ -5255,17 +5074,17 @@ def transition_night(cli):
         min, sec = td.seconds // 60, td.seconds % 60
         daydur_msg = messages["day_lasted"].format(min,sec)
 
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
 
     var.NIGHT_ID = time.time()
     if var.NIGHT_TIME_LIMIT > 0:
-        t = threading.Timer(var.NIGHT_TIME_LIMIT, transition_day, [cli, var.NIGHT_ID])
+        t = metrics.Timer(var.NIGHT_TIME_LIMIT, transition_day, [cli, var.NIGHT_ID])
         var.TIMERS["night"] = (t, var.NIGHT_ID, var.NIGHT_TIME_LIMIT)
         t.daemon = True
         t.start()
 
     if var.NIGHT_TIME_WARN > 0:
-        t2 = threading.Timer(var.NIGHT_TIME_WARN, night_warn, [cli, var.NIGHT_ID])
+        t2 = metrics.Timer(var.NIGHT_TIME_WARN, night_warn, [cli, var.NIGHT_ID])
         var.TIMERS["night_warn"] = (t2, var.NIGHT_ID, var.NIGHT_TIME_WARN)
         t2.daemon = True
         t2.start()
@@ -5308,15 +5127,16 @@ def transition_night(cli):
                 debuglog("{0} REMEMBER: {1} as {2}".format(amn, amnrole, showrole))
 
     if var.FIRST_NIGHT and chk_win(cli, end_game=False): # prevent game from ending as soon as it begins (useful for the random game mode)
-        start(cli, botconfig.NICK, botconfig.CHANNEL, restart=var.CURRENT_GAMEMODE.name)
+        start(cli, botconfig.NICK, channels.Main.name, restart=var.CURRENT_GAMEMODE.name)
         return
 
     # game ended from bitten / amnesiac turning, narcolepsy totem expiring, or other weirdness
     if chk_win(cli):
         return
 
-    # send PMs
-    ps = list_players()
+    # send PMs; these are queued up and sent all at once after transition_night_end
+    notify = Notifier(cli)
+    ps = notify.players
 
     for pht in var.ROLES["prophet"]:
         chance1 = math.floor(var.PROPHET_REVEALED_CHANCE[0] * 100)
@@ -5325,19 +5145,19 @@ def transition_night(cli):
         an2 = "n" if chance2 >= 80 and chance2 < 90 else ""
         if pht in var.PLAYERS and not is_user_simple(pht):
             if chance1 > 0:
-                pm(cli, pht, messages["prophet_notify_both"].format(an1, chance1, an2, chance2))
+                notify.pm(pht, messages["prophet_notify_both"].format(an1, chance1, an2, chance2))
             elif chance2 > 0:
-                pm(cli, pht, messages["prophet_notify_second"].format(an2, chance2))
+                notify.pm(pht, messages["prophet_notify_second"].format(an2, chance2))
             else:
-                pm(cli, pht, messages["prophet_notify_none"])
+                notify.pm(pht, messages["prophet_notify_none"])
         else:
-            pm(cli, pht, messages["prophet_simple"])
+            notify.pm(pht, messages["prophet_simple"])
 
     for drunk in var.ROLES["village drunk"]:
         if drunk in var.PLAYERS and not is_user_simple(drunk):
-            pm(cli, drunk, messages["drunk_notification"])
+            notify.pm(drunk, messages["drunk_notification"])
         else:
-            pm(cli, drunk, messages["drunk_simple"])
+            notify.pm(drunk, messages["drunk_simple"])
 
     for ms in var.ROLES["mad scientist"]:
         pl = ps[:]
@@ -5365,83 +5185,74 @@ def transition_night(cli):
                     target2 = var.ALL_PLAYERS[i]
                     break
         if ms in var.PLAYERS and not is_user_simple(ms):
-            pm(cli, ms, messages["mad_scientist_notify"].format(target1, target2))
+            notify.pm(ms, messages["mad_scientist_notify"].format(target1, target2))
         else:
-            pm(cli, ms, messages["mad_scientist_simple"].format(target1, target2))
+            notify.pm(ms, messages["mad_scientist_simple"].format(target1, target2))
 
     for doctor in var.ROLES["doctor"]:
         if doctor in var.DOCTORS and var.DOCTORS[doctor] > 0: # has immunizations remaining
-            pl = ps[:]
-            random.shuffle(pl)
             if doctor in var.PLAYERS and not is_user_simple(doctor):
-                pm(cli, doctor, messages["doctor_notify"])
+                notify.pm(doctor, messages["doctor_notify"])
             else:
-                pm(cli, doctor, messages["doctor_simple"])
-            pm(cli, doctor, messages["doctor_immunizations"].format(var.DOCTORS[doctor], 's' if var.DOCTORS[doctor] > 1 else ''))
+                notify.pm(doctor, messages["doctor_simple"])
+            notify.pm(doctor, messages["doctor_immunizations"].format(var.DOCTORS[doctor], 's' if var.DOCTORS[doctor] > 1 else ''))
 
     for fool in var.ROLES["fool"]:
         if fool in var.PLAYERS and not is_user_simple(fool):
-            pm(cli, fool, messages["fool_notify"])
+            notify.pm(fool, messages["fool_notify"])
         else:
-            pm(cli, fool, messages["fool_simple"])
+            notify.pm(fool, messages["fool_simple"])
 
     for jester in var.ROLES["jester"]:
         if jester in var.PLAYERS and not is_user_simple(jester):
-            pm(cli, jester, messages["jester_notify"])
+            notify.pm(jester, messages["jester_notify"])
         else:
-            pm(cli, jester, messages["jester_simple"])
+            notify.pm(jester, messages["jester_simple"])
 
     for monster in var.ROLES["monster"]:
         if monster in var.PLAYERS and not is_user_simple(monster):
-            pm(cli, monster, messages["monster_notify"])
+            notify.pm(monster, messages["monster_notify"])
         else:
-            pm(cli, monster, messages["monster_simple"])
+            notify.pm(monster, messages["monster_simple"])
 
     for demoniac in var.ROLES["demoniac"]:
         if demoniac in var.PLAYERS and not is_user_simple(demoniac):
-            pm(cli, demoniac, messages["demoniac_notify"])
+            notify.pm(demoniac, messages["demoniac_notify"])
         else:
-            pm(cli, demoniac, messages["demoniac_simple"])
+            notify.pm(demoniac, messages["demoniac_simple"])
 
 
     for lycan in var.ROLES["lycan"]:
         if lycan in var.PLAYERS and not is_user_simple(lycan):
-            pm(cli, lycan, messages["lycan_notify"])
+            notify.pm(lycan, messages["lycan_notify"])
         else:
-            pm(cli, lycan, messages["lycan_simple"])
+            notify.pm(lycan, messages["lycan_simple"])
 
     for ass in var.ROLES["assassin"]:
         if ass in var.TARGETED and var.TARGETED[ass] != None:
             continue # someone already targeted
-        pl = ps[:]
-        random.shuffle(pl)
-        pl.remove(ass)
-        role = get_role(ass)
+        pl = notify.player_list(ass)
+        role = notify.get_role(ass)
         if role == "village drunk":
             var.TARGETED[ass] = random.choice(pl)
             message = messages["drunken_assassin_notification"].format(var.TARGETED[ass])
             if ass in var.PLAYERS and not is_user_simple(ass):
                 message += messages["assassin_info"]
-            pm(cli, ass, message)
+            notify.pm(ass, message)
         else:
             if ass in var.PLAYERS and not is_user_simple(ass):
-                pm(cli, ass, (messages["assassin_notify"]))
+                notify.pm(ass, (messages["assassin_notify"]))
             else:
-                pm(cli, ass, messages["assassin_simple"])
-            pm(cli, ass, "Players: " + ", ".join(pl))
+                notify.pm(ass, messages["assassin_simple"])
+            notify.pm(ass, "Players: " + ", ".join(pl))
 
     for piper in var.ROLES["piper"]:
-        pl = ps[:]
-        random.shuffle(pl)
-        pl.remove(piper)
-        for charmed in var.CHARMED:
-            if charmed in pl: # corner case: if there are multiple pipers and a piper is charmed, the piper will be in var.CHARMED but not in pl
-                pl.remove(charmed)
+        pl = notify.player_list(piper, *var.CHARMED)
         if piper in var.PLAYERS and not is_user_simple(piper):
-            pm(cli, piper, (messages["piper_notify"]))
+            notify.pm(piper, (messages["piper_notify"]))
         else:
-            pm(cli, piper, messages["piper_simple"])
-        pm(cli, piper, "Players: " + ", ".join(pl))
+            notify.pm(piper, messages["piper_simple"])
+        notify.pm(piper, "Players: " + ", ".join(pl))
 
     for turncoat in var.ROLES["turncoat"]:
         # they start out as unsided, but can change n1
@@ -5454,44 +5265,40 @@ def transition_night(cli):
                 message += messages["turncoat_current_team"].format(var.TURNCOATS[turncoat][0])
             else:
                 message += messages["turncoat_no_team"]
-            pm(cli, turncoat, message)
+            notify.pm(turncoat, message)
         else:
-            pm(cli, turncoat, messages["turncoat_simple"].format(var.TURNCOATS[turncoat][0]))
+            notify.pm(turncoat, messages["turncoat_simple"].format(var.TURNCOATS[turncoat][0]))
 
     for priest in var.ROLES["priest"]:
         if priest in var.PLAYERS and not is_user_simple(priest):
-            pm(cli, priest, messages["priest_notify"])
+            notify.pm(priest, messages["priest_notify"])
         else:
-            pm(cli, priest, messages["priest_simple"])
+            notify.pm(priest, messages["priest_simple"])
 
     if var.FIRST_NIGHT or var.ALWAYS_PM_ROLE:
         for mm in var.ROLES["matchmaker"]:
-            pl = ps[:]
-            random.shuffle(pl)
+            pl = notify.player_list()
             if mm in var.PLAYERS and not is_user_simple(mm):
-                pm(cli, mm, messages["matchmaker_notify"])
+                notify.pm(mm, messages["matchmaker_notify"])
             else:
-                pm(cli, mm, messages["matchmaker_simple"])
-            pm(cli, mm, "Players: " + ", ".join(pl))
+                notify.pm(mm, messages["matchmaker_simple"])
+            notify.pm(mm, "Players: " + ", ".join(pl))
 
         for clone in var.ROLES["clone"]:
-            pl = ps[:]
-            random.shuffle(pl)
-            pl.remove(clone)
+            pl = notify.player_list(clone)
             if clone in var.PLAYERS and not is_user_simple(clone):
-                pm(cli, clone, messages["clone_notify"])
+                notify.pm(clone, messages["clone_notify"])
             else:
-                pm(cli, clone, messages["clone_simple"])
-            pm(cli, clone, "Players: "+", ".join(pl))
+                notify.pm(clone, messages["clone_simple"])
+            notify.pm(clone, "Players: "+", ".join(pl))
 
         for minion in var.ROLES["minion"]:
-            wolves = list_players(var.WOLF_ROLES)
-            random.shuffle(wolves)
+            wolves = notify.shuffled_players(var.WOLF_ROLES)
             if minion in var.PLAYERS and not is_user_simple(minion):
-                pm(cli, minion, messages["minion_notify"])
+                notify.pm(minion, messages["minion_notify"])
             else:
-                pm(cli, minion, messages["minion_simple"])
-            pm(cli, minion, "Wolves: " + ", ".join(wolves))
+                notify.pm(minion, messages["minion_simple"])
+            notify.pm(minion, "Wolves: " + ", ".join(wolves))
 
     for g in var.GUNNERS.keys():
         if g not in ps:
@@ -5512,10 +5319,11 @@ def transition_night(cli):
         else:
             gun_msg = messages["gunner_simple"].format(role, str(var.GUNNERS[g]), "s" if var.GUNNERS[g] > 1 else "")
 
-        pm(cli, g, gun_msg)
+        notify.pm(g, gun_msg)
 
-    event_end = Event("transition_night_end", {})
+    event_end = Event("transition_night_end", {}, notify=notify)
     event_end.dispatch(cli, var)
+    notify.flush()
 
     dmsg = (daydur_msg + messages["night_begin"])
 
@@ -5523,12 +5331,13 @@ def transition_night(cli):
         dmsg = (dmsg + messages["first_night_begin"])
     cli.msg(chan, dmsg)
     debuglog("BEGIN NIGHT")
+    save_game_state()
     # If there are no nightroles that can act, immediately turn it to daytime
     chk_nightdone(cli)
 
 
 def cgamemode(cli, arg):
-    chan = botconfig.CHANNEL
+    chan = channels.Main.name
     if var.ORIGINAL_SETTINGS:  # needs reset
         reset_settings()
 
@@ -5551,7 +5360,7 @@ def cgamemode(cli, arg):
             var.CURRENT_GAMEMODE = gm
             return True
         except InvalidModeException as e:
-            cli.msg(botconfig.CHANNEL, "Invalid mode: "+str(e))
+            cli.msg(channels.Main.name, "Invalid mode: "+str(e))
             return False
     else:
         cli.msg(chan, messages["game_mode_not_found"].format(modeargs[0]))
@@ -5566,6 +5375,48 @@ def expire_start_votes(cli, chan):
         var.START_VOTES.clear()
         cli.msg(chan, messages["start_expired"])
 
+def _iter_roleset_choices(roleset, amount):
+    """Yield every distinct Counter of amount roles that can be drawn from roleset.
+
+    Unlike itertools.combinations, copies of the same role are interchangeable,
+    so this yields at most one result per distinct multiset of roles instead of
+    one per combination of individual elements.
+    """
+    roles = [(role, count) for role, count in roleset.items() if count > 0]
+    # remaining[i] is how many roles can still be drawn from roles[i:]
+    remaining = [0] * (len(roles) + 1)
+    for i in range(len(roles) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + roles[i][1]
+
+    def _choose(idx, needed):
+        if needed == 0:
+            yield Counter()
+            return
+        if needed > remaining[idx]:
+            return
+        role, count = roles[idx]
+        for num in range(min(count, needed), -1, -1):
+            for choice in _choose(idx + 1, needed - num):
+                if num:
+                    choice[role] = num
+                yield choice
+
+    return _choose(0, amount)
+
+def _add_roleset_choices(possible_rolesets, roleset, amount):
+    """Combine possible_rolesets with every distinct choice from roleset.
+
+    Both the input and output are sets of frozenset(Counter.items()), so
+    rolesets which sum up to the same role counts are only stored once.
+    """
+    choices = list(_iter_roleset_choices(roleset, amount))
+    new_rolesets = set()
+    for pr in possible_rolesets:
+        base = Counter(dict(pr))
+        for choice in choices:
+            new_rolesets.add(frozenset((base + choice).items()))
+    return new_rolesets
+
 @cmd("start", phases=("none", "join"))
 def start_cmd(cli, nick, chan, rest):
     """Starts a game of Werewolf."""
@@ -5588,7 +5439,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
     if not restart:
         var.LAST_START[nick] = [datetime.now(), 1]
 
-    if chan != botconfig.CHANNEL:
+    if chan != channels.Main.name:
         return
 
     villagers = list_players()
@@ -5642,7 +5493,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
 
                     # If this was the first vote
                     if len(var.START_VOTES) == 1:
-                        t = threading.Timer(60, expire_start_votes, (cli, chan))
+                        t = metrics.Timer(60, expire_start_votes, (cli, chan))
                         var.TIMERS["start_votes"] = (t, time.time(), 60)
                         t.daemon = True
                         t.start()
@@ -5681,27 +5532,16 @@ def start(cli, nick, chan, forced = False, restart = ""):
             cli.msg(chan, messages["no_settings_defined"].format(nick, len(villagers)))
             return
 
-    possible_rolesets = []
+    # if there are no randomized roles, we have 1 element to account
+    # for the only possibility (all role counts known)
+    possible_rolesets = {frozenset()}
     roleset_roles = defaultdict(int)
     for rs, amt in var.ROLE_SETS:
         toadd = random.sample(list(rs.elements()), amt)
         for r in toadd:
             addroles[r] += 1
             roleset_roles[r] += 1
-        add_rolesets = []
-        temp_rolesets = []
-        for c in itertools.combinations(rs.elements(), amt):
-            add_rolesets.append(Counter(c))
-        for pr in possible_rolesets:
-            for ar in add_rolesets:
-                temp = Counter(pr)
-                temp.update(ar)
-                temp_rolesets.append(temp)
-        possible_rolesets = temp_rolesets
-    if not possible_rolesets:
-        # if there are no randomized roles, ensure that we have 1 element
-        # to account for the only possibility (all role counts known)
-        possible_rolesets.append(Counter())
+        possible_rolesets = _add_roleset_choices(possible_rolesets, rs, amt)
 
     if var.ORIGINAL_SETTINGS and not restart:  # Custom settings
         need_reset = True
@@ -5778,6 +5618,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
     var.SPECTATING_WOLFCHAT = set()
     var.SPECTATING_DEADCHAT = set()
 
+    fixed_roles = Counter()
     for role, count in addroles.items():
         if role in var.TEMPLATE_RESTRICTIONS.keys():
             var.ROLES[role] = [None] * count
@@ -5788,20 +5629,15 @@ def start(cli, nick, chan, forced = False, restart = ""):
         var.ROLES[role] = set(selected)
         fixed_count = count - roleset_roles[role]
         if fixed_count > 0:
-            for pr in possible_rolesets:
-                pr[role] += fixed_count
+            fixed_roles[role] += fixed_count
     for v in villagers:
         var.ROLES[var.DEFAULT_ROLE].add(v)
     if villagers:
-        for pr in possible_rolesets:
-            pr[var.DEFAULT_ROLE] += len(villagers)
+        fixed_roles[var.DEFAULT_ROLE] += len(villagers)
 
     # Collapse possible_rolesets into var.ROLE_STATS
     # which is a FrozenSet[FrozenSet[Tuple[str, int]]]
-    possible_rolesets_set = set()
-    for pr in possible_rolesets:
-        possible_rolesets_set.add(frozenset(pr.items()))
-    var.ROLE_STATS = frozenset(possible_rolesets_set)
+    var.ROLE_STATS = frozenset(frozenset((Counter(dict(pr)) + fixed_roles).items()) for pr in possible_rolesets)
 
     # Now for the templates
     for template, restrictions in var.TEMPLATE_RESTRICTIONS.items():
@@ -5895,7 +5731,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
             options = ""
 
         cli.msg(chan, messages["welcome"].format(", ".join(pl), gamemode, options))
-        cli.mode(chan, "+m")
+        channels.Main.set_modes("+m")
 
     var.ORIGINAL_ROLES = copy.deepcopy(var.ROLES)  # Make a copy
 
@@ -5954,9 +5790,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
 
     if not botconfig.DEBUG_MODE or not var.DISABLE_DEBUG_MODE_REAPER:
         # DEATH TO IDLERS!
-        reapertimer = threading.Thread(None, reaper, args=(cli,var.GAME_ID))
-        reapertimer.daemon = True
-        reapertimer.start()
+        reaper(cli, var.GAME_ID)
 
 @hook("error")
 def on_error(cli, pfx, msg):
@@ -6133,7 +5967,7 @@ def wait(cli, nick, chan, rest):
     """Increases the wait time until !start can be used."""
     pl = list_players()
 
-    if chan != botconfig.CHANNEL:
+    if chan != channels.Main.name:
         return
 
     with var.WAIT_TB_LOCK:
@@ -6190,16 +6024,16 @@ def fwait(cli, nick, chan, rest):
 def reset_game(cli, nick, chan, rest):
     """Forces the game to stop."""
     if nick == "<stderr>":
-        cli.msg(botconfig.CHANNEL, messages["error_stop"])
+        cli.msg(channels.Main.name, messages["error_stop"])
     else:
-        cli.msg(botconfig.CHANNEL, messages["fstop_success"].format(nick))
+        cli.msg(channels.Main.name, messages["fstop_success"].format(nick))
     if var.PHASE != "join":
         stop_game(cli, log=False)
     else:
         pl = [p for p in list_players() if not is_fake_nick(p)]
         reset_modes_timers(var)
         reset()
-        cli.msg(botconfig.CHANNEL, "PING! {0}".format(" ".join(pl)))
+        cli.msg(channels.Main.name, "PING! {0}".format(" ".join(pl)))
 
 @cmd("rules", pm=True)
 def show_rules(cli, nick, chan, rest):
@@ -6214,9 +6048,9 @@ def show_rules(cli, nick, chan, rest):
         if pattern.search(rules):
             rules = pattern.sub("", rules)
 
-        reply(cli, nick, chan, messages["channel_rules"].format(botconfig.CHANNEL, rules))
+        reply(cli, nick, chan, messages["channel_rules"].format(channels.Main.name, rules))
     else:
-        reply(cli, nick, chan, messages["no_channel_rules"].format(botconfig.CHANNEL))
+        reply(cli, nick, chan, messages["no_channel_rules"].format(channels.Main.name))
 
 @cmd("help", raw_nick=True, pm=True)
 def get_help(cli, rnick, chan, rest):
@@ -6267,19 +6101,7 @@ def get_help(cli, rnick, chan, rest):
         afns.sort()
         reply(cli, nick, chan, messages["admin_commands_list"].format(break_long_message(afns, ", ")), private=True)
 
-def get_wiki_page(URI):
-    try:
-        response = urllib.request.urlopen(URI, timeout=2).read().decode("utf-8", errors="replace")
-    except (urllib.error.URLError, socket.timeout):
-        return False, messages["wiki_request_timed_out"]
-    if not response:
-        return False, messages["wiki_open_failure"]
-    parsed = json.loads(response)
-    if not parsed:
-        return False, messages["wiki_open_failure"]
-    return True, parsed
-
-@cmd("wiki", pm=True)
+@cmd("wiki", pm=True, readonly=True, rate_limit=(5, 60))
 def wiki(cli, nick, chan, rest):
     """Prints information on roles from the wiki."""
 
@@ -6287,39 +6109,24 @@ def wiki(cli, nick, chan, rest):
     if not rest:
         reply(cli, nick, chan, "https://werewolf.chat")
         return
-    rest = rest.replace(" ", "_").lower()
 
-    # Get suggestions, for autocompletion
-    URI = "https://werewolf.chat/w/api.php?action=opensearch&format=json&search={0}".format(rest)
-    success, suggestionjson = get_wiki_page(URI)
-    if not success:
-        reply(cli, nick, chan, suggestionjson, private=True)
-        return
+    net, game = networks.current(), games.current()
 
-    # Parse suggested pages, take the first result
-    try:
-        suggestion = suggestionjson[1][0].replace(" ", "_")
-    except IndexError:
-        reply(cli, nick, chan, messages["wiki_no_info"], private=True)
-        return
+    def send_page(result, error):
+        # called from the cache's worker thread if the page had to be fetched
+        gameloop.loop.submit("wiki", networks.run_in, net, games.run_in, game, _send_wiki_page, cli, nick, chan, result, error)
 
-    # Fetch a page from the api, in json format
-    URI = "https://werewolf.chat/w/api.php?action=query&prop=extracts&exintro=true&explaintext=true&titles={0}&format=json".format(suggestion)
-    success, pagejson = get_wiki_page(URI)
-    if not success:
-        reply(cli, nick, chan, pagejson, private=True)
-        return
+    wiki_cache().lookup(rest, send_page)
 
-    try:
-        page = pagejson["query"]["pages"].popitem()[1]["extract"]
-    except (KeyError, IndexError):
+def _send_wiki_page(cli, nick, chan, result, error):
+    if error is not None:
+        reply(cli, nick, chan, error, private=True)
+        return
+    if result is None:
         reply(cli, nick, chan, messages["wiki_no_info"], private=True)
         return
 
-    # We only want the first paragraph
-    if page.find("\n") >= 0:
-        page = page[:page.find("\n")]
-
+    suggestion, page = result
     wikilink = "https://werewolf.chat/{0}".format(suggestion.capitalize())
     if nick == chan:
         pm(cli, nick, wikilink)
@@ -6328,9 +6135,9 @@ def wiki(cli, nick, chan, rest):
         cli.msg(chan, wikilink)
         cli.notice(nick, break_long_message(page.split()))
 
-@hook("invite")
+@hook("invite", readonly=True)
 def on_invite(cli, raw_nick, something, chan):
-    if chan == botconfig.CHANNEL:
+    if chan == channels.Main.name:
         cli.join(chan)
         return # No questions
     (nick, _, ident, host) = parse_nick(raw_nick)
@@ -6358,18 +6165,12 @@ def show_admins(cli, nick, chan, rest):
 
     var.ADMIN_PINGING = True
 
-    def admin_whoreply(event, var, chan, user):
-        if not var.ADMIN_PINGING or chan is not channels.Main:
-            return
-
+    def consider(user, away):
         if is_admin(user.nick): # FIXME: Using the old interface for now; user.is_admin() is better
-            if user is not users.Bot and not event.params.away:
+            if user is not users.Bot and not away:
                 admins.append(user.nick) # FIXME
 
-    def admin_endwho(event, var, target):
-        if not var.ADMIN_PINGING or target is not channels.Main:
-            return
-
+    def show():
         admins.sort(key=str.lower)
 
         msg = messages["available_admins"] + ", ".join(admins)
@@ -6378,10 +6179,23 @@ def show_admins(cli, nick, chan, rest):
 
         var.ADMIN_PINGING = False
 
-        events.remove_listener("who_result", admin_whoreply)
+    if "away-notify" in var.ENABLED_CAPS:
+        # everyone's away status is kept current, so there's no need to ask the server
+        for user in list(channels.Main.users):
+            consider(user, user.away)
+        show()
+        return
+
+    def admin_endwho(event, var, target):
+        if not var.ADMIN_PINGING or target is not channels.Main:
+            return
+
+        for chan, user, params in event.params.replies:
+            consider(user, params.away)
+        show()
+
         events.remove_listener("who_end", admin_endwho)
 
-    events.add_listener("who_result", admin_whoreply)
     events.add_listener("who_end", admin_endwho)
 
     channels.Main.who()
@@ -6562,7 +6376,7 @@ def listroles(cli, nick, chan, rest):
 
     reply(cli, nick, chan, " ".join(msg))
 
-@cmd("myrole", pm=True, phases=("day", "night"))
+@cmd("myrole", pm=True, phases=("day", "night"), readonly=True)
 def myrole(cli, nick, chan, rest): # FIXME: Need to fix !swap once this gets converted
     """Reminds you of your current role."""
 
@@ -6570,6 +6384,11 @@ def myrole(cli, nick, chan, rest): # FIXME: Need to fix !swap once this gets con
     if nick not in ps:
         return
 
+    for msg in responses.get("myrole", nick, _myrole_messages, cli, nick, ps) or ():
+        pm(cli, nick, msg)
+
+def _myrole_messages(cli, nick, ps):
+    info = []
     role = get_role(nick)
     if role in var.HIDDEN_VILLAGERS:
         role = "villager"
@@ -6578,18 +6397,17 @@ def myrole(cli, nick, chan, rest): # FIXME: Need to fix !swap once this gets con
 
     evt = Event("myrole", {"role": role, "messages": []})
     if not evt.dispatch(cli, var, nick):
-        return
+        return None # the event took care of it, don't cache anything
     role = evt.data["role"]
 
     an = "n" if role.startswith(("a", "e", "i", "o", "u")) else ""
-    pm(cli, nick, messages["show_role"].format(an, role))
+    info.append(messages["show_role"].format(an, role))
 
-    for msg in evt.data["messages"]:
-        pm(cli, nick, msg)
+    info.extend(evt.data["messages"])
 
     # Remind clone who they have cloned
     if role == "clone" and nick in var.CLONED:
-        pm(cli, nick, messages["clone_target"].format(var.CLONED[nick]))
+        info.append(messages["clone_target"].format(var.CLONED[nick]))
 
     # Give minion the wolf list they would have recieved night one
     if role == "minion":
@@ -6597,26 +6415,26 @@ def myrole(cli, nick, chan, rest): # FIXME: Need to fix !swap once this gets con
         for wolfrole in var.WOLF_ROLES:
             for player in var.ORIGINAL_ROLES[wolfrole]:
                 wolves.append(player)
-        pm(cli, nick, messages["original_wolves"] + ", ".join(wolves))
+        info.append(messages["original_wolves"] + ", ".join(wolves))
 
     # Remind turncoats of their side
     if role == "turncoat":
-        pm(cli, nick, messages["turncoat_side"].format(var.TURNCOATS.get(nick, "none")[0]))
+        info.append(messages["turncoat_side"].format(var.TURNCOATS.get(nick, "none")[0]))
 
     # Check for gun/bullets
     if nick not in var.ROLES["amnesiac"] and nick in var.GUNNERS and var.GUNNERS[nick]:
         role = "gunner"
         if nick in var.ROLES["sharpshooter"]:
             role = "sharpshooter"
-        pm(cli, nick, messages["gunner_simple"].format(role, var.GUNNERS[nick], "" if var.GUNNERS[nick] == 1 else "s"))
+        info.append(messages["gunner_simple"].format(role, var.GUNNERS[nick], "" if var.GUNNERS[nick] == 1 else "s"))
 
     # Check assassin
     if nick in var.ROLES["assassin"] and nick not in var.ROLES["amnesiac"]:
-        pm(cli, nick, messages["assassin_role_info"].format(messages["assassin_targeting"].format(var.TARGETED[nick]) if nick in var.TARGETED else ""))
+        info.append(messages["assassin_role_info"].format(messages["assassin_targeting"].format(var.TARGETED[nick]) if nick in var.TARGETED else ""))
 
     # Remind prophet of their role, in sleepy mode only where it is hacked into a template instead of a role
     if "prophet" in var.TEMPLATE_RESTRICTIONS and nick in var.ROLES["prophet"]:
-        pm(cli, nick, messages["prophet_simple"])
+        info.append(messages["prophet_simple"])
 
     # Remind lovers of each other
     if nick in ps and nick in var.LOVERS:
@@ -6629,7 +6447,9 @@ def myrole(cli, nick, chan, rest): # FIXME: Need to fix !swap once this gets con
         else:
             message += ", ".join(lovers[:-1]) + ", and " + lovers[-1]
         message += "."
-        pm(cli, nick, message)
+        info.append(message)
+
+    return info
 
 @command("aftergame", "faftergame", flag="D", pm=True)
 def aftergame(var, wrapper, message):
@@ -6698,7 +6518,7 @@ def game_stats(cli, nick, chan, rest):
 
     if chan != nick:
         var.LAST_GSTATS = datetime.now()
-        if var.PHASE not in ("none", "join") and chan == botconfig.CHANNEL:
+        if var.PHASE not in ("none", "join") and chan == channels.Main.name:
             cli.notice(nick, messages["stats_wait_for_game_end"])
             return
 
@@ -6742,7 +6562,7 @@ def player_stats(cli, nick, chan, rest):
         cli.notice(nick, messages["command_ratelimited"])
         return
 
-    if chan != nick and chan == botconfig.CHANNEL and var.PHASE not in ("none", "join"):
+    if chan != nick and chan == channels.Main.name and var.PHASE not in ("none", "join"):
         cli.notice(nick, messages["no_command_in_channel"])
         return
 
@@ -6870,23 +6690,45 @@ def vote(cli, nick, chan, rest):
     else:
         return show_votes.caller(cli, nick, chan, rest)
 
-def _call_command(cli, nick, chan, command, no_out=False):
+def _get_git_revision():
+    try:
+        ans = subprocess.check_output(["git", "log", "-n", "1", "--pretty=format:%h"], stderr=subprocess.DEVNULL)
+        return ans.decode()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# looked up once here and again after each successful !pull, instead of on every CTCP VERSION
+_git_revision = _get_git_revision()
+
+def _reply_from_job(cli, nick, chan, net, game, message):
+    # replies go out from the game loop, in the network and game the command came from
+    gameloop.loop.submit("admin", networks.run_in, net, games.run_in, game, reply, cli, nick, chan, message, private=True)
+
+def _call_command(cli, nick, chan, net, game, command, no_out=False):
     """
-    Executes a system command.
+    Executes a system command, sending its output to IRC as it arrives.
 
     If `no_out` is True, the command's output will not be sent to IRC,
     unless the exit code is non-zero.
+
+    This waits for the command to finish, so it must only be called from
+    a background job (see src.jobs). `net` and `game` are those the
+    command was used in; the output is sent from the game loop in them.
     """
 
-    child = subprocess.Popen(command.split(),
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE)
-    (out, err) = child.communicate()
-    ret = child.returncode
+    lines = []
 
-    if not (no_out and ret == 0):
-        for line in (out + err).splitlines():
-            reply(cli, nick, chan, line.decode("utf-8"), private=True)
+    def on_line(line):
+        lines.append(line)
+        if not no_out:
+            _reply_from_job(cli, nick, chan, net, game, line.decode("utf-8", "replace"))
+
+    ret = jobs.run_command(command.split(), on_line)
+    out = b"\n".join(lines)
+
+    if no_out and ret != 0:
+        for line in lines:
+            _reply_from_job(cli, nick, chan, net, game, line.decode("utf-8", "replace"))
 
     if ret != 0:
         if ret < 0:
@@ -6895,29 +6737,56 @@ def _call_command(cli, nick, chan, command, no_out=False):
         else:
             cause = "status"
 
-        reply(cli, nick, chan, messages["process_exited"].format(command, cause, ret), private=True)
+        _reply_from_job(cli, nick, chan, net, game, messages["process_exited"].format(command, cause, ret))
 
     return (ret, out)
 
-@cmd("pull", "fpull", flag="D", pm=True)
-def fpull(cli, nick, chan, rest):
-    """Pulls from the repository to update the bot."""
+def _pull(cli, nick, chan, net, game):
+    global _git_revision
 
-    (ret, _) = _call_command(cli, nick, chan, "git fetch")
+    (ret, _) = _call_command(cli, nick, chan, net, game, "git fetch")
     if ret != 0:
         return False
 
-    (ret, out) = _call_command(cli, nick, chan, "git status -b --porcelain", no_out=True)
+    (ret, out) = _call_command(cli, nick, chan, net, game, "git status -b --porcelain", no_out=True)
     if ret != 0:
         return False
 
     if not re.search(rb"behind \d+", out.splitlines()[0]):
         # Already up-to-date
-        reply(cli, nick, chan, messages["already_up_to_date"], private=True)
+        _reply_from_job(cli, nick, chan, net, game, messages["already_up_to_date"])
         return False
 
-    (ret, _) = _call_command(cli, nick, chan, "git rebase --stat --preserve-merges")
-    return (ret == 0)
+    (ret, _) = _call_command(cli, nick, chan, net, game, "git rebase --stat --preserve-merges")
+    if ret != 0:
+        return False
+
+    _git_revision = _get_git_revision()
+    return True
+
+@cmd("pull", "fpull", flag="D", pm=True)
+def fpull(cli, nick, chan, rest):
+    """Pulls from the repository to update the bot."""
+    jobs.runner.submit(_pull, cli, nick, chan, networks.current(), games.current())
+
+def _update(cli, nick, chan, net, game):
+    if not _pull(cli, nick, chan, net, game):
+        return
+
+    # if only roles and game modes changed, there's no need to restart
+    (ret, out) = _call_command(cli, nick, chan, net, game, "git diff --name-only ORIG_HEAD HEAD", no_out=True)
+    changed = out.decode("utf-8").split()
+    reloadable = ret == 0 and changed and all(reloader.is_reloadable(f) for f in changed)
+    # only the git work belongs on this thread; the rest touches the games
+    gameloop.loop.submit("admin", networks.run_in, net, games.run_in, game, _finish_update, cli, nick, chan, reloadable)
+
+def _finish_update(cli, nick, chan, reloadable):
+    # a game may have started while we were pulling
+    if reloadable and var.PHASE == "none":
+        restart_program.aftergame = False
+        reload_game.caller(cli, nick, chan, "")
+    else:
+        restart_program.caller(cli, nick, chan, "Updating bot")
 
 @cmd("update", flag="D", pm=True)
 def update(cli, nick, chan, rest):
@@ -6937,10 +6806,22 @@ def update(cli, nick, chan, rest):
         # Display "Scheduled restart" instead of "Forced restart" when called with !faftergame
         restart_program.aftergame = True
 
-    ret = fpull.caller(cli, nick, chan, "")
+    jobs.runner.submit(_update, cli, nick, chan, networks.current(), games.current())
 
-    if ret:
-        restart_program.caller(cli, nick, chan, "Updating bot")
+@command("reload", "freload", flag="D", pm=True)
+def reload_game(var, wrapper, message):
+    """Reloads the roles and game modes without restarting the bot."""
+    if var.PHASE != "none":
+        wrapper.pm(messages["reload_ingame"])
+        return
+
+    try:
+        names = reloader.reload_game_modules()
+    except reloader.ReloadError as e:
+        wrapper.pm(messages["reload_failed"].format(e))
+        return
+
+    wrapper.pm(messages["reload_success"].format(len(names), "" if len(names) == 1 else "s"))
 
 @command("send", "fsend", flag="F", pm=True)
 def fsend(var, wrapper, message):
@@ -7323,7 +7204,7 @@ if botconfig.DEBUG_MODE or botconfig.ALLOWED_NORMAL_MODE_COMMANDS:
                     var.ROLES[var.DEFAULT_ROLE].add(who)
                     var.ALL_PLAYERS.append(users._get(who)) # FIXME
                     if not is_fake_nick(who):
-                        cli.mode(chan, "+v", who)
+                        channels.Main.set_modes(("+v", who))
                     cli.msg(chan, messages["template_default_role"].format(var.DEFAULT_ROLE))
 
                 var.ROLES[rol].add(who)
@@ -7356,7 +7237,7 @@ if botconfig.DEBUG_MODE or botconfig.ALLOWED_NORMAL_MODE_COMMANDS:
             evt = Event("frole_role", {})
             evt.dispatch(cli, var, who, rol, oldrole, rolargs)
             if not is_fake_nick(who):
-                cli.mode(chan, "+v", who)
+                channels.Main.set_modes(("+v", who))
         else:
             cli.msg(chan, messages["invalid_role"])
             return
@@ -7375,5 +7256,6 @@ if botconfig.ALLOWED_NORMAL_MODE_COMMANDS and not botconfig.DEBUG_MODE:
         if (comd not in before_debug_mode_commands and
             comd not in botconfig.ALLOWED_NORMAL_MODE_COMMANDS):
             del COMMANDS[comd]
+    commands_changed()
 
 # vim: set sw=4 expandtab:
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# the tests import the bot from the repository root, and src parses the bot's own command line when imported
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.argv = sys.argv[:1]
+
+@pytest.fixture
+def make_game():
+    """Return a function which sets up a game in a new channel, and returns it.
+
+    Whatever game was bound before is bound again afterwards, and the
+    games and channels the test made are forgotten.
+    """
+    from src import channels, games
+    from src.context import lower
+    from src.simulator import SimClient
+
+    cli = SimClient()
+    if games.default() is None:
+        # the first game takes over the state var started with; keep that one around
+        games.add(channels.add("#tests", cli))
+    before = games.current()
+    made = []
+
+    def make(name):
+        game = games.add(channels.add(name, cli))
+        made.append(name)
+        return game
+
+    yield make
+    with games._lock:
+        games._switch(before)
+        for name in made:
+            del games.GAMES[lower(name)]
+            del channels._channels[lower(name)]
+
+@pytest.fixture
+def game_loop(monkeypatch):
+    """A running game loop, in place of the bot's."""
+    from src import gameloop
+
+    loop = gameloop.GameLoop()
+    loop.start()
+    monkeypatch.setattr(gameloop, "loop", loop)
+    return loop
+
+class RecordingClient:
+    """Keeps what the bot said, with the thread, network and game it was said from."""
+
+    def __init__(self):
+        self.said = []
+        self._said = threading.Condition()
+
+    def msg(self, target, message):
+        from src import games, networks
+        with self._said:
+            self.said.append((target, message, threading.current_thread(), networks.current(), games.current()))
+            self._said.notify_all()
+
+    notice = msg
+
+    def wait(self, count, timeout=5):
+        """Wait until the bot has said at least count lines; return whether it did."""
+        with self._said:
+            return self._said.wait_for(lambda: len(self.said) >= count, timeout)
+
+@pytest.fixture
+def irc():
+    return RecordingClient()
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,38 @@
+"""Check that commands added and removed while the bot runs are picked up by the per-phase command tables."""
+
+import pytest
+
+import src.settings as var
+from src import decorators, wolfgame
+
+@pytest.fixture
+def night():
+    phase = var.PHASE
+    var.PHASE = "night"
+    yield
+    var.PHASE = phase
+    decorators.commands_changed()
+
+def test_sleepy_commands_go_with_the_mode(night):
+    assert not decorators.commands_for("north")
+    mode = var.GAME_MODES["sleepy"][0]()
+    mode.startup()
+    added = (mode.north_cmd, mode.east_cmd, mode.south_cmd, mode.west_cmd)
+    try:
+        assert decorators.commands_for("north") == (mode.north_cmd,)
+        assert mode.west_cmd in decorators.commands_for("w")
+    finally:
+        mode.teardown()
+    # "w" is also !wait's, which has to stay
+    for name in ("north", "n", "east", "e", "south", "s", "west", "w"):
+        assert not set(added) & set(decorators.COMMANDS.get(name, ()))
+        assert not set(added) & set(decorators.commands_for(name))
+    assert not decorators.commands_for("north")
+
+def test_removed_command_stops_dispatching(night):
+    fn = decorators.cmd("testcmd", pm=True, phases=("night",))(lambda cli, nick, chan, rest: None)
+    assert decorators.commands_for("testcmd") == (fn,)
+    fn.remove()
+    assert decorators.commands_for("testcmd") == ()
+
+# vim: set sw=4 expandtab:
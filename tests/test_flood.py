@@ -0,0 +1,37 @@
+"""Check that players of a game under way get past flood control without waiting on the game."""
+
+import threading
+from types import SimpleNamespace
+
+import src.settings as var
+from src import games, handler, networks
+
+def test_players_are_exempt_without_the_game_lock(make_game):
+    game = make_game("#flood")
+    cli = game.channel.client
+    with networks.of(cli), game:
+        var.PHASE = "day"
+        var.ALL_PLAYERS = [SimpleNamespace(nick="Player")]
+        handler._publish_players(cli)
+        var.PHASE = "none"
+        var.ALL_PLAYERS = []
+
+    # the game loop is busy with a game; the thread reading from IRC mustn't have to wait for it
+    locked, done = threading.Event(), threading.Event()
+    def hold():
+        with games._lock:
+            locked.set()
+            done.wait(5)
+    threading.Thread(target=hold, daemon=True).start()
+    assert locked.wait(5)
+    try:
+        assert handler._in_game(cli, "player!ident@host")
+        assert not handler._in_game(cli, "someone!ident@host")
+    finally:
+        done.set()
+
+    with networks.of(cli):
+        handler._publish_players(cli) # the game is over now
+    assert not handler._in_game(cli, "player!ident@host")
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,44 @@
+"""Check that games in different channels keep their state apart while taking turns."""
+
+import src.settings as var
+from src import decorators, events, games
+from src.roles import angel
+
+def test_switching_swaps_role_and_mode_state(make_game, monkeypatch):
+    first, second = make_game("#games-a"), make_game("#games-b")
+    with first:
+        mode = var.CURRENT_GAMEMODE = var.GAME_MODES["sleepy"][0]()
+        mode.startup()
+        var.PHASE = "night"
+        angel.GUARDED["guard"] = "target"
+        north = decorators.commands_for("north")
+    assert north == (mode.north_cmd,)
+
+    # from here on, the mode is only put away and brought back
+    calls = []
+    monkeypatch.setattr(mode, "startup", lambda: calls.append("startup"))
+    monkeypatch.setattr(mode, "teardown", lambda: calls.append("teardown"))
+
+    try:
+        for i in range(3):
+            with second:
+                assert angel.GUARDED == {}
+                assert var.PHASE == "none"
+                var.PHASE = "night"
+                assert decorators.commands_for("north") == ()
+                assert (5, mode.prolong_night) not in events.EVENT_CALLBACKS["chk_nightdone"]
+                var.PHASE = "none"
+            with first:
+                assert angel.GUARDED == {"guard": "target"}
+                assert decorators.commands_for("north") == north
+                assert (5, mode.prolong_night) in events.EVENT_CALLBACKS["chk_nightdone"]
+        assert calls == []
+    finally:
+        with first:
+            monkeypatch.undo()
+            mode.teardown()
+            var.CURRENT_GAMEMODE = var.GAME_MODES["default"][0]()
+            var.PHASE = "none"
+            angel.GUARDED.clear()
+
+# vim: set sw=4 expandtab:
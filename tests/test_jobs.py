@@ -0,0 +1,21 @@
+"""Check that background jobs send what they have to say from the game loop."""
+
+import sys
+
+from src import networks, wolfgame
+
+def test_command_output_goes_through_game_loop(make_game, game_loop, irc):
+    game = make_game("#jobs")
+    with game:
+        net = networks.current()
+    command = "{0} -c print('one');print('two')".format(sys.executable)
+    ret, out = wolfgame._call_command(irc, "tester", "#jobs", net, game, command)
+    assert ret == 0 and out == b"one\ntwo"
+    assert irc.wait(2)
+    assert [line[:2] for line in irc.said] == [("tester", "one"), ("tester", "two")]
+    for target, message, thread, network, bound in irc.said:
+        assert thread is game_loop._thread
+        assert network is net
+        assert bound is game
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,23 @@
+"""Check that the metrics of several IRC connections are kept apart."""
+
+from oyoyo.client import IRCClient
+from src import metrics
+
+def test_clients_are_labelled_by_network(monkeypatch):
+    monkeypatch.setattr(metrics, "_clients", [])
+    monkeypatch.setattr(metrics, "REGISTRY", {})
+    first = IRCClient({}, host="irc.one.example")
+    second = IRCClient({}, host="irc.two.example")
+    metrics.watch_client(first)
+    metrics.watch_client(second)
+    metrics.watch_client(first) # reconnecting doesn't count it twice
+    first.lines_sent = 3
+    second.lines_sent = 5
+
+    assert metrics.REGISTRY["lykos_irc_lines_sent_total"].values() == {"irc.one.example": 3, "irc.two.example": 5}
+    text = metrics.prometheus_text()
+    assert 'lykos_irc_lines_sent_total{network="irc.one.example"} 3' in text
+    assert 'lykos_irc_lines_sent_total{network="irc.two.example"} 5' in text
+    assert 'lykos_irc_send_queue_length{network="irc.two.example"} 0' in text
+
+# vim: set sw=4 expandtab:
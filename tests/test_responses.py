@@ -0,0 +1,32 @@
+"""Check which commands and server events drop the cached responses of !stats, !votes and !myrole."""
+
+from src import channels, decorators, handler, wolfgame
+from src.responses import responses
+from src.simulator import SimClient
+
+def test_chatter_keeps_the_cache():
+    # these run on every message said where the bot can see it
+    assert decorators.COMMANDS[""]
+    assert all(fn.readonly for fn in decorators.COMMANDS[""])
+
+def test_bookkeeping_hooks_keep_the_cache():
+    cli = SimClient()
+    version = responses.version
+    handler._run_hooks(cli, None, decorators.HOOKS["ping"], ("irc.example.net",))
+    try:
+        handler._run_hooks(cli, "irc.example.net", decorators.HOOKS["channelcreate"], ("bot", "#responses", "0"))
+    finally:
+        del channels._channels["#responses"]
+    assert responses.version == version
+
+def test_hooks_which_may_change_games_drop_the_cache():
+    cli = SimClient()
+    changed = decorators.hook("testhook")(lambda cli, prefix, *args: None)
+    try:
+        version = responses.version
+        handler._run_hooks(cli, None, decorators.HOOKS["ping"] + [changed], ("irc.example.net",))
+        assert responses.version > version
+    finally:
+        changed.remove()
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,110 @@
+"""Check the roleset choices start() works out for !stats against listing every combination."""
+
+import inspect
+import itertools
+import math
+import time
+from collections import Counter
+
+import pytest
+
+import src.settings as var
+from src import wolfgame
+
+# "roles" can't be played without saying which roles
+MODE_ARGS = {"roles": "wolf:2,seer:1,cursed villager:1,harlot:1,traitor:1"}
+
+def brute_force(rolesets):
+    """What start() did before: one Counter per combination of elements, then a set of the distinct ones."""
+    possible = [Counter()]
+    for rs, amt in rolesets:
+        choices = [Counter(c) for c in itertools.combinations(rs.elements(), amt)]
+        possible = [pr + choice for pr in possible for choice in choices]
+    return {frozenset(pr.items()) for pr in possible}
+
+def lazy(rolesets):
+    possible = {frozenset()}
+    for rs, amt in rolesets:
+        possible = wolfgame._add_roleset_choices(possible, rs, amt)
+    return possible
+
+def mode_roles(mode, size):
+    """The roles (templates aside) a game mode hands out at the given size, as a Counter, and its ROLE_SETS."""
+    gm = var.GAME_MODES[mode][0](*([MODE_ARGS[mode]] if mode in MODE_ARGS else []))
+    guide = getattr(gm, "ROLE_GUIDE", var.ROLE_GUIDE)
+    index = getattr(gm, "ROLE_INDEX", var.ROLE_INDEX)
+    for i in range(len(index) - 1, -1, -1):
+        if index[i] <= size:
+            return Counter({role: counts[i] for role, counts in guide.items()
+                            if counts[i] > 0 and role not in var.TEMPLATE_RESTRICTIONS}), getattr(gm, "ROLE_SETS", [])
+    return Counter(), getattr(gm, "ROLE_SETS", [])
+
+def mode_sizes():
+    for mode, (cls, minp, maxp, likelihood) in sorted(var.GAME_MODES.items()):
+        for size in range(minp, maxp + 1):
+            yield mode, size
+
+@pytest.mark.parametrize("mode,size", list(mode_sizes()))
+def test_matches_brute_force(mode, size):
+    roles, mode_rolesets = mode_roles(mode, size)
+    assert lazy(mode_rolesets) == brute_force(mode_rolesets)
+
+    # no mode uses ROLE_SETS yet; draw from the roles it does hand out instead
+    total = sum(roles.values())
+    for amt in range(min(total, 4) + 1):
+        rolesets = [(roles, amt)]
+        assert lazy(rolesets) == brute_force(rolesets)
+
+    # and from two rolesets, so that choices are combined with the ones before them
+    names = sorted(roles)
+    first = Counter({role: roles[role] for role in names[::2]})
+    second = Counter({role: roles[role] for role in names[1::2]})
+    rolesets = [(first, min(2, sum(first.values()))), (second, min(2, sum(second.values())))]
+    assert lazy(rolesets) == brute_force(rolesets)
+
+@pytest.mark.parametrize("amt", range(6))
+def test_choices_are_distinct(amt):
+    roleset = Counter({"wolf": 3, "seer": 1, "harlot": 2, "cursed villager": 2})
+    choices = [frozenset(choice.items()) for choice in wolfgame._iter_roleset_choices(roleset, amt)]
+    assert len(choices) == len(set(choices))
+    assert all(sum(count for role, count in choice) == amt for choice in choices)
+    assert set(choices) == brute_force([(roleset, amt)])
+
+# brute force would go through math.comb(200, 20), about 1.6e27, combinations of these
+LARGE = Counter({"wolf": 40, "seer": 40, "harlot": 40, "cursed villager": 40, "villager": 40})
+
+def test_large_roleset_is_lazy():
+    start = time.perf_counter()
+    choices = wolfgame._iter_roleset_choices(LARGE, 20)
+    assert inspect.isgenerator(choices)
+    first = list(itertools.islice(choices, 100))
+    # with only a few of some roles to draw from, those are never drawn more often
+    tight = LARGE + Counter({"traitor": 2, "sorcerer": 1})
+    tight["seer"] = 3
+    for choice in itertools.islice(wolfgame._iter_roleset_choices(tight, 60), 1000):
+        assert sum(choice.values()) == 60
+        assert all(count <= tight[role] for role, count in choice.items())
+    assert time.perf_counter() - start < 1
+    assert len(first) == 100
+
+def test_large_roleset_in_bounded_time():
+    start = time.perf_counter()
+    choices = [frozenset(choice.items()) for choice in wolfgame._iter_roleset_choices(LARGE, 20)]
+    # as many as there are ways to split 20 between 5 roles
+    assert len(choices) == len(set(choices)) == math.comb(20 + 4, 4)
+    for choice in choices:
+        assert sum(count for role, count in choice) == 20
+        assert all(0 < count <= LARGE[role] for role, count in choice)
+
+    # and combined with the choices from another roleset
+    second = Counter({"wolf": 3, "traitor": 3})
+    possible = lazy([(LARGE, 20), (second, 3)])
+    # the number of traitors tells which choice from the second one was made, so no two are the same
+    assert len(possible) == math.comb(20 + 4, 4) * 4
+    assert all(sum(count for role, count in pr) == 23 for pr in possible)
+    assert time.perf_counter() - start < 5
+
+def test_too_few_roles():
+    assert list(wolfgame._iter_roleset_choices(Counter({"wolf": 1, "seer": 1}), 3)) == []
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,548 @@
+"""Check the default !stats deduction, kept up to date event by event, against the way it was worked out before."""
+
+import math
+import random
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+
+import src.settings as var
+from src.rolestats import RoleDeduction
+
+ROLES = ("wolf", "wolf cub", "alpha wolf", "traitor", "villager", "lycan", "doctor", "amnesiac",
+         "clone", "guardian angel", "fallen angel", "seer", "shaman", "hunter", "cultist")
+
+GAME_STATE = ("ORIGINAL_ROLES", "ALL_PLAYERS", "FINAL_ROLES", "EXCHANGED_ROLES", "TRAITOR_TURNED",
+              "EXTRA_WOLVES", "CURRENT_GAMEMODE", "HIDDEN_TRAITOR", "HIDDEN_AMNESIAC", "HIDDEN_CLONE")
+
+@pytest.fixture(autouse=True)
+def game_state():
+    saved = {name: getattr(var, name) for name in GAME_STATE if hasattr(var, name)}
+    yield
+    for name in GAME_STATE:
+        if name in saved:
+            setattr(var, name, saved[name])
+        elif hasattr(var, name):
+            delattr(var, name)
+
+def baseline_counts(pl):
+    """The default !stats deduction as it was worked out before RoleDeduction, on every use."""
+    # role: [min, max] -- "we may not necessarily know *exactly* how
+    # many of a particular role there are, but we know that there is
+    # between min and max of them"
+    rolecounts = defaultdict(lambda: [0, 0])
+    start_roles = set()
+    orig_roles = {}
+    equiv_sets = {}
+    total_immunizations = 0
+    extra_lycans = 0
+    # Step 1. Get our starting set of roles. This also calculates the maximum numbers for equivalency sets
+    # (sets of roles that are decremented together because we can't know for sure which actually died).
+    for r, v in var.ORIGINAL_ROLES.items():
+        if r in var.TEMPLATE_RESTRICTIONS.keys():
+            continue
+        if len(v) == 0:
+            continue
+        start_roles.add(r)
+        rolecounts[r] = [len(v), len(v)]
+        for p in v:
+            if p.startswith("(dced)"):
+                p = p[6:]
+            orig_roles[p] = r
+
+    if var.CURRENT_GAMEMODE.name == "villagergame":
+        # hacky hacks that hack
+        pcount = len(var.ALL_PLAYERS)
+        if pcount >= 8:
+            rolecounts["villager"][0] -= 2
+            rolecounts["villager"][1] -= 2
+            rolecounts["wolf"] = [1, 1]
+            rolecounts["traitor"] = [1, 1]
+        elif pcount == 7:
+            rolecounts["villager"][0] -= 2
+            rolecounts["villager"][1] -= 2
+            rolecounts["wolf"] = [1, 1]
+            rolecounts["cultist"] = [1, 1]
+        else:
+            rolecounts["villager"][0] -= 1
+            rolecounts["villager"][1] -= 1
+            rolecounts["wolf"] = [1, 1]
+
+    total_immunizations = rolecounts["doctor"][0] * math.ceil(len(var.ALL_PLAYERS) * var.DOCTOR_IMMUNIZATION_MULTIPLIER)
+    if "amnesiac" in start_roles and "doctor" not in var.AMNESIAC_BLACKLIST:
+        total_immunizations += rolecounts["amnesiac"][0] * math.ceil(len(var.ALL_PLAYERS) * var.DOCTOR_IMMUNIZATION_MULTIPLIER)
+
+    extra_lycans = rolecounts["lycan"][0] - min(total_immunizations, rolecounts["lycan"][0])
+
+    equiv_sets["traitor_default"] = rolecounts["traitor"][0] + rolecounts[var.DEFAULT_ROLE][0]
+    equiv_sets["lycan_villager"] = min(rolecounts["lycan"][0], total_immunizations) + rolecounts["villager"][0]
+    equiv_sets["traitor_lycan_villager"] = equiv_sets["traitor_default"] + equiv_sets["lycan_villager"] - rolecounts[var.DEFAULT_ROLE][0]
+    equiv_sets["amnesiac_clone"] = rolecounts["amnesiac"][0] + rolecounts["clone"][0]
+    equiv_sets["amnesiac_clone_cub"] = rolecounts["amnesiac"][0] + rolecounts["clone"][0] + rolecounts["wolf cub"][0]
+    equiv_sets["wolf_fallen"] = 0
+    equiv_sets["fallen_guardian"] = 0
+    if var.TRAITOR_TURNED:
+        equiv_sets["traitor_default"] -= rolecounts["traitor"][0]
+        equiv_sets["traitor_lycan_villager"] -= rolecounts["traitor"][0]
+        rolecounts["wolf"][0] += rolecounts["traitor"][0]
+        rolecounts["wolf"][1] += rolecounts["traitor"][1]
+        rolecounts["traitor"] = [0, 0]
+    # Step 2. Handle role swaps via exchange totem by modifying orig_roles -- the original
+    # roles themselves didn't change, just who has them. By doing the swap early on we greatly
+    # simplify the death logic below in step 3 -- to an outsider that doesn't know any info
+    # the role swap might as well never happened and those people simply started with those roles;
+    # they can't really tell the difference.
+    for a, b in var.EXCHANGED_ROLES:
+        orig_roles[a], orig_roles[b] = orig_roles[b], orig_roles[a]
+    # Step 3. Work out people that turned into wolves via either alpha wolf, lycan, or lycanthropy totem
+    # All three of those play the same "chilling howl" message, once per additional wolf
+    num_alpha = rolecounts["alpha wolf"][0]
+    num_angel = rolecounts["guardian angel"][0]
+    if "amnesiac" in start_roles and "guardian angel" not in var.AMNESIAC_BLACKLIST:
+        num_angel += rolecounts["amnesiac"][0]
+    have_lycan_totem = False
+    for idx, shaman in enumerate(var.TOTEM_ORDER):
+        if (shaman in start_roles or ("amnesiac" in start_roles and shaman not in var.AMNESIAC_BLACKLIST)) and var.TOTEM_CHANCES["lycanthropy"][idx] > 0:
+            have_lycan_totem = True
+
+    extra_wolves = var.EXTRA_WOLVES
+    num_wolves = rolecounts["wolf"][0]
+    num_fallen = rolecounts["fallen angel"][0]
+    while extra_wolves > 0:
+        extra_wolves -= 1
+        if num_alpha == 0 and not have_lycan_totem:
+            # This is easy, all of our extra wolves are actual lycans, and we know this for a fact
+            rolecounts["wolf"][0] += 1
+            rolecounts["wolf"][1] += 1
+            num_wolves += 1
+
+            if rolecounts["lycan"][1] > 0:
+                rolecounts["lycan"][0] -= 1
+                rolecounts["lycan"][1] -= 1
+            else:
+                # amnesiac or clone became lycan and was subsequently turned
+                maxcount = max(0, equiv_sets["amnesiac_clone"] - 1)
+
+                rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
+                if rolecounts["amnesiac"][1] > maxcount:
+                    rolecounts["amnesiac"][1] = maxcount
+
+                rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
+                if rolecounts["clone"][1] > maxcount:
+                    rolecounts["clone"][1] = maxcount
+
+                equiv_sets["amnesiac_clone"] = maxcount
+
+
+            if extra_lycans > 0:
+                extra_lycans -= 1
+            else:
+                equiv_sets["lycan_villager"] = max(0, equiv_sets["lycan_villager"] - 1)
+                equiv_sets["traitor_lycan_villager"] = max(0, equiv_sets["traitor_lycan_villager"] - 1)
+        elif num_alpha == 0 or num_angel == 0:
+            # We are guaranteed to have gotten an additional wolf, but we can't guarantee it was an actual lycan
+            rolecounts["wolf"][0] += 1
+            rolecounts["wolf"][1] += 1
+            num_wolves += 1
+            rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
+
+            # apply alphas before lycan totems (in case we don't actually have lycan totems)
+            # this way if we don't have totems and alphas is 0 we hit guaranteed lycans above
+            if num_alpha > 0:
+                num_alpha -= 1
+        else:
+            # We may have gotten an additional wolf or an additional fallen angel, we don't necessarily know which
+            num_alpha -= 1
+            num_angel -= 1
+            rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
+            rolecounts["wolf"][1] += 1
+            rolecounts["fallen angel"][1] += 1
+            rolecounts["guardian angel"][0] -= 1
+            equiv_sets["wolf_fallen"] += 1
+            equiv_sets["fallen_guardian"] += 1
+
+    # Step 4. Remove all dead players
+    # When rolesets are a thing (e.g. one of x, y, or z), those will be resolved here as well
+    for p in var.ALL_PLAYERS:
+        p = p.nick # FIXME: Need to modify this block to handle User instances
+        if p in pl:
+            continue
+        # pr should be the role the person gets revealed as should they die
+        pr = orig_roles[p]
+        if p in var.FINAL_ROLES and pr not in ("amnesiac", "clone"):
+            pr = var.FINAL_ROLES[p]
+        elif pr == "amnesiac" and not var.HIDDEN_AMNESIAC and p in var.FINAL_ROLES:
+            pr = var.FINAL_ROLES[p]
+        elif pr == "clone" and not var.HIDDEN_CLONE and p in var.FINAL_ROLES:
+            pr = var.FINAL_ROLES[p]
+        elif pr == "traitor" and var.TRAITOR_TURNED:
+            # we turned every traitor into wolf above, which means even though
+            # this person died as traitor, we need to deduct the count from wolves
+            pr = "wolf"
+        elif pr == "traitor" and var.HIDDEN_TRAITOR:
+            pr = var.DEFAULT_ROLE
+
+        # set to true if we kill more people than exist in a given role,
+        # which means that amnesiac or clone must have became that role
+        overkill = False
+
+        if pr == var.DEFAULT_ROLE:
+            # the person that died could have been traitor or an immunized lycan
+            if var.DEFAULT_ROLE == "villager":
+                maxcount = equiv_sets["traitor_lycan_villager"]
+            else:
+                maxcount = equiv_sets["traitor_default"]
+
+            if maxcount == 0:
+                overkill = True
+
+            maxcount = max(0, maxcount - 1)
+            if var.HIDDEN_TRAITOR and not var.TRAITOR_TURNED:
+                rolecounts["traitor"][0] = max(0, rolecounts["traitor"][0] - 1)
+                if rolecounts["traitor"][1] > maxcount:
+                    rolecounts["traitor"][1] = maxcount
+
+            if var.DEFAULT_ROLE == "villager" and total_immunizations > 0:
+                total_immunizations -= 1
+                rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
+                if rolecounts["lycan"][1] > maxcount + extra_lycans:
+                    rolecounts["lycan"][1] = maxcount + extra_lycans
+
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            if rolecounts[pr][1] > maxcount:
+                rolecounts[pr][1] = maxcount
+
+            if var.DEFAULT_ROLE == "villager":
+                equiv_sets["traitor_lycan_villager"] = maxcount
+            else:
+                equiv_sets["traitor_default"] = maxcount
+        elif pr == "villager":
+            # the villager that died could have been an immunized lycan
+            maxcount = max(0, equiv_sets["lycan_villager"] - 1)
+
+            if equiv_sets["lycan_villager"] == 0:
+                overkill = True
+
+            if total_immunizations > 0:
+                total_immunizations -= 1
+                rolecounts["lycan"][0] = max(0, rolecounts["lycan"][0] - 1)
+                if rolecounts["lycan"][1] > maxcount + extra_lycans:
+                    rolecounts["lycan"][1] = maxcount + extra_lycans
+
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            if rolecounts[pr][1] > maxcount:
+                rolecounts[pr][1] = maxcount
+
+            equiv_sets["lycan_villager"] = maxcount
+        elif pr == "lycan":
+            # non-immunized lycan, reduce counts appropriately
+            if rolecounts[pr][1] == 0:
+                overkill = True
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
+
+            if extra_lycans > 0:
+                extra_lycans -= 1
+            else:
+                equiv_sets["lycan_villager"] = max(0, equiv_sets["lycan_villager"] - 1)
+                equiv_sets["traitor_lycan_villager"] = max(0, equiv_sets["traitor_lycan_villager"] - 1)
+        elif pr == "wolf":
+            # person that died could have possibly been turned by alpha
+            if rolecounts[pr][1] == 0:
+                # this overkill either means that we're hitting amnesiac/clone or that cubs turned
+                overkill = True
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
+
+            if num_wolves > 0:
+                num_wolves -= 1
+            elif equiv_sets["wolf_fallen"] > 0:
+                equiv_sets["wolf_fallen"] -= 1
+                equiv_sets["fallen_guardian"] = max(0, equiv_sets["fallen_guardian"] - 1)
+                rolecounts["fallen angel"][1] = max(0, rolecounts["fallen angel"][1] - 1)
+                rolecounts["guardian angel"][0] = max(rolecounts["guardian angel"][0] + 1, rolecounts["guardian angel"][1])
+                rolecounts["fallen angel"][0] = min(rolecounts["fallen angel"][0], rolecounts["fallen angel"][1])
+        elif pr == "fallen angel":
+            # person that died could have possibly been turned by alpha
+            if rolecounts[pr][1] == 0:
+                overkill = True
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
+
+            if num_fallen > 0:
+                num_fallen -= 1
+            elif equiv_sets["wolf_fallen"] > 0:
+                equiv_sets["wolf_fallen"] -= 1
+                equiv_sets["fallen_guardian"] = max(0, equiv_sets["fallen_guardian"] - 1)
+                rolecounts["wolf"][1] = max(0, rolecounts["wolf"][1] - 1)
+                rolecounts["wolf"][0] = min(rolecounts["wolf"][0], rolecounts["wolf"][1])
+                # this also means a GA died for sure (we lowered the lower bound previously)
+                rolecounts["guardian angel"][1] = max(0, rolecounts["guardian angel"][1] - 1)
+        elif pr == "guardian angel":
+            if rolecounts[pr][1] == 0:
+                overkill = True
+            if rolecounts[pr][1] <= equiv_sets["fallen_guardian"] and equiv_sets["fallen_guardian"] > 0:
+                # we got rid of a GA that was an FA candidate, so get rid of the FA as well
+                # (this also means that there is a guaranteed wolf so add that in)
+                equiv_sets["fallen_guardian"] = max(0, equiv_sets["fallen_guardian"] - 1)
+                equiv_sets["wolf_fallen"] = max(0, equiv_sets["wolf_fallen"] - 1)
+                rolecounts["fallen angel"][1] = max(rolecounts["fallen angel"][0], rolecounts["fallen angel"][1] - 1)
+                rolecounts["wolf"][0] = min(rolecounts["wolf"][0] + 1, rolecounts["wolf"][1])
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
+        elif pr == "wolf cub":
+            if rolecounts[pr][1] == 0:
+                overkill = True
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
+            equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+        else:
+            # person that died is guaranteed to be that role (e.g. not in an equiv_set)
+            if rolecounts[pr][1] == 0:
+                overkill = True
+            rolecounts[pr][0] = max(0, rolecounts[pr][0] - 1)
+            rolecounts[pr][1] = max(0, rolecounts[pr][1] - 1)
+
+        if overkill:
+            # we tried killing more people than exist in a role, so deduct from amnesiac/clone count instead
+            if var.CURRENT_GAMEMODE.name == "sleepy" and pr == "doomsayer":
+                rolecounts["seer"][0] = max(0, rolecounts["seer"][0] - 1)
+                rolecounts["seer"][1] = max(0, rolecounts["seer"][1] - 1)
+            elif var.CURRENT_GAMEMODE.name == "sleepy" and pr == "demoniac":
+                rolecounts["cultist"][0] = max(0, rolecounts["cultist"][0] - 1)
+                rolecounts["cultist"][1] = max(0, rolecounts["cultist"][1] - 1)
+            elif var.CURRENT_GAMEMODE.name == "sleepy" and pr == "succubus":
+                rolecounts["harlot"][0] = max(0, rolecounts["harlot"][0] - 1)
+                rolecounts["harlot"][1] = max(0, rolecounts["harlot"][1] - 1)
+            elif pr == "clone":
+                # in this case, it means amnesiac became a clone (clone becoming amnesiac is impossible so we
+                # do not have the converse check in here - clones always inherit what amnesiac turns into).
+                equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
+                equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+                rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
+                rolecounts["amnesiac"][1] = max(0, rolecounts["amnesiac"][1] - 1)
+            elif pr == "wolf":
+                # This could potentially be caused by a cub, not necessarily amnesiac/clone
+                # as such we use a different equiv_set to reflect this
+                maybe_cub = True
+                num_realwolves = sum([rolecounts[r][1] for r in var.WOLF_ROLES if r != "wolf cub"])
+                if rolecounts["wolf cub"][1] == 0 or num_realwolves > 0:
+                    maybe_cub = False
+
+                if (var.HIDDEN_AMNESIAC or rolecounts["amnesiac"][1] == 0) and (var.HIDDEN_CLONE or rolecounts["clone"][1] == 0):
+                    # guaranteed to be cub
+                    equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+                    rolecounts["wolf cub"][0] = max(0, rolecounts["wolf cub"][0] - 1)
+                    rolecounts["wolf cub"][1] = max(0, rolecounts["wolf cub"][1] - 1)
+                elif (var.HIDDEN_CLONE or rolecounts["clone"][1] == 0) and not maybe_cub:
+                    # guaranteed to be amnesiac
+                    equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
+                    equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+                    rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
+                    rolecounts["amnesiac"][1] = max(0, rolecounts["amnesiac"][1] - 1)
+                elif (var.HIDDEN_AMNESIAC or rolecounts["amnesiac"][1] == 0) and not maybe_cub:
+                    # guaranteed to be clone
+                    equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
+                    equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+                    rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
+                    rolecounts["clone"][1] = max(0, rolecounts["clone"][1] - 1)
+                else:
+                    # could be anything, how exciting!
+                    if maybe_cub:
+                        maxcount = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+                    else:
+                        maxcount = max(0, equiv_sets["amnesiac_clone"] - 1)
+
+                    rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
+                    if rolecounts["amnesiac"][1] > maxcount:
+                        rolecounts["amnesiac"][1] = maxcount
+
+                    rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
+                    if rolecounts["clone"][1] > maxcount:
+                        rolecounts["clone"][1] = maxcount
+
+                    if maybe_cub:
+                        rolecounts["wolf cub"][0] = max(0, rolecounts["wolf cub"][0] - 1)
+                        if rolecounts["wolf cub"][1] > maxcount:
+                            rolecounts["wolf cub"][1] = maxcount
+
+                    if maybe_cub:
+                        equiv_sets["amnesiac_clone_cub"] = maxcount
+                        equiv_sets["amnesiac_clone"] = min(equiv_sets["amnesiac_clone"], maxcount)
+                    else:
+                        equiv_sets["amnesiac_clone"] = maxcount
+                        equiv_sets["amnesiac_clone_cub"] = max(maxcount, equiv_sets["amnesiac_clone_cub"] - 1)
+
+            elif not var.HIDDEN_AMNESIAC and (var.HIDDEN_CLONE or rolecounts["clone"][1] == 0):
+                # guaranteed to be amnesiac overkilling as clone reports as clone
+                equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
+                equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+                rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
+                rolecounts["amnesiac"][1] = max(0, rolecounts["amnesiac"][1] - 1)
+            elif not var.HIDDEN_CLONE and (var.HIDDEN_AMNESIAC or rolecounts["amnesiac"][1] == 0):
+                # guaranteed to be clone overkilling as amnesiac reports as amnesiac
+                equiv_sets["amnesiac_clone"] = max(0, equiv_sets["amnesiac_clone"] - 1)
+                equiv_sets["amnesiac_clone_cub"] = max(0, equiv_sets["amnesiac_clone_cub"] - 1)
+                rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
+                rolecounts["clone"][1] = max(0, rolecounts["clone"][1] - 1)
+            else:
+                # could be either
+                maxcount = max(0, equiv_sets["amnesiac_clone"] - 1)
+
+                rolecounts["amnesiac"][0] = max(0, rolecounts["amnesiac"][0] - 1)
+                if rolecounts["amnesiac"][1] > maxcount:
+                    rolecounts["amnesiac"][1] = maxcount
+
+                rolecounts["clone"][0] = max(0, rolecounts["clone"][0] - 1)
+                if rolecounts["clone"][1] > maxcount:
+                    rolecounts["clone"][1] = maxcount
+
+                equiv_sets["amnesiac_clone"] = maxcount
+                equiv_sets["amnesiac_clone_cub"] = max(maxcount, equiv_sets["amnesiac_clone_cub"] - 1)
+    # Step 5. Handle cub growing up. Bot does not send out a message for this, so we need
+    # to puzzle it out ourselves. If there are no amnesiacs or clones
+    # then we can deterministically figure out cubs growing up. Otherwise we don't know for
+    # sure whether or not they grew up.
+    num_realwolves = sum([rolecounts[r][1] for r in var.WOLF_ROLES if r != "wolf cub"])
+    if num_realwolves == 0:
+        # no wolves means cubs may have turned, set the min cub and max wolf appropriately
+        rolecounts["wolf"][1] += rolecounts["wolf cub"][1]
+        if rolecounts["amnesiac"][1] == 0 and rolecounts["clone"][1] == 0:
+            # we know for sure they grew up
+            rolecounts["wolf"][0] += rolecounts["wolf cub"][0]
+            rolecounts["wolf cub"][1] = 0
+        rolecounts["wolf cub"][0] = 0
+    return rolecounts
+
+def baseline(dead, alive):
+    """What the old deduction makes of the game, reading the deaths in the order they happened.
+
+    It went through the dead in join order, which is only the order they
+    died in when nobody died out of turn; so ALL_PLAYERS is put in death
+    order while it runs.
+    """
+    players = var.ALL_PLAYERS
+    by_nick = {player.nick: player for player in players}
+    var.ALL_PLAYERS = [by_nick[nick] for nick in dead] + [by_nick[nick] for nick in alive]
+    try:
+        return baseline_counts(alive)
+    finally:
+        var.ALL_PLAYERS = players
+
+def new_game(roles, *, hidden_traitor=False, hidden_amnesiac=False, hidden_clone=False):
+    """Set up var for a game whose players (p0, p1, ...) have the given roles; return the nicks."""
+    nicks = ["p{0}".format(i) for i in range(len(roles))]
+    var.ORIGINAL_ROLES = defaultdict(set)
+    for nick, role in zip(nicks, roles):
+        var.ORIGINAL_ROLES[role].add(nick)
+    var.ALL_PLAYERS = [SimpleNamespace(nick=nick) for nick in nicks]
+    var.FINAL_ROLES = {}
+    var.EXCHANGED_ROLES = []
+    var.TRAITOR_TURNED = False
+    var.EXTRA_WOLVES = 0
+    var.CURRENT_GAMEMODE = SimpleNamespace(name="default")
+    var.HIDDEN_TRAITOR = hidden_traitor
+    var.HIDDEN_AMNESIAC = hidden_amnesiac
+    var.HIDDEN_CLONE = hidden_clone
+    return nicks
+
+def counts(rolecounts):
+    return {role: count for role, count in rolecounts.items() if count != [0, 0]}
+
+def play(rng, check):
+    """Play out a random game, calling check(deduction, dead, alive) after every event.
+
+    Players die in any order, and role swaps, amnesiacs remembering and
+    nick changes can happen at any time. The old deduction took the extra
+    wolves and the traitors turning to have happened before anyone died,
+    so those only happen then here; see test_traitor_turns_after_deaths
+    for what happens otherwise.
+    """
+    roles = [rng.choice(ROLES) for i in range(rng.randint(6, 20))]
+    roles[0] = "wolf"
+    nicks = new_game(roles, hidden_traitor=rng.random() < 0.5,
+                     hidden_amnesiac=rng.random() < 0.5, hidden_clone=rng.random() < 0.5)
+    current = dict(zip(nicks, roles))
+    alive = list(nicks)
+    dead = []
+    deduction = RoleDeduction()
+    while len(alive) > 2:
+        event = rng.random()
+        if event < 0.45:
+            nick = alive.pop(rng.randrange(len(alive)))
+            dead.append(nick)
+            deduction.died(nick)
+        elif event < 0.6:
+            a, b = rng.sample(alive, 2)
+            current[a], current[b] = current[b], current[a]
+            var.FINAL_ROLES[a] = current[a]
+            var.FINAL_ROLES[b] = current[b]
+            var.EXCHANGED_ROLES.append((a, b))
+            deduction.exchanged(a, b)
+        elif event < 0.7:
+            wolves = [nick for nick in alive if current[nick] not in var.WOLF_ROLES]
+            if dead or not wolves:
+                continue
+            nick = rng.choice(wolves)
+            current[nick] = var.FINAL_ROLES[nick] = "wolf"
+            var.EXTRA_WOLVES += 1
+            deduction.wolf_added()
+        elif event < 0.75:
+            traitors = [nick for nick in alive if current[nick] == "traitor"]
+            if dead or var.TRAITOR_TURNED or not traitors:
+                continue
+            var.TRAITOR_TURNED = True
+            for nick in traitors:
+                current[nick] = var.FINAL_ROLES[nick] = "wolf"
+            deduction.traitors_turned()
+        elif event < 0.85:
+            amnesiacs = [nick for nick in alive if current[nick] == "amnesiac"]
+            if not amnesiacs or not dead:
+                continue
+            nick = rng.choice(amnesiacs)
+            current[nick] = var.FINAL_ROLES[nick] = current[rng.choice(dead)]
+        else:
+            old = rng.choice(alive)
+            new = old + "_"
+            alive[alive.index(old)] = new
+            current[new] = current.pop(old)
+            for players in var.ORIGINAL_ROLES.values():
+                if old in players:
+                    players.remove(old)
+                    players.add(new)
+            for player in var.ALL_PLAYERS:
+                if player.nick == old:
+                    player.nick = new
+            if old in var.FINAL_ROLES:
+                var.FINAL_ROLES[new] = var.FINAL_ROLES.pop(old)
+            var.EXCHANGED_ROLES[:] = [tuple(new if nick == old else nick for nick in pair) for pair in var.EXCHANGED_ROLES]
+            deduction.renamed(old, new)
+        check(deduction, dead, alive)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_baseline(seed):
+    def check(deduction, dead, alive):
+        assert counts(deduction.get_counts()) == counts(baseline(dead, alive))
+    play(random.Random(seed), check)
+
+def test_deaths_out_of_join_order():
+    new_game(["wolf", "villager", "seer", "villager", "traitor"])
+    deduction = RoleDeduction()
+    deduction.died("p3")
+    deduction.died("p2")
+    assert counts(deduction.get_counts()) == counts(baseline(["p3", "p2"], ["p0", "p1", "p4"]))
+
+@pytest.mark.parametrize("hidden", (False, True))
+def test_traitor_turns_after_deaths(hidden):
+    new_game(["wolf", "villager", "traitor", "villager", "villager"], hidden_traitor=hidden)
+    deduction = RoleDeduction()
+    deduction.died("p0")
+    deduction.died("p1")
+    var.TRAITOR_TURNED = True
+    var.FINAL_ROLES["p2"] = "wolf"
+    deduction.traitors_turned()
+    # someone turned, so the villager who died wasn't the only traitor
+    assert counts(deduction.get_counts()) == {"wolf": [1, 1], "villager": [2, 2]}
+
+# vim: set sw=4 expandtab:
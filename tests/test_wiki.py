@@ -0,0 +1,132 @@
+"""Check !wiki and its cache against a local stand-in for the wiki's API."""
+
+import http.server
+import json
+import os
+import threading
+import urllib.parse
+
+import pytest
+
+import src.settings as var
+from src import games, networks, wiki, wolfgame
+
+PAGES = {"Seer": "The seer sees.\nMore about the seer."}
+
+class WikiHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        server.release.wait(5)
+        if server.broken:
+            self.send_error(500)
+            return
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        if query["action"] == ["opensearch"]:
+            term = query["search"][0]
+            body = [term, [title for title in PAGES if title.lower().startswith(term.lower())]]
+        else:
+            title = query["titles"][0]
+            body = {"query": {"pages": {"1": {"extract": PAGES[title]}}}}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), WikiHandler)
+    server.requests = 0
+    server.broken = False
+    server.release = threading.Event()
+    server.release.set()
+    server.base = "http://127.0.0.1:{0}".format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def cache(server, tmp_path):
+    return wiki.WikiCache(str(tmp_path / "data" / "wiki_cache.json"), ttl=60,
+                          fetch=lambda term: wiki.fetch_page(term, server.base))
+
+def lookup(cache, term):
+    done = threading.Event()
+    answers = []
+    def callback(result, error):
+        answers.append((result, error, threading.current_thread()))
+        done.set()
+    cache.lookup(term, callback)
+    assert done.wait(5)
+    return answers[0]
+
+def test_fetch_page(server):
+    assert wiki.fetch_page("seer", server.base) == ("Seer", "The seer sees.")
+    assert wiki.fetch_page("nothing", server.base) is None
+
+def test_fetch_page_fails(server):
+    server.broken = True
+    with pytest.raises(wiki.WikiError):
+        wiki.fetch_page("seer", server.base)
+
+def test_cache_fetches_once(server, cache, tmp_path):
+    assert not (tmp_path / "data").exists()
+    result, error, thread = lookup(cache, "seer")
+    assert (result, error) == (("Seer", "The seer sees."), None)
+    assert thread is not threading.current_thread()
+    assert server.requests == 2
+
+    # served from the cache this time, before lookup() returns
+    result, error, thread = lookup(cache, "Seer")
+    assert result == ("Seer", "The seer sees.")
+    assert thread is threading.current_thread()
+    assert server.requests == 2
+
+    cache._runner._queue.join() # saved after the callbacks are called
+    saved = json.loads((tmp_path / "data" / "wiki_cache.json").read_text())
+    assert saved["seer"][1] == ["Seer", "The seer sees."]
+
+def test_cache_errors_are_not_kept(server, cache):
+    server.broken = True
+    result, error, thread = lookup(cache, "seer")
+    assert result is None and error
+    server.broken = False
+    assert lookup(cache, "seer")[:2] == (("Seer", "The seer sees."), None)
+
+def test_cache_file_in_data_dir(monkeypatch):
+    monkeypatch.setattr(wiki, "_cache", None)
+    monkeypatch.setattr(var, "WIKI_CACHE_DUMP", "")
+    cache = wiki.wiki_cache()
+    assert cache is wiki.wiki_cache()
+    assert os.path.abspath(cache.path) == os.path.abspath(os.path.join(
+        os.path.dirname(__file__), "..", var.DATA_DIR, var.WIKI_CACHE_FILE))
+
+def test_wiki_answers_on_game_loop(server, cache, make_game, game_loop, irc, monkeypatch):
+    monkeypatch.setattr(wolfgame, "wiki_cache", lambda: cache)
+    first, second = make_game("#wiki-a"), make_game("#wiki-b")
+
+    server.release.clear()
+    with first:
+        net = networks.current()
+        wolfgame.wiki.func(irc, "tester", "#wiki-a", "seer")
+    # another game is bound by the time the answer arrives
+    with games._lock:
+        games._switch(second)
+    server.release.set()
+    assert irc.wait(2)
+
+    assert [line[:2] for line in irc.said] == [("#wiki-a", "https://werewolf.chat/Seer"), ("tester", "The seer sees.")]
+    for target, message, thread, network, game in irc.said:
+        assert thread is game_loop._thread
+        assert network is net
+        assert game is first
+
+# vim: set sw=4 expandtab:
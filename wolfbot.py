@@ -46,35 +46,128 @@ except ImportError:
           "- The lykos developers"]))
     sys.exit(1)
 
+import threading
+import time
+
+class ImportTimer:
+    """Record how long each module takes to import, not counting the modules it imports."""
+
+    def __init__(self):
+        self.times = {}
+        self._children = []
+        self._finding = set()
+
+    def find_spec(self, name, path=None, target=None):
+        if name in self._finding:
+            return None
+        self._finding.add(name)
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            spec = None
+        finally:
+            self._finding.discard(name)
+        if spec is None or spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return None
+        spec.loader = _TimedLoader(self, name, spec.loader)
+        return spec
+
+    def report(self, limit=25):
+        total = sum(self.times.values())
+        src.plog("Imported {0} modules in {1:.0f}ms, slowest first:".format(len(self.times), total * 1000))
+        for name, t in sorted(self.times.items(), key=lambda x: -x[1])[:limit]:
+            src.plog("{0:>8.1f}ms  {1}".format(t * 1000, name))
+
+class _TimedLoader:
+    def __init__(self, timer, name, loader):
+        self._timer = timer
+        self._name = name
+        self._loader = loader
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        timer = self._timer
+        timer._children.append(0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = timer._children.pop()
+            if timer._children:
+                timer._children[-1] += elapsed
+            timer.times[self._name] = timer.times.get(self._name, 0) + elapsed - children
+
+import_timer = None
+if "--profile-startup" in sys.argv:
+    import importlib.util
+    import_timer = ImportTimer()
+    sys.meta_path.insert(0, import_timer)
+
 from oyoyo.client import IRCClient
 
 import src
-from src import handler
+import src.settings as var
+from src import handler, db, gameloop, networks, pacing, wolfgame
 from src.events import Event
 
 def main():
+    start = time.perf_counter()
+    db.init()
+    if import_timer is not None:
+        sys.meta_path.remove(import_timer)
+        import_timer.report()
+        src.plog("Initialized the database in {0:.0f}ms".format((time.perf_counter() - start) * 1000))
+
     evt = Event("init", {})
     evt.dispatch()
-    src.plog("Connecting to {0}:{1}{2}".format(botconfig.HOST, "+" if botconfig.USE_SSL else "", botconfig.PORT))
-    cli = IRCClient(
-                      {"privmsg": lambda *s: None,
-                       "notice": lambda *s: None,
-                       "": handler.unhandled},
-                     host=botconfig.HOST,
-                     port=botconfig.PORT,
-                     authname=botconfig.USERNAME,
-                     password=botconfig.PASS,
-                     nickname=botconfig.NICK,
-                     ident=botconfig.IDENT,
-                     real_name=botconfig.REALNAME,
-                     sasl_auth=botconfig.SASL_AUTHENTICATION,
-                     server_pass=botconfig.SERVER_PASS,
-                     use_ssl=botconfig.USE_SSL,
-                     connect_cb=handler.connect_callback,
-                     stream_handler=src.stream,
-    )
-    cli.mainLoop()
 
+    extra = getattr(botconfig, "NETWORKS", [])
+    if extra:
+        # every network gets the listeners the roles come with, so they can't wait until the first game
+        wolfgame.load_roles()
+    # from here on, everything that touches the games runs in the game loop
+    gameloop.loop.start()
+    clients = [connect(network) for network in [networks.default()] + [networks.add(settings) for settings in extra]]
+    for cli in clients[1:]:
+        threading.Thread(None, cli.mainLoop, name="network-" + cli.host, daemon=True).start()
+    clients[0].mainLoop()
+
+def connect(network):
+    """Create the client for a network, which connects once its mainLoop is run."""
+    with network:
+        src.plog("Connecting to {0}:{1}{2}".format(botconfig.HOST, "+" if botconfig.USE_SSL else "", botconfig.PORT))
+        network.client = IRCClient(
+                          {"privmsg": lambda *s: None,
+                           "notice": lambda *s: None,
+                           "": handler.unhandled},
+                         host=botconfig.HOST,
+                         port=botconfig.PORT,
+                         authname=botconfig.USERNAME,
+                         password=botconfig.PASS,
+                         nickname=botconfig.NICK,
+                         ident=botconfig.IDENT,
+                         real_name=botconfig.REALNAME,
+                         sasl_auth=botconfig.SASL_AUTHENTICATION,
+                         server_pass=botconfig.SERVER_PASS,
+                         use_ssl=botconfig.USE_SSL,
+                         connect_cb=handler.connect_callback,
+                         stream_handler=src.stream,
+        )
+        if var.IRC_CAPTURE_FILE:
+            path = var.IRC_CAPTURE_FILE
+            if network is not networks.default():
+                path += "." + botconfig.HOST
+            network.client.capture = open(path, "ab", buffering=0)
+        pacing.Pacer(network.client, *(network.settings.get(name, getattr(var, name)) for name in pacing.SETTINGS))
+        # the game loop only queues lines, instead of waiting on the flood limiter itself
+        network.client.start_sending()
+        return network.client
 
 if __name__ == "__main__":
     try: